@@ -68,9 +68,23 @@ class TriggerMode:
     CONTINUOUS = "Continuous Acquisition"
 
 
+class AcquisitionOutputFormat(Enum):
+    """How multipoint acquisition images are written to disk.
+
+    INDIVIDUAL_IMAGES: One file per image, in Acquisition.IMAGE_FORMAT
+    OME_ZARR: All images streamed into a single chunked OME-Zarr store
+    OME_TIFF: Images streamed into one OME-TIFF per region and time point
+    """
+
+    INDIVIDUAL_IMAGES = "INDIVIDUAL_IMAGES"
+    OME_ZARR = "OME_ZARR"
+    OME_TIFF = "OME_TIFF"
+
+
 class Acquisition:
     NUMBER_OF_FOVS_PER_AF = 3
     IMAGE_FORMAT = "bmp"
+    OUTPUT_FORMAT = AcquisitionOutputFormat.INDIVIDUAL_IMAGES.value
     IMAGE_DISPLAY_SCALING_FACTOR = 0.3
     DX = 0.9
     DY = 0.9
@@ -259,6 +273,10 @@ class SpotDetectionMode(Enum):
 
 PRINT_CAMERA_FPS = True
 
+# Bin the live view (when it isn't in napari) to the screen and map it to 8 bit on its own thread, showing the newest
+# frame whenever the display is ready for one, rather than queueing full frames for the gui thread.
+USE_DISPLAY_PIPELINE = True
+
 ###########################################################
 #### machine specific configurations - to be overridden ###
 ###########################################################
@@ -452,6 +470,15 @@ class AF:
     STOP_THRESHOLD = 0.85
     CROP_WIDTH = 800
     CROP_HEIGHT = 800
+    # The coarse sweep steps this many focus steps (deltaZ) at a time, focus is then found to within half a focus step.
+    COARSE_STEP_MULTIPLE = 2
+    # Focus measures are computed on the crop downsampled by this factor.
+    FOCUS_MEASURE_DOWNSAMPLE = 2
+    # Near (within HISTORY_MAX_DISTANCE_MM of) one of the last HISTORY_LENGTH autofocus results, only
+    # PREDICTED_RANGE_FRACTION of the range is searched, centered on that result's z.
+    HISTORY_LENGTH = 50
+    HISTORY_MAX_DISTANCE_MM = 2.0
+    PREDICTED_RANGE_FRACTION = 0.5
 
 
 class Tracking:
@@ -461,6 +488,10 @@ class Tracking:
     DEFAULT_TRACKER = "csrt"
     INIT_METHODS = ["roi"]
     DEFAULT_INIT_METHOD = "roi"
+    # The tracker only looks at a window this many pixels across around the object (0 for the whole frame), re-centered
+    # on the object when it gets within the margin of the window's edge.
+    SEARCH_WINDOW_PX = 1024
+    SEARCH_WINDOW_MARGIN_PX = 128
 
 
 SHOW_DAC_CONTROL = False
@@ -524,6 +555,10 @@ ENABLE_STROBE_OUTPUT = False
 
 ACQUISITION_PATTERN = "S-Pattern"  # 'S-Pattern', 'Unidirectional'
 FOV_PATTERN = "Unidirectional"  # 'S-Pattern', 'Unidirectional'
+# If True, before an acquisition the regions (and fovs within each region) are reordered to minimize stage travel
+# time, using the stage speeds and accelerations.  The order only depends on the regions, so it is the same every time
+# for the same regions.
+OPTIMIZE_SCAN_PATH = False
 
 Z_STACKING_CONFIG = "FROM BOTTOM"  # 'FROM BOTTOM', 'FROM TOP'
 Z_STACKING_CONFIG_MAP = {0: "FROM BOTTOM", 1: "FROM CENTER", 2: "FROM TOP"}
@@ -569,7 +604,16 @@ LASER_AF_MIN_PEAK_WIDTH = 10
 LASER_AF_MIN_PEAK_DISTANCE = 10
 LASER_AF_MIN_PEAK_PROMINENCE = 0.25
 LASER_AF_SPOT_SPACING = 100
+# Once the laser spots are found, the next frames are only searched within this many pixels of where they were (falling
+# back to the whole frame when the spot isn't found there).  0 always searches the whole frame.
+LASER_AF_ROI_MARGIN_PX = 64
+# With a piezo, keep measuring and correcting after a laser AF move until the displacement is within the displacement
+# success window of the target, up to LASER_AF_CLOSED_LOOP_MAX_ITERATIONS more measurements.
+LASER_AF_CLOSED_LOOP_PIEZO = False
+LASER_AF_CLOSED_LOOP_MAX_ITERATIONS = 3
 SHOW_LEGACY_DISPLACEMENT_MEASUREMENT_WINDOWS = False
+# If set, every displacement measurement (time, x, y) is appended to this csv, for logging drift over long sessions.
+DISPLACEMENT_MEASUREMENT_LOG_PATH = None
 
 MULTIPOINT_REFLECTION_AUTOFOCUS_ENABLE_BY_DEFAULT = False
 MULTIPOINT_CONTRAST_AUTOFOCUS_ENABLE_BY_DEFAULT = False
@@ -641,6 +685,8 @@ USE_NAPARI_WELL_SELECTION = False
 USE_NAPARI_FOR_LIVE_CONTROL = False
 LIVE_ONLY_MODE = False
 MOSAIC_VIEW_TARGET_PIXEL_SIZE_UM = 2
+# The mosaic view is stored in tiles of this many pixels across, only allocated where something was imaged.
+MOSAIC_VIEW_TILE_SIZE = 512
 
 # Controller SN (needed when using multiple teensy-based connections)
 CONTROLLER_SN = None
@@ -661,6 +707,28 @@ ENABLE_STITCHER = False
 IS_HCS = False
 DYNAMIC_REGISTRATION = False
 STITCH_COMPLETE_ACQUISITION = False
+# The coordinate stitcher assembles each region one row of output chunks at a time and writes the rows straight into
+# the output zarr.  Tiles are read, flatfield corrected, and placed by a pool of worker threads, and at most
+# STITCHING_MAX_CHUNK_ROWS_IN_MEMORY rows (plus the tiles they overlap) are held in memory at once.
+STITCHING_NUM_WORKERS = 4
+STITCHING_MAX_CHUNK_ROWS_IN_MEMORY = 8
+# With registration, every pair of neighbouring tiles is registered on its overlap strips (downsampled by
+# STITCHING_REGISTRATION_DOWNSAMPLE_FACTOR), and each tile is placed at the position that agrees best with all of
+# them.  Pairs whose phase correlation peak is below STITCHING_REGISTRATION_MIN_CONFIDENCE fall back to the stage
+# coordinates.  Pairwise results are cached next to the acquisition, so re-stitching doesn't redo them.
+# STITCHING_SAVE_REGISTRATION_DEBUG_IMAGES writes each pair's overlap strips side by side as a PNG.
+STITCHING_REGISTRATION_DOWNSAMPLE_FACTOR = 2
+STITCHING_REGISTRATION_MIN_CONFIDENCE = 0.05
+STITCHING_SAVE_REGISTRATION_DEBUG_IMAGES = False
+
+# Flatfields estimated by the stitcher are cached per (objective, channel, binning) in FLATFIELD_CACHE_PATH, and
+# reused by later stitching runs.  They are fit on a random sample of FLATFIELD_MAX_IMAGES tiles, downsampled by
+# FLATFIELD_DOWNSAMPLE_FACTOR.  With MULTIPOINT_APPLY_FLATFIELD, multipoint acquisitions also divide each image by
+# its cached flatfield (if there is one) before saving it.
+FLATFIELD_CACHE_PATH = "cache/flatfields"
+FLATFIELD_MAX_IMAGES = 32
+FLATFIELD_DOWNSAMPLE_FACTOR = 4
+MULTIPOINT_APPLY_FLATFIELD = False
 
 # Pseudo color settings
 CHANNEL_COLORS_MAP = {
@@ -676,6 +744,58 @@ CHANNEL_COLORS_MAP = {
 SAVE_IN_PSEUDO_COLOR = False
 MERGE_CHANNELS = False
 
+# Pipelined multipoint saving.  When enabled, images are encoded and written by a pool of worker threads so the
+# stage can already move to the next fov while the previous one is being saved.  The queue size bounds how many
+# images can be waiting to be written before the acquisition blocks.
+MULTIPOINT_USE_PIPELINED_SAVING = False
+MULTIPOINT_SAVING_WORKERS = 2
+MULTIPOINT_SAVING_QUEUE_SIZE = 16
+# Record a timeline of every measured acquisition stage (move, settle, trigger, readout, save, ...) per fov, and save it
+# as acquisition_trace.json (Chrome trace format) and acquisition_trace.csv next to the acquisition's coordinates.csv.
+MULTIPOINT_RECORD_TRACE = True
+MULTIPOINT_TRACE_MAX_SPANS = 1_000_000
+# Sequenced multipoint acquisition.  With a hardware triggered camera, the channels of each z level are acquired back
+# to back: the camera and illumination settings are only changed when the channel changes (and the illumination
+# commands aren't waited for before the trigger), each trigger goes out as soon as the camera is ready, and there is no
+# gui round trip or event processing per image.  Z moves are not sequenced, each z level is still a move and settle
+# like the image by image path.  Acquisitions that can't be sequenced (software trigger, RGB or spectrometer channels,
+# custom scripts, ...) use the image by image path instead.
+MULTIPOINT_USE_SEQUENCED_ACQUISITION = False
+# coordinates.csv (a row per fov and z level) and image_metadata.csv (a row per image, with its channel, exposure time
+# and camera frame id) are appended to as the acquisition goes: every MULTIPOINT_COORDINATES_FLUSH_ROWS rows, or
+# MULTIPOINT_COORDINATES_FLUSH_INTERVAL_S after the oldest row that isn't on disk yet.
+MULTIPOINT_COORDINATES_FLUSH_ROWS = 100
+MULTIPOINT_COORDINATES_FLUSH_INTERVAL_S = 1.0
+# Focus tracking.  With autofocus (contrast or laser) on, every successful autofocus result is added to a surface
+# (FOCUS_TRACKING_SURFACE_METHOD: "plane", or a FocusMap "spline" or "rbf" surface), and z moves to the surface's
+# prediction for the next fov along with x and y.  Autofocus is skipped while the last FOCUS_TRACKING_RESIDUAL_WINDOW
+# predictions were within FOCUS_TRACKING_TOLERANCE_UM of where autofocus found focus, for fovs within
+# FOCUS_TRACKING_MAX_DISTANCE_MM of an autofocus result, and for at most FOCUS_TRACKING_MAX_SKIPPED_FOVS fovs in a row.
+MULTIPOINT_USE_FOCUS_TRACKING = False
+FOCUS_TRACKING_SURFACE_METHOD = "plane"
+FOCUS_TRACKING_TOLERANCE_UM = 2.0
+FOCUS_TRACKING_RESIDUAL_WINDOW = 3
+FOCUS_TRACKING_MAX_DISTANCE_MM = 3.0
+FOCUS_TRACKING_MAX_SKIPPED_FOVS = 10
+# Continuous motion (on the fly) scanning.  For single channel, single z level acquisitions without autofocus and with a
+# hardware triggered camera, each row of fovs is scanned without stopping: x moves at a constant speed and the camera is
+# triggered as the stage passes each fov.  The speed is limited so the stage moves at most
+# CONTINUOUS_SCAN_MAX_MOTION_BLUR_PIXELS during an exposure, and so there's at least the camera's frame time plus
+# CONTINUOUS_SCAN_FRAME_OVERHEAD_MS between fovs.  A warning is logged for fovs triggered more than
+# CONTINUOUS_SCAN_MAX_TRIGGER_ERROR_UM from where they should be, and coordinates.csv has where each fov actually was.
+MULTIPOINT_USE_CONTINUOUS_SCAN = False
+CONTINUOUS_SCAN_MAX_MOTION_BLUR_PIXELS = 0.5
+CONTINUOUS_SCAN_FRAME_OVERHEAD_MS = 20
+CONTINUOUS_SCAN_MAX_TRIGGER_ERROR_UM = 5
+
+# Recording (ImageSaver).  Frames waiting to be saved may use up to IMAGE_SAVER_MAX_QUEUED_MB of memory (frames that
+# don't fit are dropped and counted), and are encoded and written by IMAGE_SAVER_NUM_ENCODER_THREADS threads.  With
+# IMAGE_SAVER_USE_SPILL_FILE, frames are instead appended raw to a single file while recording, and only encoded as
+# individual images once the recording is finished.
+IMAGE_SAVER_MAX_QUEUED_MB = 1024
+IMAGE_SAVER_NUM_ENCODER_THREADS = 4
+IMAGE_SAVER_USE_SPILL_FILE = False
+
 # Emission filter wheel
 USE_ZABER_EMISSION_FILTER_WHEEL = False
 ZABER_EMISSION_FILTER_WHEEL_DELAY_MS = 70
@@ -201,6 +201,8 @@ def multipoint_custom_script_entry(multiPointWorker, time_point, current_path, c
                     round(multiPointWorker.crop_width * multiPointWorker.display_resolution_scaling),
                     round(multiPointWorker.crop_height * multiPointWorker.display_resolution_scaling),
                 )
+                # A copy, since it's displayed later and the camera may have reused the frame this is a view of by then.
+                image_to_display = image_to_display.copy()
                 multiPointWorker.image_to_display.emit(image_to_display)
                 multiPointWorker.image_to_display_multi.emit(image_to_display, config.illumination_source)
                 if image.dtype == np.uint16:
@@ -244,17 +246,7 @@ def multipoint_custom_script_entry(multiPointWorker, time_point, current_path, c
                         np.savetxt(saving_path, data, delimiter=",")
 
         # add the coordinate of the current location
-        new_row = pd.DataFrame(
-            {
-                "i": [i],
-                "j": [multiPointWorker.NX - 1 - j],
-                "k": [k],
-                "x (mm)": [multiPointWorker.navigationController.x_pos_mm],
-                "y (mm)": [multiPointWorker.navigationController.y_pos_mm],
-                "z (um)": [multiPointWorker.navigationController.z_pos_mm * 1000],
-            },
-        )
-        multiPointWorker.coordinates_pd = pd.concat([multiPointWorker.coordinates_pd, new_row], ignore_index=True)
+        multiPointWorker.update_coordinates_dataframe(coordiante_name, k, coordinate_id)
 
         # register the current fov in the navigationViewer
         multiPointWorker.signal_register_current_fov.emit(
@@ -279,9 +271,7 @@ def multipoint_custom_script_entry(multiPointWorker, time_point, current_path, c
             else:
                 multiPointWorker.navigationController.move_z_usteps(-multiPointWorker.dz_usteps)
                 multiPointWorker.wait_till_operation_is_completed()
-            multiPointWorker.coordinates_pd.to_csv(
-                os.path.join(current_path, "coordinates.csv"), index=False, header=True
-            )
+            multiPointWorker.close_coordinates_logs()
             multiPointWorker.navigationController.enable_joystick_button_action = True
             return
 
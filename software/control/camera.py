@@ -152,14 +152,13 @@ class DefaultCamera(AbstractCamera):
             if CameraPixelFormat.is_color_format(this_pixel_format):
                 rgb_image = raw_image.convert("RGB")
                 numpy_image = rgb_image.get_numpy_array()
-                if this_pixel_format == CameraPixelFormat.BAYER_RG12:
-                    numpy_image = numpy_image << 4
+                left_shift = 4 if this_pixel_format == CameraPixelFormat.BAYER_RG12 else 0
             else:
                 numpy_image = raw_image.get_numpy_array()
-                if this_pixel_format == CameraPixelFormat.MONO12:
-                    numpy_image = numpy_image << 4
+                left_shift = 4 if this_pixel_format == CameraPixelFormat.MONO12 else 0
 
-            processed_image = self._process_raw_frame(numpy_image)
+            # The 12 bit shift is done as the frame is written into the frame buffer, rather than into a new array.
+            processed_image, slot = self._process_raw_frame_into_buffer(numpy_image, left_shift=left_shift)
 
             current_frame = CameraFrame(
                 frame_id=this_frame_id,
@@ -167,6 +166,7 @@ class DefaultCamera(AbstractCamera):
                 frame=processed_image,
                 frame_format=this_frame_format,
                 frame_pixel_format=this_pixel_format,
+                slot=slot,
             )
             self._current_frame = current_frame
 
@@ -137,7 +137,8 @@ class HamamatsuCamera(AbstractCamera):
                         self._log.error("Frame read resulted in boolean, must be an error.")
                         continue
 
-                    processed_frame = self._process_raw_frame(raw_frame)
+                    # raw_frame is in one of the dcam buffers, which get reused, so process it into our own.
+                    processed_frame, slot = self._process_raw_frame_into_buffer(raw_frame)
                     with self._frame_lock:
                         camera_frame = CameraFrame(
                             frame_id=self._current_frame.frame_id + 1 if self._current_frame else 1,
@@ -145,6 +146,7 @@ class HamamatsuCamera(AbstractCamera):
                             frame=processed_frame,
                             frame_format=self.get_frame_format(),
                             frame_pixel_format=self.get_pixel_format(),
+                            slot=slot,
                         )
 
                         self._current_frame = camera_frame
@@ -1,3 +1,4 @@
+import ctypes
 import math
 import time
 from typing import Optional, Tuple, Sequence, Dict
@@ -260,37 +261,47 @@ class ToupcamCamera(AbstractCamera):
             # while waiting for this frame, that we allow subsequent software triggers.
             self._trigger_sent = False
 
+            this_frame_id = (self._current_frame.frame_id if self._current_frame else 0) + 1
+            this_timestamp = time.time()
+            this_frame_format = self.get_frame_format()
+            this_pixel_format = self.get_pixel_format()
+
+            (x_offset, y_offset, width, height) = self.get_region_of_interest()
+            dtype = np.uint8 if self._get_pixel_size_in_bytes() == 1 else np.uint16
+            # If there is nothing to do to the raw frame, pull it straight into the frame buffer.  Otherwise, pull it
+            # into our read buffer and process it into the frame buffer from there.
+            slot = None
+            read_buffer = self._internal_read_buffer
+            if this_frame_format == CameraFrameFormat.RAW and not self._needs_rotate_or_flip():
+                slot = self._acquire_frame_slot((height, width), dtype)
+                read_buffer = slot.array.ctypes.data_as(ctypes.c_char_p)
+
             # get the image from the camera
             try:
                 self._camera.PullImageV2(
-                    self._internal_read_buffer, self._get_pixel_size_in_bytes() * 8, None
+                    read_buffer, self._get_pixel_size_in_bytes() * 8, None
                 )  # the second camera is number of bits per pixel - ignored in RAW mode
             except toupcam.HRESULTException as ex:
                 # TODO(imo): Propagate error in some way and handle
                 self._log.error("pull image failed, hr=0x{:x}".format(ex.hr))
 
-            this_frame_id = (self._current_frame.frame_id if self._current_frame else 0) + 1
-            this_timestamp = time.time()
-            this_frame_format = self.get_frame_format()
-            this_pixel_format = self.get_pixel_format()
-
             if this_frame_format != CameraFrameFormat.RAW:
                 self._log.error("Only RAW CameraFrameFormat are supported, cannot handle frame.")
                 return
 
-            (x_offset, y_offset, width, height) = self.get_region_of_interest()
-            if self._get_pixel_size_in_bytes() == 1:
-                raw_image = np.frombuffer(self._internal_read_buffer, dtype="uint8")
-            elif self._get_pixel_size_in_bytes() == 2:
-                raw_image = np.frombuffer(self._internal_read_buffer, dtype="uint16")
-            current_raw_image = raw_image.reshape(height, width)
+            if slot:
+                frame = self._frame_view(slot)
+            else:
+                raw_image = np.frombuffer(self._internal_read_buffer, dtype=dtype)
+                frame, slot = self._process_raw_frame_into_buffer(raw_image.reshape(height, width))
 
             current_frame = CameraFrame(
                 frame_id=this_frame_id,
                 timestamp=this_timestamp,
-                frame=self._process_raw_frame(current_raw_image),
+                frame=frame,
                 frame_format=this_frame_format,
                 frame_pixel_format=this_pixel_format,
+                slot=slot,
             )
 
             # Before releasing the lock, set the new current fram with the incremented frame id so other methods can
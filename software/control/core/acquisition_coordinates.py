@@ -0,0 +1,220 @@
+"""
+The coordinates.csv and image_metadata.csv of a multipoint time point.
+
+coordinates.csv has where the stage was for every fov and z level: the columns it always had (region, fov, z_level,
+x (mm), y (mm), z (um), time and, with a piezo, z_piezo (um)), one row per (region, fov, z_level).  image_metadata.csv
+has a row per image, with the (region, fov, z_level) it was taken at, its channel, exposure time and camera frame id.
+
+Rows are kept in a few flat columns (so recording one is a handful of appends rather than a DataFrame concat), and
+appended to the csv as the acquisition goes: every flush_rows rows, or flush_interval_s after the first row that isn't
+on disk yet.  So if the acquisition dies, the files still have everything acquired up to the last flush.
+"""
+
+import abc
+import csv
+import math
+import time
+from array import array
+from typing import List, Optional
+
+import pandas as pd
+
+from squid.abc import Pos
+
+COORDINATES_FILE_NAME = "coordinates.csv"
+IMAGE_METADATA_FILE_NAME = "image_metadata.csv"
+
+
+def _number(value: float):
+    return "" if math.isnan(value) else value
+
+
+class _CsvLog(abc.ABC):
+    def __init__(self, path: Optional[str], columns: List[str], flush_rows: int, flush_interval_s: float):
+        """
+        Appends rows to the csv at path (which is truncated), or only keeps them in memory if path is None.  Not
+        thread safe, rows should be added from one thread.
+        """
+        self.path = path
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+
+        # Rows before this are in the file.
+        self._flushed_rows = 0
+        self._first_unflushed_time: Optional[float] = None
+        self._file = None
+        self._writer = None
+        if path is not None:
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+            self._file.flush()
+
+    @abc.abstractmethod
+    def __len__(self):
+        """
+        The number of rows so far.
+        """
+        pass
+
+    @abc.abstractmethod
+    def _row(self, i: int) -> list:
+        """
+        The csv values of row i.
+        """
+        pass
+
+    def _row_added(self):
+        if self._file is None:
+            return
+        now = time.monotonic()
+        if self._first_unflushed_time is None:
+            self._first_unflushed_time = now
+        if (
+            len(self) - self._flushed_rows >= self.flush_rows
+            or now - self._first_unflushed_time >= self.flush_interval_s
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the rows that aren't in the file yet to it.
+        """
+        if self._file is None or self._flushed_rows == len(self):
+            return
+        self._writer.writerows(self._row(i) for i in range(self._flushed_rows, len(self)))
+        self._file.flush()
+        self._flushed_rows = len(self)
+        self._first_unflushed_time = None
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+class CoordinatesLog(_CsvLog):
+    BASE_COLUMNS = ("region", "fov", "z_level", "x (mm)", "y (mm)", "z (um)", "time")
+    PIEZO_COLUMN = "z_piezo (um)"
+
+    def __init__(
+        self, path: Optional[str], use_piezo: bool = False, flush_rows: int = 100, flush_interval_s: float = 1.0
+    ):
+        self.use_piezo = use_piezo
+        self._region: List = []
+        self._fov: List = []
+        self._z_level: List = []
+        self._x_mm = array("d")
+        self._y_mm = array("d")
+        self._z_um = array("d")
+        self._time: List[str] = []
+        self._z_piezo_um = array("d")
+        super().__init__(
+            path, list(self.BASE_COLUMNS) + ([self.PIEZO_COLUMN] if use_piezo else []), flush_rows, flush_interval_s
+        )
+
+    def __len__(self):
+        return len(self._region)
+
+    def append(self, region_id, fov, z_level: int, pos: Pos, time_str: str, z_piezo_um: Optional[float] = None):
+        self._region.append(region_id)
+        self._fov.append(fov)
+        self._z_level.append(z_level)
+        self._x_mm.append(pos.x_mm)
+        self._y_mm.append(pos.y_mm)
+        self._z_um.append(pos.z_mm * 1000)
+        self._time.append(time_str)
+        self._z_piezo_um.append(math.nan if z_piezo_um is None else z_piezo_um)
+        self._row_added()
+
+    def _row(self, i: int) -> list:
+        row = [self._region[i], self._fov[i], self._z_level[i], self._x_mm[i], self._y_mm[i], self._z_um[i]]
+        row.append(self._time[i])
+        if self.use_piezo:
+            row.append(_number(self._z_piezo_um[i]))
+        return row
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        The rows so far, as they read back from the csv.
+        """
+        data = {
+            "region": self._region,
+            "fov": self._fov,
+            "z_level": self._z_level,
+            "x (mm)": self._x_mm,
+            "y (mm)": self._y_mm,
+            "z (um)": self._z_um,
+            "time": self._time,
+        }
+        if self.use_piezo:
+            data[self.PIEZO_COLUMN] = self._z_piezo_um
+        return pd.DataFrame(data, columns=self.columns)
+
+
+class ImageMetadataLog(_CsvLog):
+    COLUMNS = ("region", "fov", "z_level", "channel", "exposure (ms)", "frame_id", "time")
+
+    def __init__(self, path: Optional[str], flush_rows: int = 100, flush_interval_s: float = 1.0):
+        self._region: List = []
+        self._fov: List = []
+        self._z_level: List = []
+        self._channel: List[str] = []
+        self._exposure_ms = array("d")
+        self._frame_id: List[Optional[int]] = []
+        self._time: List[str] = []
+        super().__init__(path, list(self.COLUMNS), flush_rows, flush_interval_s)
+
+    def __len__(self):
+        return len(self._region)
+
+    def append(
+        self,
+        region_id,
+        fov,
+        z_level: int,
+        channel: str,
+        exposure_ms: Optional[float],
+        frame_id: Optional[int],
+        time_str: str,
+    ):
+        self._region.append(region_id)
+        self._fov.append(fov)
+        self._z_level.append(z_level)
+        self._channel.append(channel)
+        self._exposure_ms.append(math.nan if exposure_ms is None else exposure_ms)
+        self._frame_id.append(frame_id)
+        self._time.append(time_str)
+        self._row_added()
+
+    def _row(self, i: int) -> list:
+        return [
+            self._region[i],
+            self._fov[i],
+            self._z_level[i],
+            self._channel[i],
+            _number(self._exposure_ms[i]),
+            self._frame_id[i],
+            self._time[i],
+        ]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        The rows so far, as they read back from the csv.
+        """
+        data = {
+            "region": self._region,
+            "fov": self._fov,
+            "z_level": self._z_level,
+            "channel": self._channel,
+            "exposure (ms)": self._exposure_ms,
+            "frame_id": self._frame_id,
+            "time": self._time,
+        }
+        return pd.DataFrame(data, columns=self.columns)
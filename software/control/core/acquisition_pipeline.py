@@ -0,0 +1,169 @@
+"""
+Helpers for overlapping the slow, non-hardware parts of an acquisition (encoding and writing images, building
+derived images) with the hardware parts (stage moves, triggering, readout).
+
+The acquisition thread hands jobs to an AcquisitionPipeline, which runs them on a small pool of worker threads.  The
+hand-off queue is bounded, so if the disk can't keep up the acquisition thread blocks in submit() instead of
+buffering an unbounded number of frames in memory.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue
+from typing import Callable, Dict, List, Optional
+
+import squid.logging
+from control.core.acquisition_trace import AcquisitionTracer
+
+
+class StageTimings:
+    """
+    Thread safe accumulator of (count, total, max) durations per named stage of an acquisition.  Used so we can
+    see how much time goes to each stage, and whether the work on the pipeline threads actually overlaps with
+    the work on the acquisition thread.  If given a tracer, every measured span is also recorded in its timeline.
+    """
+
+    def __init__(self, tracer: Optional[AcquisitionTracer] = None):
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}
+        self._start_time = time.perf_counter()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._start_time = time.perf_counter()
+
+    def add(self, stage: str, duration_s: float):
+        with self._lock:
+            stats = self._stats.setdefault(stage, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration_s
+            stats[2] = max(stats[2], duration_s)
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(stage, end - start)
+            if self.tracer is not None:
+                self.tracer.add_span(stage, start, end)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns {stage: {"count", "total_s", "mean_ms", "max_ms"}} for all stages seen so far.
+        """
+        with self._lock:
+            return {
+                stage: {
+                    "count": count,
+                    "total_s": total_s,
+                    "mean_ms": 1000.0 * total_s / count if count else 0.0,
+                    "max_ms": 1000.0 * max_s,
+                }
+                for stage, (count, total_s, max_s) in self._stats.items()
+            }
+
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self._start_time
+
+    def summary_str(self) -> str:
+        parts = [f"wall={self.elapsed_s():.3f} [s]"]
+        for stage, stats in self.summary().items():
+            parts.append(
+                f"{stage}: n={stats['count']} total={stats['total_s']:.3f} [s] "
+                f"mean={stats['mean_ms']:.1f} [ms] max={stats['max_ms']:.1f} [ms]"
+            )
+        return ", ".join(parts)
+
+
+class AcquisitionPipeline:
+    """
+    A bounded job queue consumed by a pool of worker threads.
+
+    submit() blocks once max_queued_jobs jobs are waiting (backpressure), so the memory held by queued frames is
+    bounded.  drain() blocks until everything submitted so far has been processed, and shutdown() drains and then
+    stops the workers.  Exceptions raised by jobs are logged and counted, but do not stop the workers.
+    """
+
+    def __init__(self, num_workers: int = 2, max_queued_jobs: int = 8, timings: Optional[StageTimings] = None):
+        if num_workers < 1:
+            raise ValueError(f"Need at least 1 worker, got {num_workers=}")
+        if max_queued_jobs < 1:
+            raise ValueError(f"Need room for at least 1 queued job, got {max_queued_jobs=}")
+
+        self._log = squid.logging.get_logger(self.__class__.__name__)
+        self._queue = Queue(max_queued_jobs)
+        self._timings = timings if timings is not None else StageTimings()
+        self._error_lock = threading.Lock()
+        self._error_count = 0
+        self._running = True
+        self._workers = [
+            threading.Thread(target=self._process_queue, name=f"AcquisitionPipeline-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def timings(self) -> StageTimings:
+        return self._timings
+
+    @property
+    def error_count(self) -> int:
+        with self._error_lock:
+            return self._error_count
+
+    def pending_jobs(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def submit(self, fn: Callable, *args, stage: str = "save", **kwargs):
+        """
+        Queue fn(*args, **kwargs) to run on a worker thread.  The time spent by the worker running it is recorded
+        under the given stage name, and the time spent blocked here waiting for room in the queue is recorded as
+        "queue_wait".
+        """
+        if not self._running:
+            raise RuntimeError("Cannot submit jobs to an AcquisitionPipeline that has been shut down.")
+        with self._timings.measure("queue_wait"):
+            self._queue.put((fn, args, kwargs, stage))
+
+    def drain(self):
+        """
+        Block until all jobs submitted so far have been processed.
+        """
+        with self._timings.measure("drain"):
+            self._queue.join()
+
+    def shutdown(self):
+        """
+        Process all pending jobs, then stop the worker threads.  Safe to call more than once.
+        """
+        if not self._running:
+            return
+        self.drain()
+        self._running = False
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _process_queue(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs, stage = job
+                with self._timings.measure(stage):
+                    fn(*args, **kwargs)
+            except Exception:
+                with self._error_lock:
+                    self._error_count += 1
+                self._log.exception("Acquisition pipeline job failed.")
+            finally:
+                self._queue.task_done()
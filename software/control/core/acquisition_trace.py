@@ -0,0 +1,197 @@
+"""
+A timeline of what an acquisition spent its time on, per fov.
+
+StageTimings only keeps totals per stage.  When given an AcquisitionTracer, it also records every measured span
+(stage name, start, end, thread, and the fov it was for) here, in a few flat arrays so recording a span is just a
+handful of appends.  The timeline can be exported as a Chrome trace (open in chrome://tracing or
+https://ui.perfetto.dev) or as csv.  A disabled tracer records nothing.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import squid.logging
+
+TRACE_JSON_FILE_NAME = "acquisition_trace.json"
+TRACE_CSV_FILE_NAME = "acquisition_trace.csv"
+
+# (time point, region id, fov index)
+FovKey = Tuple[int, Hashable, int]
+
+
+class AcquisitionTracer:
+    """
+    Thread safe recorder of named spans, each attributed to the fov its thread was working on (see set_fov).  Holds
+    at most max_spans spans, later ones are counted in dropped_spans instead.
+    """
+
+    def __init__(self, enabled: bool = True, max_spans: int = 1_000_000):
+        self._log = squid.logging.get_logger(self.__class__.__name__)
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        # The fov spans recorded on each thread are attributed to.
+        self._thread_fov = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._start_time = time.perf_counter()
+            self._start_datetime = datetime.now()
+            self._names: List[str] = []
+            self._name_ids: Dict[str, int] = {}
+            self._fovs: List[FovKey] = []
+            self._fov_ids: Dict[FovKey, int] = {}
+            self._threads: List[str] = []
+            self._thread_ids: Dict[int, int] = {}
+            self._span_name = array("H")
+            self._span_fov = array("i")
+            self._span_thread = array("H")
+            self._span_start = array("d")
+            self._span_end = array("d")
+            self.dropped_spans = 0
+
+    def __len__(self):
+        return len(self._span_start)
+
+    def set_fov(self, fov: Optional[FovKey]):
+        """
+        Attribute the spans recorded on this thread from now on to the given fov (or to none).
+        """
+        self._thread_fov.fov = fov
+
+    def get_fov(self) -> Optional[FovKey]:
+        return getattr(self._thread_fov, "fov", None)
+
+    def run_in_fov(self, fov: Optional[FovKey], fn: Callable, *args, **kwargs):
+        """
+        For jobs that run on other threads: sets this thread's fov to the fov the job was created for, then runs it.
+        """
+        self.set_fov(fov)
+        return fn(*args, **kwargs)
+
+    def add_span(self, name: str, start: float, end: float):
+        """
+        Records a span of the given name from start to end (time.perf_counter() values), on the current thread and
+        for the current thread's fov.
+        """
+        if not self.enabled:
+            return
+        fov = self.get_fov()
+        thread = threading.get_ident()
+        with self._lock:
+            if len(self._span_start) >= self.max_spans:
+                self.dropped_spans += 1
+                return
+            name_id = self._name_ids.get(name)
+            if name_id is None:
+                name_id = self._name_ids[name] = len(self._names)
+                self._names.append(name)
+            fov_id = -1
+            if fov is not None:
+                fov_id = self._fov_ids.get(fov)
+                if fov_id is None:
+                    fov_id = self._fov_ids[fov] = len(self._fovs)
+                    self._fovs.append(fov)
+            thread_id = self._thread_ids.get(thread)
+            if thread_id is None:
+                thread_id = self._thread_ids[thread] = len(self._threads)
+                self._threads.append(threading.current_thread().name)
+            self._span_name.append(name_id)
+            self._span_fov.append(fov_id)
+            self._span_thread.append(thread_id)
+            self._span_start.append(start - self._start_time)
+            self._span_end.append(end - self._start_time)
+
+    def spans(self) -> List[Dict]:
+        """
+        Returns every recorded span as a dict of name, start_s, duration_s (relative to the last reset), thread,
+        time_point, region and fov.
+        """
+        with self._lock:
+            spans = []
+            for name_id, fov_id, thread_id, start, end in zip(
+                self._span_name, self._span_fov, self._span_thread, self._span_start, self._span_end
+            ):
+                time_point, region, fov = self._fovs[fov_id] if fov_id >= 0 else (None, None, None)
+                spans.append(
+                    {
+                        "name": self._names[name_id],
+                        "start_s": start,
+                        "duration_s": end - start,
+                        "thread": self._threads[thread_id],
+                        "time_point": time_point,
+                        "region": region,
+                        "fov": fov,
+                    }
+                )
+            return spans
+
+    def write_chrome_trace(self, path: str):
+        spans = self.spans()
+        threads = sorted({span["thread"] for span in spans})
+        thread_ids = {thread: i for i, thread in enumerate(threads)}
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 0, "tid": thread_ids[thread], "args": {"name": thread}}
+            for thread in threads
+        ]
+        for span in spans:
+            event = {
+                "name": span["name"],
+                "cat": "acquisition",
+                "ph": "X",
+                "pid": 0,
+                "tid": thread_ids[span["thread"]],
+                "ts": 1e6 * span["start_s"],
+                "dur": 1e6 * span["duration_s"],
+            }
+            if span["fov"] is not None:
+                event["args"] = {"time_point": span["time_point"], "region": str(span["region"]), "fov": span["fov"]}
+            events.append(event)
+
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {
+                        "start_time": self._start_datetime.isoformat(),
+                        "dropped_spans": self.dropped_spans,
+                    },
+                },
+                f,
+            )
+
+    def write_csv(self, path: str):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "start_ms", "duration_ms", "thread", "time_point", "region", "fov"])
+            for span in self.spans():
+                writer.writerow(
+                    [
+                        span["name"],
+                        f"{1000 * span['start_s']:.3f}",
+                        f"{1000 * span['duration_s']:.3f}",
+                        span["thread"],
+                        "" if span["time_point"] is None else span["time_point"],
+                        "" if span["region"] is None else span["region"],
+                        "" if span["fov"] is None else span["fov"],
+                    ]
+                )
+
+    def export(self, directory: str):
+        """
+        Writes the timeline to directory as both a Chrome trace and csv, if anything was recorded.
+        """
+        if not self.enabled or not len(self):
+            return
+        if self.dropped_spans:
+            self._log.warning(f"The acquisition trace is full, {self.dropped_spans} spans were not recorded.")
+        self.write_chrome_trace(os.path.join(directory, TRACE_JSON_FILE_NAME))
+        self.write_csv(os.path.join(directory, TRACE_CSV_FILE_NAME))
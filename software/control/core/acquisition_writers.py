@@ -0,0 +1,453 @@
+"""
+Streaming image writers for multipoint acquisitions.
+
+By default a multipoint acquisition saves one file per (region, fov, z, channel) image (see
+utils_acquisition.save_image).  The writers here instead stream frames into a small number of pre-allocated,
+chunked containers as they are acquired, with the acquisition metadata embedded, so no post-conversion pass over
+the data is needed:
+
+  * OmeZarrImageWriter: one OME-Zarr (NGFF 0.4) store per acquisition with a TCZYX array per fov.  If all the
+    region names are well names (eg: "B12"), the store uses the HCS plate layout (row/column/field).
+  * OmeTiffImageWriter: one BigTIFF OME-TIFF per region and time point, with one ZYX-by-channel series per fov.  These
+    go in their own folder, so the time point folders only have the files the stitcher expects.
+
+Only monochrome frames can be streamed.  Writers are safe to call from multiple threads.
+"""
+
+import abc
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tifffile
+import zarr
+
+from control._def import AcquisitionOutputFormat, FILE_ID_PADDING
+import control.utils as utils
+import squid.logging
+
+_WELL_NAME_PATTERN = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+def split_well_name(region_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns (row, column) for well style region names (eg: "B12" -> ("B", "12")), or None otherwise.
+    """
+    match = _WELL_NAME_PATTERN.match(str(region_id))
+    if not match:
+        return None
+    return match.group(1), match.group(2)
+
+
+class AcquisitionImageWriter(abc.ABC):
+    """
+    Base class for writers that stream a whole multipoint acquisition into pre-allocated containers.
+
+    region_fov_coordinates is the {region_id: [(x_mm, y_mm[, z_mm]), ...]} dict the acquisition will visit, which
+    is used to size the containers up front.  Channel indices passed to write_frame index into channel_names.
+    """
+
+    def __init__(
+        self,
+        experiment_path: str,
+        channel_names: Sequence[str],
+        region_fov_coordinates: Dict[str, Sequence[Tuple[float, ...]]],
+        nt: int,
+        nz: int,
+        pixel_size_um: float,
+        dz_um: float,
+        dt_s: float,
+        acquisition_parameters: Optional[dict] = None,
+    ):
+        self._log = squid.logging.get_logger(self.__class__.__name__)
+        self.experiment_path = experiment_path
+        self.channel_names = list(channel_names)
+        self.region_fov_coordinates = {
+            str(region_id): [tuple(coord) for coord in coords] for region_id, coords in region_fov_coordinates.items()
+        }
+        self.nt = max(1, nt)
+        self.nz = max(1, nz)
+        self.pixel_size_um = pixel_size_um
+        self.dz_um = dz_um if dz_um else 1.0
+        self.dt_s = dt_s if dt_s else 1.0
+        self.acquisition_parameters = acquisition_parameters if acquisition_parameters is not None else {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _check_frame(self, image: np.ndarray, region_id: str, fov: int, z_level: int, channel_index: int):
+        if image.ndim != 2:
+            raise ValueError(f"Only monochrome frames can be streamed, got frame with shape {image.shape}")
+        if region_id not in self.region_fov_coordinates:
+            raise ValueError(f"Unknown region '{region_id}'")
+        if not 0 <= fov < len(self.region_fov_coordinates[region_id]):
+            raise ValueError(f"fov={fov} out of range for region '{region_id}'")
+        if not 0 <= z_level < self.nz:
+            raise ValueError(f"z_level={z_level} out of range (nz={self.nz})")
+        if not 0 <= channel_index < len(self.channel_names):
+            raise ValueError(f"channel_index={channel_index} out of range ({len(self.channel_names)} channels)")
+
+    @abc.abstractmethod
+    def write_frame(
+        self,
+        image: np.ndarray,
+        time_point: int,
+        region_id: str,
+        fov: int,
+        z_level: int,
+        channel_index: int,
+        position: Optional[dict] = None,
+    ):
+        """
+        Write a single 2D frame to its place in the output.  position is an optional dict of per-plane metadata
+        (eg: stage x/y/z and timestamp) that is stored alongside the frame.
+        """
+        pass
+
+    def finish_time_point(self, time_point: int):
+        """
+        Called once all the frames of a time point have been written.  Writers should make sure everything
+        written so far is on disk, so that a crash later in the acquisition doesn't lose it.
+        """
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+
+class OmeZarrImageWriter(AcquisitionImageWriter):
+    STORE_NAME = "acquisition.ome.zarr"
+    NGFF_VERSION = "0.4"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store_path = os.path.join(self.experiment_path, OmeZarrImageWriter.STORE_NAME)
+        self._root = OmeZarrImageWriter._open_group(self.store_path)
+        self._wells = {region_id: split_well_name(region_id) for region_id in self.region_fov_coordinates}
+        self.is_plate = len(self._wells) > 0 and all(well is not None for well in self._wells.values())
+        self._arrays = {}
+        # (region_id, fov) -> list of per plane metadata dicts, flushed to the fov group's attributes.
+        self._planes: Dict[Tuple[str, int], List[dict]] = {}
+        self._dirty_fovs = set()
+
+        self._write_layout_metadata()
+
+    @staticmethod
+    def _open_group(path):
+        try:
+            return zarr.open_group(path, mode="a", zarr_format=2)
+        except TypeError:
+            # zarr-python < 3 only knows how to write format 2, and doesn't have the zarr_format argument.
+            return zarr.open_group(path, mode="a")
+
+    @staticmethod
+    def _create_array(group, name, shape, chunks, dtype):
+        if hasattr(group, "create_array"):
+            return group.create_array(
+                name=name,
+                shape=shape,
+                chunks=chunks,
+                dtype=dtype,
+                fill_value=0,
+                chunk_key_encoding={"name": "v2", "separator": "/"},
+            )
+        return group.create_dataset(
+            name, shape=shape, chunks=chunks, dtype=dtype, fill_value=0, dimension_separator="/"
+        )
+
+    def _fov_group_path(self, region_id: str, fov: int) -> str:
+        if self.is_plate:
+            row, column = self._wells[region_id]
+            return f"{row}/{column}/{fov}"
+        return f"{region_id}/{fov}"
+
+    def _write_layout_metadata(self):
+        root_attrs = {
+            "squid": {
+                "acquisition_parameters": self.acquisition_parameters,
+                "channels": self.channel_names,
+                "regions": {
+                    region_id: {"fov_coordinates_mm": [list(coord) for coord in coords]}
+                    for region_id, coords in self.region_fov_coordinates.items()
+                },
+            }
+        }
+
+        if self.is_plate:
+            rows = sorted({row for (row, _) in self._wells.values()}, key=lambda r: (len(r), r))
+            columns = sorted({column for (_, column) in self._wells.values()}, key=int)
+            wells = []
+            for region_id, (row, column) in self._wells.items():
+                wells.append(
+                    {"path": f"{row}/{column}", "rowIndex": rows.index(row), "columnIndex": columns.index(column)}
+                )
+                fov_count = len(self.region_fov_coordinates[region_id])
+                well_group = self._root.require_group(row).require_group(column)
+                well_group.attrs.update(
+                    {
+                        "well": {
+                            "images": [{"path": str(fov)} for fov in range(fov_count)],
+                            "version": OmeZarrImageWriter.NGFF_VERSION,
+                        }
+                    }
+                )
+            root_attrs["plate"] = {
+                "name": os.path.basename(os.path.normpath(self.experiment_path)),
+                "rows": [{"name": row} for row in rows],
+                "columns": [{"name": column} for column in columns],
+                "wells": wells,
+                "field_count": max(len(coords) for coords in self.region_fov_coordinates.values()),
+                "version": OmeZarrImageWriter.NGFF_VERSION,
+            }
+
+        self._root.attrs.update(root_attrs)
+
+    def _image_attrs(self, region_id: str, fov: int) -> dict:
+        return {
+            "multiscales": [
+                {
+                    "version": OmeZarrImageWriter.NGFF_VERSION,
+                    "name": f"{region_id}_{fov}",
+                    "axes": [
+                        {"name": "t", "type": "time", "unit": "second"},
+                        {"name": "c", "type": "channel"},
+                        {"name": "z", "type": "space", "unit": "micrometer"},
+                        {"name": "y", "type": "space", "unit": "micrometer"},
+                        {"name": "x", "type": "space", "unit": "micrometer"},
+                    ],
+                    "datasets": [
+                        {
+                            "path": "0",
+                            "coordinateTransformations": [
+                                {
+                                    "type": "scale",
+                                    "scale": [self.dt_s, 1.0, self.dz_um, self.pixel_size_um, self.pixel_size_um],
+                                }
+                            ],
+                        }
+                    ],
+                }
+            ],
+            "omero": {"channels": [{"label": name, "active": True} for name in self.channel_names]},
+            "squid": {
+                "region": region_id,
+                "fov": fov,
+                "planned_position_mm": list(self.region_fov_coordinates[region_id][fov]),
+                "planes": [],
+            },
+        }
+
+    def _get_array(self, region_id: str, fov: int, frame_shape, dtype):
+        key = (region_id, fov)
+        array = self._arrays.get(key)
+        if array is not None:
+            return array
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is None:
+                group = self._root.require_group(self._fov_group_path(region_id, fov))
+                group.attrs.update(self._image_attrs(region_id, fov))
+                shape = (self.nt, len(self.channel_names), self.nz, *frame_shape)
+                array = OmeZarrImageWriter._create_array(group, "0", shape, (1, 1, 1, *frame_shape), dtype)
+                self._arrays[key] = array
+        return array
+
+    def write_frame(self, image, time_point, region_id, fov, z_level, channel_index, position=None):
+        region_id = str(region_id)
+        self._check_frame(image, region_id, fov, z_level, channel_index)
+        array = self._get_array(region_id, fov, image.shape, image.dtype)
+        array[time_point, channel_index, z_level] = image
+
+        plane = {"t": time_point, "c": channel_index, "z": z_level}
+        if position:
+            plane.update(position)
+        with self._lock:
+            self._planes.setdefault((region_id, fov), []).append(plane)
+            self._dirty_fovs.add((region_id, fov))
+
+    def _flush_plane_metadata(self):
+        with self._lock:
+            dirty = [(key, list(self._planes[key])) for key in self._dirty_fovs]
+            self._dirty_fovs = set()
+        for (region_id, fov), planes in dirty:
+            group = self._root[self._fov_group_path(region_id, fov)]
+            squid_attrs = dict(group.attrs.get("squid", {}))
+            squid_attrs["planes"] = planes
+            group.attrs["squid"] = squid_attrs
+
+    def finish_time_point(self, time_point):
+        self._flush_plane_metadata()
+
+    def close(self):
+        if self._closed:
+            return
+        self._flush_plane_metadata()
+        self._closed = True
+
+
+class OmeTiffImageWriter(AcquisitionImageWriter):
+    """
+    Writes <experiment>/ome_tiff/<time point>/<region>.ome.tiff, with one CZYX series per fov.  Each file is created
+    (sparse, so this is fast) with all of its series when the first frame for that region arrives, and frames
+    are then written directly to their place in the file.  The OME-XML written with the file has the planned
+    position of each plane, and is replaced with one that has where the stage actually was (and when) once the
+    time point is finished.
+    """
+
+    FOLDER_NAME = "ome_tiff"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (time_point, region_id) -> (path, [data offset of each fov's series], bytes per frame, frame shape, dtype)
+        self._files = {}
+        self._file_locks: Dict[Tuple[int, str], threading.Lock] = {}
+        self._planes: Dict[Tuple[int, str], List[dict]] = {}
+
+    def get_path(self, time_point: int, region_id: str) -> str:
+        return os.path.join(
+            self.experiment_path,
+            OmeTiffImageWriter.FOLDER_NAME,
+            f"{time_point:0{FILE_ID_PADDING}}",
+            f"{region_id}.ome.tiff",
+        )
+
+    def _tiff_metadata(self, region_id: str, fov: int, planes: Optional[List[dict]] = None) -> dict:
+        """
+        The OME metadata of a fov's series.  planes are the fov's written planes (as recorded by write_frame), whose
+        positions replace the planned ones.
+        """
+        x_mm, y_mm, *z_mm = self.region_fov_coordinates[region_id][fov]
+        plane_count = len(self.channel_names) * self.nz
+        positions = {
+            "PositionX": [x_mm] * plane_count,
+            "PositionY": [y_mm] * plane_count,
+            "PositionZ": [z_mm[0] if z_mm else None] * plane_count,
+        }
+        times: List[Optional[datetime]] = [None] * plane_count
+        for plane in planes or []:
+            # Planes are stored in CZ order.
+            index = plane["c"] * self.nz + plane["z"]
+            if "x_mm" in plane:
+                positions["PositionX"][index] = plane["x_mm"]
+            if "y_mm" in plane:
+                positions["PositionY"][index] = plane["y_mm"]
+            if "z_um" in plane:
+                positions["PositionZ"][index] = plane["z_um"] / 1000
+            if "time" in plane:
+                times[index] = datetime.strptime(plane["time"], "%Y-%m-%d_%H-%M-%S.%f")
+
+        plane_metadata = {}
+        for key, values in positions.items():
+            if all(value is not None for value in values):
+                plane_metadata[key] = values
+                plane_metadata[key + "Unit"] = ["mm"] * plane_count
+        metadata = {}
+        if all(plane_time is not None for plane_time in times):
+            acquisition_date = min(times)
+            metadata["AcquisitionDate"] = acquisition_date.isoformat()
+            plane_metadata["DeltaT"] = [(plane_time - acquisition_date).total_seconds() for plane_time in times]
+            plane_metadata["DeltaTUnit"] = ["s"] * plane_count
+        return {
+            **metadata,
+            "axes": "CZYX",
+            "Name": f"{region_id}_{fov}",
+            "Description": json.dumps(self.acquisition_parameters),
+            "PhysicalSizeX": self.pixel_size_um,
+            "PhysicalSizeXUnit": "µm",
+            "PhysicalSizeY": self.pixel_size_um,
+            "PhysicalSizeYUnit": "µm",
+            "PhysicalSizeZ": self.dz_um,
+            "PhysicalSizeZUnit": "µm",
+            "Channel": {"Name": self.channel_names},
+            "Plane": plane_metadata,
+        }
+
+    def _get_file(self, time_point: int, region_id: str, frame_shape, dtype):
+        key = (time_point, region_id)
+        file_info = self._files.get(key)
+        if file_info is not None:
+            return file_info
+        with self._lock:
+            file_info = self._files.get(key)
+            if file_info is None:
+                path = self.get_path(time_point, region_id)
+                utils.ensure_directory_exists(os.path.dirname(path))
+                series_shape = (len(self.channel_names), self.nz, *frame_shape)
+                with tifffile.TiffWriter(path, bigtiff=True, ome=True) as tif:
+                    for fov in range(len(self.region_fov_coordinates[region_id])):
+                        tif.write(shape=series_shape, dtype=dtype, metadata=self._tiff_metadata(region_id, fov))
+                with tifffile.TiffFile(path) as tif:
+                    offsets = [series.dataoffset for series in tif.series]
+                frame_bytes = int(np.prod(frame_shape)) * np.dtype(dtype).itemsize
+                file_info = (path, offsets, frame_bytes, tuple(frame_shape), np.dtype(dtype))
+                self._file_locks[key] = threading.Lock()
+                self._files[key] = file_info
+        return file_info
+
+    def write_frame(self, image, time_point, region_id, fov, z_level, channel_index, position=None):
+        region_id = str(region_id)
+        self._check_frame(image, region_id, fov, z_level, channel_index)
+        path, offsets, frame_bytes, frame_shape, dtype = self._get_file(time_point, region_id, image.shape, image.dtype)
+        if image.shape != frame_shape or image.dtype != dtype:
+            raise ValueError(f"Frame {image.shape} {image.dtype} doesn't match file's {frame_shape} {dtype}")
+
+        offset = offsets[fov] + (channel_index * self.nz + z_level) * frame_bytes
+        data = np.ascontiguousarray(image).tobytes()
+        with self._file_locks[(time_point, region_id)]:
+            with open(path, "r+b") as f:
+                f.seek(offset)
+                f.write(data)
+
+        plane = {"region": region_id, "fov": fov, "t": time_point, "c": channel_index, "z": z_level}
+        if position:
+            plane.update(position)
+        with self._lock:
+            self._planes.setdefault((time_point, region_id), []).append(plane)
+
+    def finish_time_point(self, time_point):
+        # The OME-XML is written when each file is created, before we know where the stage actually was for each
+        # plane (and when), so it's rewritten with that once the time point's frames are all in.
+        with self._lock:
+            keys = [key for key in self._planes if key[0] == time_point]
+            planes = {key: self._planes.pop(key) for key in keys}
+        for (t, region_id), region_planes in planes.items():
+            path, _, _, frame_shape, dtype = self._files[(t, region_id)]
+            fov_planes: Dict[int, List[dict]] = {}
+            for plane in region_planes:
+                fov_planes.setdefault(plane["fov"], []).append(plane)
+
+            channel_count = len(self.channel_names)
+            omexml = tifffile.OmeXml()
+            for fov in range(len(self.region_fov_coordinates[region_id])):
+                omexml.addimage(
+                    dtype,
+                    (channel_count, self.nz, *frame_shape),
+                    (channel_count * self.nz, 1, 1, *frame_shape, 1),
+                    **self._tiff_metadata(region_id, fov, fov_planes.get(fov)),
+                )
+            with self._file_locks[(t, region_id)]:
+                tifffile.tiffcomment(path, omexml.tostring(declaration=True).encode())
+
+    def close(self):
+        if self._closed:
+            return
+        for time_point in sorted({t for (t, _) in self._planes}):
+            self.finish_time_point(time_point)
+        self._closed = True
+
+
+def get_image_writer(output_format: str, **kwargs) -> Optional[AcquisitionImageWriter]:
+    """
+    Returns a writer for the given AcquisitionOutputFormat value, or None if frames should be saved as
+    individual image files.  kwargs are passed to the AcquisitionImageWriter constructor.
+    """
+    output_format = AcquisitionOutputFormat(output_format)
+    if output_format == AcquisitionOutputFormat.OME_ZARR:
+        return OmeZarrImageWriter(**kwargs)
+    elif output_format == AcquisitionOutputFormat.OME_TIFF:
+        return OmeTiffImageWriter(**kwargs)
+    return None
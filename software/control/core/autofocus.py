@@ -0,0 +1,227 @@
+"""
+Contrast autofocus: finding the z that maximizes a focus measure with as few exposures as possible.
+
+The search starts with a coarse sweep up through the range (so open loop z always approaches from below), with steps
+of a few focus steps, which stops as soon as the focus measure drops well below the best so far.  The peak is then
+found to sub-step accuracy without more exposures, by fitting a gaussian (a parabola in log space) through the best
+sample and its neighbours.  Only if that fails, because the curve isn't peaked there, is there a golden section search
+in the bracket around the best sample.
+
+The focus measure of a sweep frame is computed (on a downsampled copy) while the stage moves to the next z.
+
+FocusHistory keeps where earlier autofocus calls found focus, so the next one nearby can search a narrower range
+around where focus should be.
+"""
+
+import math
+from collections import deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+import squid.logging
+
+_log = squid.logging.get_logger("control.core.autofocus")
+
+# How much of the bracket is left after each golden section step.
+GOLDEN_SECTION_RATIO = (math.sqrt(5) - 1) / 2
+
+
+def downsample(image: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Averages factor x factor blocks of image (which also averages out some of the noise the focus measure would see).
+    """
+    if factor <= 1:
+        return image
+    height, width = image.shape[:2]
+    return cv2.resize(image, (max(width // factor, 1), max(height // factor, 1)), interpolation=cv2.INTER_AREA)
+
+
+def fit_peak(z_mm: Sequence[float], measures: Sequence[float]) -> Optional[float]:
+    """
+    The z of the peak of a gaussian (or a parabola, if a measure isn't positive) through the sample with the highest
+    focus measure and its neighbours in z.  None if that sample is at the lowest or highest z, or the curve is flat
+    there.
+    """
+    z = np.asarray(z_mm, dtype=float)
+    m = np.asarray(measures, dtype=float)
+    order = np.argsort(z, kind="stable")
+    z, m = z[order], m[order]
+    best = int(np.argmax(m))
+    if best == 0 or best == len(m) - 1:
+        return None
+    z3, m3 = z[best - 1 : best + 2], m[best - 1 : best + 2]
+    if len(np.unique(z3)) < 3:
+        return None
+    if np.all(m3 > 0):
+        m3 = np.log(m3)
+    # Flat at the top, the peak could be anywhere along there.
+    if max(m3[0], m3[2]) >= m3[1]:
+        return None
+    a, b, _ = np.polyfit(z3, m3, 2)
+    return float(np.clip(-b / (2 * a), z3[0], z3[2]))
+
+
+@dataclass
+class FocusSearchResult:
+    z_mm: float
+    # How z_mm was found: "fit", "golden section", "edge" if the best sample was at the end of the range searched, or
+    # "no frames" if no frame could be read.
+    method: str
+    # The (z, focus measure) of every exposure, in the order they were taken.
+    samples: List[Tuple[float, float]] = field(default_factory=list)
+
+    @property
+    def exposures(self) -> int:
+        return len(self.samples)
+
+
+class FocusSearch:
+    def __init__(
+        self,
+        move_to: Callable[[float], None],
+        capture: Callable[[], Optional[np.ndarray]],
+        measure: Callable[[np.ndarray], float],
+        executor: Optional[Executor] = None,
+    ):
+        """
+        move_to(z_mm) moves the stage (and waits for it), capture() takes a frame there (or returns None if it
+        couldn't), and measure(frame) is the frame's focus measure.  With an executor, the focus measures of sweep
+        frames are computed on it while the stage moves on.
+        """
+        self._move_to = move_to
+        self._capture = capture
+        self._measure = measure
+        self._executor = executor
+
+    def _submit(self, frame: np.ndarray) -> Future:
+        if self._executor is not None:
+            return self._executor.submit(self._measure, frame)
+        future = Future()
+        future.set_result(self._measure(frame))
+        return future
+
+    def sweep(self, z_mm: Sequence[float], stop_threshold: float) -> Tuple[List[Tuple[float, float]], bool]:
+        """
+        Takes a frame at each z in turn.  Stops once a focus measure drops below stop_threshold times the best so far.
+        Returns the (z, focus measure) samples, and whether the sweep stopped early.
+        """
+        samples = []
+        best = -np.inf
+        pending: Optional[Tuple[float, Future]] = None
+        for z in z_mm:
+            self._move_to(z)
+            if pending is not None:
+                pending_z, future = pending
+                pending = None
+                measure = future.result()
+                samples.append((pending_z, measure))
+                if measure < best * stop_threshold:
+                    return samples, True
+                best = max(best, measure)
+            frame = self._capture()
+            if frame is not None:
+                pending = (z, self._submit(frame))
+        if pending is not None:
+            pending_z, future = pending
+            samples.append((pending_z, future.result()))
+        return samples, False
+
+    def golden_section(self, low_mm: float, high_mm: float, tolerance_mm: float) -> List[Tuple[float, float]]:
+        """
+        Narrows [low_mm, high_mm] down to tolerance_mm around the peak, assuming there's a single one in there.
+        Returns the (z, focus measure) samples.
+        """
+        samples = []
+
+        def sample(z):
+            self._move_to(z)
+            frame = self._capture()
+            if frame is None:
+                return -np.inf
+            measure = self._measure(frame)
+            samples.append((z, measure))
+            return measure
+
+        low, high = low_mm, high_mm
+        z_c = high - GOLDEN_SECTION_RATIO * (high - low)
+        z_d = low + GOLDEN_SECTION_RATIO * (high - low)
+        m_c, m_d = sample(z_c), sample(z_d)
+        while high - low > tolerance_mm:
+            if m_c >= m_d:
+                high, z_d, m_d = z_d, z_c, m_c
+                z_c = high - GOLDEN_SECTION_RATIO * (high - low)
+                m_c = sample(z_c)
+            else:
+                low, z_c, m_c = z_c, z_d, m_d
+                z_d = low + GOLDEN_SECTION_RATIO * (high - low)
+                m_d = sample(z_d)
+        return samples
+
+    def run(
+        self, low_mm: float, high_mm: float, coarse_step_mm: float, tolerance_mm: float, stop_threshold: float
+    ) -> FocusSearchResult:
+        """
+        Finds the z of best focus in [low_mm, high_mm].  The stage is left wherever the search last sampled.
+        """
+        n = max(int(round((high_mm - low_mm) / coarse_step_mm)), 1) + 1
+        sweep_z = np.linspace(low_mm, high_mm, n)
+        samples, stopped_early = self.sweep(sweep_z, stop_threshold)
+        if not samples:
+            return FocusSearchResult((low_mm + high_mm) / 2, "no frames")
+
+        z, measures = (np.array(values) for values in zip(*samples))
+        best = int(np.argmax(measures))
+        if z[best] == sweep_z[0] or (z[best] == sweep_z[-1] and not stopped_early):
+            return FocusSearchResult(float(z[best]), "edge", samples)
+
+        z_fit = fit_peak(z, measures)
+        if z_fit is not None:
+            return FocusSearchResult(z_fit, "fit", samples)
+
+        step = sweep_z[1] - sweep_z[0]
+        _log.debug(f"Couldn't fit the focus curve around z={z[best]:.4f} [mm], doing a golden section search.")
+        fine_samples = self.golden_section(z[best] - step, z[best] + step, tolerance_mm)
+        samples += fine_samples
+        fine = [(z[best], measures[best])] + fine_samples
+        fine_z, fine_measures = zip(*fine)
+        z_fit = fit_peak(fine_z, fine_measures)
+        if z_fit is None:
+            z_fit = fine_z[int(np.argmax(fine_measures))]
+        return FocusSearchResult(float(z_fit), "golden section", samples)
+
+
+class FocusHistory:
+    def __init__(self, max_length: int = 50, max_distance_mm: float = 2.0):
+        """
+        Keeps the max_length most recent (x, y, z) in focus positions.  Predictions only use positions within
+        max_distance_mm (in x and y) of where the prediction is for.
+        """
+        self.max_distance_mm = max_distance_mm
+        self._positions = deque(maxlen=max_length)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def add(self, x_mm: float, y_mm: float, z_mm: float):
+        self._positions.append((x_mm, y_mm, z_mm))
+
+    def clear(self):
+        self._positions.clear()
+
+    def predict(self, x_mm: float, y_mm: float) -> Optional[float]:
+        """
+        Where focus should be at (x_mm, y_mm): the z of the nearest position in the history, or None if there's none
+        close enough.
+        """
+        if not self._positions:
+            return None
+        positions = np.array(self._positions)
+        distances = np.hypot(positions[:, 0] - x_mm, positions[:, 1] - y_mm)
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self.max_distance_mm:
+            return None
+        return float(positions[nearest, 2])
@@ -0,0 +1,169 @@
+"""
+Planning for continuous motion (on the fly) scanning, where each row of fovs is scanned without stopping.
+
+The stage moves along x at a constant speed over the whole row, and the camera is triggered when the stage should be
+at each fov.  So that the stage is already at speed at the first fov, and still at speed at the last, the move starts
+a run up distance before the first fov and ends as far past the last.
+
+The speed is the slowest of:
+  - the speed at which the stage moves max_blur_pixels during an exposure (the motion blur budget),
+  - the speed at which there's min_frame_interval_s between fovs (so the camera can keep up),
+  - the stage's max speed, and the speed for which the run up fits within the stage limits.
+
+The micro doesn't do position based triggering, so triggers are timed from the start of the move with the same
+trapezoidal velocity profile scan_path uses for move times.  Positions reported by the micro are ~10 ms stale (which is
+a lot at scanning speeds), so the position the stage was at for an image is the planned position at the time the
+trigger went out.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import squid.logging
+
+_log = squid.logging.get_logger("control.core.continuous_scan")
+
+
+def max_blur_free_speed(exposure_ms: float, pixel_size_um: float, max_blur_pixels: float) -> float:
+    """
+    The fastest the stage can move, in mm/s, while moving at most max_blur_pixels pixels (of pixel_size_um at the
+    sample) during an exposure.
+    """
+    if exposure_ms <= 0:
+        return np.inf
+    return max_blur_pixels * pixel_size_um / 1000 / (exposure_ms / 1000)
+
+
+def motion_blur_pixels(speed_mm_per_s: float, exposure_ms: float, pixel_size_um: float) -> float:
+    """
+    How many pixels (of pixel_size_um at the sample) the stage moves during an exposure at speed_mm_per_s.
+    """
+    return speed_mm_per_s * (exposure_ms / 1000) / (pixel_size_um / 1000)
+
+
+def split_into_rows(coordinates: Sequence[Sequence[float]], tolerance_mm: float = 1e-4) -> List[List[int]]:
+    """
+    Splits the fov coordinates (in scan order) into rows that can be scanned continuously: runs of consecutive fovs
+    with the same y and z, whose x keeps going the same way.  Returns the fov indices of every row, in order.  Rows may
+    have a single fov.
+    """
+    rows = []
+    row = []
+    for i, coordinate in enumerate(coordinates):
+        if row:
+            first, previous = coordinates[row[0]], coordinates[row[-1]]
+            direction = np.sign(coordinates[row[1]][0] - first[0]) if len(row) > 1 else 0
+            step = coordinate[0] - previous[0]
+            same_line = abs(coordinate[1] - first[1]) <= tolerance_mm and (
+                len(coordinate) < 3 or len(first) < 3 or abs(coordinate[2] - first[2]) <= tolerance_mm
+            )
+            same_direction = abs(step) > tolerance_mm and (direction == 0 or np.sign(step) == direction)
+            if not (same_line and same_direction):
+                rows.append(row)
+                row = []
+        row.append(i)
+    if row:
+        rows.append(row)
+    return rows
+
+
+@dataclass(frozen=True)
+class RowScan:
+    # The fov x positions, in scan order, and the move that scans them.
+    fov_x_mm: Tuple[float, ...]
+    start_x_mm: float
+    end_x_mm: float
+    speed_mm_per_s: float
+    acceleration_mm_per_s2: float
+    # When to trigger for each fov, in seconds since the start of the move.
+    trigger_times_s: Tuple[float, ...]
+
+    @property
+    def direction(self) -> float:
+        return 1.0 if self.end_x_mm >= self.start_x_mm else -1.0
+
+    @property
+    def duration_s(self) -> float:
+        """
+        How long the whole move takes, run up and run out included.
+        """
+        return self.trigger_times_s[-1] + self.speed_mm_per_s / self.acceleration_mm_per_s2
+
+    def x_at(self, t_s: float) -> float:
+        """
+        Where the stage should be t_s seconds after the start of the move.
+        """
+        v, a = self.speed_mm_per_s, self.acceleration_mm_per_s2
+        distance = abs(self.end_x_mm - self.start_x_mm)
+        ramp_s = v / a
+        ramp_mm = v**2 / (2 * a)
+        t_s = min(max(t_s, 0.0), self.duration_s)
+        if t_s < ramp_s:
+            travelled = a * t_s**2 / 2
+        elif t_s < self.duration_s - ramp_s:
+            travelled = ramp_mm + v * (t_s - ramp_s)
+        else:
+            remaining_s = self.duration_s - t_s
+            travelled = distance - a * remaining_s**2 / 2
+        return self.start_x_mm + self.direction * travelled
+
+
+def plan_row(
+    fov_x_mm: Sequence[float],
+    max_speed_mm_per_s: float,
+    acceleration_mm_per_s2: float,
+    x_limits_mm: Optional[Tuple[float, float]] = None,
+) -> RowScan:
+    """
+    Plans the constant speed move over the fovs at fov_x_mm (in scan order, all going the same way), at up to
+    max_speed_mm_per_s.  If the run up or run out would leave x_limits_mm, the speed is lowered until they fit.
+    """
+    fov_x_mm = tuple(float(x) for x in fov_x_mm)
+    direction = 1.0 if fov_x_mm[-1] >= fov_x_mm[0] else -1.0
+    speed = max_speed_mm_per_s
+    if x_limits_mm is not None:
+        low, high = x_limits_mm
+        # The room there is to get up to speed before the first fov, and to stop after the last.
+        room = (
+            min(fov_x_mm[0] - low, high - fov_x_mm[-1])
+            if direction > 0
+            else min(high - fov_x_mm[0], fov_x_mm[-1] - low)
+        )
+        room = max(room, 0.0)
+        if speed**2 / (2 * acceleration_mm_per_s2) > room:
+            speed = np.sqrt(2 * acceleration_mm_per_s2 * room)
+            _log.info(f"Not enough room to get up to speed within the stage limits, scanning at {speed:.3f} [mm/s].")
+    if speed <= 0:
+        raise ValueError(f"Can't scan the row starting at x={fov_x_mm[0]} [mm], there's no room to get up to speed.")
+
+    ramp_mm = speed**2 / (2 * acceleration_mm_per_s2)
+    ramp_s = speed / acceleration_mm_per_s2
+    trigger_times_s = tuple(ramp_s + abs(x - fov_x_mm[0]) / speed for x in fov_x_mm)
+    return RowScan(
+        fov_x_mm=fov_x_mm,
+        start_x_mm=fov_x_mm[0] - direction * ramp_mm,
+        end_x_mm=fov_x_mm[-1] + direction * ramp_mm,
+        speed_mm_per_s=float(speed),
+        acceleration_mm_per_s2=acceleration_mm_per_s2,
+        trigger_times_s=trigger_times_s,
+    )
+
+
+def scan_speed(
+    fov_x_mm: Sequence[float],
+    exposure_ms: float,
+    pixel_size_um: float,
+    max_blur_pixels: float,
+    min_frame_interval_s: float,
+    stage_max_speed_mm_per_s: float,
+) -> float:
+    """
+    The speed to scan the fovs at fov_x_mm at, given the motion blur budget and how fast the camera can keep up.
+    """
+    spacing_mm = np.min(np.abs(np.diff(fov_x_mm))) if len(fov_x_mm) > 1 else np.inf
+    camera_speed = spacing_mm / min_frame_interval_s if min_frame_interval_s > 0 else np.inf
+    return float(
+        min(max_blur_free_speed(exposure_ms, pixel_size_um, max_blur_pixels), camera_speed, stage_max_speed_mm_per_s)
+    )
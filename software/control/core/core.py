@@ -19,6 +19,7 @@ from qtpy.QtGui import *
 
 # control
 from control._def import *
+from control.core import autofocus, display, focus_tracking, laser_spot, recording, scan_path, tracking_pipeline
 from control.core.multi_point_worker import MultiPointWorker
 
 import control.utils as utils
@@ -35,9 +36,11 @@ try:
 except:
     pass
 
+import dataclasses
 from typing import List, Tuple, Optional, Dict, Any, Callable
-from queue import Queue
-from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from threading import Event, Thread, Lock
 from pathlib import Path
 from datetime import datetime
 from enum import Enum
@@ -110,6 +113,8 @@ class StreamHandler(QObject):
         self.save_image_flag = False
         self.handler_busy = False
 
+        self.display_pipeline: Optional[display.DisplayPipeline] = None
+
         # for fps measurement
         self.timestamp_last = 0
         self.counter = 0
@@ -126,6 +131,16 @@ class StreamHandler(QObject):
 
     def set_display_fps(self, fps):
         self.fps_display = fps
+        if self.display_pipeline is not None:
+            self.display_pipeline.set_max_fps(fps)
+
+    def set_display_pipeline(self, display_pipeline: display.DisplayPipeline):
+        """
+        Hands every frame to display_pipeline, which displays the newest one whenever the display is ready for it (at
+        most fps_display a second).  image_to_display is then only emitted if something else is connected to it.
+        """
+        self.display_pipeline = display_pipeline
+        display_pipeline.set_max_fps(self.fps_display)
 
     def set_save_fps(self, fps):
         self.fps_save = fps
@@ -156,21 +171,29 @@ class StreamHandler(QObject):
         image = np.squeeze(frame.frame)
 
         # send image to display
+        image_to_display = utils.crop_image(
+            image,
+            round(image.shape[1] * self.display_resolution_scaling),
+            round(image.shape[0] * self.display_resolution_scaling),
+        )
+        if self.display_pipeline is not None:
+            # Doesn't wait: the pipeline only keeps the newest frame, and bins and maps it on its own thread.
+            self.display_pipeline.submit(image_to_display, frame)
         time_now = time.time()
-        if time_now - self.timestamp_last_display >= 1 / self.fps_display:
-            self.image_to_display.emit(
-                utils.crop_image(
-                    image,
-                    round(image.shape[1] * self.display_resolution_scaling),
-                    round(image.shape[0] * self.display_resolution_scaling),
-                )
-            )
+        if time_now - self.timestamp_last_display >= 1 / self.fps_display and (
+            self.display_pipeline is None or self.receivers(self.image_to_display) > 0
+        ):
+            # Displayed later on the gui thread, by which time the camera may have reused the frame this is a view of.
+            self.image_to_display.emit(image_to_display.copy())
             self.timestamp_last_display = time_now
 
         # send image to write
         if self.save_image_flag and time_now - self.timestamp_last_save >= 1 / self.fps_save:
             if frame.is_color():
                 image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            else:
+                # The saver queues images, so it needs a copy rather than a view into the camera's frame buffer.
+                image = image.copy()
             self.packet_image_to_write.emit(image, frame.frame_id, frame.timestamp)
             self.timestamp_last_save = time_now
 
@@ -178,70 +201,115 @@ class StreamHandler(QObject):
 
 
 class ImageSaver(QObject):
+    """
+    Saves the frames streamed to it while recording.  Frames waiting to be saved are limited by their total size
+    rather than their count, and are encoded and written by a pool of threads (or, in spill file mode, appended raw
+    to a spill file that is converted to individual images by finish_recording).  Frames that don't fit in the
+    memory budget are dropped and counted.  recording_stats is emitted with the counts and sustained throughput
+    at most once a second while recording, and once more when the recording is finished.
+    """
 
     stop_recording = Signal()
+    recording_stats = Signal(object)
+
+    STATS_INTERVAL_S = 1.0
 
     def __init__(self, image_format=Acquisition.IMAGE_FORMAT):
         QObject.__init__(self)
+        self._log = squid.logging.get_logger(self.__class__.__name__)
         self.base_path = "./"
         self.experiment_ID = ""
         self.image_format = image_format
         self.max_num_image_per_folder = 1000
-        self.queue = Queue(10)  # max 10 items in the queue
+        self.max_queued_bytes = IMAGE_SAVER_MAX_QUEUED_MB * 1024**2
+        self.use_spill_file = IMAGE_SAVER_USE_SPILL_FILE
+        self.num_encoder_threads = max(1, IMAGE_SAVER_NUM_ENCODER_THREADS)
+        self.queue = Queue()
+        # Protects the counters and stats, which are updated from the enqueueing and encoder threads.
         self.image_lock = Lock()
+        self.queued_bytes = 0
+        self.stats = recording.RecordingStats()
+        self.spill_file: Optional[recording.SpillFile] = None
+        # Cleared by finish_recording, so frames that come in after it (until the next start_new_experiment) are
+        # ignored instead of being queued for a recording that's being finished.
+        self.accepting_frames = True
+        self._last_stats_time = 0
         self.stop_signal_received = False
-        self.thread = Thread(target=self.process_queue, daemon=True)
-        self.thread.start()
+        self.threads = [Thread(target=self.process_queue, daemon=True) for _ in range(self.num_encoder_threads)]
+        for thread in self.threads:
+            thread.start()
         self.counter = 0
         self.recording_start_time = 0
         self.recording_time_limit = -1
 
     def process_queue(self):
-        while True:
-            # stop the thread if stop signal is received
-            if self.stop_signal_received:
-                return
-            # process the queue
+        while not self.stop_signal_received:
             try:
-                [image, frame_ID, timestamp] = self.queue.get(timeout=0.1)
-                self.image_lock.acquire(True)
-                folder_ID = int(self.counter / self.max_num_image_per_folder)
-                file_ID = int(self.counter % self.max_num_image_per_folder)
-                # create a new folder
-                if file_ID == 0:
-                    utils.ensure_directory_exists(os.path.join(self.base_path, self.experiment_ID, str(folder_ID)))
+                image, frame_ID, timestamp, counter, experiment_path, spill_file = self.queue.get(timeout=0.1)
+            except Empty:
+                continue
 
-                if image.dtype == np.uint16:
-                    # need to use tiff when saving 16 bit images
-                    saving_path = os.path.join(
-                        self.base_path, self.experiment_ID, str(folder_ID), str(file_ID) + "_" + str(frame_ID) + ".tiff"
-                    )
-                    iio.imwrite(saving_path, image)
+            saved = False
+            try:
+                if spill_file:
+                    spill_file.append(counter, frame_ID, timestamp, image)
                 else:
-                    saving_path = os.path.join(
-                        self.base_path,
-                        self.experiment_ID,
-                        str(folder_ID),
-                        str(file_ID) + "_" + str(frame_ID) + "." + self.image_format,
+                    recording.write_recorded_image(
+                        recording.recorded_image_path(
+                            experiment_path,
+                            counter,
+                            frame_ID,
+                            self.image_format,
+                            image.dtype,
+                            self.max_num_image_per_folder,
+                        ),
+                        image,
                     )
-                    cv2.imwrite(saving_path, image)
-
-                self.counter = self.counter + 1
+                saved = True
+            except Exception:
+                self._log.exception(f"Failed to save frame {frame_ID}")
+            finally:
+                with self.image_lock:
+                    self.queued_bytes -= image.nbytes
+                    if saved:
+                        self.stats.frames_saved += 1
+                        self.stats.bytes_saved += image.nbytes
+                    else:
+                        self.stats.frames_failed += 1
                 self.queue.task_done()
-                self.image_lock.release()
-            except:
-                pass
 
     def enqueue(self, image, frame_ID, timestamp):
-        try:
-            self.queue.put_nowait([image, frame_ID, timestamp])
-            if (self.recording_time_limit > 0) and (
-                time.time() - self.recording_start_time >= self.recording_time_limit
-            ):
-                self.stop_recording.emit()
-            # when using self.queue.put(str_), program can be slowed down despite multithreading because of the block and the GIL
-        except:
-            print("imageSaver queue is full, image discarded")
+        experiment_path = os.path.join(self.base_path, self.experiment_ID)
+        with self.image_lock:
+            if not self.accepting_frames:
+                self._log.debug(f"Recording finished, ignoring frame {frame_ID}")
+                return
+            self.stats.frames_received += 1
+            dropped = self.queued_bytes + image.nbytes > self.max_queued_bytes
+            if dropped:
+                self.stats.frames_dropped += 1
+            else:
+                self.queued_bytes += image.nbytes
+                counter = self.counter
+                self.counter += 1
+                # Queued under the lock (never blocking, since this is called from the frame receiving path), so
+                # finish_recording can't stop accepting frames between this and the queue having it.
+                self.queue.put_nowait((image, frame_ID, timestamp, counter, experiment_path, self.spill_file))
+
+        if dropped:
+            self._log.warning(
+                f"Saving is falling behind, frame {frame_ID} dropped ({self.stats.frames_dropped} so far)"
+            )
+
+        if (self.recording_time_limit > 0) and (time.time() - self.recording_start_time >= self.recording_time_limit):
+            self.stop_recording.emit()
+        if time.time() - self._last_stats_time >= ImageSaver.STATS_INTERVAL_S:
+            self.recording_stats.emit(self.get_recording_stats())
+
+    def get_recording_stats(self) -> recording.RecordingStats:
+        self._last_stats_time = time.time()
+        with self.image_lock:
+            return dataclasses.replace(self.stats, elapsed_s=time.time() - self.recording_start_time)
 
     def set_base_path(self, path):
         self.base_path = path
@@ -257,18 +325,53 @@ class ImageSaver(QObject):
             self.experiment_ID = experiment_ID
         self.recording_start_time = time.time()
         # create a new folder
+        experiment_path = os.path.join(self.base_path, self.experiment_ID)
         try:
-            utils.ensure_directory_exists(os.path.join(self.base_path, self.experiment_ID))
-            # to do: save configuration
-        except:
-            pass
-        # reset the counter
-        self.counter = 0
+            utils.ensure_directory_exists(experiment_path)
+        except OSError:
+            self._log.exception(f"Could not create {experiment_path}")
+        spill_file = recording.SpillFile(experiment_path) if self.use_spill_file else None
+        # reset the counter and stats
+        with self.image_lock:
+            self.counter = 0
+            self.stats = recording.RecordingStats()
+            self.spill_file = spill_file
+            self.accepting_frames = True
+
+    def finish_recording(self, blocking=False):
+        """
+        Stops accepting frames, waits for the ones already queued to be saved (converting the spill file if there is
+        one) and emits the final recording_stats, on a background thread unless blocking.
+        """
+        with self.image_lock:
+            self.accepting_frames = False
+            spill_file, self.spill_file = self.spill_file, None
+
+        def finish():
+            # Everything queued for spill_file is in the queue by now, so it's all been appended once this returns.
+            self.queue.join()
+            stats = self.get_recording_stats()
+            if spill_file:
+                spill_file.close()
+                recording.convert_spill_file(
+                    spill_file.experiment_path,
+                    self.image_format,
+                    self.num_encoder_threads,
+                    self.max_num_image_per_folder,
+                )
+            self._log.info(f"Recording finished: {stats}")
+            self.recording_stats.emit(stats)
+
+        if blocking:
+            finish()
+        else:
+            Thread(target=finish, daemon=True).start()
 
     def close(self):
-        self.queue.join()
+        self.finish_recording(blocking=True)
         self.stop_signal_received = True
-        self.thread.join()
+        for thread in self.threads:
+            thread.join()
 
 
 class ImageSaver_Tracking(QObject):
@@ -940,6 +1043,9 @@ class AutofocusWorker(QObject):
 
         self.crop_width = self.autofocusController.crop_width
         self.crop_height = self.autofocusController.crop_height
+        self.focus_history: autofocus.FocusHistory = self.autofocusController.focus_history
+
+        self._log = squid.logging.get_logger(self.__class__.__name__)
 
     def run(self):
         self.run_autofocus()
@@ -949,72 +1055,96 @@ class AutofocusWorker(QObject):
         while self.microcontroller.is_busy():
             time.sleep(SLEEP_TIME_S)
 
-    def run_autofocus(self):
-        # @@@ to add: increase gain, decrease exposure time
-        # @@@ can move the execution into a thread - done 08/21/2021
-        focus_measure_vs_z = [0] * self.N
-        focus_measure_max = 0
-
-        z_af_offset = self.deltaZ * round(self.N / 2)
+    def _move_z_to(self, z_mm):
+        self.stage.move_z_to(z_mm)
 
-        self.stage.move_z(-z_af_offset)
-
-        steps_moved = 0
-        for i in range(self.N):
-            self.stage.move_z(self.deltaZ)
-            steps_moved = steps_moved + 1
-            # trigger acquisition (including turning on the illumination) and read frame
-            if self.liveController.trigger_mode == TriggerMode.SOFTWARE:
-                self.liveController.turn_on_illumination()
-                self.wait_till_operation_is_completed()
-                self.camera.send_trigger()
+    def _capture_frame(self) -> Optional[np.ndarray]:
+        # trigger acquisition (including turning on the illumination) and read frame
+        if self.liveController.trigger_mode == TriggerMode.SOFTWARE:
+            self.liveController.turn_on_illumination()
+            self.wait_till_operation_is_completed()
+            self.camera.send_trigger()
+            image = self.camera.read_frame()
+            self.liveController.turn_off_illumination()
+        elif self.liveController.trigger_mode == TriggerMode.HARDWARE:
+            if "Fluorescence" in self.liveController.currentConfiguration.name and ENABLE_NL5 and NL5_USE_DOUT:
+                self.microscope.nl5.start_acquisition()
+                # TODO(imo): This used to use the "reset_image_ready_flag=False" arg, but oinly the toupcam camera implementation had the
+                #  "reset_image_ready_flag" arg, so this is broken for all other cameras.
                 image = self.camera.read_frame()
-            elif self.liveController.trigger_mode == TriggerMode.HARDWARE:
-                if "Fluorescence" in self.liveController.currentConfiguration.name and ENABLE_NL5 and NL5_USE_DOUT:
-                    self.microscope.nl5.start_acquisition()
-                    # TODO(imo): This used to use the "reset_image_ready_flag=False" arg, but oinly the toupcam camera implementation had the
-                    #  "reset_image_ready_flag" arg, so this is broken for all other cameras.
-                    image = self.camera.read_frame()
-                else:
-                    self.microcontroller.send_hardware_trigger(
-                        control_illumination=True, illumination_on_time_us=self.camera.get_exposure_time() * 1000
-                    )
-                    image = self.camera.read_frame()
-            if image is None:
-                continue
-            # tunr of the illumination if using software trigger
-            if self.liveController.trigger_mode == TriggerMode.SOFTWARE:
-                self.liveController.turn_off_illumination()
-
-            image = utils.crop_image(image, self.crop_width, self.crop_height)
-            self.image_to_display.emit(image)
-
-            QApplication.processEvents()
-            timestamp_0 = time.time()
-            focus_measure = utils.calculate_focus_measure(image, FOCUS_MEASURE_OPERATOR)
-            timestamp_1 = time.time()
-            print("             calculating focus measure took " + str(timestamp_1 - timestamp_0) + " second")
-            focus_measure_vs_z[i] = focus_measure
-            print(i, focus_measure)
-            focus_measure_max = max(focus_measure, focus_measure_max)
-            if focus_measure < focus_measure_max * AF.STOP_THRESHOLD:
-                break
-
-        QApplication.processEvents()
+            else:
+                self.microcontroller.send_hardware_trigger(
+                    control_illumination=True, illumination_on_time_us=self.camera.get_exposure_time() * 1000
+                )
+                image = self.camera.read_frame()
+        else:
+            image = None
+        if image is None:
+            return None
 
-        # maneuver for achiving uniform step size and repeatability when using open-loop control
-        self.stage.move_z(-steps_moved * self.deltaZ)
-        # determine the in-focus position
-        idx_in_focus = focus_measure_vs_z.index(max(focus_measure_vs_z))
-        self.stage.move_z((idx_in_focus + 1) * self.deltaZ)
+        image = utils.crop_image(image, self.crop_width, self.crop_height)
+        # A copy, since the display gets it later and the camera may reuse the frame buffer this is a view of by then.
+        self.image_to_display.emit(image.copy())
+        return image
 
-        QApplication.processEvents()
+    @staticmethod
+    def _focus_measure(image: np.ndarray) -> float:
+        return utils.calculate_focus_measure(
+            autofocus.downsample(image, AF.FOCUS_MEASURE_DOWNSAMPLE), FOCUS_MEASURE_OPERATOR
+        )
 
-        # move to the calculated in-focus position
-        if idx_in_focus == 0:
-            print("moved to the bottom end of the AF range")
-        if idx_in_focus == self.N - 1:
-            print("moved to the top end of the AF range")
+    def run_autofocus(self):
+        start_time = time.perf_counter()
+        pos = self.stage.get_pos()
+        # The same range the fixed N step sweep covered, N focus steps going up from a bit more than half the range
+        # below the current z.
+        low_mm = pos.z_mm - self.deltaZ * round(self.N / 2) + self.deltaZ
+        high_mm = low_mm + (self.N - 1) * self.deltaZ
+        coarse_step_mm = AF.COARSE_STEP_MULTIPLE * self.deltaZ
+
+        predicted_z_mm = self.focus_history.predict(pos.x_mm, pos.y_mm)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="autofocus_measure") as executor:
+            search = autofocus.FocusSearch(self._move_z_to, self._capture_frame, self._focus_measure, executor)
+            if predicted_z_mm is not None:
+                half_range_mm = max(AF.PREDICTED_RANGE_FRACTION * (high_mm - low_mm) / 2, coarse_step_mm)
+                result = search.run(
+                    predicted_z_mm - half_range_mm,
+                    predicted_z_mm + half_range_mm,
+                    coarse_step_mm,
+                    self.deltaZ / 2,
+                    AF.STOP_THRESHOLD,
+                )
+                if result.method in ("edge", "no frames"):
+                    self._log.info(
+                        f"Focus isn't near the predicted z={predicted_z_mm:.4f} [mm], searching the whole range."
+                    )
+                    predicted_samples = result.samples
+                    result = search.run(low_mm, high_mm, coarse_step_mm, self.deltaZ / 2, AF.STOP_THRESHOLD)
+                    result.samples = predicted_samples + result.samples
+            else:
+                result = search.run(low_mm, high_mm, coarse_step_mm, self.deltaZ / 2, AF.STOP_THRESHOLD)
+
+        # maneuver for achiving uniform step size and repeatability when using open-loop control: always approach the
+        # in-focus position from below.
+        if self.stage.get_pos().z_mm > result.z_mm:
+            self.stage.move_z_to(result.z_mm - coarse_step_mm)
+        self.stage.move_z_to(result.z_mm)
+
+        if result.method == "edge":
+            end = "bottom" if result.z_mm <= (low_mm + high_mm) / 2 else "top"
+            self._log.warning(f"Moved to the {end} end of the AF range, z={result.z_mm:.4f} [mm]")
+        elif result.method == "no frames":
+            self._log.error("Couldn't read any frames for autofocus, staying at the center of the AF range.")
+        else:
+            self.focus_history.add(pos.x_mm, pos.y_mm, result.z_mm)
+
+        elapsed_s = time.perf_counter() - start_time
+        self.autofocusController.last_result = result
+        self.autofocusController.last_duration_s = elapsed_s
+        self._log.info(
+            f"Autofocus found z={result.z_mm:.4f} [mm] ({result.method}) with {result.exposures} exposures in "
+            f"{elapsed_s:.3f} [s]" + (f", predicted z={predicted_z_mm:.4f} [mm]" if predicted_z_mm is not None else "")
+        )
 
 
 class AutoFocusController(QObject):
@@ -1036,6 +1166,11 @@ class AutoFocusController(QObject):
         self.autofocus_in_progress = False
         self.focus_map_coords = []
         self.use_focus_map = False
+        # Where earlier autofocus calls found focus, to predict where the next ones will.
+        self.focus_history = autofocus.FocusHistory(AF.HISTORY_LENGTH, AF.HISTORY_MAX_DISTANCE_MM)
+        # The last autofocus result (a control.core.autofocus.FocusSearchResult), and how long it took.
+        self.last_result: Optional[autofocus.FocusSearchResult] = None
+        self.last_duration_s: Optional[float] = None
 
     def set_N(self, N):
         self.N = N
@@ -1155,6 +1290,13 @@ class AutoFocusController(QObject):
         self.focus_map_coords = []
         self.set_focus_map_use(False)
 
+    def clear_focus_history(self):
+        """
+        Forgets where earlier autofocus calls found focus, for when that no longer says anything about where it is now
+        (a new acquisition, objective or sample).
+        """
+        self.focus_history.clear()
+
     def gen_focus_map(self, coord1, coord2, coord3):
         """
         Navigate to 3 coordinates and get your focus-map coordinates
@@ -1355,6 +1497,7 @@ class ScanCoordinates(QObject):
         self.well_selector = None
         self.acquisition_pattern = ACQUISITION_PATTERN
         self.fov_pattern = FOV_PATTERN
+        self.optimize_scan_path = OPTIMIZE_SCAN_PATH
         self.format = WELLPLATE_FORMAT
         self.a1_x_mm = A1_X_MM
         self.a1_y_mm = A1_Y_MM
@@ -1501,17 +1644,9 @@ class ScanCoordinates(QObject):
             half_steps_height = (steps_height - 1) / 2
             half_steps_width = (steps_width - 1) / 2
 
-            for i in range(steps_height):
-                row = []
-                y = center_y + (i - half_steps_height) * step_size_mm
-                for j in range(steps_width):
-                    x = center_x + (j - half_steps_width) * step_size_mm
-                    if self.validate_coordinates(x, y):
-                        row.append((x, y))
-                        self.navigationViewer.register_fov_to_image(x, y)
-                if self.fov_pattern == "S-Pattern" and i % 2 == 1:
-                    row.reverse()
-                scan_coordinates.extend(row)
+            x = center_x + (np.arange(steps_width) - half_steps_width) * step_size_mm
+            y = center_y + (np.arange(steps_height) - half_steps_height) * step_size_mm
+            scan_coordinates = self._grid_coordinates(x, y, self.fov_pattern == "S-Pattern")
         else:
             steps = math.floor(scan_size_mm / step_size_mm)
             if shape == "Circle":
@@ -1537,31 +1672,21 @@ class ScanCoordinates(QObject):
             radius_squared = (scan_size_mm / 2) ** 2
             fov_size_mm_half = fov_size_mm / 2
 
-            for i in range(steps):
-                row = []
-                y = center_y + (i - half_steps) * step_size_mm
-                for j in range(steps):
-                    x = center_x + (j - half_steps) * step_size_mm
-                    if (
-                        shape == "Square"
-                        or shape == "Rectangle"
-                        or (
-                            shape == "Circle"
-                            and self._is_in_circle(x, y, center_x, center_y, radius_squared, fov_size_mm_half)
-                        )
-                    ):
-                        if self.validate_coordinates(x, y):
-                            row.append((x, y))
-                            self.navigationViewer.register_fov_to_image(x, y)
+            x = center_x + (np.arange(steps) - half_steps) * step_size_mm
+            y = center_y + (np.arange(steps) - half_steps) * step_size_mm
+            include = None
+            if shape == "Circle":
 
-                if self.fov_pattern == "S-Pattern" and i % 2 == 1:
-                    row.reverse()
-                scan_coordinates.extend(row)
+                def include(xx, yy):
+                    return self._are_in_circle(xx, yy, center_x, center_y, radius_squared, fov_size_mm_half)
+
+            scan_coordinates = self._grid_coordinates(x, y, self.fov_pattern == "S-Pattern", include)
 
         if not scan_coordinates and shape == "Circle":
             if self.validate_coordinates(center_x, center_y):
                 scan_coordinates.append((center_x, center_y))
-                self.navigationViewer.register_fov_to_image(center_x, center_y)
+
+        self.navigationViewer.register_fovs_to_image(scan_coordinates)
 
         self.region_shapes[well_id] = shape
         self.region_centers[well_id] = [float(center_x), float(center_y), float(self.stage.get_pos().z_mm)]
@@ -1578,8 +1703,7 @@ class ScanCoordinates(QObject):
 
             if well_id in self.region_fov_coordinates:
                 region_scan_coordinates = self.region_fov_coordinates.pop(well_id)
-                for coord in region_scan_coordinates:
-                    self.navigationViewer.deregister_fov_to_image(coord[0], coord[1])
+                self.navigationViewer.deregister_fovs_to_image(region_scan_coordinates)
 
             self._log.info(f"Removed Region: {well_id}")
             self.signal_scan_coordinates_updated.emit()
@@ -1602,19 +1726,10 @@ class ScanCoordinates(QObject):
         grid_width_mm = (Nx - 1) * step_size_mm
         grid_height_mm = (Ny - 1) * step_size_mm
 
-        scan_coordinates = []
-        for i in range(Ny):
-            row = []
-            y = center_y - grid_height_mm / 2 + i * step_size_mm
-            for j in range(Nx):
-                x = center_x - grid_width_mm / 2 + j * step_size_mm
-                if self.validate_coordinates(x, y):
-                    row.append((x, y))
-                    self.navigationViewer.register_fov_to_image(x, y)
-
-            if self.fov_pattern == "S-Pattern" and i % 2 == 1:  # reverse even rows
-                row.reverse()
-            scan_coordinates.extend(row)
+        x = center_x - grid_width_mm / 2 + np.arange(Nx) * step_size_mm
+        y = center_y - grid_height_mm / 2 + np.arange(Ny) * step_size_mm
+        scan_coordinates = self._grid_coordinates(x, y, self.fov_pattern == "S-Pattern")
+        self.navigationViewer.register_fovs_to_image(scan_coordinates)
 
         # Region coordinates are already centered since center_x, center_y is grid center
         if scan_coordinates:  # Only add region if there are valid coordinates
@@ -1630,19 +1745,10 @@ class ScanCoordinates(QObject):
         grid_width_mm = (Nx - 1) * dx
         grid_height_mm = (Ny - 1) * dy
 
-        # Pre-calculate step sizes and ranges
-        x_steps = [center_x - grid_width_mm / 2 + j * dx for j in range(Nx)]
-        y_steps = [center_y - grid_height_mm / 2 + i * dy for i in range(Ny)]
-
-        scan_coordinates = []
-        for i, y in enumerate(y_steps):
-            row = []
-            x_range = x_steps if i % 2 == 0 else reversed(x_steps)
-            for x in x_range:
-                if self.validate_coordinates(x, y):
-                    row.append((x, y))
-                    self.navigationViewer.register_fov_to_image(x, y)
-            scan_coordinates.extend(row)
+        x = center_x - grid_width_mm / 2 + np.arange(Nx) * dx
+        y = center_y - grid_height_mm / 2 + np.arange(Ny) * dy
+        scan_coordinates = self._grid_coordinates(x, y, s_pattern=True)
+        self.navigationViewer.register_fovs_to_image(scan_coordinates)
 
         if scan_coordinates:  # Only add region if there are valid coordinates
             self._log.info(f"Added Flexible Region: {region_id}")
@@ -1680,62 +1786,37 @@ class ScanCoordinates(QObject):
         xx, yy = np.meshgrid(x_range, y_range)
         grid_points = np.column_stack((xx.ravel(), yy.ravel()))
 
-        # # Use Delaunay triangulation for efficient point-in-polygon test
-        # # hull = Delaunay(shape_coords)
-        # # mask = hull.find_simplex(grid_points) >= 0
-        # # or
-        # # Use Ray Casting for point-in-polygon test
-        # mask = np.array([self._is_in_polygon(x, y, shape_coords) for x, y in grid_points])
-
-        # # Filter points inside the polygon
-        # valid_points = grid_points[mask]
-
-        def corners(x_mm, y_mm, fov):
-            center_to_corner = fov / 2
-            return (
-                (x_mm + center_to_corner, y_mm + center_to_corner),
-                (x_mm - center_to_corner, y_mm + center_to_corner),
-                (x_mm - center_to_corner, y_mm - center_to_corner),
-                (x_mm + center_to_corner, y_mm - center_to_corner),
+        # Keep the fovs in our movement range that have their center or any corner in the polygon.
+        in_range = self._valid_coordinates_mask(grid_points[:, 0], grid_points[:, 1])
+        grid_points = grid_points[in_range]
+        center_to_corner = fov_size_mm / 2
+        touches_polygon = self._points_in_polygon(grid_points, shape_coords)
+        for corner_offset in ((1, 1), (-1, 1), (-1, -1), (1, -1)):
+            touches_polygon |= self._points_in_polygon(
+                grid_points + center_to_corner * np.array(corner_offset), shape_coords
             )
-
-        valid_points = []
-        for x_center, y_center in grid_points:
-            if not self.validate_coordinates(x_center, y_center):
-                self._log.debug(
-                    f"Manual coords: ignoring {x_center=},{y_center=} because it is outside our movement range."
-                )
-                continue
-            if not self._is_in_polygon(x_center, y_center, shape_coords) and not any(
-                [
-                    self._is_in_polygon(x_corner, y_corner, shape_coords)
-                    for (x_corner, y_corner) in corners(x_center, y_center, fov_size_mm)
-                ]
-            ):
-                self._log.debug(
-                    f"Manual coords: ignoring {x_center=},{y_center=} because no corners or center are in poly. (corners={corners(x_center, y_center, fov_size_mm)}"
-                )
-                continue
-
-            valid_points.append((x_center, y_center))
-        if not valid_points:
+        self._log.debug(
+            f"Manual coords: ignoring {np.count_nonzero(~in_range)} fovs outside our movement range, and "
+            f"{np.count_nonzero(~touches_polygon)} fovs with no corners or center in the polygon."
+        )
+        valid_points = grid_points[touches_polygon]
+        if not len(valid_points):
             return []
-        valid_points = np.array(valid_points)
 
         # Sort points
         sorted_indices = np.lexsort((valid_points[:, 0], valid_points[:, 1]))
         sorted_points = valid_points[sorted_indices]
 
-        # Apply S-Pattern if needed
+        # Apply S-Pattern if needed.  After sorting, each row (unique y) is a contiguous run of points.
         if self.fov_pattern == "S-Pattern":
-            unique_y = np.unique(sorted_points[:, 1])
-            for i in range(1, len(unique_y), 2):
-                mask = sorted_points[:, 1] == unique_y[i]
-                sorted_points[mask] = sorted_points[mask][::-1]
+            _, row_starts, row_counts = np.unique(sorted_points[:, 1], return_index=True, return_counts=True)
+            for row_start, row_count in zip(row_starts[1::2], row_counts[1::2]):
+                sorted_points[row_start : row_start + row_count] = sorted_points[row_start : row_start + row_count][
+                    ::-1
+                ]
 
         # Register FOVs
-        for x, y in sorted_points:
-            self.navigationViewer.register_fov_to_image(x, y)
+        self.navigationViewer.register_fovs_to_image(sorted_points)
 
         return sorted_points.tolist()
 
@@ -1749,13 +1830,11 @@ class ScanCoordinates(QObject):
         region_id: str,
     ):
         """Add a region based on a template of x and y coordinates"""
-        scan_coordinates = []
-        for i in range(len(template_x_mm)):
-            x = x_mm + template_x_mm[i]
-            y = y_mm + template_y_mm[i]
-            if self.validate_coordinates(x, y):
-                scan_coordinates.append((x, y))
-                self.navigationViewer.register_fov_to_image(x, y)
+        x = x_mm + np.asarray(template_x_mm, dtype=float)
+        y = y_mm + np.asarray(template_y_mm, dtype=float)
+        valid = self._valid_coordinates_mask(x, y)
+        scan_coordinates = list(zip(x[valid].tolist(), y[valid].tolist()))
+        self.navigationViewer.register_fovs_to_image(scan_coordinates)
         self.region_centers[region_id] = [x_mm, y_mm, z_mm]
         self.region_fov_coordinates[region_id] = scan_coordinates
 
@@ -1797,6 +1876,50 @@ class ScanCoordinates(QObject):
             p1x, p1y = p2x, p2y
         return inside
 
+    @staticmethod
+    def _points_in_polygon(points, poly) -> np.ndarray:
+        """
+        The same ray casting test as _is_in_polygon, for an (n, 2) array of points at once.
+        """
+        x = points[:, 0]
+        y = points[:, 1]
+        inside = np.zeros(len(points), dtype=bool)
+        poly = np.asarray(poly, dtype=float)
+        for (p1x, p1y), (p2x, p2y) in zip(poly, np.roll(poly, -1, axis=0)):
+            # Horizontal edges never cross the ray.
+            if p1y == p2y:
+                continue
+            crosses = (y > min(p1y, p2y)) & (y <= max(p1y, p2y)) & (x <= max(p1x, p2x))
+            if p1x != p2x:
+                xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                crosses &= x <= xinters
+            inside ^= crosses
+        return inside
+
+    def _are_in_circle(self, x, y, center_x, center_y, radius_squared, fov_size_mm_half) -> np.ndarray:
+        """
+        _is_in_circle for arrays of x and y.
+        """
+        in_circle = np.ones(np.shape(x), dtype=bool)
+        for corner_x, corner_y in ((-1, -1), (1, -1), (-1, 1), (1, 1)):
+            in_circle &= (x + corner_x * fov_size_mm_half - center_x) ** 2 + (
+                y + corner_y * fov_size_mm_half - center_y
+            ) ** 2 <= radius_squared
+        return in_circle
+
+    def _grid_coordinates(self, x, y, s_pattern, include=None) -> List[Tuple[float, float]]:
+        """
+        The (x, y) fovs of the grid of the given x and y values that are in our movement range (and for which
+        include(x, y) is true, if given), row by row.  With s_pattern, every other row of the grid is reversed.
+        """
+        xx, yy = np.meshgrid(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        if s_pattern:
+            xx[1::2] = xx[1::2, ::-1]
+        keep = self._valid_coordinates_mask(xx, yy)
+        if include is not None:
+            keep &= include(xx, yy)
+        return list(zip(xx[keep].tolist(), yy[keep].tolist()))
+
     def _is_in_circle(self, x, y, center_x, center_y, radius_squared, fov_size_mm_half):
         corners = [
             (x - fov_size_mm_half, y - fov_size_mm_half),
@@ -1820,10 +1943,33 @@ class ScanCoordinates(QObject):
             and SOFTWARE_POS_LIMIT.Y_NEGATIVE <= y <= SOFTWARE_POS_LIMIT.Y_POSITIVE
         )
 
+    def _valid_coordinates_mask(self, x, y) -> np.ndarray:
+        """
+        validate_coordinates for arrays of x and y.
+        """
+        return (
+            (SOFTWARE_POS_LIMIT.X_NEGATIVE <= x)
+            & (x <= SOFTWARE_POS_LIMIT.X_POSITIVE)
+            & (SOFTWARE_POS_LIMIT.Y_NEGATIVE <= y)
+            & (y <= SOFTWARE_POS_LIMIT.Y_POSITIVE)
+        )
+
+    def get_motion_model(self) -> scan_path.MotionModel:
+        return scan_path.MotionModel.from_stage(
+            self.stage,
+            settle_xy_s=max(SCAN_STABILIZATION_TIME_MS_X, SCAN_STABILIZATION_TIME_MS_Y) / 1000,
+            settle_z_s=SCAN_STABILIZATION_TIME_MS_Z / 1000,
+        )
+
+    def estimate_scan_time(self, per_fov_acquisition_s: float = 0.0) -> scan_path.ScanTimeEstimate:
+        return scan_path.estimate_scan_time(self.region_fov_coordinates, self.get_motion_model(), per_fov_acquisition_s)
+
     def sort_coordinates(self):
         self._log.info(f"Acquisition pattern: {self.acquisition_pattern}")
 
         if len(self.region_centers) <= 1:
+            if self.optimize_scan_path:
+                self._optimize_scan_path()
             return
 
         def sort_key(item):
@@ -1858,6 +2004,21 @@ class ScanCoordinates(QObject):
             k: self.region_fov_coordinates[k] for k, _ in sorted_items if k in self.region_fov_coordinates
         }
 
+        if self.optimize_scan_path:
+            self._optimize_scan_path()
+
+    def _optimize_scan_path(self):
+        """
+        Reorder the regions, and fovs within regions, to minimize stage travel time.  The sorted order is the
+        starting point, so for the same regions this always gives the same order.
+        """
+        planned = scan_path.plan_scan_path(self.region_fov_coordinates, self.get_motion_model())
+        self.region_fov_coordinates = planned
+        self.region_centers = {
+            **{k: self.region_centers[k] for k in planned if k in self.region_centers},
+            **{k: v for k, v in self.region_centers.items() if k not in planned},
+        }
+
     def get_region_bounds(self, region_id):
         """Get region boundaries"""
         if not self.validate_region(region_id):
@@ -1880,22 +2041,13 @@ class ScanCoordinates(QObject):
         if not self.has_regions():
             return None
 
-        min_x = float("inf")
-        max_x = float("-inf")
-        min_y = float("inf")
-        max_y = float("-inf")
-
         # Find global bounds across all regions
-        for region_id in self.region_fov_coordinates.keys():
-            bounds = self.get_region_bounds(region_id)
-            if bounds:
-                min_x = min(min_x, bounds["min_x"])
-                max_x = max(max_x, bounds["max_x"])
-                min_y = min(min_y, bounds["min_y"])
-                max_y = max(max_y, bounds["max_y"])
-
-        if min_x == float("inf"):
+        fovs = [np.asarray(coords, dtype=float)[:, :2] for coords in self.region_fov_coordinates.values() if coords]
+        if not fovs:
             return None
+        fovs = np.concatenate(fovs)
+        min_x, min_y = fovs.min(axis=0).tolist()
+        max_x, max_y = fovs.max(axis=0).tolist()
 
         # Add margin around bounds (5% of larger dimension)
         width = max_x - min_x
@@ -2075,6 +2227,19 @@ class MultiPointController(QObject):
     def set_focus_map(self, focusMap):
         self.focus_map = focusMap  # None if dont use focusMap
 
+    def new_focus_tracker(self) -> focus_tracking.FocusTracker:
+        """
+        A focus tracker (for one time point of an acquisition), which fits the same kinds of surfaces focus maps do.
+        """
+        return focus_tracking.FocusTracker(
+            FocusMap(),
+            method=FOCUS_TRACKING_SURFACE_METHOD,
+            tolerance_mm=FOCUS_TRACKING_TOLERANCE_UM / 1000,
+            max_distance_mm=FOCUS_TRACKING_MAX_DISTANCE_MM,
+            max_skipped_fovs=FOCUS_TRACKING_MAX_SKIPPED_FOVS,
+            residual_window=FOCUS_TRACKING_RESIDUAL_WINDOW,
+        )
+
     def set_base_path(self, path):
         self.base_path = path
 
@@ -2124,6 +2289,7 @@ class MultiPointController(QObject):
                 pass
         # TODO: USE OBJECTIVE STORE DATA
         acquisition_parameters["sensor_pixel_size_um"] = self.camera.get_pixel_size_binned_um()
+        acquisition_parameters["binning"] = list(self.camera.get_binning())
         acquisition_parameters["tube_lens_mm"] = TUBE_LENS_MM
         f = open(os.path.join(self.base_path, self.experiment_ID) + "/acquisition parameters.json", "w")
         f.write(json.dumps(acquisition_parameters))
@@ -2160,8 +2326,10 @@ class MultiPointController(QObject):
             all_regions_coord_count = sum(coords_per_region)
 
             non_merged_images = self.Nt * self.NZ * all_regions_coord_count * len(self.selected_configurations)
-            # When capturing merged images, we capture 1 per fov (where all the configurations are merged)
-            merged_images = self.Nt * self.NZ * all_regions_coord_count if control._def.MERGE_CHANNELS else 0
+            # When capturing merged images, we capture 1 per fov (where all the configurations are merged), unless
+            # there's only one configuration to merge.
+            merge = control._def.MERGE_CHANNELS and len(self.selected_configurations) > 1
+            merged_images = self.Nt * self.NZ * all_regions_coord_count if merge else 0
 
             return non_merged_images + merged_images
         except AttributeError:
@@ -2270,8 +2438,19 @@ class MultiPointController(QObject):
         self._log.info(f"num regions: {len(self.scan_region_coords_mm)}")
         self._log.info(f"region ids: {self.scan_region_names}")
         self._log.info(f"region centers: {self.scan_region_coords_mm}")
+        if not self.run_acquisition_current_fov:
+            per_fov_acquisition_s = (
+                self.NZ * sum(config.exposure_time for config in self.selected_configurations) / 1000
+            )
+            self._log.info(
+                f"Estimated scan time per time point: {self.scanCoordinates.estimate_scan_time(per_fov_acquisition_s)}"
+            )
 
         self.abort_acqusition_requested = False
+        # Focus found before this acquisition (by an earlier one, or by hand since) might be long out of date.  (The
+        # headless Microscope hands us its laser autofocus controller, which keeps no history.)
+        if isinstance(self.autofocusController, AutoFocusController):
+            self.autofocusController.clear_focus_history()
 
         self.configuration_before_running_multipoint = self.liveController.currentConfiguration
         # stop live
@@ -2700,6 +2879,10 @@ class TrackingController(QObject):
 
 
 class TrackingWorker(QObject):
+    """
+    Acquires frames on its own thread, tracks the object in them on another, and moves the stage after it on a third
+    (see control.core.tracking_pipeline).
+    """
 
     finished = Signal()
     image_to_display = Signal(np.ndarray)
@@ -2734,34 +2917,39 @@ class TrackingWorker(QObject):
     def run(self):
 
         tracking_frame_counter = 0
-        t0 = time.time()
+        frames_dropped = 0
+        experiment_path = os.path.join(self.base_path, self.experiment_ID)
 
         # save metadata
-        self.txt_file = open(os.path.join(self.base_path, self.experiment_ID, "metadata.txt"), "w+")
+        self.txt_file = open(os.path.join(experiment_path, "metadata.txt"), "w+")
         self.txt_file.write("t0: " + datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f") + "\n")
         self.txt_file.write("objective: " + self.trackingController.objective + "\n")
         self.txt_file.close()
 
         # create a file for logging
-        self.csv_file = open(os.path.join(self.base_path, self.experiment_ID, "track.csv"), "w+")
-        self.csv_file.write(
-            "dt (s), x_stage (mm), y_stage (mm), z_stage (mm), x_image (mm), y_image(mm), image_filename\n"
+        self.track_log = tracking_pipeline.TrackLog(
+            os.path.join(experiment_path, tracking_pipeline.TRACK_LOG_FILE_NAME)
         )
 
-        # reset tracker
-        self.tracker.reset()
-
-        # get the manually selected roi
-        init_roi = self.imageDisplayWindow.get_roi_bounding_box()
-        self.tracker.set_roi_bbox(init_roi)
-
-        # tracking loop
-        while not self.trackingController.flag_stop_tracking_requested:
-            self._log.info("tracking_frame_counter: " + str(tracking_frame_counter))
-            if tracking_frame_counter == 0:
-                is_first_frame = True
-            else:
-                is_first_frame = False
+        # start the tracker on the manually selected roi
+        self.windowed_tracker = tracking_pipeline.WindowedTracker(
+            self.tracker, Tracking.SEARCH_WINDOW_PX, Tracking.SEARCH_WINDOW_MARGIN_PX
+        )
+        self.windowed_tracker.start(self.imageDisplayWindow.get_roi_bounding_box())
+
+        # (frame counter, camera frame, image, stage position) of the newest frame, for the tracker thread
+        self._frames = display.LatestFrameMailbox()
+        # (frame counter, frame timestamp, stage position, x error, y error) per tracked frame, for the stage thread
+        self._stage_targets = Queue()
+        self._object_lost = Event()
+        tracker_thread = Thread(target=self._run_tracker, daemon=True)
+        stage_thread = Thread(target=self._run_stage, daemon=True)
+        tracker_thread.start()
+        stage_thread.start()
+
+        # acquisition loop
+        while not self.trackingController.flag_stop_tracking_requested and not self._object_lost.is_set():
+            self._log.debug("tracking_frame_counter: " + str(tracking_frame_counter))
 
             # timestamp
             timestamp_last_frame = time.time()
@@ -2792,13 +2980,20 @@ class TrackingWorker(QObject):
             self.camera.send_trigger()
             camera_frame = self.camera.read_camera_frame()
             image = camera_frame.frame
-            t = camera_frame.timestamp
             if self.number_of_selected_configurations > 1:
                 self.liveController.turn_off_illumination()  # keep illumination on for single configuration acqusition
             image = np.squeeze(image)
-            # get image size
-            image_shape = image.shape
-            image_center = np.array([image_shape[1] * 0.5, image_shape[0] * 0.5])
+
+            # hand the frame to the tracker, replacing the last one if it hasn't got to it yet
+            camera_frame.retain()
+            replaced = self._frames.put((tracking_frame_counter, camera_frame, image, pos))
+            if replaced is not None:
+                replaced[1].release()
+                frames_dropped += 1
+
+            # save image
+            if self.trackingController.flag_save_image:
+                self.image_saver.enqueue(image.copy(), tracking_frame_counter, str(config.name))
 
             # image the rest configurations
             for config_ in self.selected_configurations[1:]:
@@ -2819,71 +3014,103 @@ class TrackingWorker(QObject):
                     round(image_.shape[1] * self.liveController.display_resolution_scaling),
                     round(image_.shape[0] * self.liveController.display_resolution_scaling),
                 )
-                self.image_to_display_multi.emit(image_to_display_, config_.illumination_source)
+                self.image_to_display_multi.emit(image_to_display_.copy(), config_.illumination_source)
                 # save image
                 if self.trackingController.flag_save_image:
                     if camera_frame.is_color():
-                        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                    self.image_saver.enqueue(image_, tracking_frame_counter, str(config_.name))
+                        image_ = cv2.cvtColor(image_, cv2.COLOR_RGB2BGR)
+                    self.image_saver.enqueue(image_.copy(), tracking_frame_counter, str(config_.name))
 
-            # track
-            object_found, centroid, rect_pts = self.tracker.track(image, None, is_first_frame=is_first_frame)
-            if not object_found:
-                self._log.error("tracker: object not found")
-                break
-            in_plane_position_error_pixel = image_center - centroid
-            in_plane_position_error_mm = (
-                in_plane_position_error_pixel * self.trackingController.pixel_size_um_scaled / 1000
+            # wait till tracking interval has elapsed (or the object is lost)
+            self._object_lost.wait(
+                self.trackingController.tracking_time_interval_s - (time.time() - timestamp_last_frame)
             )
-            x_error_mm = in_plane_position_error_mm[0]
-            y_error_mm = in_plane_position_error_mm[1]
-
-            # display the new bounding box and the image
-            self.imageDisplayWindow.update_bounding_box(rect_pts)
-            self.imageDisplayWindow.display_image(image)
-
-            # move
-            if self.trackingController.flag_stage_tracking_enabled:
-                # TODO(imo): This needs testing!
-                self.stage.move_x(x_error_mm)
-                self.stage.move_y(y_error_mm)
-
-            # save image
-            if self.trackingController.flag_save_image:
-                self.image_saver.enqueue(image, tracking_frame_counter, str(config.name))
-
-            # save position data
-            self.csv_file.write(
-                str(t)
-                + ","
-                + str(pos.x_mm)
-                + ","
-                + str(pos.y_mm)
-                + ","
-                + str(pos.z_mm)
-                + ","
-                + str(x_error_mm)
-                + ","
-                + str(y_error_mm)
-                + ","
-                + str(tracking_frame_counter)
-                + "\n"
-            )
-            if tracking_frame_counter % 100 == 0:
-                self.csv_file.flush()
-
-            # wait till tracking interval has elapsed
-            while time.time() - timestamp_last_frame < self.trackingController.tracking_time_interval_s:
-                time.sleep(0.005)
 
             # increament counter
             tracking_frame_counter = tracking_frame_counter + 1
 
-        # tracking terminated
-        self.csv_file.close()
+        # tracking terminated, let the tracker and the stage finish what they have
+        self._frames.close()
+        tracker_thread.join()
+        leftover = self._frames.take(timeout=0)
+        if leftover is not None:
+            leftover[1].release()
+        self._stage_targets.put(None)
+        stage_thread.join()
+
+        self.track_log.close(os.path.join(experiment_path, tracking_pipeline.TRACK_CSV_FILE_NAME))
         self.image_saver.close()
+        self._log.info(
+            f"tracked {len(self.track_log)} of {tracking_frame_counter} frames ({frames_dropped} dropped while the "
+            f"tracker was busy), median latency {self._median_latency_ms():.1f} [ms]"
+        )
         self.finished.emit()
 
+    def _run_tracker(self):
+        while True:
+            item = self._frames.take()
+            if item is None:
+                return
+            frame_counter, camera_frame, image, pos = item
+            try:
+                object_found, centroid, rect_pts = self.windowed_tracker.track(image)
+                if not object_found:
+                    self._log.error("tracker: object not found")
+                    self._object_lost.set()
+                    return
+
+                image_center = np.array([image.shape[1] * 0.5, image.shape[0] * 0.5])
+                in_plane_position_error_pixel = image_center - centroid
+                in_plane_position_error_mm = (
+                    in_plane_position_error_pixel * self.trackingController.pixel_size_um_scaled / 1000
+                )
+                self._stage_targets.put(
+                    (
+                        frame_counter,
+                        camera_frame.timestamp,
+                        pos,
+                        in_plane_position_error_mm[0],
+                        in_plane_position_error_mm[1],
+                    )
+                )
+
+                # display the new bounding box and the image
+                self.imageDisplayWindow.update_bounding_box(rect_pts)
+                # The image view keeps this to paint later, after the camera frame is released below.
+                self.imageDisplayWindow.display_image(image.copy())
+            except Exception:
+                self._log.exception("Tracking failed, stopping")
+                self._object_lost.set()
+                return
+            finally:
+                camera_frame.release()
+
+    def _run_stage(self):
+        stopping = False
+        while not stopping:
+            # only the newest target is moved to, the rest are just logged
+            targets = [self._stage_targets.get()]
+            while not self._stage_targets.empty():
+                targets.append(self._stage_targets.get_nowait())
+            if targets[-1] is None:
+                stopping = True
+                targets.pop()
+            for i, (frame_counter, timestamp, pos, x_error_mm, y_error_mm) in enumerate(targets):
+                latency_ms = math.nan
+                if i == len(targets) - 1 and self.trackingController.flag_stage_tracking_enabled:
+                    latency_ms = 1000 * (time.time() - timestamp)
+                    try:
+                        self.stage.move_xy_to(pos.x_mm + x_error_mm, pos.y_mm + y_error_mm)
+                    except Exception:
+                        self._log.exception("Failed to move the stage, stopping")
+                        self._object_lost.set()
+                self.track_log.append(frame_counter, timestamp, pos, x_error_mm, y_error_mm, latency_ms)
+
+    def _median_latency_ms(self) -> float:
+        latencies = tracking_pipeline.read_track_log(self.track_log.path)["latency_ms"].to_numpy()
+        latencies = latencies[~np.isnan(latencies)]
+        return float(np.median(latencies)) if len(latencies) else math.nan
+
 
 class ImageDisplayWindow(QMainWindow):
 
@@ -2926,6 +3153,12 @@ class ImageDisplayWindow(QMainWindow):
         self.preview_line = None
         self.start_point_marker = None
 
+        # Live frames from a display pipeline are binned: the binned raw frame (for pixel values and line profiles),
+        # and how many image pixels each displayed pixel covers.
+        self.display_pipeline: Optional[display.DisplayPipeline] = None
+        self.display_raw = None
+        self.display_binning = 1
+
         # Create main layout
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
@@ -3187,7 +3420,7 @@ class ImageDisplayWindow(QMainWindow):
 
         try:
             if hasattr(self.graphics_widget.img, "image"):
-                image = self.graphics_widget.img.image
+                image = self.get_displayed_image()
                 if image is not None:
                     # Get the line ROI state
                     state = self.line_roi.getState()
@@ -3206,7 +3439,8 @@ class ImageDisplayWindow(QMainWindow):
                     end_img = self.graphics_widget.img.mapFromView(pg.Point(end[0], end[1]))
 
                     # Get the profile along the line
-                    profile = self.get_line_profile(image, start_img, end_img, size[1])  # size[1] is the width
+                    # size[1] is the width (in image pixels, the profile is taken from the displayed pixels)
+                    profile = self.get_line_profile(image, start_img, end_img, size[1] / self.display_binning)
 
                     # Clear previous plots
                     self.line_profiler_plot.clear()
@@ -3295,10 +3529,12 @@ class ImageDisplayWindow(QMainWindow):
                 self.last_valid_y = y
                 self.has_valid_position = True
 
-                self.cursor_position_label.setText(f"Position: ({x}, {y})")
+                self.cursor_position_label.setText(
+                    f"Position: ({x * self.display_binning}, {y * self.display_binning})"
+                )
 
                 # Get pixel value
-                image = self.graphics_widget.img.image
+                image = self.get_displayed_image()
                 if image is not None and 0 <= y < image.shape[0] and 0 <= x < image.shape[1]:
                     pixel_value = image[y, x]
                     self.last_valid_value = pixel_value
@@ -3409,11 +3645,13 @@ class ImageDisplayWindow(QMainWindow):
             return
 
         if self.is_within_image(image_coord):
-            x_pixel_centered = int(image_coord.x() - self.graphics_widget.img.width() / 2)
-            y_pixel_centered = int(image_coord.y() - self.graphics_widget.img.height() / 2)
-            self.image_click_coordinates.emit(
-                x_pixel_centered, y_pixel_centered, self.graphics_widget.img.width(), self.graphics_widget.img.height()
-            )
+            # In image pixels, whatever the binning of what's displayed.
+            binning = self.display_binning
+            image_width = self.graphics_widget.img.width() * binning
+            image_height = self.graphics_widget.img.height() * binning
+            x_pixel_centered = int(image_coord.x() * binning - image_width / 2)
+            y_pixel_centered = int(image_coord.y() * binning - image_height / 2)
+            self.image_click_coordinates.emit(x_pixel_centered, y_pixel_centered, image_width, image_height)
 
     def is_within_image(self, coordinates):
         try:
@@ -3423,12 +3661,148 @@ class ImageDisplayWindow(QMainWindow):
         except:
             return False
 
+    def set_display_pipeline(self, display_pipeline: display.DisplayPipeline):
+        """
+        Displays the frames display_pipeline prepares (with display_frame), binned to what the view shows and with this
+        window's contrast limits.
+        """
+        self.display_pipeline = display_pipeline
+        display_pipeline.auto_levels = self.autoLevels
+        display_pipeline.compute_histogram = self.show_LUT
+        display_pipeline.frame_ready.connect(self.display_frame)
+
+    def get_display_levels(self, dtype) -> Optional[Tuple[float, float]]:
+        """
+        The contrast limits for a live frame of dtype, or None to use the frame's own range (auto levels).  Only call
+        this from the gui thread, it can rescale the contrast manager's limits.
+        """
+        if self.autoLevels:
+            return None
+        if self.liveController is not None and self.contrastManager is not None:
+            if self.contrastManager.acquisition_dtype != None and self.contrastManager.acquisition_dtype != np.dtype(
+                dtype
+            ):
+                self.contrastManager.scale_contrast_limits(np.dtype(dtype))
+            return self.contrastManager.get_limits(self.liveController.currentConfiguration.name, dtype)
+        info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+        return info.min, info.max
+
+    def update_display_pipeline_levels(self, dtype=None):
+        """
+        Hands the display pipeline a snapshot of the current contrast limits, for frames of dtype (by default, that of
+        the frame displayed last).  The pipeline's thread only ever reads the snapshot, so the contrast limits are only
+        read and changed here, on the gui thread.
+        """
+        if self.display_pipeline is None:
+            return
+        self.display_pipeline.auto_levels = self.autoLevels
+        if dtype is None:
+            if self.display_raw is None:
+                return
+            dtype = self.display_raw.dtype
+        levels = self.get_display_levels(dtype)
+        if levels is not None:
+            self.display_pipeline.set_levels(dtype, levels)
+
+    def get_displayed_image(self):
+        """
+        The image displayed, in its own dtype (binned, for frames from the display pipeline).
+        """
+        return self.display_raw if self.display_raw is not None else self.graphics_widget.img.image
+
+    def get_viewport_binning(self) -> int:
+        """
+        How many image pixels the view puts on each screen pixel, across and down.
+        """
+        view = self.graphics_widget.view.getView() if self.show_LUT else self.graphics_widget.view
+        try:
+            pixel_width, pixel_height = view.viewPixelSize()
+        except Exception:
+            return 1
+        return max(1, int(min(pixel_width, pixel_height) / self.devicePixelRatioF()))
+
+    def _set_histogram_follows_image(self, follows: bool):
+        # Frames from the display pipeline are already 8 bit, so the LUT widget shows the pipeline's histogram and
+        # levels (in the frame's values) instead of following the image item.
+        if not self.show_LUT:
+            return
+        histogram = self.LUTWidget.item
+        if (histogram.imageItem() is not None) == follows:
+            return
+        if follows:
+            histogram.setImageItem(self.graphics_widget.img)
+        else:
+            self.graphics_widget.img.sigImageChanged.disconnect(histogram.imageChanged)
+            histogram.imageItem = lambda: None  # like HistogramLUTItem without an image
+
+    def display_frame(self, frame: display.DisplayFrame):
+        """
+        Paints a frame prepared by the display pipeline.  It's already binned and 8 bit, so this only hands it to the
+        image item, scaled up by the binning so the view stays in image pixels.
+        """
+        try:
+            if self.first_image:
+                self.first_image = False
+                self.btn_line_profiler.setEnabled(True)
+
+            self._set_histogram_follows_image(False)
+            self.display_raw = frame.raw
+            self.display_binning = frame.binning
+            self.graphics_widget.img.setImage(frame.image, autoLevels=False)
+            # Separately, since setImage applies levels that were set before there was an image after the ones passed
+            # to it.
+            self.graphics_widget.img.setLevels((0, 255))
+            self.graphics_widget.img.setTransform(QTransform.fromScale(frame.binning, frame.binning))
+            if self.show_LUT:
+                if frame.histogram is not None:
+                    self.LUTWidget.plot.setData(*frame.histogram)
+                    self.LUTWidget.setHistogramRange(frame.histogram[0][0], frame.histogram[0][-1])
+                self.LUTWidget.setLevels(*frame.levels)
+
+            self._update_pixel_value(frame.raw)
+            if self.line_roi is not None and self.btn_line_profiler.isChecked():
+                self.update_line_profile()
+
+            if self.display_pipeline is not None:
+                # Bin the frames after this one to what the view shows now, with the contrast limits of the channel
+                # that's live now.
+                self.display_pipeline.set_binning(self.get_viewport_binning())
+                self.update_display_pipeline_levels(frame.raw.dtype)
+        finally:
+            # Even if painting failed, or the pipeline would never emit another frame.
+            if self.display_pipeline is not None:
+                self.display_pipeline.frame_displayed()
+
+    def _update_pixel_value(self, image):
+        # Update pixel value based on last valid position
+        if self.has_valid_position:
+            position = (
+                f"Position: ({self.last_valid_x * self.display_binning}, {self.last_valid_y * self.display_binning})"
+            )
+            try:
+                if 0 <= self.last_valid_y < image.shape[0] and 0 <= self.last_valid_x < image.shape[1]:
+                    pixel_value = image[self.last_valid_y, self.last_valid_x]
+                    self.last_valid_value = pixel_value
+                    self.cursor_position_label.setText(position)
+                    self.pixel_value_label.setText(f"Value: {pixel_value}")
+            except:
+                # If there's an error, keep the last valid values
+                self.cursor_position_label.setText(position)
+                self.pixel_value_label.setText(f"Value: {self.last_valid_value}")
+
     def display_image(self, image):
         # enable the line profiler button after the first image is displayed
         if self.first_image:
             self.first_image = False
             self.btn_line_profiler.setEnabled(True)
 
+        # Undo what displaying a frame from the display pipeline set up.
+        if self.display_raw is not None:
+            self._set_histogram_follows_image(True)
+            self.display_raw = None
+            self.display_binning = 1
+            self.graphics_widget.img.setTransform(QTransform())
+
         if ENABLE_TRACKING:
             image = np.copy(image)
             self.image_height, self.image_width = image.shape[:2]
@@ -3458,18 +3832,7 @@ class ImageDisplayWindow(QMainWindow):
 
         self.graphics_widget.img.updateImage()
 
-        # Update pixel value based on last valid position
-        if self.has_valid_position:
-            try:
-                if 0 <= self.last_valid_y < image.shape[0] and 0 <= self.last_valid_x < image.shape[1]:
-                    pixel_value = image[self.last_valid_y, self.last_valid_x]
-                    self.last_valid_value = pixel_value
-                    self.cursor_position_label.setText(f"Position: ({self.last_valid_x}, {self.last_valid_y})")
-                    self.pixel_value_label.setText(f"Value: {pixel_value}")
-            except:
-                # If there's an error, keep the last valid values
-                self.cursor_position_label.setText(f"Position: ({self.last_valid_x}, {self.last_valid_y})")
-                self.pixel_value_label.setText(f"Value: {self.last_valid_value}")
+        self._update_pixel_value(image)
 
         if self.line_roi is not None and self.btn_line_profiler.isChecked():
             self.update_line_profile()
@@ -3507,6 +3870,7 @@ class ImageDisplayWindow(QMainWindow):
         if self.show_LUT and self.contrastManager and self.contrastManager.acquisition_dtype:
             min_val, max_val = self.LUTWidget.region.getRegion()
             self.contrastManager.update_limits(self.liveController.currentConfiguration.name, min_val, max_val)
+            self.update_display_pipeline_levels()
 
     def update_ROI(self):
         self.roi_pos = self.ROI.pos()
@@ -3536,10 +3900,20 @@ class ImageDisplayWindow(QMainWindow):
 
     def set_autolevel(self, enabled):
         self.autoLevels = enabled
+        self.update_display_pipeline_levels()
         self._log.info("set autolevel to " + str(enabled))
 
 
 class NavigationViewer(QFrame):
+    """
+    The sample carrier with the current fov, the fovs to scan, the focus points, and the fovs acquired so far drawn
+    over it.
+
+    Drawing only updates the overlay arrays (or, for the fovs to scan and the focus points, the coordinates they're
+    drawn from) and marks the layer as changed.  The changed layers are redrawn and handed to their image items at
+    most once per event loop iteration, however many fovs were registered in between (or right away, with
+    update_layers).
+    """
 
     signal_coordinates_clicked = Signal(float, float)  # Will emit x_mm, y_mm when clicked
 
@@ -3590,6 +3964,13 @@ class NavigationViewer(QFrame):
         self.view = self.graphics_widget.addViewBox(invertX=not INVERTED_OBJECTIVE, invertY=True)
         self.view.setAspectLocked(True)
 
+        # Layers changed since they were last handed to their image items, updated the next time the event loop runs.
+        self._changed_layers = set()
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(0)
+        self._update_timer.timeout.connect(self.update_layers)
+
         self.grid = QVBoxLayout()
         self.grid.addWidget(self.graphics_widget)
         self.setLayout(self.grid)
@@ -3628,6 +4009,11 @@ class NavigationViewer(QFrame):
         self.view.addItem(self.fov_overlay_item)
         self.view.addItem(self.focus_point_overlay_item)
 
+        # (x_mm, y_mm) of the fovs to scan and of the focus points, in the order they were registered.  Their layers
+        # are redrawn from these.
+        self.scan_fovs: Dict[Tuple[float, float], None] = {}
+        self.focus_points: Dict[Tuple[float, float], None] = {}
+
         self.background_item.setZValue(-1)  # Background layer at the bottom
         self.scan_overlay_item.setZValue(0)  # Scan overlay in the middle
         self.focus_point_overlay_item.setZValue(1)  # # Focus points next
@@ -3753,13 +4139,45 @@ class NavigationViewer(QFrame):
             )
         return current_FOV_top_left, current_FOV_bottom_right
 
+    def _layer_changed(self, *layers):
+        self._changed_layers.update(layers)
+        if not self._update_timer.isActive():
+            self._update_timer.start()
+
+    def update_layers(self):
+        """
+        Redraws the layers that changed and hands them to their image items (this otherwise happens the next time the
+        event loop runs).
+        """
+        self._update_timer.stop()
+        changed, self._changed_layers = self._changed_layers, set()
+        if "scan" in changed:
+            self.scan_overlay.fill(0)
+            if self.scan_fovs:
+                rectangles = self.get_FOV_pixel_rectangles(np.array(list(self.scan_fovs)))
+                mask = utils.rectangle_outlines_mask(self.scan_overlay.shape, rectangles, self.box_line_thickness)
+                self.scan_overlay[mask] = (252, 174, 30, 128)  # Yellow RGBA
+            self.scan_overlay_item.setImage(self.scan_overlay)
+        if "focus points" in changed:
+            self.focus_point_overlay.fill(0)
+            if self.focus_points:
+                for left, top, right, bottom in self.get_FOV_pixel_rectangles(np.array(list(self.focus_points))):
+                    # A filled circle at the center of the fov.
+                    center = (int(left + right) // 2, int(top + bottom) // 2)
+                    cv2.circle(self.focus_point_overlay, center, 5, (0, 255, 0, 255), -1)  # Green RGBA
+            self.focus_point_overlay_item.setImage(self.focus_point_overlay)
+        if "fov" in changed:
+            self.fov_overlay_item.setImage(self.fov_overlay)
+        if "background" in changed:
+            self.background_item.setImage(self.background_image)
+
     def draw_current_fov(self, x_mm, y_mm):
         self.fov_overlay.fill(0)
         current_FOV_top_left, current_FOV_bottom_right = self.get_FOV_pixel_coordinates(x_mm, y_mm)
         cv2.rectangle(
             self.fov_overlay, current_FOV_top_left, current_FOV_bottom_right, (255, 0, 0, 255), self.box_line_thickness
         )
-        self.fov_overlay_item.setImage(self.fov_overlay)
+        self._layer_changed("fov")
 
     def register_fov(self, x_mm, y_mm):
         color = (0, 0, 255, 255)  # Blue RGBA
@@ -3767,48 +4185,89 @@ class NavigationViewer(QFrame):
         cv2.rectangle(
             self.background_image, current_FOV_top_left, current_FOV_bottom_right, color, self.box_line_thickness
         )
-        self.background_item.setImage(self.background_image)
+        self._layer_changed("background")
 
     def register_fov_to_image(self, x_mm, y_mm):
-        color = (252, 174, 30, 128)  # Yellow RGBA
-        current_FOV_top_left, current_FOV_bottom_right = self.get_FOV_pixel_coordinates(x_mm, y_mm)
-        cv2.rectangle(self.scan_overlay, current_FOV_top_left, current_FOV_bottom_right, color, self.box_line_thickness)
-        self.scan_overlay_item.setImage(self.scan_overlay)
+        self.register_fovs_to_image([(x_mm, y_mm)])
 
     def deregister_fov_to_image(self, x_mm, y_mm):
-        current_FOV_top_left, current_FOV_bottom_right = self.get_FOV_pixel_coordinates(x_mm, y_mm)
-        cv2.rectangle(
-            self.scan_overlay, current_FOV_top_left, current_FOV_bottom_right, (0, 0, 0, 0), self.box_line_thickness
-        )
-        self.scan_overlay_item.setImage(self.scan_overlay)
+        self.deregister_fovs_to_image([(x_mm, y_mm)])
+
+    def get_FOV_pixel_rectangles(self, coordinates) -> np.ndarray:
+        """
+        Like get_FOV_pixel_coordinates, but for many fovs at once.  coordinates are (x_mm, y_mm, ...) rows, and this
+        returns an (n, 4) int array of (left, top, right, bottom) rows.
+        """
+        xy = self._xy_mm(coordinates)
+        half_fov_pixels = self.fov_size_mm / 2 / self.mm_per_pixel
+        x_pixel = self.origin_x_pixel + xy[:, 0] / self.mm_per_pixel
+        y_pixel = self.origin_y_pixel + xy[:, 1] / self.mm_per_pixel
+        if self.sample == "glass slide":
+            y_pixel = self.image_height - y_pixel
+        # np.round rounds halves to even, like round() does in get_FOV_pixel_coordinates
+        return np.round(
+            np.column_stack(
+                (
+                    x_pixel - half_fov_pixels,
+                    y_pixel - half_fov_pixels,
+                    x_pixel + half_fov_pixels,
+                    y_pixel + half_fov_pixels,
+                )
+            )
+        ).astype(int)
+
+    @staticmethod
+    def _xy_mm(coordinates) -> np.ndarray:
+        # (n, 2) x_mm, y_mm from an array of (x_mm, y_mm, ...) rows, or from rows of different lengths.
+        try:
+            xy = np.asarray(coordinates, dtype=float)
+        except ValueError:
+            xy = np.asarray([coordinate[:2] for coordinate in coordinates], dtype=float)
+        return xy.reshape(len(xy), -1)[:, :2] if len(xy) else np.empty((0, 2))
+
+    def _coordinate_keys(self, coordinates):
+        return [(x_mm, y_mm) for x_mm, y_mm in self._xy_mm(coordinates).tolist()]
+
+    def register_fovs_to_image(self, coordinates):
+        """
+        Like register_fov_to_image for every (x_mm, y_mm, ...) row in coordinates (a list or an array).
+        """
+        if len(coordinates):
+            self.scan_fovs.update(dict.fromkeys(self._coordinate_keys(coordinates)))
+            self._layer_changed("scan")
+
+    def deregister_fovs_to_image(self, coordinates):
+        if len(coordinates):
+            for key in self._coordinate_keys(coordinates):
+                self.scan_fovs.pop(key, None)
+            self._layer_changed("scan")
 
     def register_focus_point(self, x_mm, y_mm):
         """Draw focus point marker as filled circle centered on the FOV"""
-        color = (0, 255, 0, 255)  # Green RGBA
-        # Get FOV corner coordinates, then calculate FOV center pixel coordinates
-        current_FOV_top_left, current_FOV_bottom_right = self.get_FOV_pixel_coordinates(x_mm, y_mm)
-        center_x = (current_FOV_top_left[0] + current_FOV_bottom_right[0]) // 2
-        center_y = (current_FOV_top_left[1] + current_FOV_bottom_right[1]) // 2
-        # Draw a filled circle at the center
-        radius = 5  # Radius of circle in pixels
-        cv2.circle(self.focus_point_overlay, (center_x, center_y), radius, color, -1)  # -1 thickness means filled
-        self.focus_point_overlay_item.setImage(self.focus_point_overlay)
+        self.register_focus_points([(x_mm, y_mm)])
+
+    def register_focus_points(self, coordinates):
+        """
+        Like register_focus_point for every (x_mm, y_mm, ...) row in coordinates (a list or an array).
+        """
+        if len(coordinates):
+            self.focus_points.update(dict.fromkeys(self._coordinate_keys(coordinates)))
+            self._layer_changed("focus points")
 
     def clear_focus_points(self):
         """Clear just the focus point overlay"""
-        self.focus_point_overlay = np.zeros((self.image_height, self.image_width, 4), dtype=np.uint8)
-        self.focus_point_overlay_item.setImage(self.focus_point_overlay)
+        self.focus_points.clear()
+        self._layer_changed("focus points")
 
     def clear_slide(self):
         self.background_image = self.background_image_copy.copy()
-        self.background_item.setImage(self.background_image)
+        self._layer_changed("background")
         self.draw_current_fov(self.x_mm, self.y_mm)
 
     def clear_overlay(self):
-        self.scan_overlay.fill(0)
-        self.scan_overlay_item.setImage(self.scan_overlay)
-        self.focus_point_overlay.fill(0)
-        self.focus_point_overlay_item.setImage(self.focus_point_overlay)
+        self.scan_fovs.clear()
+        self.focus_points.clear()
+        self._layer_changed("scan", "focus points")
 
     def handle_mouse_click(self, evt):
         if not evt.double():
@@ -4415,6 +4874,10 @@ class LaserAutofocusController(QObject):
 
         self.image = None  # for saving the focus camera image for debugging when centroid cannot be found
 
+        # Finds the spot in focus camera frames, remembering where it was.  Rebuilt when the detection settings change.
+        self._spot_tracker: Optional[laser_spot.SpotTracker] = None
+        self._spot_tracker_settings = None
+
         # Load configurations if provided
         if self.laserAFSettingManager:
             self.load_cached_configuration()
@@ -4433,6 +4896,7 @@ class LaserAutofocusController(QObject):
         )
 
         self.laser_af_properties = adjusted_config
+        self._spot_tracker = None
 
         if self.laser_af_properties.has_reference:
             self.reference_crop = self.laser_af_properties.reference_image_cropped
@@ -4481,6 +4945,7 @@ class LaserAutofocusController(QObject):
             bool: True if initialization successful, False if any step fails
         """
         self.camera.set_region_of_interest(0, 0, 3088, 2064)
+        self._spot_tracker = None
 
         # update camera settings
         self.camera.set_exposure_time(self.laser_af_properties.focus_camera_exposure_time_ms)
@@ -4689,6 +5154,8 @@ class LaserAutofocusController(QObject):
 
         um_to_move = target_um - current_displacement_um
         self._move_z(um_to_move)
+        if LASER_AF_CLOSED_LOOP_PIEZO and self.piezo is not None:
+            um_to_move += self._correct_with_piezo(target_um)
 
         # Verify using cross-correlation that spot is in same location as reference
         cc_result, correlation = self._verify_spot_alignment()
@@ -4702,6 +5169,26 @@ class LaserAutofocusController(QObject):
             self._log.info("Cross correlation check passed - spots are well aligned")
             return True
 
+    def _correct_with_piezo(self, target_um: float) -> float:
+        """Measure and correct the displacement with the piezo until it's within the success window of target_um.
+
+        Returns:
+            float: How far the piezo moved in total (um)
+        """
+        moved_um = 0.0
+        for _ in range(LASER_AF_CLOSED_LOOP_MAX_ITERATIONS):
+            displacement_um = self.measure_displacement()
+            if math.isnan(displacement_um) or abs(displacement_um) > self.laser_af_properties.laser_af_range:
+                self._log.warning("Failed to measure displacement after laser AF move, not correcting it")
+                break
+            error_um = target_um - displacement_um
+            if abs(error_um) <= self.laser_af_properties.displacement_success_window_um:
+                break
+            self._log.debug(f"Laser AF displacement is {error_um:.2f} μm off target, correcting with the piezo")
+            self._move_z(error_um)
+            moved_um += error_um
+        return moved_um
+
     def _move_z(self, um_to_move: float) -> None:
         if self.piezo is not None:
             # TODO: check if um_to_move is in the range of the piezo
@@ -4803,13 +5290,15 @@ class LaserAutofocusController(QObject):
             self._log.exception("Failed to turn on AF laser for verifying spot alignment.")
             return failure_return_value
 
-        # TODO: create a function to get the current image (taking care of trigger mode checking and laser on/off switching)
-        """
-        self.camera.send_trigger()
-        current_image = self.camera.read_frame()
-        """
-        self._get_laser_spot_centroid()
-        current_image = self.image
+        # Only the image is needed here, not the spot's centroid (averaged over several frames).
+        self.camera.enable_callbacks(False)
+        try:
+            current_image = self.get_new_frame()
+        except Exception:
+            self._log.exception("Failed to read a frame for verifying spot alignment.")
+            current_image = None
+        if current_image is not None:
+            self.image = current_image
 
         try:
             self.microcontroller.turn_off_AF_laser()
@@ -4855,11 +5344,36 @@ class LaserAutofocusController(QObject):
         self.camera.send_trigger(self.camera.get_exposure_time())
         return self.camera.read_frame()
 
+    def _send_frame_trigger(self) -> bool:
+        # IMPORTANT: This assumes that the autofocus laser is already on!
+        try:
+            self.camera.send_trigger(self.camera.get_exposure_time())
+            return True
+        except Exception as e:
+            self._log.error(f"Failed to trigger a focus camera frame: {e}")
+            return False
+
+    def _get_spot_tracker(self) -> laser_spot.SpotTracker:
+        properties = self.laser_af_properties
+        settings = (
+            properties.spot_detection_mode,
+            properties.y_window,
+            properties.x_window,
+            properties.min_peak_width,
+            properties.min_peak_distance,
+            properties.min_peak_prominence,
+        )
+        if self._spot_tracker is None or settings != self._spot_tracker_settings:
+            self._spot_tracker = laser_spot.SpotTracker(*settings)
+            self._spot_tracker_settings = settings
+        return self._spot_tracker
+
     def _get_laser_spot_centroid(self, remove_background: bool = False) -> Optional[Tuple[float, float]]:
         """Get the centroid location of the laser spot.
 
         Averages multiple measurements to improve accuracy. The number of measurements
-        is controlled by LASER_AF_AVERAGING_N.
+        is controlled by LASER_AF_AVERAGING_N.  Each frame is processed while the next
+        one is exposing, and the spot is searched for around where it was last found.
 
         Returns:
             Optional[Tuple[float, float]]: (x,y) coordinates of spot centroid, or None if detection fails
@@ -4867,40 +5381,38 @@ class LaserAutofocusController(QObject):
         # disable camera callback
         self.camera.enable_callbacks(False)
 
+        spot_tracker = self._get_spot_tracker()
+        n = self.laser_af_properties.laser_af_averaging_n
         successful_detections = 0
         tmp_x = 0
         tmp_y = 0
+        detection_ms = 0
+        image = None
 
-        for i in range(self.laser_af_properties.laser_af_averaging_n):
+        triggered = self._send_frame_trigger()
+        for i in range(n):
             try:
-                image = self.get_new_frame()
-                if image is None:
-                    self._log.warning(f"Failed to read frame {i+1}/{self.laser_af_properties.laser_af_averaging_n}")
-                    continue
+                image = self.camera.read_frame() if triggered else None
+            except Exception as e:
+                self._log.error(f"Error reading frame {i+1}/{n}: {str(e)}")
+                image = None
+            # Start exposing the next frame before processing this one.
+            triggered = i + 1 < n and self._send_frame_trigger()
 
+            if image is None:
+                self._log.warning(f"Failed to read frame {i+1}/{n}")
+                continue
+
+            try:
                 self.image = image  # store for debugging # TODO: add to return instead of storing
 
                 if remove_background:
-                    # remove background using top hat filter
-                    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (50, 50))  # TODO: tmp hard coded value
-                    image = cv2.morphologyEx(image, cv2.MORPH_TOPHAT, kernel)
-
-                # calculate centroid
-                spot_detection_params = {
-                    "y_window": self.laser_af_properties.y_window,
-                    "x_window": self.laser_af_properties.x_window,
-                    "peak_width": self.laser_af_properties.min_peak_width,
-                    "peak_distance": self.laser_af_properties.min_peak_distance,
-                    "peak_prominence": self.laser_af_properties.min_peak_prominence,
-                    "spot_spacing": self.laser_af_properties.spot_spacing,
-                }
-                result = utils.find_spot_location(
-                    image, mode=self.laser_af_properties.spot_detection_mode, params=spot_detection_params
-                )
+                    image = laser_spot.remove_background(image)
+
+                result = spot_tracker.detect(image)
+                detection_ms += spot_tracker.last_detection_ms
                 if result is None:
-                    self._log.warning(
-                        f"No spot detected in frame {i+1}/{self.laser_af_properties.laser_af_averaging_n}"
-                    )
+                    self._log.warning(f"No spot detected in frame {i+1}/{n}")
                     continue
 
                 x, y = result
@@ -4909,14 +5421,14 @@ class LaserAutofocusController(QObject):
                 successful_detections += 1
 
             except Exception as e:
-                self._log.error(
-                    f"Error processing frame {i+1}/{self.laser_af_properties.laser_af_averaging_n}: {str(e)}"
-                )
+                self._log.error(f"Error processing frame {i+1}/{n}: {str(e)}")
                 continue
 
         # optionally display the image
-        if LASER_AF_DISPLAY_SPOT_IMAGE:
-            self.image_to_display.emit(image)
+        if LASER_AF_DISPLAY_SPOT_IMAGE and image is not None:
+            # A copy, since the display gets it later and the camera may reuse the frame buffer this is a view of by
+            # then.
+            self.image_to_display.emit(image.copy())
 
         # Check if we got enough successful detections
         if successful_detections <= 0:
@@ -4927,7 +5439,10 @@ class LaserAutofocusController(QObject):
         x = tmp_x / successful_detections
         y = tmp_y / successful_detections
 
-        self._log.debug(f"Spot centroid found at ({x:.1f}, {y:.1f}) from {successful_detections} detections")
+        self._log.debug(
+            f"Spot centroid found at ({x:.1f}, {y:.1f}) from {successful_detections} detections "
+            f"in {detection_ms:.1f} [ms]"
+        )
         return (x, y)
 
     def get_image(self) -> Optional[np.ndarray]:
@@ -4955,7 +5470,7 @@ class LaserAutofocusController(QObject):
                 self._log.error("Failed to read frame in get_image")
                 return None
 
-            self.image_to_display.emit(image)
+            self.image_to_display.emit(image.copy())
             return image
 
         except Exception as e:
@@ -0,0 +1,283 @@
+"""
+The live view's display pipeline.
+
+Frames go into a mailbox that only ever holds the newest one: a frame that's replaced before the worker gets to it is
+dropped (and counted) rather than queued, so handing a frame over never waits on the display, and the display never
+falls behind the camera.  The worker thread bins each frame down to about the resolution it's shown at, maps it to
+8 bit with the current contrast limits (through a lookup table for 8 and 16 bit images), and emits a DisplayFrame
+that's ready to paint.  It only emits a frame once the one before has been displayed, and at most max_fps a second,
+so frames are displayed as fast as the gui keeps up with (up to max_fps) whatever the camera's frame rate.
+"""
+
+import dataclasses
+import functools
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from qtpy.QtCore import QObject, Signal
+
+import squid.abc
+import squid.logging
+
+
+@dataclasses.dataclass
+class DisplayFrame:
+    # 8 bit, binned and with the contrast limits applied.
+    image: np.ndarray
+    # The binned frame in its own dtype, for pixel values and line profiles.
+    raw: np.ndarray
+    # Frame pixels per displayed pixel, across and down.
+    binning: int
+    # The raw values mapped to 0 and 255.
+    levels: Tuple[float, float]
+    # (bin centers, counts) of the raw values, if the pipeline computes histograms.
+    histogram: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+
+@dataclasses.dataclass
+class DisplayStats:
+    frames_received: int = 0
+    frames_dropped: int = 0
+    frames_displayed: int = 0
+    elapsed_s: float = 0.0
+    # How long binning and mapping the last frame took.
+    prepare_ms: float = 0.0
+
+    @property
+    def fps(self) -> float:
+        return self.frames_displayed / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"displayed {self.frames_displayed}/{self.frames_received} frames ({self.fps:.1f} fps), "
+            f"dropped {self.frames_dropped}, {self.prepare_ms:.1f} [ms] per frame"
+        )
+
+
+class LatestFrameMailbox:
+    """
+    Holds at most one item: put replaces whatever hasn't been taken yet.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+
+    def put(self, item):
+        """
+        Returns the item this replaced if it was never taken, otherwise None.
+        """
+        with self._condition:
+            replaced, self._item = self._item, item
+            self._condition.notify()
+        return replaced
+
+    def take(self, timeout: Optional[float] = None):
+        """
+        The newest item (and the mailbox is empty after), or None if nothing came in within timeout.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+@functools.lru_cache(maxsize=8)
+def _lookup_table(dtype_str: str, low: float, high: float) -> np.ndarray:
+    values = np.arange(np.iinfo(np.dtype(dtype_str)).max + 1, dtype=np.float32)
+    return np.clip((values - low) * (255 / (high - low)), 0, 255).astype(np.uint8)
+
+
+def bin_image(image: np.ndarray, binning: int) -> np.ndarray:
+    """
+    Averages binning x binning blocks of image (dropping the rows and columns that don't fill a block).
+    """
+    binning = max(1, min(binning, image.shape[0], image.shape[1]))
+    if binning == 1:
+        return image
+    height, width = image.shape[0] // binning, image.shape[1] // binning
+    return cv2.resize(image[: height * binning, : width * binning], (width, height), interpolation=cv2.INTER_AREA)
+
+
+def to_8bit(image: np.ndarray, low: float, high: float) -> np.ndarray:
+    """
+    Maps low to 0 and high to 255, clipping what's outside.
+    """
+    high = max(high, low + 1)
+    if image.dtype in (np.uint8, np.uint16):
+        return np.take(_lookup_table(image.dtype.str, float(low), float(high)), image)
+    scaled = (image.astype(np.float32) - low) * (255 / (high - low))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+class DisplayPipeline(QObject):
+    """
+    Prepares frames for display on its own thread, keeping only the newest (see the module docstring).  submit can be
+    called from any thread; frame_ready is emitted from the worker thread with a DisplayFrame, and whatever displays
+    it calls frame_displayed once it has (the next frame isn't emitted until then).
+
+    Frames are mapped to 8 bit with their own minimum and maximum if auto_levels is set, otherwise with the levels last
+    given to set_levels for their dtype (or their dtype's whole range, or their own range for floats, if there are none
+    yet).  Both are set by whatever owns the contrast limits, and the worker only ever reads the last ones set, so it
+    never touches the contrast limits themselves.
+    """
+
+    frame_ready = Signal(object)
+
+    def __init__(
+        self,
+        max_fps: float = 30.0,
+        auto_levels: bool = False,
+    ):
+        QObject.__init__(self)
+        self._log = squid.logging.get_logger(self.__class__.__name__)
+        self.max_fps = max_fps
+        self.auto_levels = auto_levels
+        # (dtype, levels), replaced as a whole so the worker never sees the levels of one dtype with another.
+        self._levels: Optional[Tuple[np.dtype, Tuple[float, float]]] = None
+        self.binning = 1
+        self.compute_histogram = False
+
+        self._mailbox = LatestFrameMailbox()
+        self._stats_lock = threading.Lock()
+        self.stats = DisplayStats()
+        self._stats_start_time = time.time()
+        self._last_emit_time = 0.0
+        # Set once the last frame emitted has been displayed, so there's only ever one waiting for the gui thread.
+        self._displayed = threading.Event()
+        self._displayed.set()
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set_max_fps(self, fps: float):
+        self.max_fps = fps
+
+    def set_binning(self, binning: int):
+        self.binning = max(1, int(binning))
+
+    def set_levels(self, dtype, levels: Tuple[float, float]):
+        """
+        The contrast limits to map frames of dtype to 8 bit with (unless auto_levels is set).
+        """
+        self._levels = (np.dtype(dtype), (float(levels[0]), float(levels[1])))
+
+    def get_levels(self, dtype) -> Optional[Tuple[float, float]]:
+        """
+        The contrast limits frames of dtype are mapped to 8 bit with, or None for their own minimum and maximum.
+        """
+        if self.auto_levels:
+            return None
+        levels = self._levels
+        if levels is not None and levels[0] == dtype:
+            return levels[1]
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            return float(info.min), float(info.max)
+        return None
+
+    def submit(self, image: np.ndarray, frame: Optional[squid.abc.CameraFrame] = None):
+        """
+        Hands image over to be displayed, replacing the last one submitted if it hasn't been picked up yet.  Never
+        waits.  If image is a view of a camera frame, pass the frame too: it's retained until image is binned (or
+        replaced).
+        """
+        if frame is not None:
+            frame.retain()
+        replaced = self._mailbox.put((image, frame))
+        if replaced is not None and replaced[1] is not None:
+            replaced[1].release()
+        with self._stats_lock:
+            self.stats.frames_received += 1
+            if replaced is not None:
+                self.stats.frames_dropped += 1
+
+    def get_stats(self) -> DisplayStats:
+        with self._stats_lock:
+            return dataclasses.replace(self.stats, elapsed_s=time.time() - self._stats_start_time)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = DisplayStats()
+            self._stats_start_time = time.time()
+
+    def prepare(self, image: np.ndarray) -> DisplayFrame:
+        """
+        Bins image by the current binning and maps it to 8 bit.
+        """
+        binning = self.binning
+        raw = bin_image(image, binning)
+        if np.may_share_memory(raw, image):
+            # raw backs the pixel readouts and line profiles until the next frame is displayed, long after the camera
+            # may have reused the frame buffer image is in.
+            raw = raw.copy()
+        levels = self.get_levels(raw.dtype)
+        if levels is None:
+            levels = (float(np.min(raw)), float(np.max(raw)))
+        histogram = None
+        if self.compute_histogram:
+            info = np.iinfo(raw.dtype) if np.issubdtype(raw.dtype, np.integer) else None
+            value_range = (info.min, info.max) if info is not None else levels
+            # Every other pixel is plenty for the histogram.
+            counts, edges = np.histogram(raw[::2, ::2], bins=256, range=value_range)
+            histogram = ((edges[:-1] + edges[1:]) / 2, counts)
+        return DisplayFrame(
+            image=to_8bit(raw, *levels),
+            raw=raw,
+            binning=min(binning, image.shape[0], image.shape[1]),
+            levels=(float(levels[0]), float(levels[1])),
+            histogram=histogram,
+        )
+
+    def frame_displayed(self):
+        with self._stats_lock:
+            self.stats.frames_displayed += 1
+        self._displayed.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self._displayed.wait(timeout=0.1):
+                continue
+            if self.max_fps > 0:
+                wait_s = self._last_emit_time + 1 / self.max_fps - time.time()
+                if wait_s > 0:
+                    self._stop_event.wait(min(wait_s, 0.1))
+                    continue
+            item = self._mailbox.take(timeout=0.1)
+            if item is None:
+                continue
+
+            image, camera_frame = item
+            start = time.perf_counter()
+            try:
+                frame = self.prepare(image)
+            except Exception:
+                self._log.exception("Failed to prepare a frame for display")
+                continue
+            finally:
+                if camera_frame is not None:
+                    camera_frame.release()
+            with self._stats_lock:
+                self.stats.prepare_ms = 1000 * (time.perf_counter() - start)
+
+            self._displayed.clear()
+            self._last_emit_time = time.time()
+            self.frame_ready.emit(frame)
+
+    def close(self):
+        self._stop_event.set()
+        self._mailbox.close()
+        self._thread.join()
+        item = self._mailbox.take(timeout=0)
+        if item is not None and item[1] is not None:
+            item[1].release()
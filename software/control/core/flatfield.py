@@ -0,0 +1,169 @@
+"""
+Flatfield estimation, caching, and correction, shared by the stitchers and multipoint acquisitions.
+
+A flatfield only needs a few dozen tiles to estimate, so tiles are sampled by path first and only the sampled ones
+are ever read (in parallel, and optionally downsampled before the BaSiC fit since flatfields are smooth).  Estimated
+flatfields are cached on disk per (objective, channel, binning), so later acquisitions with the same setup can
+reuse them, including to correct images in-line as they are acquired.
+"""
+
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import cv2
+import imageio.v2 as imageio
+import numpy as np
+
+import squid.logging
+
+_log = squid.logging.get_logger("control.core.flatfield")
+
+
+def sample_paths(paths: Sequence[str], max_count: int, seed: Optional[int] = None) -> list:
+    """
+    Returns up to max_count of the paths, picked at random without replacement.
+    """
+    paths = list(paths)
+    if len(paths) <= max_count:
+        return paths
+    return random.Random(seed).sample(paths, max_count)
+
+
+def downsample(image: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Area-averages the first two (y, x) axes of image down by an integer factor.
+    """
+    if factor <= 1:
+        return image
+    height, width = image.shape[:2]
+    return cv2.resize(
+        image.astype(np.float32), (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA
+    )
+
+
+def load_images(
+    paths: Sequence[str],
+    downsample_factor: int = 1,
+    num_workers: int = 4,
+    read_fn: Callable[[str], np.ndarray] = imageio.imread,
+) -> np.ndarray:
+    """
+    Reads (and downsamples) the images at paths in parallel, and returns them stacked along a new first axis.
+    """
+    if not paths:
+        return np.empty((0,))
+
+    def load(path):
+        return downsample(np.asarray(read_fn(path)), downsample_factor)
+
+    with ThreadPoolExecutor(max(1, num_workers)) as pool:
+        return np.stack(list(pool.map(load, paths)))
+
+
+def fit_flatfield(images: np.ndarray, output_shape: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """
+    Fits a BaSiC flatfield to a (N, Y, X) stack of images.  If output_shape is given (eg: because the images were
+    downsampled), the flatfield is resized to it.
+    """
+    # basicpy pulls in jax, which is slow to import and only needed here.
+    from basicpy import BaSiC
+
+    if images.ndim != 3:
+        raise ValueError(f"Images must be a (N, Y, X) stack, got shape {images.shape}")
+
+    basic = BaSiC(get_darkfield=False, smoothness_flatfield=1)
+    basic.fit(images)
+    flatfield = np.asarray(basic.flatfield, dtype=np.float32)
+    if output_shape is not None and flatfield.shape != tuple(output_shape):
+        flatfield = cv2.resize(flatfield, (output_shape[1], output_shape[0]), interpolation=cv2.INTER_LINEAR)
+    return flatfield
+
+
+def estimate_flatfields(
+    paths: Sequence[str],
+    channel_names: Sequence[str],
+    max_images: int = 32,
+    downsample_factor: int = 1,
+    num_workers: int = 4,
+    read_fn: Callable[[str], np.ndarray] = imageio.imread,
+    seed: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Estimates flatfields from a random sample of at most max_images of the images at paths.  channel_names has
+    one name for monochrome images, or one per color for RGB images (in which case each color gets its own
+    flatfield).  Returns {channel name: flatfield}, with flatfields at the full image resolution.
+    """
+    full_shapes = []
+
+    def read_and_record_shape(path):
+        image = np.asarray(read_fn(path))
+        full_shapes.append(image.shape[:2])
+        return image
+
+    images = load_images(sample_paths(paths, max_images, seed), downsample_factor, num_workers, read_and_record_shape)
+    if images.size == 0:
+        return {}
+
+    full_shape = full_shapes[0]
+    if images.ndim == 3:
+        return {channel_names[0]: fit_flatfield(images, full_shape)}
+    elif images.ndim == 4 and images.shape[-1] == len(channel_names):
+        return {name: fit_flatfield(images[..., i], full_shape) for i, name in enumerate(channel_names)}
+    raise ValueError(f"Unexpected image stack shape {images.shape} for channels {list(channel_names)}")
+
+
+def apply_flatfield(image: np.ndarray, flatfield: np.ndarray) -> np.ndarray:
+    """
+    Divides image by flatfield, clipping to (and returning) the image's dtype.
+    """
+    corrected = image / flatfield
+    if np.issubdtype(image.dtype, np.integer):
+        info = np.iinfo(image.dtype)
+        corrected = corrected.clip(min=info.min, max=info.max)
+    return corrected.astype(image.dtype)
+
+
+class FlatfieldCache:
+    """
+    Stores flatfields as .npy files in a directory, keyed by (objective, channel, binning).
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    @staticmethod
+    def _file_name(objective: str, channel: str, binning) -> str:
+        if isinstance(binning, (tuple, list)):
+            binning = "x".join(str(b) for b in binning)
+        key = f"{objective}_{channel}_{binning}"
+        return re.sub(r"[^A-Za-z0-9.\-]+", "_", key) + ".npy"
+
+    def path(self, objective: str, channel: str, binning) -> str:
+        return os.path.join(self._directory, FlatfieldCache._file_name(objective, channel, binning))
+
+    def get(self, objective: str, channel: str, binning, shape: Optional[Tuple[int, int]] = None):
+        """
+        Returns the cached flatfield, or None if there isn't one (or if it doesn't match the given image shape).
+        """
+        path = self.path(objective, channel, binning)
+        if not os.path.exists(path):
+            return None
+        try:
+            flatfield = np.load(path)
+        except (OSError, ValueError):
+            _log.warning(f"Could not load cached flatfield {path}, ignoring it.")
+            return None
+        if shape is not None and flatfield.shape != tuple(shape):
+            return None
+        return flatfield
+
+    def put(self, objective: str, channel: str, binning, flatfield: np.ndarray):
+        os.makedirs(self._directory, exist_ok=True)
+        path = self.path(objective, channel, binning)
+        # Write to a temporary file and rename, so a concurrent reader never sees a partial file.
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, np.asarray(flatfield, dtype=np.float32))
+        os.replace(tmp_path, path)
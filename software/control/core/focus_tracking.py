@@ -0,0 +1,153 @@
+"""
+Tracking focus across the fovs of an acquisition from the autofocus results so far.
+
+Every successful autofocus adds its (x, y, z) to a surface fit: the z of the nearest result until there are 3 (that
+aren't on a line), then a plane, and with the "spline" or "rbf" method a FocusMap surface once there are enough
+points for one.  The worker moves z to the surface's prediction for the next fov along with x and y, so autofocus
+starts (or, if it's skipped, stays) where focus should be.
+
+Autofocus is skipped at a fov when there's a plane or surface (not just the nearest z), the last few predictions were
+all within tolerance of where autofocus then found focus, there's an autofocus result close by, and not too many fovs
+have been skipped in a row.  So on a flat or tilted sample most autofocus calls are skipped, and as soon as predictions
+get worse (a warped plate, a new well) autofocus runs at every fov again until the surface catches up.
+"""
+
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+import squid.logging
+
+_log = squid.logging.get_logger("control.core.focus_tracking")
+
+SURFACE_METHODS = ("plane", "spline", "rbf")
+
+
+class FocusTracker:
+    def __init__(
+        self,
+        surface=None,
+        method: str = "plane",
+        tolerance_mm: float = 0.002,
+        max_distance_mm: float = 3.0,
+        max_skipped_fovs: int = 10,
+        residual_window: int = 3,
+        min_surface_points: int = 6,
+    ):
+        """
+        surface is the FocusMap to fit "spline" and "rbf" surfaces with (from min_surface_points autofocus results
+        on, a plane before that).  Autofocus is only skipped within max_distance_mm of an autofocus result, when the
+        last residual_window predictions were within tolerance_mm, and for at most max_skipped_fovs fovs in a row.
+        """
+        if method not in SURFACE_METHODS:
+            raise ValueError(f"Focus tracking method must be one of {SURFACE_METHODS}, not '{method}'")
+        if method != "plane" and surface is None:
+            raise ValueError(f"Focus tracking with '{method}' surfaces needs a FocusMap to fit them with.")
+        self.surface = surface
+        self.method = method
+        self.tolerance_mm = tolerance_mm
+        self.max_distance_mm = max_distance_mm
+        self.max_skipped_fovs = max_skipped_fovs
+        self.min_surface_points = min_surface_points
+
+        self._points: List[Tuple[float, float, float]] = []
+        # Where autofocus found focus minus where it was predicted to be, for the most recent autofocus results.
+        self._residuals_mm = deque(maxlen=residual_window)
+        self._skipped_fovs = 0
+        self._predict_fn: Optional[Callable[[float, float], float]] = None
+        self._fit_dirty = False
+        # What predictions come from: "nearest" (the nearest point's z), "plane", or the surface method.
+        self.model: Optional[str] = None
+
+        self.autofocus_count = 0
+        self.skipped_count = 0
+
+    def __len__(self):
+        return len(self._points)
+
+    @property
+    def residuals_mm(self) -> List[float]:
+        return list(self._residuals_mm)
+
+    def _fit(self):
+        self._fit_dirty = False
+        points = np.array(self._points)
+        if self.method != "plane" and len(points) >= self.min_surface_points:
+            try:
+                self.surface.set_method(self.method)
+                self.surface.set_fit_by_region(False)
+                self.surface.fit({"tracked": self._points})
+                self._predict_fn = lambda x, y: self.surface.interpolate(x, y)
+                self.model = self.method
+                return
+            except Exception as e:
+                _log.warning(f"Couldn't fit a {self.method} surface to {len(points)} focus points, using a plane: {e}")
+
+        if len(points) >= 3:
+            design = np.column_stack((points[:, 0], points[:, 1], np.ones(len(points))))
+            coefficients, _, rank, _ = np.linalg.lstsq(design, points[:, 2], rcond=None)
+            if rank == 3:
+                a, b, c = coefficients
+                self._predict_fn = lambda x, y: a * x + b * y + c
+                self.model = "plane"
+                return
+
+        def nearest_z(x, y):
+            return points[np.argmin(np.hypot(points[:, 0] - x, points[:, 1] - y)), 2]
+
+        self._predict_fn = nearest_z
+        self.model = "nearest"
+
+    def predict(self, x_mm: float, y_mm: float) -> Optional[float]:
+        """
+        Where focus should be at (x_mm, y_mm), or None before the first autofocus result.
+        """
+        if not self._points:
+            return None
+        if self._fit_dirty:
+            self._fit()
+        return float(self._predict_fn(x_mm, y_mm))
+
+    def distance_to_nearest_mm(self, x_mm: float, y_mm: float) -> float:
+        if not self._points:
+            return np.inf
+        points = np.array(self._points)
+        return float(np.min(np.hypot(points[:, 0] - x_mm, points[:, 1] - y_mm)))
+
+    def should_autofocus(self, x_mm: float, y_mm: float) -> bool:
+        """
+        Whether to autofocus at (x_mm, y_mm), or trust the prediction.  Counts the fov as skipped if not.  Autofocus
+        is never skipped while there are too few points (or they're all on a line) for anything but the nearest z.
+        """
+        if self._fit_dirty:
+            self._fit()
+        if (
+            self.model in (None, "nearest")
+            or len(self._residuals_mm) < self._residuals_mm.maxlen
+            or max(abs(r) for r in self._residuals_mm) > self.tolerance_mm
+            or self._skipped_fovs >= self.max_skipped_fovs
+            or self.distance_to_nearest_mm(x_mm, y_mm) > self.max_distance_mm
+        ):
+            return True
+        self._skipped_fovs += 1
+        self.skipped_count += 1
+        return False
+
+    def add(self, x_mm: float, y_mm: float, z_mm: float):
+        """
+        Adds where autofocus found focus at (x_mm, y_mm).
+        """
+        predicted_z_mm = self.predict(x_mm, y_mm)
+        if predicted_z_mm is not None:
+            self._residuals_mm.append(z_mm - predicted_z_mm)
+        self._points.append((x_mm, y_mm, z_mm))
+        self._fit_dirty = True
+        self._skipped_fovs = 0
+        self.autofocus_count += 1
+
+    def summary_str(self) -> str:
+        return (
+            f"{self.autofocus_count} autofocus calls, {self.skipped_count} skipped, recent residuals "
+            f"{[round(1000 * r, 2) for r in self._residuals_mm]} [um]"
+        )
@@ -0,0 +1,228 @@
+"""
+Fast laser spot detection for reflection autofocus.
+
+SpotTracker finds the spot the same way utils.find_spot_location does (the brightest rows, the peaks of the intensity
+along x in them, then an intensity weighted centroid around the peak the detection mode picks), but quicker:
+  - Once it has found the spots, the next frames are only searched in an ROI spanning them plus roi_margin_px on
+    either side, since the spots only move a few tens of pixels between measurements.  If the ROI doesn't have the same
+    number of peaks, one of them is too close to the ROI's edge, or the spot moved further than roi_margin_px, the whole
+    frame is searched again (and the ROI moves to wherever the spots are now).
+  - The intensity profiles are summed with cv2.reduce instead of np.sum.
+  - The centroid comes from the window's row and column sums and a cached coordinate vector, instead of a meshgrid of
+    the window's coordinates.
+  - The top hat structuring element for background removal is only built once per size.
+
+Within the ROI, a spot that appears away from the others (say, from debris) is not seen, where searching the whole frame
+would have found it.
+"""
+
+import functools
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from scipy import signal
+
+import squid.logging
+from control._def import (
+    LASER_AF_MIN_PEAK_DISTANCE,
+    LASER_AF_MIN_PEAK_PROMINENCE,
+    LASER_AF_MIN_PEAK_WIDTH,
+    LASER_AF_ROI_MARGIN_PX,
+    LASER_AF_X_WINDOW,
+    LASER_AF_Y_WINDOW,
+    SpotDetectionMode,
+)
+
+_log = squid.logging.get_logger("control.core.laser_spot")
+
+
+@functools.lru_cache(maxsize=4)
+def _top_hat_kernel(size: int) -> np.ndarray:
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+
+
+def remove_background(image: np.ndarray, kernel_size: int = 50) -> np.ndarray:
+    """
+    Removes anything broader than about kernel_size pixels (the background) from image with a top hat filter.
+    """
+    return cv2.morphologyEx(image, cv2.MORPH_TOPHAT, _top_hat_kernel(kernel_size))
+
+
+def _profile(image: np.ndarray, axis: int) -> np.ndarray:
+    """
+    The sum of image along axis (like np.sum), as float64.
+    """
+    if image.dtype in (np.uint8, np.uint16):
+        return cv2.reduce(image, axis, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel().astype(np.float64)
+    return np.sum(image, axis=axis, dtype=np.float64)
+
+
+class SpotTracker:
+    def __init__(
+        self,
+        mode: SpotDetectionMode = SpotDetectionMode.SINGLE,
+        y_window: int = LASER_AF_Y_WINDOW,
+        x_window: int = LASER_AF_X_WINDOW,
+        min_peak_width: float = LASER_AF_MIN_PEAK_WIDTH,
+        min_peak_distance: float = LASER_AF_MIN_PEAK_DISTANCE,
+        min_peak_prominence: float = LASER_AF_MIN_PEAK_PROMINENCE,
+        intensity_threshold: float = 0.1,
+        roi_margin_px: int = LASER_AF_ROI_MARGIN_PX,
+    ):
+        """
+        The parameters are the same as utils.find_spot_location's.  roi_margin_px is how far the spots can move
+        between frames and still be found in the ROI around where they were; 0 always searches the whole frame.
+        """
+        self.mode = mode
+        self.y_window = int(y_window)
+        self.x_window = int(x_window)
+        self.min_peak_width = min_peak_width
+        self.min_peak_distance = min_peak_distance
+        self.min_peak_prominence = min_peak_prominence
+        self.intensity_threshold = intensity_threshold
+        self.roi_margin_px = int(roi_margin_px)
+
+        self._coordinates = np.arange(0, dtype=np.float64)
+        # The columns [start, end) to search in the next frame, how many peaks there should be in them, and the x of
+        # the last spot found.  None when the next frame has to be searched in full.
+        self._roi: Optional[Tuple[int, int]] = None
+        self._roi_peak_count = 0
+        self._last_x: Optional[float] = None
+        self._frame_shape: Optional[Tuple[int, ...]] = None
+
+        self.roi_detections = 0
+        self.full_frame_detections = 0
+        self.last_detection_ms = 0.0
+
+    def reset(self):
+        """
+        Forgets where the spots were, so the next frame is searched in full.
+        """
+        self._roi = None
+        self._last_x = None
+
+    def _coordinates_to(self, n: int) -> np.ndarray:
+        if len(self._coordinates) < n:
+            self._coordinates = np.arange(n, dtype=np.float64)
+        return self._coordinates[:n]
+
+    def _select_peak(self, peak_locations: np.ndarray) -> int:
+        if self.mode == SpotDetectionMode.SINGLE:
+            if len(peak_locations) > 1:
+                raise ValueError(f"Found {len(peak_locations)} peaks but expected single peak")
+            return int(peak_locations[0])
+        elif self.mode in (SpotDetectionMode.DUAL_RIGHT, SpotDetectionMode.MULTI_RIGHT):
+            return int(peak_locations[-1])
+        elif self.mode == SpotDetectionMode.DUAL_LEFT:
+            return int(peak_locations[0])
+        elif self.mode == SpotDetectionMode.MULTI_SECOND_RIGHT:
+            raise NotImplementedError("MULTI_SECOND_RIGHT is not supported")
+        raise ValueError(f"Unknown spot detection mode: {self.mode}")
+
+    def _centroid(self, rows: np.ndarray, peak_x: int) -> Tuple[float, float]:
+        """
+        The intensity weighted centroid of the 2 * x_window columns of rows around peak_x, ignoring pixels below
+        intensity_threshold of the brightest (after subtracting the dimmest).
+        """
+        x_start = max(peak_x - self.x_window, 0)
+        x_end = min(peak_x + self.x_window, rows.shape[1])
+        window = rows[:, x_start:x_end].astype(np.float64)
+        window -= window.min()
+        brightest = window.max()
+        if brightest > 0:
+            window[window < self.intensity_threshold * brightest] = 0
+        total = window.sum()
+        if total == 0:
+            raise ValueError("No significant intensity in centroid window")
+        centroid_x = self._coordinates_to(x_end)[x_start:] @ window.sum(axis=0) / total
+        centroid_y = self._coordinates_to(window.shape[0]) @ window.sum(axis=1) / total
+        return float(centroid_x), float(centroid_y)
+
+    def _find(self, image: np.ndarray, x_start: int, x_end: int) -> Tuple[float, float, np.ndarray, int]:
+        """
+        Finds the spot in columns [x_start, x_end) of image.  Returns its (x, y) centroid, the x of all the peaks found,
+        and the x of the peak picked, all in image coordinates.  Raises ValueError if there's no spot to be found.
+        """
+        region = image[:, x_start:x_end]
+        y_profile = _profile(region, axis=1)
+        if not y_profile.any():
+            raise ValueError("No spots detected in image")
+        peak_y = int(np.argmax(y_profile))
+        if peak_y < self.y_window or peak_y > region.shape[0] - self.y_window:
+            raise ValueError("Spot too close to image edge")
+        rows = region[peak_y - self.y_window : peak_y + self.y_window]
+
+        x_profile = _profile(rows, axis=0)
+        x_profile -= x_profile.min()
+        x_max = x_profile.max()
+        if x_max == 0:
+            raise ValueError("No peaks detected")
+        x_profile /= x_max
+        peak_locations, _ = signal.find_peaks(
+            x_profile, width=self.min_peak_width, distance=self.min_peak_distance, prominence=self.min_peak_prominence
+        )
+        if len(peak_locations) == 0:
+            raise ValueError("No peaks detected")
+        peak_x = self._select_peak(peak_locations)
+
+        centroid_x, centroid_y = self._centroid(rows, peak_x)
+        return (
+            centroid_x + x_start,
+            centroid_y + peak_y - self.y_window,
+            peak_locations + x_start,
+            peak_x + x_start,
+        )
+
+    def _find_in_roi(self, image: np.ndarray) -> Optional[Tuple[float, float, np.ndarray, int]]:
+        x_start, x_end = self._roi
+        try:
+            x, y, peak_locations, peak_x = self._find(image, x_start, x_end)
+        except ValueError as e:
+            _log.debug(f"No spot in the roi [{x_start}, {x_end}) ({e}), searching the whole frame.")
+            return None
+        if (
+            len(peak_locations) != self._roi_peak_count
+            or peak_locations[0] - x_start < self.x_window
+            or x_end - peak_locations[-1] <= self.x_window
+            or abs(x - self._last_x) > self.roi_margin_px
+        ):
+            _log.debug(f"Spot at x={x:.1f} moved out of the roi [{x_start}, {x_end}), searching the whole frame.")
+            return None
+        return x, y, peak_locations, peak_x
+
+    def detect(self, image: np.ndarray) -> Optional[Tuple[float, float]]:
+        """
+        The (x, y) centroid of the spot in image, or None if there isn't one.
+        """
+        if image is None or not isinstance(image, np.ndarray):
+            raise ValueError("Invalid input image")
+        start = time.perf_counter()
+        try:
+            found = None
+            if self._roi is not None and image.shape == self._frame_shape:
+                found = self._find_in_roi(image)
+                if found is not None:
+                    self.roi_detections += 1
+            if found is None:
+                self.reset()
+                try:
+                    found = self._find(image, 0, image.shape[1])
+                except ValueError as e:
+                    _log.debug(f"No spot detected: {e}")
+                    return None
+                self.full_frame_detections += 1
+
+            x, y, peak_locations, _ = found
+            if self.roi_margin_px > 0:
+                self._roi = (
+                    max(int(peak_locations[0]) - self.roi_margin_px - self.x_window, 0),
+                    min(int(peak_locations[-1]) + self.roi_margin_px + self.x_window + 1, image.shape[1]),
+                )
+                self._roi_peak_count = len(peak_locations)
+                self._last_x = x
+                self._frame_shape = image.shape
+            return x, y
+        finally:
+            self.last_detection_ms = 1000 * (time.perf_counter() - start)
@@ -0,0 +1,202 @@
+"""
+A tiled, multiscale store for the mosaic view.
+
+TiledMosaic keeps the mosaic in fixed size tiles that are only allocated once something is written to them, so memory
+goes with the area imaged rather than the extent of the scan, and the mosaic can grow in any direction without copying
+what's already there.  Pixel coordinates are relative to a fixed origin and can be negative.
+
+Level 0 is full resolution and each level after it is half the size of the one before.  Inserting an image updates
+the region it covers on every level (each from the level before it), so an insert costs about 4/3 of the image's size
+whatever the size of the mosaic.
+
+levels() gives read only, array like views of the levels for napari's multiscale image layers.  They cover the
+mosaic's current bounds, and only assemble the tiles napari actually slices.
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class TiledMosaic:
+    def __init__(self, dtype, channels: Optional[int] = None, tile_size: int = 512, max_levels: int = 8):
+        """
+        channels is None for single channel images, or the number of channels (like 3 for rgb).
+        """
+        self.dtype = np.dtype(dtype)
+        self.channels = channels
+        self.tile_size = tile_size
+        self.max_levels = max_levels
+        # (level, tile row, tile column) -> tile.
+        self._tiles: Dict[Tuple[int, int, int], np.ndarray] = {}
+        # The region of level 0 the level views cover: (top, left, height, width) in pixels.
+        self.bounds: Tuple[int, int, int, int] = (0, 0, 0, 0)
+        # napari slices from its own threads, while images are inserted from the gui thread.
+        self._lock = threading.Lock()
+
+    @property
+    def tile_count(self) -> int:
+        return len(self._tiles)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tile.nbytes for tile in self._tiles.values())
+
+    def _tile_shape(self) -> Tuple[int, ...]:
+        if self.channels is None:
+            return self.tile_size, self.tile_size
+        return self.tile_size, self.tile_size, self.channels
+
+    def set_bounds(self, top: int, left: int, height: int, width: int):
+        self.bounds = (int(top), int(left), int(height), int(width))
+
+    def clear(self):
+        """
+        Drops every tile (the bounds stay as they are).
+        """
+        with self._lock:
+            self._tiles.clear()
+
+    def read(self, level: int, top: int, left: int, height: int, width: int) -> np.ndarray:
+        """
+        The region of level with its top left corner at (top, left), zeros where nothing was written.
+        """
+        with self._lock:
+            return self._read(level, top, left, height, width)
+
+    def _tile_ranges(self, top: int, left: int, height: int, width: int):
+        size = self.tile_size
+        for tile_row in range(top // size, (top + height - 1) // size + 1):
+            y0 = max(top, tile_row * size)
+            y1 = min(top + height, (tile_row + 1) * size)
+            for tile_column in range(left // size, (left + width - 1) // size + 1):
+                x0 = max(left, tile_column * size)
+                x1 = min(left + width, (tile_column + 1) * size)
+                yield tile_row, tile_column, y0, y1, x0, x1
+
+    def _read(self, level: int, top: int, left: int, height: int, width: int) -> np.ndarray:
+        shape = (height, width) if self.channels is None else (height, width, self.channels)
+        region = np.zeros(shape, dtype=self.dtype)
+        if height <= 0 or width <= 0:
+            return region
+        size = self.tile_size
+        for tile_row, tile_column, y0, y1, x0, x1 in self._tile_ranges(top, left, height, width):
+            tile = self._tiles.get((level, tile_row, tile_column))
+            if tile is not None:
+                region[y0 - top : y1 - top, x0 - left : x1 - left] = tile[
+                    y0 - tile_row * size : y1 - tile_row * size, x0 - tile_column * size : x1 - tile_column * size
+                ]
+        return region
+
+    def _write(self, level: int, top: int, left: int, data: np.ndarray):
+        size = self.tile_size
+        height, width = data.shape[:2]
+        for tile_row, tile_column, y0, y1, x0, x1 in self._tile_ranges(top, left, height, width):
+            key = (level, tile_row, tile_column)
+            tile = self._tiles.get(key)
+            if tile is None:
+                tile = self._tiles[key] = np.zeros(self._tile_shape(), dtype=self.dtype)
+            tile[y0 - tile_row * size : y1 - tile_row * size, x0 - tile_column * size : x1 - tile_column * size] = data[
+                y0 - top : y1 - top, x0 - left : x1 - left
+            ]
+
+    def insert(self, image: np.ndarray, top: int, left: int):
+        """
+        Writes image with its top left corner at (top, left) on level 0, and updates the levels below.
+        """
+        image = image.astype(self.dtype, copy=False)
+        with self._lock:
+            self._write(0, top, left, image)
+            height, width = image.shape[:2]
+            for level in range(1, self.max_levels):
+                # The region of the level above that covers what changed, grown to whole 2x2 blocks.
+                y0, x0 = 2 * (top // 2), 2 * (left // 2)
+                y1, x1 = 2 * math.ceil((top + height) / 2), 2 * math.ceil((left + width) / 2)
+                above = self._read(level - 1, y0, x0, y1 - y0, x1 - x0)
+                top, left, height, width = y0 // 2, x0 // 2, (y1 - y0) // 2, (x1 - x0) // 2
+                self._write(level, top, left, cv2.resize(above, (width, height), interpolation=cv2.INTER_AREA))
+
+    def levels(self, min_size: Optional[int] = None) -> List["MosaicLevel"]:
+        """
+        Views of level 0 down to the first level no bigger than min_size (the tile size by default) across, over the
+        current bounds.
+        """
+        min_size = self.tile_size if min_size is None else min_size
+        _, _, height, width = self.bounds
+        levels = [MosaicLevel(self, 0)]
+        while len(levels) < self.max_levels and max(height, width) >> (len(levels) - 1) > min_size:
+            levels.append(MosaicLevel(self, len(levels)))
+        return levels
+
+
+class MosaicLevel:
+    """
+    A read only, array like view of one level of a TiledMosaic over its bounds, for napari.
+    """
+
+    def __init__(self, mosaic: TiledMosaic, level: int):
+        self.mosaic = mosaic
+        self.level = level
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.mosaic.dtype
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        _, _, height, width = self.mosaic.bounds
+        shape = (max(math.ceil(height / 2**self.level), 1), max(math.ceil(width / 2**self.level), 1))
+        return shape if self.mosaic.channels is None else shape + (self.mosaic.channels,)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return math.prod(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _origin(self) -> Tuple[int, int]:
+        top, left, _, _ = self.mosaic.bounds
+        return top // 2**self.level, left // 2**self.level
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1 :]
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        # Read just the rows and columns asked for, then index what was read like numpy would.
+        ranges = []
+        local_key = []
+        for k, n in zip(key[:2], self.shape[:2]):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(n)
+                if step > 0:
+                    ranges.append((start, max(stop - start, 0)))
+                    local_key.append(slice(0, max(stop - start, 0), step))
+                else:
+                    ranges.append((0, n))
+                    local_key.append(k)
+            else:
+                index = int(k) + n if int(k) < 0 else int(k)
+                if not 0 <= index < n:
+                    raise IndexError(f"index {k} is out of bounds for axis with size {n}")
+                ranges.append((index, 1))
+                local_key.append(0)
+        top, left = self._origin()
+        (row, height), (column, width) = ranges
+        region = self.mosaic.read(self.level, top + row, left + column, height, width)
+        return region[tuple(local_key) + tuple(key[2:])]
+
+    def __array__(self, dtype=None, copy=None):
+        region = self[:, :]
+        return region if dtype is None else region.astype(dtype)
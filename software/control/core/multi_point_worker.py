@@ -1,11 +1,14 @@
+import functools
+import json
 import os
+import threading
 import time
 from datetime import datetime
+from typing import Optional
 
 import cv2
 import imageio as iio
 import numpy as np
-import pandas as pd
 
 os.environ["QT_API"] = "pyqt5"
 from qtpy.QtCore import Signal, QObject
@@ -13,9 +16,19 @@ from PyQt5.QtWidgets import QApplication
 
 from control._def import *
 from control import utils, utils_acquisition
+from control.core import continuous_scan, flatfield, focus_tracking, scan_path
+from control.core.acquisition_coordinates import (
+    COORDINATES_FILE_NAME,
+    IMAGE_METADATA_FILE_NAME,
+    CoordinatesLog,
+    ImageMetadataLog,
+)
+from control.core.acquisition_pipeline import AcquisitionPipeline, StageTimings
+from control.core.acquisition_trace import AcquisitionTracer
+from control.core.acquisition_writers import AcquisitionImageWriter, get_image_writer
 from control.piezo import PiezoStage
 from control.utils_config import ChannelMode
-from squid.abc import AbstractCamera
+from squid.abc import AbstractCamera, CameraAcquisitionMode, CameraError, CameraFrame, Pos
 import squid.logging
 
 try:
@@ -27,6 +40,8 @@ except:
 
 
 class MultiPointWorker(QObject):
+    # The channels that handle_rgb_generation combines into one RGB image.
+    RGB_CHANNELS = ["BF LED matrix full_R", "BF LED matrix full_G", "BF LED matrix full_B"]
 
     finished = Signal()
     image_to_display = Signal(np.ndarray)
@@ -87,16 +102,34 @@ class MultiPointWorker(QObject):
 
         self.crop = SEGMENTATION_CROP
 
-        self.t_dpc = []
-        self.t_inf = []
-        self.t_over = []
-
         self.init_napari_layers = not USE_NAPARI_FOR_MULTIPOINT
 
         self.count = 0
 
-        self.merged_image = None
-        self.image_count = 0
+        # file_ID -> (number of images merged so far, merged image).  Keyed by file_ID and locked because with
+        # pipelined saving the images of one fov can be saved out of order and on different threads.
+        self._merged_images = {}
+        self._merged_images_lock = threading.Lock()
+
+        self.tracer = AcquisitionTracer(enabled=MULTIPOINT_RECORD_TRACE, max_spans=MULTIPOINT_TRACE_MAX_SPANS)
+        self.timings = StageTimings(tracer=self.tracer)
+        self._save_pipeline: Optional[AcquisitionPipeline] = None
+        self._image_writer: Optional[AcquisitionImageWriter] = None
+        # Where every image of the current time point was acquired.
+        self.coordinates_log: Optional[CoordinatesLog] = None
+        self.image_metadata_log: Optional[ImageMetadataLog] = None
+        # config name -> flatfield to divide that config's images by before saving them.
+        self._flatfields = {}
+        # Why this acquisition isn't sequenced (see get_sequencing_unsupported_reason), or None if it is.
+        self._sequencing_unsupported_reason: Optional[str] = "the acquisition hasn't started"
+        # The channel the camera and illumination are currently set up for, when sequencing.
+        self._sequenced_config: Optional[ChannelMode] = None
+        # Why rows of fovs aren't scanned continuously (see get_continuous_scan_unsupported_reason), or None if they are.
+        self._continuous_scan_unsupported_reason: Optional[str] = "the acquisition hasn't started"
+        # Why focus isn't tracked across fovs (see get_focus_tracking_unsupported_reason), or None if it is.
+        self._focus_tracking_unsupported_reason: Optional[str] = "the acquisition hasn't started"
+        # Where autofocus found focus so far this time point, when focus is tracked.
+        self.focus_tracker: Optional[focus_tracking.FocusTracker] = None
 
     def update_use_piezo(self, value):
         self.use_piezo = value
@@ -105,6 +138,33 @@ class MultiPointWorker(QObject):
     def run(self):
         try:
             self.start_time = time.perf_counter_ns()
+            self.timings.reset()
+            self.tracer.reset()
+            if MULTIPOINT_USE_PIPELINED_SAVING:
+                self._save_pipeline = AcquisitionPipeline(
+                    num_workers=MULTIPOINT_SAVING_WORKERS,
+                    max_queued_jobs=MULTIPOINT_SAVING_QUEUE_SIZE,
+                    timings=self.timings,
+                )
+            self._image_writer = self._create_image_writer()
+            self._flatfields = self._load_flatfields() if MULTIPOINT_APPLY_FLATFIELD else {}
+            self._sequencing_unsupported_reason = self.get_sequencing_unsupported_reason()
+            if self._sequencing_unsupported_reason:
+                self._log.info(
+                    f"Acquiring one image at a time, not sequenced, because {self._sequencing_unsupported_reason}"
+                )
+            else:
+                self._log.info("Using sequenced acquisition.")
+            self._continuous_scan_unsupported_reason = self.get_continuous_scan_unsupported_reason()
+            if self._continuous_scan_unsupported_reason:
+                self._log.info(f"Stopping at every fov, because {self._continuous_scan_unsupported_reason}")
+            else:
+                self._log.info("Scanning rows of fovs continuously.")
+            self._focus_tracking_unsupported_reason = self.get_focus_tracking_unsupported_reason()
+            if self._focus_tracking_unsupported_reason:
+                self._log.info(f"Not tracking focus across fovs, because {self._focus_tracking_unsupported_reason}")
+            else:
+                self._log.info("Tracking focus across fovs.")
             self.camera.start_streaming()
 
             while self.time_point < self.Nt:
@@ -157,12 +217,189 @@ class MultiPointWorker(QObject):
             self._log.error(f"Operation timed out during acquisition, aborting acquisition!")
             self._log.error(te)
             self.multiPointController.request_abort_aquisition()
+        finally:
+            self._shutdown_save_pipeline()
+            if self._image_writer:
+                self._image_writer.close()
+                self._image_writer = None
+            self.close_coordinates_logs()
+            self._log.info(f"Acquisition stage timings: {self.timings.summary_str()}")
+            self.tracer.set_fov(None)
+            try:
+                self.tracer.export(os.path.join(self.base_path, self.experiment_ID))
+            except OSError:
+                self._log.exception("Could not save the acquisition trace.")
         if not self.headless:
             self.finished.emit()
 
+    def get_sequencing_unsupported_reason(self) -> Optional[str]:
+        """
+        Returns why this acquisition can't use sequenced acquisition (see MULTIPOINT_USE_SEQUENCED_ACQUISITION), or
+        None if it can.
+        """
+        if not MULTIPOINT_USE_SEQUENCED_ACQUISITION:
+            return "MULTIPOINT_USE_SEQUENCED_ACQUISITION is off"
+        if RUN_CUSTOM_MULTIPOINT and "multipoint_custom_script_entry" in globals():
+            return "a custom multipoint script is used"
+        if (
+            self.liveController.trigger_mode != TriggerMode.HARDWARE
+            or self.camera.get_acquisition_mode() != CameraAcquisitionMode.HARDWARE_TRIGGER
+        ):
+            return "the camera isn't hardware triggered"
+        if ENABLE_NL5 and NL5_USE_DOUT:
+            return "the NL5 triggers the camera"
+        if self.use_piezo and self.piezo is None:
+            return "there is no piezo"
+        if self.do_reflection_af and self.microscope.laserAutofocusController.characterization_mode:
+            return "laser af characterization mode saves a focus camera image at every z level"
+        for config in self.selected_configurations:
+            if "RGB" in config.name or "USB Spectrometer" in config.name:
+                return f"the {config.name} channel isn't a single camera image"
+        return None
+
+    def get_continuous_scan_unsupported_reason(self) -> Optional[str]:
+        """
+        Returns why this acquisition can't scan rows of fovs without stopping (see MULTIPOINT_USE_CONTINUOUS_SCAN), or
+        None if it can.
+        """
+        if not MULTIPOINT_USE_CONTINUOUS_SCAN:
+            return "MULTIPOINT_USE_CONTINUOUS_SCAN is off"
+        if RUN_CUSTOM_MULTIPOINT and "multipoint_custom_script_entry" in globals():
+            return "a custom multipoint script is used"
+        if (
+            self.liveController.trigger_mode != TriggerMode.HARDWARE
+            or self.camera.get_acquisition_mode() != CameraAcquisitionMode.HARDWARE_TRIGGER
+        ):
+            return "the camera isn't hardware triggered"
+        if ENABLE_NL5 and NL5_USE_DOUT:
+            return "the NL5 triggers the camera"
+        if self.NZ != 1:
+            return "there is a z stack at every fov"
+        if len(self.selected_configurations) != 1:
+            return "more than one channel is selected"
+        config = self.selected_configurations[0]
+        if "RGB" in config.name or "USB Spectrometer" in config.name:
+            return f"the {config.name} channel isn't a single camera image"
+        if self.do_autofocus or self.do_reflection_af:
+            return "autofocus is on"
+        if type(self.stage).set_x_max_speed is squid.abc.AbstractStage.set_x_max_speed:
+            return "the stage can't change its x speed"
+        return None
+
+    def get_focus_tracking_unsupported_reason(self) -> Optional[str]:
+        """
+        Returns why this acquisition can't predict focus from its autofocus results so far (see
+        MULTIPOINT_USE_FOCUS_TRACKING), or None if it can.
+        """
+        if not MULTIPOINT_USE_FOCUS_TRACKING:
+            return "MULTIPOINT_USE_FOCUS_TRACKING is off"
+        if RUN_CUSTOM_MULTIPOINT and "multipoint_custom_script_entry" in globals():
+            return "a custom multipoint script is used"
+        if not (self.do_autofocus or self.do_reflection_af):
+            return "autofocus is off"
+        if self.multiPointController.focus_map:
+            return "the fovs' z come from a focus map"
+        if self.do_reflection_af:
+            if self.microscope.laserAutofocusController.piezo is not None:
+                return "laser autofocus moves the piezo, not the stage"
+        elif self.autofocusController.use_focus_map:
+            return "autofocus uses the autofocus plane"
+        return None
+
     def wait_till_operation_is_completed(self):
-        while self.microcontroller.is_busy():
-            time.sleep(SLEEP_TIME_S)
+        with self.timings.measure("microcontroller_wait"):
+            while self.microcontroller.is_busy():
+                time.sleep(SLEEP_TIME_S)
+
+    def _run_save_job(self, fn, *args, frame: Optional[CameraFrame] = None):
+        """
+        Run a saving/processing job either on the save pipeline (if pipelined saving is enabled) or immediately
+        on this thread.  Jobs must only use their arguments, not worker state that changes as the acquisition
+        progresses (eg: the stage position).  If the job uses the image of a camera frame, pass the frame too so
+        it stays valid (is retained in the camera's frame buffer) until the job is done with it.
+        """
+        if self._save_pipeline:
+            if frame:
+                frame.retain()
+                fn = functools.partial(MultiPointWorker._run_and_release, fn, frame)
+            if self.tracer.enabled:
+                # So the job's spans are attributed to the fov it was submitted for, not whatever fov we're at by then.
+                fn = functools.partial(self.tracer.run_in_fov, self.tracer.get_fov(), fn)
+            self._save_pipeline.submit(fn, *args)
+        else:
+            with self.timings.measure("save"):
+                fn(*args)
+
+    @staticmethod
+    def _run_and_release(fn, frame, *args):
+        try:
+            fn(*args)
+        finally:
+            frame.release()
+
+    def _create_image_writer(self) -> Optional[AcquisitionImageWriter]:
+        """
+        Returns the writer to stream monochrome images into if Acquisition.OUTPUT_FORMAT asks for one, or None if
+        images should be saved as individual files.
+        """
+        if Acquisition.OUTPUT_FORMAT == AcquisitionOutputFormat.INDIVIDUAL_IMAGES.value:
+            return None
+
+        experiment_path = os.path.join(self.base_path, self.experiment_ID)
+        acquisition_parameters = {}
+        try:
+            with open(os.path.join(experiment_path, "acquisition parameters.json"), "r") as f:
+                acquisition_parameters = json.load(f)
+        except (OSError, ValueError):
+            self._log.warning("Could not read acquisition parameters.json, it will not be embedded in the output.")
+
+        return get_image_writer(
+            Acquisition.OUTPUT_FORMAT,
+            experiment_path=experiment_path,
+            channel_names=[config.name for config in self.selected_configurations],
+            region_fov_coordinates=self.scan_region_fov_coords_mm,
+            nt=self.Nt,
+            nz=self.NZ,
+            pixel_size_um=self.camera.get_pixel_size_binned_um() * self.objectiveStore.get_pixel_size_factor(),
+            dz_um=abs(self.deltaZ) * 1000,
+            dt_s=self.dt,
+            acquisition_parameters=acquisition_parameters,
+        )
+
+    def _load_flatfields(self):
+        """
+        Returns {config name: flatfield} for the selected configurations that have a cached flatfield for the
+        current objective and binning.
+        """
+        cache = flatfield.FlatfieldCache(FLATFIELD_CACHE_PATH)
+        objective = self.objectiveStore.current_objective
+        binning = self.camera.get_binning()
+        flatfields = {}
+        for config in self.selected_configurations:
+            config_flatfield = cache.get(objective, config.name, binning)
+            if config_flatfield is not None:
+                flatfields[config.name] = config_flatfield
+            else:
+                self._log.warning(f"No cached flatfield for {config.name} ({objective=}, {binning=}), not correcting.")
+        return flatfields
+
+    def _flatfield_corrected(self, image, config):
+        config_flatfield = self._flatfields.get(config.name)
+        if config_flatfield is None or image.shape != config_flatfield.shape:
+            return image
+        return flatfield.apply_flatfield(image, config_flatfield)
+
+    def _wait_for_pending_saves(self):
+        if self._save_pipeline:
+            self._save_pipeline.drain()
+
+    def _shutdown_save_pipeline(self):
+        if not self._save_pipeline:
+            return
+        self._save_pipeline.shutdown()
+        if self._save_pipeline.error_count:
+            self._log.error(f"{self._save_pipeline.error_count} image saving jobs failed during this acquisition!")
+        self._save_pipeline = None
 
     def run_single_time_point(self):
         start = time.time()
@@ -176,26 +413,37 @@ class MultiPointWorker(QObject):
 
         slide_path = os.path.join(self.base_path, self.experiment_ID)
 
-        # create a dataframe to save coordinates
-        self.initialize_coordinates_dataframe()
+        # start this time point's coordinates.csv and image_metadata.csv
+        self.initialize_coordinates_dataframe(current_path)
+
+        # focus may have drifted since the last time point, start tracking it over
+        if not self._focus_tracking_unsupported_reason:
+            self.focus_tracker = self.multiPointController.new_focus_tracker()
 
         # init z parameters, z range
         self.initialize_z_stack()
 
         self.run_coordinate_acquisition(current_path)
+        if self.focus_tracker is not None:
+            self._log.info(f"Focus tracking: {self.focus_tracker.summary_str()}")
+
+        # Make sure all of this time point's images are on disk before we write the coordinates and mark it done.
+        self._wait_for_pending_saves()
+        if self._image_writer:
+            self._image_writer.finish_time_point(self.time_point)
 
         # finished region scan
-        self.coordinates_pd.to_csv(os.path.join(current_path, "coordinates.csv"), index=False, header=True)
+        self.close_coordinates_logs()
 
-        # Emit the xyz data for plotting
-        if len(self.coordinates_pd) > 1:
-            x = self.coordinates_pd["x (mm)"].values
-            y = self.coordinates_pd["y (mm)"].values
+        coordinates_pd = self.coordinates_log.to_dataframe()
+        if len(coordinates_pd) > 1:
+            x = coordinates_pd["x (mm)"].values
+            y = coordinates_pd["y (mm)"].values
 
             # When performing a z-stack (NZ > 1), only use the bottom z position for each (x,y) location
             if self.NZ > 1:
                 # Create a copy to avoid modifying the original dataframe
-                plot_df = self.coordinates_pd.copy()
+                plot_df = coordinates_pd.copy()
 
                 # Group by x, y, region and get the minimum z value for each group
                 if "z_piezo (um)" in plot_df.columns:
@@ -219,11 +467,11 @@ class MultiPointWorker(QObject):
                 region = plot_df["region"].values
             else:
                 # For single z acquisitions, use all points as before
-                if "z_piezo (um)" in self.coordinates_pd.columns:
-                    z = self.coordinates_pd["z (um)"].values + self.coordinates_pd["z_piezo (um)"].values
+                if "z_piezo (um)" in coordinates_pd.columns:
+                    z = coordinates_pd["z (um)"].values + coordinates_pd["z_piezo (um)"].values
                 else:
-                    z = self.coordinates_pd["z (um)"].values
-                region = self.coordinates_pd["region"].values
+                    z = coordinates_pd["z (um)"].values
+                region = coordinates_pd["region"].values
 
             x = np.array(x).astype(float)
             y = np.array(y).astype(float)
@@ -245,35 +493,85 @@ class MultiPointWorker(QObject):
 
         self.z_pos = self.stage.get_pos().z_mm  # zpos at the beginning of the scan
 
-    def initialize_coordinates_dataframe(self):
-        base_columns = ["z_level", "x (mm)", "y (mm)", "z (um)", "time"]
-        piezo_column = ["z_piezo (um)"] if self.use_piezo else []
-        self.coordinates_pd = pd.DataFrame(columns=["region", "fov"] + base_columns + piezo_column)
-
-    def update_coordinates_dataframe(self, region_id, z_level, fov=None):
-        pos = self.stage.get_pos()
-        base_data = {
-            "z_level": [z_level],
-            "x (mm)": [pos.x_mm],
-            "y (mm)": [pos.y_mm],
-            "z (um)": [pos.z_mm * 1000],
-            "time": [datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f")],
-        }
-        piezo_data = {"z_piezo (um)": [self.z_piezo_um]} if self.use_piezo else {}
+    def initialize_coordinates_dataframe(self, current_path: Optional[str] = None):
+        """
+        Starts new coordinates and image metadata logs, which are written to current_path's coordinates.csv and
+        image_metadata.csv as the acquisition goes (or only kept in memory without a current_path).
+        """
+        self.close_coordinates_logs()
+        self.coordinates_log = CoordinatesLog(
+            os.path.join(current_path, COORDINATES_FILE_NAME) if current_path else None,
+            use_piezo=self.use_piezo,
+            flush_rows=MULTIPOINT_COORDINATES_FLUSH_ROWS,
+            flush_interval_s=MULTIPOINT_COORDINATES_FLUSH_INTERVAL_S,
+        )
+        self.image_metadata_log = ImageMetadataLog(
+            os.path.join(current_path, IMAGE_METADATA_FILE_NAME) if current_path else None,
+            flush_rows=MULTIPOINT_COORDINATES_FLUSH_ROWS,
+            flush_interval_s=MULTIPOINT_COORDINATES_FLUSH_INTERVAL_S,
+        )
 
-        new_row = pd.DataFrame({"region": [region_id], "fov": [fov], **base_data, **piezo_data})
+    def close_coordinates_logs(self):
+        """
+        Writes out what's left of the coordinates and image metadata logs.
+        """
+        if self.coordinates_log:
+            self.coordinates_log.close()
+        if self.image_metadata_log:
+            self.image_metadata_log.close()
+
+    def update_coordinates_dataframe(self, region_id, z_level, fov=None, pos: Optional[Pos] = None):
+        """
+        Records where the stage was for the images of this fov and z level, which is where it is now unless pos is
+        given.
+        """
+        if pos is None:
+            pos = self.stage.get_pos()
+        self.coordinates_log.append(
+            region_id,
+            fov,
+            z_level,
+            pos,
+            datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f"),
+            z_piezo_um=self.z_piezo_um if self.use_piezo else None,
+        )
 
-        self.coordinates_pd = pd.concat([self.coordinates_pd, new_row], ignore_index=True)
+    def update_image_metadata(self, region_id, z_level, fov, config: ChannelMode, frame_id: Optional[int] = None):
+        """
+        Records the channel, exposure time and camera frame id (if it came from the camera) of an image.
+        """
+        self.image_metadata_log.append(
+            region_id,
+            fov,
+            z_level,
+            config.name,
+            config.exposure_time,
+            frame_id,
+            datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f"),
+        )
 
     def move_to_coordinate(self, coordinate_mm):
-        print("moving to coordinate", coordinate_mm)
+        self._log.debug(f"moving to coordinate {coordinate_mm}")
         x_mm = coordinate_mm[0]
-        self.stage.move_x_to(x_mm)
-        time.sleep(SCAN_STABILIZATION_TIME_MS_X / 1000)
-
         y_mm = coordinate_mm[1]
-        self.stage.move_y_to(y_mm)
-        time.sleep(SCAN_STABILIZATION_TIME_MS_Y / 1000)
+        predicted_z_mm = self.focus_tracker.predict(x_mm, y_mm) if self.focus_tracker is not None else None
+        if predicted_z_mm is not None:
+            # Move z to where focus should be along with x and y, instead of to the region's z.
+            z_axis = self.stage.get_config().Z_AXIS
+            predicted_z_mm = min(max(predicted_z_mm, z_axis.MIN_POSITION), z_axis.MAX_POSITION)
+            self._log.debug(f"moving z to predicted focus at {predicted_z_mm} [mm]")
+            with self.timings.measure("move"):
+                self.stage.move_xyz_to(x_mm, y_mm, predicted_z_mm)
+            with self.timings.measure("settle"):
+                time.sleep(
+                    max(SCAN_STABILIZATION_TIME_MS_X, SCAN_STABILIZATION_TIME_MS_Y, SCAN_STABILIZATION_TIME_MS_Z) / 1000
+                )
+            return
+
+        with self.timings.measure("move"):
+            self.stage.move_xy_to(x_mm, y_mm)
+        with self.timings.measure("settle"):
+            time.sleep(max(SCAN_STABILIZATION_TIME_MS_X, SCAN_STABILIZATION_TIME_MS_Y) / 1000)
 
         # check if z is included in the coordinate
         if len(coordinate_mm) == 3:
@@ -281,9 +579,11 @@ class MultiPointWorker(QObject):
             self.move_to_z_level(z_mm)
 
     def move_to_z_level(self, z_mm):
-        print("moving z")
-        self.stage.move_z_to(z_mm)
-        time.sleep(SCAN_STABILIZATION_TIME_MS_Z / 1000)
+        self._log.debug(f"moving z to {z_mm} [mm]")
+        with self.timings.measure("move"):
+            self.stage.move_z_to(z_mm)
+        with self.timings.measure("settle"):
+            time.sleep(SCAN_STABILIZATION_TIME_MS_Z / 1000)
 
     def run_coordinate_acquisition(self, current_path):
         n_regions = len(self.scan_region_coords_mm)
@@ -295,15 +595,162 @@ class MultiPointWorker(QObject):
             self.num_fovs = len(coordinates)
             self.total_scans = self.num_fovs * self.NZ * len(self.selected_configurations)
 
-            for fov_count, coordinate_mm in enumerate(coordinates):
+            if self._continuous_scan_unsupported_reason:
+                rows = [[fov_count] for fov_count in range(len(coordinates))]
+            else:
+                rows = continuous_scan.split_into_rows(coordinates)
+
+            for row_fovs in rows:
+                row = self.plan_continuous_row([coordinates[fov_count] for fov_count in row_fovs])
+                if row is not None:
+                    self.acquire_row_continuously(row, region_id, current_path, row_fovs, coordinates[row_fovs[0]])
+                else:
+                    for fov_count in row_fovs:
+                        self.tracer.set_fov((self.time_point, region_id, fov_count))
+                        with self.timings.measure("fov"):
+                            self.move_to_coordinate(coordinates[fov_count])
+                            self.acquire_at_position(region_id, current_path, fov_count)
 
-                self.move_to_coordinate(coordinate_mm)
-                self.acquire_at_position(region_id, current_path, fov_count)
+                        if self.multiPointController.abort_acqusition_requested:
+                            break
 
                 if self.multiPointController.abort_acqusition_requested:
                     self.handle_acquisition_abort(current_path, region_id)
                     return
 
+    def plan_continuous_row(self, row_coordinates) -> Optional[continuous_scan.RowScan]:
+        """
+        Plans scanning these fovs (a row from continuous_scan.split_into_rows) without stopping, or returns None if
+        they should be acquired one at a time: with continuous scanning off, for single fov rows, or if stopping at
+        every fov would be faster (eg: with long exposures).
+        """
+        if self._continuous_scan_unsupported_reason or len(row_coordinates) < 2:
+            return None
+        x_axis = self.stage.get_config().X_AXIS
+        fov_x_mm = [coordinate[0] for coordinate in row_coordinates]
+        # The camera is only set up for the channel once we're at the start of the row.
+        exposure_ms = self.selected_configurations[0].exposure_time
+        pixel_size_um = self.camera.get_pixel_size_binned_um() * self.objectiveStore.get_pixel_size_factor()
+        speed = continuous_scan.scan_speed(
+            fov_x_mm,
+            exposure_ms,
+            pixel_size_um,
+            CONTINUOUS_SCAN_MAX_MOTION_BLUR_PIXELS,
+            (exposure_ms + self.camera.get_strobe_time() + CONTINUOUS_SCAN_FRAME_OVERHEAD_MS) / 1000,
+            x_axis.MAX_SPEED,
+        )
+        # The micro sets speeds in steps of 0.01 [mm/s].
+        if speed < 0.01:
+            return None
+        try:
+            row = continuous_scan.plan_row(
+                fov_x_mm, speed, x_axis.MAX_ACCELERATION, (x_axis.MIN_POSITION, x_axis.MAX_POSITION)
+            )
+        except ValueError as e:
+            self._log.warning(f"Stopping at every fov of the row: {e}")
+            return None
+
+        stopping_s = np.sum(
+            scan_path.axis_move_time(np.diff(fov_x_mm), x_axis.MAX_SPEED, x_axis.MAX_ACCELERATION)
+            + max(SCAN_STABILIZATION_TIME_MS_X, SCAN_STABILIZATION_TIME_MS_Y) / 1000
+        )
+        if row.duration_s >= stopping_s:
+            self._log.debug(f"Stopping at every fov is faster ({stopping_s:.3f} [s]) than {row}.")
+            return None
+        return row
+
+    def acquire_row_continuously(
+        self, row: continuous_scan.RowScan, region_id, current_path, fovs, first_coordinate_mm
+    ):
+        """
+        Acquires a row of fovs without stopping: x moves at a constant speed over the whole row, and the camera is
+        triggered as the stage passes each fov.  The position recorded for each fov is where the stage was planned to
+        be when its trigger went out.
+
+        While the stage moves, frames are only read out (and retained in the camera's frame buffer, which allocates
+        new frames rather than reuse retained ones); they're displayed and saved once the row is done, so a slow save
+        can't make the triggers after it late.
+        """
+        config = self.selected_configurations[0]
+        # The row was planned for this channel's exposure (and set_microscope_mode sets it below), not whatever the
+        # camera has right now.
+        exposure_ms = config.exposure_time
+        pixel_size_um = self.camera.get_pixel_size_binned_um() * self.objectiveStore.get_pixel_size_factor()
+        self.tracer.set_fov((self.time_point, region_id, fovs[0]))
+        self.move_to_coordinate((row.start_x_mm, *first_coordinate_mm[1:]))
+        self.handle_z_offset(config, True)
+        with self.timings.measure("set_channel"):
+            self.liveController.set_microscope_mode(config)
+            self.wait_till_operation_is_completed()
+        start_pos = self.stage.get_pos()
+        self._log.info(
+            f"Scanning fovs {fovs[0]}-{fovs[-1]} of {region_id} at {row.speed_mm_per_s:.3f} [mm/s], motion blur "
+            f"{continuous_scan.motion_blur_pixels(row.speed_mm_per_s, exposure_ms, pixel_size_um):.2f} [pixels]"
+        )
+
+        # (fov, position, retained frame or None) of each fov triggered so far.
+        acquired = []
+        try:
+            self.stage.set_x_max_speed(row.speed_mm_per_s)
+            try:
+                self.stage.move_x_to(row.end_x_mm, blocking=False)
+                move_start = time.perf_counter()
+                for fov, fov_x_mm, trigger_time_s in zip(fovs, row.fov_x_mm, row.trigger_times_s):
+                    self.tracer.set_fov((self.time_point, region_id, fov))
+                    # Wait for the stage to get to the fov.
+                    with self.timings.measure("move"):
+                        delay_s = move_start + trigger_time_s - time.perf_counter()
+                        if delay_s > 0:
+                            time.sleep(delay_s)
+                    with self.timings.measure("trigger"):
+                        while not self.camera.get_ready_for_trigger():
+                            time.sleep(0.0001)
+                        triggered_s = time.perf_counter() - move_start
+                        self.camera.send_trigger(illumination_time=exposure_ms)
+                    with self.timings.measure("readout"):
+                        camera_frame = self.camera.read_camera_frame()
+
+                    pos = Pos(
+                        x_mm=row.x_at(triggered_s),
+                        y_mm=start_pos.y_mm,
+                        z_mm=start_pos.z_mm,
+                        theta_rad=start_pos.theta_rad,
+                    )
+                    if abs(pos.x_mm - fov_x_mm) * 1000 > CONTINUOUS_SCAN_MAX_TRIGGER_ERROR_UM:
+                        self._log.warning(
+                            f"Triggered fov {fov} of {region_id} {1000 * (triggered_s - trigger_time_s):.1f} [ms] "
+                            f"late, {1000 * abs(pos.x_mm - fov_x_mm):.1f} [um] from where it should be."
+                        )
+                    if not camera_frame or camera_frame.frame is None:
+                        self._log.warning("self.camera.read_frame() returned None")
+                        camera_frame = None
+                    acquired.append((fov, pos, camera_frame.retain() if camera_frame else None))
+                    self.af_fov_count = self.af_fov_count + 1
+
+                    if self.multiPointController.abort_acqusition_requested:
+                        break
+                if not self.headless:
+                    QApplication.processEvents()
+                self.wait_till_operation_is_completed()
+            finally:
+                self.stage.set_x_max_speed(None)
+                self.handle_z_offset(config, False)
+
+            for fov, pos, camera_frame in acquired:
+                self.tracer.set_fov((self.time_point, region_id, fov))
+                if camera_frame is not None:
+                    file_ID = f"{region_id}_{fov:0{FILE_ID_PADDING}}_{0:0{FILE_ID_PADDING}}"
+                    self._handle_camera_frame(
+                        camera_frame, config, file_ID, current_path, {}, 0, region_id, fov, 0, pos=pos
+                    )
+                self.update_coordinates_dataframe(region_id, 0, fov, pos=pos)
+                self.signal_register_current_fov.emit(pos.x_mm, pos.y_mm)
+                self.signal_region_progress.emit(fov + 1, self.total_scans)
+        finally:
+            for _, _, camera_frame in acquired:
+                if camera_frame is not None:
+                    camera_frame.release()
+
     def acquire_at_position(self, region_id, current_path, fov):
 
         if RUN_CUSTOM_MULTIPOINT and "multipoint_custom_script_entry" in globals():
@@ -311,7 +758,9 @@ class MultiPointWorker(QObject):
             multipoint_custom_script_entry(self, current_path, region_id, fov)
             return
 
-        if not self.perform_autofocus(region_id, fov):
+        with self.timings.measure("autofocus"):
+            autofocus_succeeded = self.perform_autofocus(region_id, fov)
+        if not autofocus_succeeded:
             self._log.error(
                 f"Autofocus failed in acquire_at_position.  Continuing to acquire anyway using the current z position (z={self.stage.get_pos().z_mm} [mm])"
             )
@@ -322,6 +771,8 @@ class MultiPointWorker(QObject):
         pos = self.stage.get_pos()
         if self.use_piezo:
             self.z_piezo_um = self.piezo.position
+        # Autofocus might have changed the channel.
+        self._sequenced_config = None
 
         for z_level in range(self.NZ):
             file_ID = f"{region_id}_{fov:0{FILE_ID_PADDING}}_{z_level:0{FILE_ID_PADDING}}"
@@ -344,12 +795,36 @@ class MultiPointWorker(QObject):
                     self.handle_z_offset(config, True)
 
                 # acquire image
-                if "USB Spectrometer" not in config.name and "RGB" not in config.name:
-                    self.acquire_camera_image(config, file_ID, current_path, current_round_images, z_level)
+                if not self._sequencing_unsupported_reason:
+                    with self.timings.measure("acquire_camera_image"):
+                        self.acquire_camera_image_sequenced(
+                            config,
+                            file_ID,
+                            current_path,
+                            current_round_images,
+                            z_level,
+                            region_id=region_id,
+                            fov=fov,
+                            config_idx=config_idx,
+                        )
+                elif "USB Spectrometer" not in config.name and "RGB" not in config.name:
+                    with self.timings.measure("acquire_camera_image"):
+                        self.acquire_camera_image(
+                            config,
+                            file_ID,
+                            current_path,
+                            current_round_images,
+                            z_level,
+                            region_id=region_id,
+                            fov=fov,
+                            config_idx=config_idx,
+                        )
                 elif "RGB" in config.name:
                     self.acquire_rgb_image(config, file_ID, current_path, current_round_images, z_level)
+                    self.update_image_metadata(region_id, z_level, fov, config)
                 else:
                     self.acquire_spectrometer_data(config, file_ID, current_path, z_level)
+                    self.update_image_metadata(region_id, z_level, fov, config)
 
                 if self.NZ == 1:  # TODO: handle z offset for z stack
                     self.handle_z_offset(config, False)
@@ -362,6 +837,10 @@ class MultiPointWorker(QObject):
                 )
                 self.signal_region_progress.emit(current_image, self.total_scans)
 
+            # Sequenced images don't process gui events one by one.
+            if not self._sequencing_unsupported_reason and not self.headless:
+                QApplication.processEvents()
+
             # updates coordinates df
             self.update_coordinates_dataframe(region_id, z_level, fov)
             self.signal_register_current_fov.emit(self.stage.get_pos().x_mm, self.stage.get_pos().y_mm)
@@ -380,6 +859,28 @@ class MultiPointWorker(QObject):
         if self.NZ > 1:
             self.move_z_back_after_stack()
 
+    def skip_autofocus_for_focus_tracking(self, fov) -> bool:
+        """
+        Whether focus tracking predicts focus well enough here (where move_to_coordinate already moved z to) to skip
+        autofocus at this fov.  Only call this at fovs autofocus would otherwise run at, since a fov it returns True for
+        is counted as skipped.
+        """
+        if self.focus_tracker is None:
+            return False
+        pos = self.stage.get_pos()
+        if self.focus_tracker.should_autofocus(pos.x_mm, pos.y_mm):
+            return False
+        self._log.info(f"Skipping autofocus at fov {fov}, using the predicted focus z={pos.z_mm:.4f} [mm]")
+        return True
+
+    def track_focus(self):
+        """
+        Adds where autofocus just found focus to the focus tracker.
+        """
+        if self.focus_tracker is not None:
+            pos = self.stage.get_pos()
+            self.focus_tracker.add(pos.x_mm, pos.y_mm, pos.z_mm)
+
     def perform_autofocus(self, region_id, fov):
         if not self.do_reflection_af:
             # contrast-based AF; perform AF only if when not taking z stack or doing z stack from center
@@ -388,6 +889,10 @@ class MultiPointWorker(QObject):
                 and (self.do_autofocus)
                 and (self.af_fov_count % Acquisition.NUMBER_OF_FOVS_PER_AF == 0)
             ):
+                # Only here, where autofocus would run: the tracker counts every fov it's asked about and doesn't
+                # autofocus at as skipped.
+                if self.skip_autofocus_for_focus_tracking(fov):
+                    return True
                 configuration_name_AF = MULTIPOINT_AUTOFOCUS_CHANNEL
                 config_AF = self.channelConfigurationManager.get_channel_configuration_by_name(
                     self.objectiveStore.current_objective, configuration_name_AF
@@ -398,10 +903,17 @@ class MultiPointWorker(QObject):
                 ) or self.autofocusController.use_focus_map:
                     self.autofocusController.autofocus()
                     self.autofocusController.wait_till_autofocus_has_completed()
+                    result = self.autofocusController.last_result
+                    if result is not None and result.method in ("fit", "golden section"):
+                        self.track_focus()
         else:
+            # Laser autofocus runs at every fov.
+            if self.skip_autofocus_for_focus_tracking(fov):
+                return True
             self._log.info("laser reflection af")
             try:
-                self.microscope.laserAutofocusController.move_to_target(0)
+                if self.microscope.laserAutofocusController.move_to_target(0):
+                    self.track_focus()
             except Exception as e:
                 file_ID = f"{region_id}_focus_camera.bmp"
                 saving_path = os.path.join(self.base_path, self.experiment_ID, str(self.time_point), file_ID)
@@ -429,21 +941,25 @@ class MultiPointWorker(QObject):
                 self.wait_till_operation_is_completed()
                 time.sleep(SCAN_STABILIZATION_TIME_MS_Z / 1000)
 
-    def acquire_camera_image(self, config, file_ID, current_path, current_round_images, k):
+    def acquire_camera_image(
+        self, config, file_ID, current_path, current_round_images, k, region_id=None, fov=None, config_idx=None
+    ):
         # update the current configuration
-        if not self.performance_mode:
-            self.signal_current_configuration.emit(config)
-            self.wait_till_operation_is_completed()
-        else:
-            # set channel mode directly if in performance mode
-            self.liveController.set_microscope_mode(config)
-            self.wait_till_operation_is_completed()
+        with self.timings.measure("set_channel"):
+            if not self.performance_mode:
+                self.signal_current_configuration.emit(config)
+                self.wait_till_operation_is_completed()
+            else:
+                # set channel mode directly if in performance mode
+                self.liveController.set_microscope_mode(config)
+                self.wait_till_operation_is_completed()
 
         # trigger acquisition (including turning on the illumination) and read frame
         camera_illumination_time = self.camera.get_exposure_time()
         if self.liveController.trigger_mode == TriggerMode.SOFTWARE:
-            self.liveController.turn_on_illumination()
-            self.wait_till_operation_is_completed()
+            with self.timings.measure("illumination"):
+                self.liveController.turn_on_illumination()
+                self.wait_till_operation_is_completed()
             camera_illumination_time = None
         elif self.liveController.trigger_mode == TriggerMode.HARDWARE:
             if "Fluorescence" in config.name and ENABLE_NL5 and NL5_USE_DOUT:
@@ -451,41 +967,131 @@ class MultiPointWorker(QObject):
                 #  "reset_image_ready_flag" arg, so this is broken for all other cameras.  Also this used to do some other funky stuff like setting internal camera flags.
                 #   I am pretty sure this is broken!
                 self.microscope.nl5.start_acquisition()
-        while not self.camera.get_ready_for_trigger():
-            time.sleep(0.001)
-        self.camera.send_trigger(illumination_time=camera_illumination_time)
-        camera_frame = self.camera.read_camera_frame()
-        image = camera_frame.frame
+        with self.timings.measure("trigger"):
+            while not self.camera.get_ready_for_trigger():
+                time.sleep(0.001)
+            self.camera.send_trigger(illumination_time=camera_illumination_time)
+        with self.timings.measure("readout"):
+            camera_frame = self.camera.read_camera_frame()
+        image = camera_frame.frame if camera_frame else None
         if not camera_frame or image is None:
             self._log.warning("self.camera.read_frame() returned None")
             return
 
         # turn off the illumination if using software trigger
         if self.liveController.trigger_mode == TriggerMode.SOFTWARE:
-            self.liveController.turn_off_illumination()
+            with self.timings.measure("illumination"):
+                self.liveController.turn_off_illumination()
 
-        height, width = image.shape[:2]
-        image_to_display = utils.crop_image(
-            image,
-            round(width * self.display_resolution_scaling),
-            round(height * self.display_resolution_scaling),
+        self._handle_camera_frame(
+            camera_frame, config, file_ID, current_path, current_round_images, k, region_id, fov, config_idx
         )
-        self.image_to_display.emit(image_to_display)
-        self.image_to_display_multi.emit(image_to_display, config.illumination_source)
 
-        self.save_image(image, file_ID, config, current_path, camera_frame.is_color())
-        self.update_napari(image, config.name, k)
+        if not self.headless:
+            QApplication.processEvents()
 
-        current_round_images[config.name] = np.copy(image)
+    def acquire_camera_image_sequenced(
+        self, config, file_ID, current_path, current_round_images, k, region_id=None, fov=None, config_idx=None
+    ):
+        """
+        acquire_camera_image for sequenced acquisitions, where the camera is hardware triggered and the micro controls
+        the illumination.  The channel is only set up when it differs from the previous image's, without a gui round
+        trip, and the illumination commands that sends aren't waited for before the trigger.  The previous image has
+        been read out, so the camera is normally ready for the trigger right away.  Each image still gets its own
+        trigger, and the z moves between images are done by the caller as usual.
+
+        If something goes wrong with sequencing, the rest of the acquisition falls back to acquire_camera_image.
+        """
+        try:
+            with self.timings.measure("set_channel"):
+                if config is not self._sequenced_config:
+                    self._sequenced_config = None
+                    self.liveController.set_microscope_mode(config)
+                    self._sequenced_config = config
+            with self.timings.measure("trigger"):
+                while not self.camera.get_ready_for_trigger():
+                    time.sleep(0.0001)
+                self.camera.send_trigger(illumination_time=self.camera.get_exposure_time())
+            with self.timings.measure("readout"):
+                camera_frame = self.camera.read_camera_frame()
+        except (CameraError, TimeoutError) as e:
+            self._log.error("Sequenced acquisition failed, acquiring one image at a time from now on.", exc_info=e)
+            self._sequencing_unsupported_reason = f"sequencing failed with: {e}"
+            self._sequenced_config = None
+            self.acquire_camera_image(
+                config, file_ID, current_path, current_round_images, k, region_id, fov, config_idx
+            )
+            return
 
-        MultiPointWorker.handle_rgb_generation(current_round_images, file_ID, current_path, k)
+        if not camera_frame or camera_frame.frame is None:
+            self._log.warning("self.camera.read_frame() returned None")
+            return
+        self._handle_camera_frame(
+            camera_frame, config, file_ID, current_path, current_round_images, k, region_id, fov, config_idx
+        )
 
-        if not self.headless:
-            QApplication.processEvents()
+    def _handle_camera_frame(
+        self,
+        camera_frame: CameraFrame,
+        config,
+        file_ID,
+        current_path,
+        current_round_images,
+        k,
+        region_id=None,
+        fov=None,
+        config_idx=None,
+        pos: Optional[Pos] = None,
+    ):
+        """
+        Displays and saves an acquired frame.  pos is where the stage was for it, if that's not where it is now.
+        """
+        image = camera_frame.frame
+        if region_id is not None:
+            self.update_image_metadata(region_id, k, fov, config, frame_id=camera_frame.frame_id)
+        with self.timings.measure("display"):
+            self._emit_image_to_display(image, config)
+
+        if self._image_writer and region_id is not None and not camera_frame.is_color():
+            if pos is None:
+                pos = self.stage.get_pos()
+            position = {
+                "x_mm": pos.x_mm,
+                "y_mm": pos.y_mm,
+                "z_um": pos.z_mm * 1000,
+                "time": datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f"),
+            }
+            self._run_save_job(
+                self.write_frame,
+                image,
+                config,
+                self.time_point,
+                region_id,
+                fov,
+                k,
+                config_idx,
+                position,
+                frame=camera_frame,
+            )
+        else:
+            self._run_save_job(
+                self.save_image, image, file_ID, config, current_path, camera_frame.is_color(), frame=camera_frame
+            )
+        with self.timings.measure("display"):
+            self.update_napari(image, config.name, k, pos)
+
+        # Only the RGB channels are combined after the fact, so only they need a copy that outlives the frame.
+        if config.name in MultiPointWorker.RGB_CHANNELS:
+            current_round_images[config.name] = np.copy(image)
+
+            # Hand over a snapshot of the dict, since we keep adding to it while the job might be waiting to run.
+            self._run_save_job(
+                MultiPointWorker.handle_rgb_generation, dict(current_round_images), file_ID, current_path, k
+            )
 
     def acquire_rgb_image(self, config, file_ID, current_path, current_round_images, k):
         # go through the channels
-        rgb_channels = ["BF LED matrix full_R", "BF LED matrix full_G", "BF LED matrix full_B"]
+        rgb_channels = MultiPointWorker.RGB_CHANNELS
         images = {}
 
         for config_ in self.channelConfigurationManager.get_channel_configurations_for_objective(
@@ -544,48 +1150,71 @@ class MultiPointWorker(QObject):
                 )
                 np.savetxt(saving_path, data, delimiter=",")
 
+    def write_frame(
+        self, image: np.array, config: ChannelMode, time_point, region_id, fov, z_level, config_idx, position
+    ):
+        self._image_writer.write_frame(
+            self._flatfield_corrected(image, config), time_point, region_id, fov, z_level, config_idx, position
+        )
+
     def save_image(self, image: np.array, file_ID: str, config: ChannelMode, current_path: str, is_color: bool):
+        image = self._flatfield_corrected(image, config)
         saved_image = utils_acquisition.save_image(
             image=image, file_id=file_ID, save_directory=current_path, config=config, is_color=is_color
         )
 
-        if MERGE_CHANNELS:
+        # With one channel, the merged image would just be another copy of it.
+        if MERGE_CHANNELS and len(self.selected_configurations) > 1:
             self._save_merged_image(saved_image, file_ID, current_path)
 
     def _save_merged_image(self, image: np.array, file_ID: str, current_path: str):
-        self.image_count += 1
+        with self._merged_images_lock:
+            image_count, merged_image = self._merged_images.pop(file_ID, (0, None))
+            image_count += 1
+            merged_image = image if merged_image is None else np.maximum(merged_image, image)
 
-        if self.image_count == 1:
-            self.merged_image = image
-        else:
-            self.merged_image = np.maximum(self.merged_image, image)
+            if image_count < len(self.selected_configurations):
+                self._merged_images[file_ID] = (image_count, merged_image)
+                return
 
-            if self.image_count == len(self.selected_configurations):
-                if image.dtype == np.uint16:
-                    saving_path = os.path.join(current_path, file_ID + "_merged" + ".tiff")
-                else:
-                    saving_path = os.path.join(current_path, file_ID + "_merged" + "." + Acquisition.IMAGE_FORMAT)
+        if image.dtype == np.uint16:
+            saving_path = os.path.join(current_path, file_ID + "_merged" + ".tiff")
+        else:
+            saving_path = os.path.join(current_path, file_ID + "_merged" + "." + Acquisition.IMAGE_FORMAT)
 
-                iio.imwrite(saving_path, self.merged_image)
-                self.image_count = 0
+        iio.imwrite(saving_path, merged_image)
 
-        return
+    def _emit_image_to_display(self, image, config):
+        height, width = image.shape[:2]
+        image_to_display = utils.crop_image(
+            image,
+            round(width * self.display_resolution_scaling),
+            round(height * self.display_resolution_scaling),
+        )
+        # The display gets it later, on the gui thread, by which time the camera may have reused the frame the image
+        # is a view of, so it gets its own copy.
+        image_to_display = image_to_display.copy()
+        self.image_to_display.emit(image_to_display)
+        self.image_to_display_multi.emit(image_to_display, config.illumination_source)
 
-    def update_napari(self, image, config_name, k):
+    def update_napari(self, image, config_name, k, pos: Optional[Pos] = None):
         if not self.performance_mode and (USE_NAPARI_FOR_MOSAIC_DISPLAY or USE_NAPARI_FOR_MULTIPOINT):
 
             if not self.init_napari_layers:
                 print("init napari layers")
                 self.init_napari_layers = True
                 self.napari_layers_init.emit(image.shape[0], image.shape[1], image.dtype)
-            pos = self.stage.get_pos()
+            if pos is None:
+                pos = self.stage.get_pos()
             objective_magnification = str(int(self.objectiveStore.get_current_objective_info()["magnification"]))
-            self.napari_layers_update.emit(image, pos.x_mm, pos.y_mm, k, objective_magnification + "x " + config_name)
+            # A copy, for the same reason as in _emit_image_to_display.
+            self.napari_layers_update.emit(
+                image.copy(), pos.x_mm, pos.y_mm, k, objective_magnification + "x " + config_name
+            )
 
     @staticmethod
     def handle_rgb_generation(current_round_images, file_ID, current_path, k):
-        keys_to_check = ["BF LED matrix full_R", "BF LED matrix full_G", "BF LED matrix full_B"]
-        if all(key in current_round_images for key in keys_to_check):
+        if all(key in current_round_images for key in MultiPointWorker.RGB_CHANNELS):
             print("constructing RGB image")
             print(current_round_images["BF LED matrix full_R"].dtype)
             size = current_round_images["BF LED matrix full_R"].shape
@@ -610,13 +1239,7 @@ class MultiPointWorker(QObject):
 
     def handle_rgb_channels(self, images, file_ID, current_path, config, k):
         for channel in ["BF LED matrix full_R", "BF LED matrix full_G", "BF LED matrix full_B"]:
-            image_to_display = utils.crop_image(
-                images[channel],
-                round(images[channel].shape[1] * self.display_resolution_scaling),
-                round(images[channel].shape[0] * self.display_resolution_scaling),
-            )
-            self.image_to_display.emit(image_to_display)
-            self.image_to_display_multi.emit(image_to_display, config.illumination_source)
+            self._emit_image_to_display(images[channel], config)
 
             self.update_napari(images[channel], channel, k)
 
@@ -635,14 +1258,7 @@ class MultiPointWorker(QObject):
         rgb_image[:, :, 2] = images["BF LED matrix full_B"]
 
         # send image to display
-        height, width = rgb_image.shape[:2]
-        image_to_display = utils.crop_image(
-            rgb_image,
-            round(width * self.display_resolution_scaling),
-            round(height * self.display_resolution_scaling),
-        )
-        self.image_to_display.emit(image_to_display)
-        self.image_to_display_multi.emit(image_to_display, config.illumination_source)
+        self._emit_image_to_display(rgb_image, config)
 
         self.update_napari(rgb_image, config.name, k)
 
@@ -660,8 +1276,8 @@ class MultiPointWorker(QObject):
         region_center = self.scan_region_coords_mm[self.scan_region_names.index(region_id)]
         self.move_to_coordinate(region_center)
 
-        # Save coordinates.csv
-        self.coordinates_pd.to_csv(os.path.join(current_path, "coordinates.csv"), index=False, header=True)
+        # Make sure everything acquired so far is in coordinates.csv and image_metadata.csv
+        self.close_coordinates_logs()
         self.microcontroller.enable_joystick(True)
 
     def move_z_for_stack(self):
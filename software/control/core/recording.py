@@ -0,0 +1,148 @@
+"""
+Helpers for ImageSaver's recording mode: where recorded frames go, throughput statistics, and the raw spill file.
+
+Encoding every frame (tiff/bmp/png) as it comes in often can't keep up with a fast camera.  In spill file mode,
+frames are instead appended raw to one file (plus a small csv index), which only needs sequential disk bandwidth,
+and convert_spill_file turns them into the usual individual images once the recording is over.  Since the index
+is written as frames come in, a spill file left behind by a crash can be converted later too.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import cv2
+import imageio as iio
+import numpy as np
+import pandas as pd
+
+import squid.logging
+
+_log = squid.logging.get_logger("control.core.recording")
+
+SPILL_FILE_NAME = "recording.raw"
+SPILL_INDEX_FILE_NAME = "recording_index.csv"
+
+
+def recorded_image_path(experiment_path: str, counter: int, frame_ID, image_format: str, dtype, max_per_folder=1000):
+    """
+    Returns where the counter-th frame of a recording is saved: <experiment>/<folder>/<file>_<frame ID>.<format>,
+    with max_per_folder images per folder.  16 bit images are always saved as tiff.
+    """
+    folder_ID, file_ID = divmod(counter, max_per_folder)
+    extension = "tiff" if np.dtype(dtype) == np.uint16 else image_format
+    return os.path.join(experiment_path, str(folder_ID), f"{file_ID}_{frame_ID}.{extension}")
+
+
+def write_recorded_image(path: str, image: np.ndarray):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if image.dtype == np.uint16:
+        iio.imwrite(path, image)
+    elif not cv2.imwrite(path, image):
+        raise OSError(f"Could not write image to {path}")
+
+
+@dataclass
+class RecordingStats:
+    frames_received: int = 0
+    frames_saved: int = 0
+    frames_dropped: int = 0
+    frames_failed: int = 0
+    bytes_saved: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def fps(self) -> float:
+        return self.frames_saved / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes_saved / 1024**2 / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"saved {self.frames_saved}/{self.frames_received} frames ({self.fps:.1f} fps, {self.mb_per_s:.1f} MB/s), "
+            f"dropped {self.frames_dropped}, failed {self.frames_failed}"
+        )
+
+
+class SpillFile:
+    """
+    Appends raw frames to <experiment>/recording.raw, and a line per frame to <experiment>/recording_index.csv.
+    Safe to append to from several threads.
+    """
+
+    def __init__(self, experiment_path: str):
+        self.experiment_path = experiment_path
+        os.makedirs(experiment_path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data_file = open(os.path.join(experiment_path, SPILL_FILE_NAME), "wb")
+        self._index_file = open(os.path.join(experiment_path, SPILL_INDEX_FILE_NAME), "w")
+        self._index_file.write("counter,frame_ID,timestamp,offset,dtype,shape\n")
+        self._size = 0
+
+    def append(self, counter: int, frame_ID, timestamp: float, image: np.ndarray):
+        image = np.ascontiguousarray(image)
+        shape = "x".join(str(size) for size in image.shape)
+        with self._lock:
+            offset = self._size
+            self._data_file.write(memoryview(image).cast("B"))
+            self._size += image.nbytes
+            self._index_file.write(f"{counter},{frame_ID},{timestamp},{offset},{image.dtype.str},{shape}\n")
+
+    def close(self):
+        with self._lock:
+            self._data_file.close()
+            self._index_file.close()
+
+
+def convert_spill_file(
+    experiment_path: str,
+    image_format: str,
+    num_workers: int = 4,
+    max_per_folder: int = 1000,
+    on_image_written: Optional[Callable[[], None]] = None,
+) -> int:
+    """
+    Writes every frame in the experiment's spill file out as an individual image (see recorded_image_path), on
+    num_workers threads, then deletes the spill file.  Returns the number of images written.  If some images can't
+    be written, the spill file is kept so nothing is lost.
+    """
+    data_path = os.path.join(experiment_path, SPILL_FILE_NAME)
+    index_path = os.path.join(experiment_path, SPILL_INDEX_FILE_NAME)
+    index = pd.read_csv(index_path, dtype={"frame_ID": str, "dtype": str, "shape": str})
+    if index.empty:
+        os.remove(data_path)
+        os.remove(index_path)
+        return 0
+
+    data = np.memmap(data_path, dtype=np.uint8, mode="r")
+
+    def write(row):
+        shape = tuple(int(size) for size in row.shape.split("x"))
+        dtype = np.dtype(row.dtype)
+        image = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=row.offset).reshape(shape)
+        try:
+            write_recorded_image(
+                recorded_image_path(experiment_path, row.counter, row.frame_ID, image_format, dtype, max_per_folder),
+                image,
+            )
+        except Exception:
+            _log.exception(f"Could not convert frame {row.frame_ID} from the spill file.")
+            return False
+        if on_image_written:
+            on_image_written()
+        return True
+
+    with ThreadPoolExecutor(max(1, num_workers)) as pool:
+        written = list(pool.map(write, index.itertuples(index=False)))
+    del data
+
+    if all(written):
+        os.remove(data_path)
+        os.remove(index_path)
+    else:
+        _log.error(f"{written.count(False)} frames could not be converted, keeping the spill file in {experiment_path}")
+    return sum(written)
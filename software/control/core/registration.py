@@ -0,0 +1,276 @@
+"""
+Global registration of overlapping tiles.
+
+Every pair of neighbouring tiles is registered by phase correlation of only the strips where they are expected
+to overlap (according to the stage coordinates).  The strips are downsampled and batched into one FFT call per
+strip shape.  The pairwise offsets are then combined into one position per tile with a weighted least squares
+solve, so stage drift is corrected across the whole scan instead of assuming a single shift for every pair.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+import squid.logging
+
+_log = squid.logging.get_logger("control.core.registration")
+
+Position = Tuple[float, float]
+
+
+@dataclass
+class PairwiseOffset:
+    tile_a: Hashable
+    tile_b: Hashable
+    # Measured position of tile_b minus position of tile_a, in full resolution pixels.
+    dy: float
+    dx: float
+    # Height of the phase correlation peak, from 0 (no match at all) to 1 (perfect match).
+    confidence: float
+
+
+def find_neighbors(
+    positions: Dict[Hashable, Position], tile_shape: Tuple[int, int], min_overlap_fraction: float = 0.5
+) -> List[Tuple[Hashable, Hashable]]:
+    """
+    Returns the (tile_a, tile_b) pairs of tiles that overlap side by side or one above the other, given their
+    expected (y, x) pixel positions.  Tiles that only touch at a corner are not neighbours: along the axis they
+    are not offset on, they have to overlap by at least min_overlap_fraction of the tile.
+
+    Tiles are bucketed by position, so this is linear in the number of tiles.
+    """
+    height, width = tile_shape
+    buckets = {}
+    for key, (y, x) in positions.items():
+        buckets.setdefault((int(y // height), int(x // width)), []).append(key)
+
+    pairs = []
+    for key_a, (y_a, x_a) in positions.items():
+        bucket_y, bucket_x = int(y_a // height), int(x_a // width)
+        for neighbor_bucket_y in (bucket_y - 1, bucket_y, bucket_y + 1):
+            for neighbor_bucket_x in (bucket_x - 1, bucket_x, bucket_x + 1):
+                for key_b in buckets.get((neighbor_bucket_y, neighbor_bucket_x), []):
+                    y_b, x_b = positions[key_b]
+                    dy, dx = y_b - y_a, x_b - x_a
+                    # Only keep one of (a, b) and (b, a).
+                    if (dy, dx) <= (0, 0):
+                        continue
+                    if abs(dy) >= height or abs(dx) >= width:
+                        continue
+                    if abs(dx) >= abs(dy):
+                        side_by_side = height - abs(dy) >= min_overlap_fraction * height
+                    else:
+                        side_by_side = width - abs(dx) >= min_overlap_fraction * width
+                    if side_by_side:
+                        pairs.append((key_a, key_b))
+    return pairs
+
+
+def overlap_strips(tile_a: np.ndarray, tile_b: np.ndarray, dy: int, dx: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the parts of tile_a and tile_b that overlap if tile_b is at (dy, dx) relative to tile_a.
+    """
+    height, width = tile_a.shape[:2]
+    strip_a = tile_a[max(0, dy) : height + min(0, dy), max(0, dx) : width + min(0, dx)]
+    strip_b = tile_b[max(0, -dy) : height - max(0, dy), max(0, -dx) : width - max(0, dx)]
+    return strip_a, strip_b
+
+
+def downsample_strip(strip: np.ndarray, factor: int) -> np.ndarray:
+    strip = strip.astype(np.float32)
+    if factor <= 1:
+        return strip
+    height, width = (strip.shape[0] // factor) * factor, (strip.shape[1] // factor) * factor
+    return strip[:height, :width].reshape(height // factor, factor, width // factor, factor).mean(axis=(1, 3))
+
+
+def _subpixel_peak_offset(before: float, peak: float, after: float) -> float:
+    # Vertex of the parabola through the peak and its two neighbours.
+    denominator = before - 2 * peak + after
+    if denominator == 0:
+        return 0.0
+    return float(np.clip(0.5 * (before - after) / denominator, -0.5, 0.5))
+
+
+def phase_correlate(strips_a: np.ndarray, strips_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Phase correlates a (N, h, w) batch of strip pairs.  Returns ((N, 2) shifts, (N,) peak heights), where the
+    shift r is such that strips_b[i](p) ~ strips_a[i](p + r).
+    """
+    count, height, width = strips_a.shape
+    window = np.outer(np.hanning(height), np.hanning(width)).astype(np.float32) if min(height, width) > 2 else 1.0
+
+    def prepare(strips):
+        return (strips - strips.mean(axis=(1, 2), keepdims=True)) * window
+
+    cross_power = np.fft.fft2(prepare(strips_a)) * np.conj(np.fft.fft2(prepare(strips_b)))
+    cross_power /= np.abs(cross_power) + 1e-12
+    correlation = np.fft.ifft2(cross_power).real
+
+    shifts = np.zeros((count, 2))
+    peaks = np.zeros(count)
+    for i in range(count):
+        peak_y, peak_x = np.unravel_index(np.argmax(correlation[i]), (height, width))
+        peaks[i] = correlation[i, peak_y, peak_x]
+        sub_y = _subpixel_peak_offset(
+            correlation[i, (peak_y - 1) % height, peak_x],
+            peaks[i],
+            correlation[i, (peak_y + 1) % height, peak_x],
+        )
+        sub_x = _subpixel_peak_offset(
+            correlation[i, peak_y, (peak_x - 1) % width],
+            peaks[i],
+            correlation[i, peak_y, (peak_x + 1) % width],
+        )
+        # Shifts past the middle wrap around to negative shifts.
+        shifts[i, 0] = (peak_y if peak_y <= height // 2 else peak_y - height) + sub_y
+        shifts[i, 1] = (peak_x if peak_x <= width // 2 else peak_x - width) + sub_x
+    return shifts, np.clip(peaks, 0, 1)
+
+
+def register_pairs(
+    pairs: Sequence[Tuple[Hashable, Hashable]],
+    expected_positions: Dict[Hashable, Position],
+    read_fn: Callable[[Hashable], np.ndarray],
+    downsample_factor: int = 2,
+    num_workers: int = 4,
+    batch_size: int = 64,
+    debug_fn: Optional[Callable[[Hashable, Hashable, np.ndarray, np.ndarray], None]] = None,
+) -> List[PairwiseOffset]:
+    """
+    Measures the offset between each pair of tiles.  read_fn(tile) must return the tile as a 2D array.  Tiles
+    are read on num_workers threads, and only the (downsampled) overlap strips are kept once a tile has been cropped
+    into them, so at most num_workers full tiles are in memory at a time.
+    """
+    if not pairs:
+        return []
+
+    def expected_offset(pair):
+        tile_a, tile_b = pair
+        return (
+            int(round(expected_positions[tile_b][0] - expected_positions[tile_a][0])),
+            int(round(expected_positions[tile_b][1] - expected_positions[tile_a][1])),
+        )
+
+    # The (pair, side of the pair) of every strip each tile is cropped into.
+    strips_of_tile = {}
+    for pair in pairs:
+        strips_of_tile.setdefault(pair[0], []).append((pair, 0))
+        strips_of_tile.setdefault(pair[1], []).append((pair, 1))
+
+    def read_strips(tile):
+        # Crops the tile into its strips as soon as it's read, so the full tile can go.  Only the workers' tiles are
+        # ever in memory at once.
+        image = read_fn(tile)
+        strips = []
+        for pair, side in strips_of_tile[tile]:
+            strip = overlap_strips(image, image, *expected_offset(pair))[side]
+            strips.append((pair, side, strip.copy() if debug_fn else downsample_strip(strip, downsample_factor)))
+        return strips
+
+    tiles = sorted(strips_of_tile, key=lambda tile: str(tile))
+    pair_strips = {pair: [None, None] for pair in pairs}
+    with ThreadPoolExecutor(max(1, num_workers)) as pool:
+        for strips in pool.map(read_strips, tiles):
+            for pair, side, strip in strips:
+                pair_strips[pair][side] = strip
+
+    # Group the strips by shape so each group is a single batched FFT.
+    strips_by_shape = {}
+    for pair in pairs:
+        strip_a, strip_b = pair_strips.pop(pair)
+        if debug_fn:
+            debug_fn(pair[0], pair[1], strip_a, strip_b)
+            strip_a = downsample_strip(strip_a, downsample_factor)
+            strip_b = downsample_strip(strip_b, downsample_factor)
+        if min(strip_a.shape) < 2:
+            _log.warning(f"Overlap of tiles {pair} is too small to register, using the expected offset.")
+            continue
+        strips_by_shape.setdefault(strip_a.shape, []).append((pair, strip_a, strip_b))
+
+    offsets = []
+    for group in strips_by_shape.values():
+        for start in range(0, len(group), batch_size):
+            batch = group[start : start + batch_size]
+            shifts, peaks = phase_correlate(
+                np.stack([strip_a for _, strip_a, _ in batch]), np.stack([strip_b for _, _, strip_b in batch])
+            )
+            for (pair, _, _), shift, peak in zip(batch, shifts, peaks):
+                dy, dx = expected_offset(pair)
+                offsets.append(
+                    PairwiseOffset(
+                        tile_a=pair[0],
+                        tile_b=pair[1],
+                        dy=dy + shift[0] * max(1, downsample_factor),
+                        dx=dx + shift[1] * max(1, downsample_factor),
+                        confidence=float(peak),
+                    )
+                )
+    return offsets
+
+
+def solve_positions(
+    expected_positions: Dict[Hashable, Position],
+    offsets: Sequence[PairwiseOffset],
+    min_confidence: float = 0.05,
+    max_residual_px: float = 10.0,
+) -> Dict[Hashable, Position]:
+    """
+    Returns the (y, x) position of every tile that best agrees with the measured pairwise offsets, in a weighted
+    least squares sense (weighted by confidence).  Every tile is also weakly tied to its expected position, so
+    tiles (or groups of tiles) without any reliable offsets stay where the stage put them.  Offsets below
+    min_confidence are ignored, and offsets that disagree with the solution by more than max_residual_px are
+    dropped and the positions re-solved once.
+    """
+    tiles = list(expected_positions)
+    if not tiles:
+        return {}
+    index = {tile: i for i, tile in enumerate(tiles)}
+    expected = np.array([expected_positions[tile] for tile in tiles], dtype=float)
+    prior_weight = 1e-3
+
+    usable = [
+        offset
+        for offset in offsets
+        if offset.confidence >= min_confidence and offset.tile_a in index and offset.tile_b in index
+    ]
+
+    def solve(offsets_to_use):
+        rows, cols, values = [], [], []
+        targets = []
+        for row, offset in enumerate(offsets_to_use):
+            weight = offset.confidence
+            rows += [row, row]
+            cols += [index[offset.tile_b], index[offset.tile_a]]
+            values += [weight, -weight]
+            targets.append((weight * offset.dy, weight * offset.dx))
+        for i in range(len(tiles)):
+            rows.append(len(offsets_to_use) + i)
+            cols.append(i)
+            values.append(prior_weight)
+            targets.append(prior_weight * expected[i])
+        matrix = scipy.sparse.csr_matrix((values, (rows, cols)), shape=(len(offsets_to_use) + len(tiles), len(tiles)))
+        targets = np.array(targets, dtype=float)
+        return np.stack(
+            [scipy.sparse.linalg.lsqr(matrix, targets[:, axis], atol=1e-10, btol=1e-10)[0] for axis in range(2)],
+            axis=1,
+        )
+
+    solution = solve(usable)
+    residuals = [
+        np.hypot(
+            solution[index[offset.tile_b], 0] - solution[index[offset.tile_a], 0] - offset.dy,
+            solution[index[offset.tile_b], 1] - solution[index[offset.tile_a], 1] - offset.dx,
+        )
+        for offset in usable
+    ]
+    consistent = [offset for offset, residual in zip(usable, residuals) if residual <= max_residual_px]
+    if len(consistent) < len(usable):
+        _log.info(f"Dropping {len(usable) - len(consistent)} inconsistent pairwise offsets and re-solving.")
+        solution = solve(consistent)
+
+    return {tile: (float(solution[i, 0]), float(solution[i, 1])) for i, tile in enumerate(tiles)}
@@ -0,0 +1,276 @@
+"""
+Ordering of scan regions and fovs to minimize stage travel time, and estimates of how long a scan will take.
+
+Moves are timed with a trapezoidal velocity profile per axis (max speed and acceleration from the StageConfig).  X and
+Y move at the same time, so an xy move takes as long as its slower axis, and z moves after xy.  Moving z down costs an
+extra move past the target and back up to clear backlash, like CephlaStage.move_z_to does.
+
+Regions are ordered with nearest neighbour + 2-opt over their centers, then the fovs within each region are ordered
+the same way starting from wherever the previous region left off.  Nothing depends on where the stage currently is,
+so the same regions always give the same order (and so the same fov indices and file names).  If the planned order
+isn't faster than the order we were given, the given order is kept.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+import squid.logging
+from squid.abc import AbstractStage
+from squid.config import StageConfig
+
+_log = squid.logging.get_logger("control.core.scan_path")
+
+
+def axis_move_time(distance, max_speed: float, max_acceleration: float):
+    """
+    Time to move the given distance(s) from standstill to standstill, accelerating at max_acceleration up to at most
+    max_speed.
+    """
+    distance = np.abs(np.asarray(distance, dtype=float))
+    if max_acceleration <= 0 or not np.isfinite(max_acceleration):
+        return distance / max_speed
+    # Below this distance we never reach max speed (a triangular velocity profile).
+    full_speed_distance = max_speed**2 / max_acceleration
+    return np.where(
+        distance < full_speed_distance,
+        2 * np.sqrt(distance / max_acceleration),
+        distance / max_speed + max_speed / max_acceleration,
+    )
+
+
+@dataclass(frozen=True)
+class MotionModel:
+    x_max_speed: float
+    x_max_acceleration: float
+    y_max_speed: float
+    y_max_acceleration: float
+    z_max_speed: float
+    z_max_acceleration: float
+    # When moving z down, the stage moves this much past the target then back up.
+    z_backlash_mm: float = 0.0
+    # Time we wait after every xy move, and after every z move.
+    settle_xy_s: float = 0.0
+    settle_z_s: float = 0.0
+
+    @staticmethod
+    def from_stage_config(
+        stage_config: StageConfig, z_backlash_mm: float = 0.0, settle_xy_s: float = 0.0, settle_z_s: float = 0.0
+    ) -> "MotionModel":
+        return MotionModel(
+            x_max_speed=stage_config.X_AXIS.MAX_SPEED,
+            x_max_acceleration=stage_config.X_AXIS.MAX_ACCELERATION,
+            y_max_speed=stage_config.Y_AXIS.MAX_SPEED,
+            y_max_acceleration=stage_config.Y_AXIS.MAX_ACCELERATION,
+            z_max_speed=stage_config.Z_AXIS.MAX_SPEED,
+            z_max_acceleration=stage_config.Z_AXIS.MAX_ACCELERATION,
+            z_backlash_mm=z_backlash_mm,
+            settle_xy_s=settle_xy_s,
+            settle_z_s=settle_z_s,
+        )
+
+    @staticmethod
+    def from_stage(stage: AbstractStage, settle_xy_s: float = 0.0, settle_z_s: float = 0.0) -> "MotionModel":
+        # Only the cephla stage clears z backlash.
+        from squid.stage.cephla import CephlaStage
+
+        z_backlash_mm = CephlaStage._BACKLASH_COMPENSATION_DISTANCE_MM if isinstance(stage, CephlaStage) else 0.0
+        return MotionModel.from_stage_config(stage.get_config(), z_backlash_mm, settle_xy_s, settle_z_s)
+
+    def xy_move_time(self, dx, dy):
+        return np.maximum(
+            axis_move_time(dx, self.x_max_speed, self.x_max_acceleration),
+            axis_move_time(dy, self.y_max_speed, self.y_max_acceleration),
+        )
+
+    def z_move_time(self, dz):
+        dz = np.asarray(dz, dtype=float)
+        up = axis_move_time(dz, self.z_max_speed, self.z_max_acceleration)
+        if not self.z_backlash_mm:
+            return up
+        down = axis_move_time(np.abs(dz) + self.z_backlash_mm, self.z_max_speed, self.z_max_acceleration)
+        down = down + axis_move_time(self.z_backlash_mm, self.z_max_speed, self.z_max_acceleration)
+        return np.where(dz < 0, down, up)
+
+    def xy_time_matrix(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        The time to move from each of the xy points in a (shape (n, 2)) to each of the points in b, shape (n, m).
+        """
+        return self.xy_move_time(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+
+
+@dataclass
+class ScanTimeEstimate:
+    n_fovs: int
+    move_s: float
+    settle_s: float
+    acquisition_s: float
+
+    @property
+    def total_s(self) -> float:
+        return self.move_s + self.settle_s + self.acquisition_s
+
+    def __str__(self):
+        return (
+            f"{self.n_fovs} fovs in ~{self.total_s:.1f} [s] (moving {self.move_s:.1f} [s], settling {self.settle_s:.1f}"
+            f" [s], acquiring {self.acquisition_s:.1f} [s])"
+        )
+
+
+def _as_array(coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    Coordinates as an (n, 3) array, with nan for a missing z.
+    """
+    array = np.full((len(coordinates), 3), np.nan)
+    for i, coordinate in enumerate(coordinates):
+        array[i, : min(3, len(coordinate))] = coordinate[:3]
+    return array
+
+
+def path_move_times(points: np.ndarray, motion: MotionModel, start: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    The time of each move along the path through points (an (n, 3) array as from _as_array), starting with the move
+    from start (if given) to the first point.  z is only moved for points that have one.
+    """
+    if start is not None:
+        points = np.vstack([np.asarray(start, dtype=float).reshape(1, 3), points])
+    if len(points) < 2:
+        return np.zeros(0)
+    steps = np.diff(points, axis=0)
+    times = motion.xy_move_time(steps[:, 0], steps[:, 1])
+    dz = np.nan_to_num(steps[:, 2])
+    return times + np.where(dz != 0, motion.z_move_time(dz), 0.0)
+
+
+def estimate_scan_time(
+    region_fov_coordinates: Dict[Hashable, Sequence[Sequence[float]]],
+    motion: MotionModel,
+    per_fov_acquisition_s: float = 0.0,
+) -> ScanTimeEstimate:
+    """
+    How long it takes to visit every fov of every region in order (dict order, then list order), settle, and acquire.
+    """
+    chunks = [_as_array(coordinates) for coordinates in region_fov_coordinates.values() if len(coordinates)]
+    if not chunks:
+        return ScanTimeEstimate(0, 0.0, 0.0, 0.0)
+    points = np.vstack(chunks)
+    n_fovs = len(points)
+    # We settle after every xy move, and after every z move (for fovs that have a z).
+    n_z_moves = int(np.count_nonzero(~np.isnan(points[:, 2])))
+    return ScanTimeEstimate(
+        n_fovs=n_fovs,
+        move_s=float(np.sum(path_move_times(points, motion))),
+        settle_s=n_fovs * motion.settle_xy_s + n_z_moves * motion.settle_z_s,
+        acquisition_s=n_fovs * per_fov_acquisition_s,
+    )
+
+
+def _nearest_neighbor_order(times: np.ndarray, first: int) -> np.ndarray:
+    n = len(times)
+    order = np.empty(n, dtype=int)
+    visited = np.zeros(n, dtype=bool)
+    current = first
+    for i in range(n):
+        order[i] = current
+        visited[current] = True
+        if i + 1 < n:
+            candidates = np.where(visited, np.inf, times[current])
+            # argmin picks the lowest index on ties, which keeps this deterministic.
+            current = int(np.argmin(candidates))
+    return order
+
+
+def _two_opt(order: np.ndarray, times: np.ndarray, max_passes: int) -> np.ndarray:
+    """
+    Improves an open path with a fixed first point by reversing sub paths, until no reversal helps (or max_passes).
+    times must be symmetric.
+    """
+    order = order.copy()
+    n = len(order)
+    if n < 4:
+        return order
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            a, b = order[i], order[i + 1]
+            # Reversing order[i + 1 : j + 1] replaces edges (a, b) and (c, d) with (a, c) and (b, d).  For the last j
+            # there's no d, so only (a, b) is replaced with (a, c).
+            c = order[i + 2 :]
+            d = order[i + 3 :]
+            delta = times[a, c] - times[a, b]
+            delta[:-1] += times[b, d] - times[c[:-1], d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                order[i + 1 : i + j + 3] = order[i + 1 : i + j + 3][::-1]
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_points(
+    xy: np.ndarray, motion: MotionModel, start_xy: Optional[np.ndarray] = None, max_two_opt_passes: int = 20
+) -> np.ndarray:
+    """
+    Returns the indices of the (n, 2) xy points in the order that visits them all quickly.  The path starts with the
+    point closest (in move time) to start_xy, or with the first point if there is no start.
+    """
+    n = len(xy)
+    if n <= 1:
+        return np.arange(n)
+    times = motion.xy_time_matrix(xy, xy)
+    first = 0 if start_xy is None else int(np.argmin(motion.xy_time_matrix(np.asarray(start_xy).reshape(1, 2), xy)))
+    return _two_opt(_nearest_neighbor_order(times, first), times, max_two_opt_passes)
+
+
+def plan_scan_path(
+    region_fov_coordinates: Dict[Hashable, List[Sequence[float]]],
+    motion: MotionModel,
+    max_fovs_per_region: int = 2000,
+) -> Dict[Hashable, List[Sequence[float]]]:
+    """
+    Returns the regions (and the fovs within each region) reordered to minimize the total move time.  The given
+    order is the starting point, and is kept if the plan isn't faster.
+
+    Regions with more than max_fovs_per_region fovs keep their fov order (these are big grids where the generated
+    raster is already good and planning is expensive), but may be scanned in reverse if that is faster.
+    """
+    region_ids = [region_id for region_id, coordinates in region_fov_coordinates.items() if len(coordinates)]
+    if not region_ids:
+        return dict(region_fov_coordinates)
+
+    points = {region_id: _as_array(region_fov_coordinates[region_id]) for region_id in region_ids}
+    centers = np.array([np.mean(points[region_id][:, :2], axis=0) for region_id in region_ids])
+    region_order = order_points(centers, motion)
+
+    planned = {}
+    previous = None
+    for region_index in region_order:
+        region_id = region_ids[region_index]
+        coordinates = region_fov_coordinates[region_id]
+        region_points = points[region_id]
+        start_xy = None if previous is None else previous[:2]
+        if len(coordinates) <= max_fovs_per_region:
+            fov_order = order_points(region_points[:, :2], motion, start_xy)
+        else:
+            fov_order = np.arange(len(coordinates))
+            if previous is not None:
+                to_first, to_last = motion.xy_time_matrix(start_xy.reshape(1, 2), region_points[[0, -1], :2])[0]
+                if to_last < to_first:
+                    fov_order = fov_order[::-1]
+        planned[region_id] = [coordinates[i] for i in fov_order]
+        previous = region_points[fov_order[-1]]
+
+    # Regions without fovs don't cost anything, keep them at the end.
+    for region_id, coordinates in region_fov_coordinates.items():
+        if region_id not in planned:
+            planned[region_id] = coordinates
+
+    given_time = estimate_scan_time(region_fov_coordinates, motion).move_s
+    planned_time = estimate_scan_time(planned, motion).move_s
+    if planned_time >= given_time:
+        _log.info(f"Planned scan path isn't faster than the given order ({given_time:.1f} [s] of moves), keeping it.")
+        return dict(region_fov_coordinates)
+    _log.info(f"Planned scan path has {planned_time:.1f} [s] of moves, down from {given_time:.1f} [s].")
+    return planned
@@ -0,0 +1,188 @@
+"""
+The pieces TrackingWorker's pipeline is built from.
+
+Tracking runs in three stages, each on its own thread, so a slow stage never holds up the ones before it:
+  - acquisition (the worker's thread): switches configurations, autofocuses, triggers and reads frames, saves images.
+  - tracking: runs the tracker on the newest frame, within a search window around where the object last was.
+  - stage: moves the stage to put the object back in the center of the field of view, and logs the track.
+
+Frames and stage targets are both newest-wins: a frame the tracker hasn't got to by the time the next one comes in is
+dropped, and a stage target that's replaced before the stage gets to it is logged but never moved to.  Stage targets
+are absolute (where the stage was when the frame was taken, plus the object's offset from the center), so skipping
+one never loses a correction.
+
+The track is logged as fixed size binary records (TrackLog.DTYPE) appended to track.bin, and written out as track.csv
+once tracking stops.
+"""
+
+import math
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from squid.abc import Pos
+
+TRACK_LOG_FILE_NAME = "track.bin"
+TRACK_CSV_FILE_NAME = "track.csv"
+
+
+class TrackLog:
+    DTYPE = np.dtype(
+        [
+            ("frame", "<i8"),
+            # The camera's timestamp of the frame.
+            ("time_s", "<f8"),
+            # Where the stage was when the frame was taken.
+            ("x_stage_mm", "<f8"),
+            ("y_stage_mm", "<f8"),
+            ("z_stage_mm", "<f8"),
+            # How far the object was from the center of the frame.
+            ("x_error_mm", "<f8"),
+            ("y_error_mm", "<f8"),
+            # From the frame's timestamp to sending the stage its target, nan if the stage wasn't moved for this frame.
+            ("latency_ms", "<f8"),
+        ]
+    )
+
+    def __init__(self, path: str, flush_rows: int = 100, flush_interval_s: float = 1.0):
+        """
+        Appends records to the file at path (which is truncated) every flush_rows rows, or flush_interval_s after the
+        first row that isn't on disk yet.  Not thread safe, rows should be added from one thread.
+        """
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self._pending = np.zeros(max(1, flush_rows), self.DTYPE)
+        self._pending_rows = 0
+        self._flushed_rows = 0
+        self._first_pending_time: Optional[float] = None
+        self._file = open(path, "wb")
+
+    def __len__(self):
+        return self._flushed_rows + self._pending_rows
+
+    def append(
+        self,
+        frame: int,
+        time_s: float,
+        pos: Pos,
+        x_error_mm: float,
+        y_error_mm: float,
+        latency_ms: float = math.nan,
+    ):
+        self._pending[self._pending_rows] = (
+            frame,
+            time_s,
+            pos.x_mm,
+            pos.y_mm,
+            pos.z_mm,
+            x_error_mm,
+            y_error_mm,
+            latency_ms,
+        )
+        self._pending_rows += 1
+
+        now = time.monotonic()
+        if self._first_pending_time is None:
+            self._first_pending_time = now
+        if self._pending_rows == len(self._pending) or now - self._first_pending_time >= self.flush_interval_s:
+            self.flush()
+
+    def flush(self):
+        if self._file is None or not self._pending_rows:
+            return
+        self._pending[: self._pending_rows].tofile(self._file)
+        self._file.flush()
+        self._flushed_rows += self._pending_rows
+        self._pending_rows = 0
+        self._first_pending_time = None
+
+    def close(self, csv_path: Optional[str] = None):
+        """
+        Flushes what's left, and writes the whole track to csv_path if given.
+        """
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        if csv_path is not None:
+            read_track_log(self.path).to_csv(csv_path, index=False)
+
+
+def read_track_log(path: str) -> pd.DataFrame:
+    return pd.DataFrame(np.fromfile(path, dtype=TrackLog.DTYPE))
+
+
+def search_window(image_shape, bbox, size: int) -> Tuple[int, int, int, int]:
+    """
+    The (left, top, right, bottom) of a size x size window centered on the (x, y, width, height) bbox, moved to be
+    within an image of image_shape (and clipped if the image is smaller).  The whole image if size is 0.
+    """
+    height, width = image_shape[:2]
+    if size <= 0:
+        return 0, 0, width, height
+    window_width, window_height = min(size, width), min(size, height)
+    center_x, center_y = bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2
+    left = int(min(max(round(center_x - window_width / 2), 0), width - window_width))
+    top = int(min(max(round(center_y - window_height / 2), 0), height - window_height))
+    return left, top, left + window_width, top + window_height
+
+
+class WindowedTracker:
+    """
+    Runs a tracking.Tracker_Image on a window of each frame around the object rather than on the whole frame.  The
+    window stays put while the object is more than margin_px inside it; once it gets closer to an edge, the window is
+    re-centered on the object and the tracker is restarted on it (trackers work in the coordinates of what they're
+    given, so they can't follow a window that moves every frame).
+    """
+
+    def __init__(self, tracker, window_size_px: int, margin_px: int):
+        self.tracker = tracker
+        self.window_size_px = window_size_px
+        self.margin_px = margin_px
+        self.window: Optional[Tuple[int, int, int, int]] = None
+        self.bbox = None
+
+    def start(self, roi_bbox):
+        """
+        Starts tracking what's in the (x, y, width, height) roi_bbox, from the next frame on.
+        """
+        self.tracker.reset()
+        self.window = None
+        self.bbox = np.asarray(roi_bbox, dtype=float)
+
+    def _needs_new_window(self, image_shape) -> bool:
+        if self.window is None:
+            return True
+        left, top, right, bottom = self.window
+        if (right - left, bottom - top) == (image_shape[1], image_shape[0]):
+            return False
+        x, y, width, height = self.bbox
+        return (
+            x - left < self.margin_px
+            or y - top < self.margin_px
+            or right - (x + width) < self.margin_px
+            or bottom - (y + height) < self.margin_px
+        )
+
+    def track(self, image: np.ndarray):
+        """
+        Like Tracker_Image.track, with the centroid and rectangle points in the coordinates of image.
+        """
+        is_first_frame = self._needs_new_window(image.shape)
+        if is_first_frame:
+            self.window = search_window(image.shape, self.bbox, self.window_size_px)
+        left, top, right, bottom = self.window
+        offset = np.array([left, top])
+        if is_first_frame:
+            self.tracker.set_roi_bbox((self.bbox[0] - left, self.bbox[1] - top, self.bbox[2], self.bbox[3]))
+
+        cropped = np.ascontiguousarray(image[top:bottom, left:right])
+        object_found, centroid, rect_pts = self.tracker.track(cropped, None, is_first_frame=is_first_frame)
+        if not object_found:
+            return False, None, None
+        bbox = np.asarray(self.tracker.bbox, dtype=float)
+        self.bbox = np.array([bbox[0] + left, bbox[1] + top, bbox[2], bbox[3]])
+        return True, np.asarray(centroid) + offset, np.asarray(rect_pts) + offset
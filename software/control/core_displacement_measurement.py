@@ -12,11 +12,78 @@ from qtpy.QtGui import *
 import control.utils as utils
 from control._def import *
 
+import csv
 import time
+from typing import Optional, Tuple
+
 import numpy as np
 import cv2
 
 
+def spot_centroid(image: np.ndarray) -> Tuple[float, float]:
+    """
+    The intensity weighted (x, y) centroid of image, after subtracting its minimum and ignoring pixels below 20% of
+    what's left of its maximum.  (nan, nan) for a flat image.
+    """
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    intensity = image.astype(np.float32)
+    low, high = float(intensity.min()), float(intensity.max())
+    intensity -= low
+    intensity[intensity < 0.2 * (high - low)] = 0
+    moments = cv2.moments(intensity)
+    if moments["m00"] == 0:
+        return np.nan, np.nan
+    return moments["m10"] / moments["m00"], moments["m01"] / moments["m00"]
+
+
+class MeasurementHistory:
+    """
+    The last capacity (t, x, y) measurements, in a fixed size array that's written round and round, so adding one
+    costs the same however long the measurements have been running.
+    """
+
+    def __init__(self, capacity: int):
+        self._samples = np.zeros((max(1, capacity), 3))
+        # Where the next sample goes, and how many of the slots hold samples.
+        self._next = 0
+        self._length = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._samples)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, t: float, x: float, y: float):
+        self._samples[self._next] = (t, x, y)
+        self._next = (self._next + 1) % self.capacity
+        self._length = min(self._length + 1, self.capacity)
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        """
+        An (n, 3) array of the last n (or all the kept) (t, x, y) samples, oldest first.
+        """
+        n = self._length if n is None else max(0, min(n, self._length))
+        indices = np.arange(self._next - n, self._next) % self.capacity
+        return self._samples[indices]
+
+    def resize(self, capacity: int):
+        """
+        Changes the capacity, keeping as many of the most recent samples as fit.
+        """
+        samples = self.latest(capacity)
+        self._samples = np.zeros((max(1, capacity), 3))
+        self._samples[: len(samples)] = samples
+        self._length = len(samples)
+        self._next = self._length % self.capacity
+
+    def clear(self):
+        self._next = 0
+        self._length = 0
+
+
 class DisplacementMeasurementController(QObject):
 
     signal_readings = Signal(list)
@@ -31,36 +98,35 @@ class DisplacementMeasurementController(QObject):
         self.y_scaling = y_scaling
         self.N_average = N_average
         self.N = N  # length of array to emit
-        self.t_array = np.array([])
-        self.x_array = np.array([])
-        self.y_array = np.array([])
+        # Only what's plotted or averaged is kept in memory, everything goes to the log file if there is one.
+        self.history = MeasurementHistory(max(N, N_average))
+        self.log_flush_interval_s = 1.0
+        self._log_file = None
+        self._log_writer = None
+        self._log_last_flush_time = 0.0
 
     def update_measurement(self, image):
 
         t = time.time()
 
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-
-        h, w = image.shape
-        x, y = np.meshgrid(range(w), range(h))
-        I = image.astype(float)
-        I = I - np.amin(I)
-        I[I / np.amax(I) < 0.2] = 0
-        x = np.sum(x * I) / np.sum(I)
-        y = np.sum(y * I) / np.sum(I)
+        x, y = spot_centroid(image)
 
         x = x - self.x_offset
         y = y - self.y_offset
         x = x * self.x_scaling
         y = y * self.y_scaling
 
-        self.t_array = np.append(self.t_array, t)
-        self.x_array = np.append(self.x_array, x)
-        self.y_array = np.append(self.y_array, y)
+        self.history.append(t, x, y)
+        if self._log_writer is not None:
+            self._log_writer.writerow((t, x, y))
+            if t - self._log_last_flush_time >= self.log_flush_interval_s:
+                self._log_file.flush()
+                self._log_last_flush_time = t
 
-        self.signal_plots.emit(self.t_array[-self.N :], np.vstack((self.x_array[-self.N :], self.y_array[-self.N :])))
-        self.signal_readings.emit([np.mean(self.x_array[-self.N_average :]), np.mean(self.y_array[-self.N_average :])])
+        plotted = self.history.latest(self.N)
+        self.signal_plots.emit(plotted[:, 0], plotted[:, 1:].T)
+        averaged = plotted[-self.N_average :] if self.N_average <= self.N else self.history.latest(self.N_average)
+        self.signal_readings.emit([np.mean(averaged[:, 1]), np.mean(averaged[:, 2])])
 
     def update_settings(self, x_offset, y_offset, x_scaling, y_scaling, N_average, N):
         self.N = N
@@ -69,3 +135,23 @@ class DisplacementMeasurementController(QObject):
         self.y_offset = y_offset
         self.x_scaling = x_scaling
         self.y_scaling = y_scaling
+        if self.history.capacity != max(N, N_average):
+            self.history.resize(max(N, N_average))
+
+    def start_logging(self, path: str):
+        """
+        Appends every measurement from now on to the csv at path (time, x, y), flushed every log_flush_interval_s,
+        until stop_logging.
+        """
+        self.stop_logging()
+        self._log_file = open(path, "a", newline="")
+        self._log_writer = csv.writer(self._log_file)
+        if self._log_file.tell() == 0:
+            self._log_writer.writerow(("time", "x", "y"))
+        self._log_last_flush_time = time.time()
+
+    def stop_logging(self):
+        if self._log_file is not None:
+            self._log_file.close()
+        self._log_file = None
+        self._log_writer = None
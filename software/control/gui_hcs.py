@@ -255,6 +255,11 @@ class HighContentScreeningGui(QMainWindow):
         )
         self.imageSaver = core.ImageSaver()
         self.imageDisplay = core.ImageDisplay()
+        # The live view is painted from the display pipeline unless it's in napari (and tracking draws on the frames).
+        if USE_DISPLAY_PIPELINE and not ENABLE_TRACKING and not (USE_NAPARI_FOR_LIVE_VIEW and not self.live_only_mode):
+            self.displayPipeline = core.display.DisplayPipeline()
+        else:
+            self.displayPipeline = None
         if ENABLE_TRACKING:
             self.trackingController = core.TrackingController(
                 self.camera,
@@ -304,6 +309,8 @@ class HighContentScreeningGui(QMainWindow):
             )
             self.imageDisplayWindow_focus = core.ImageDisplayWindow(show_LUT=False, autoLevels=False)
             self.displacementMeasurementController = core_displacement_measurement.DisplacementMeasurementController()
+            if DISPLACEMENT_MEASUREMENT_LOG_PATH:
+                self.displacementMeasurementController.start_logging(DISPLACEMENT_MEASUREMENT_LOG_PATH)
             self.laserAutofocusController = core.LaserAutofocusController(
                 self.microcontroller,
                 self.camera_focus,
@@ -1007,6 +1014,7 @@ class HighContentScreeningGui(QMainWindow):
 
         self.navigationViewer.signal_coordinates_clicked.connect(self.move_from_click_mm)
         self.objectivesWidget.signal_objective_changed.connect(self.navigationViewer.redraw_fov)
+        self.objectivesWidget.signal_objective_changed.connect(self.autofocusController.clear_focus_history)
         self.cameraSettingWidget.signal_binning_changed.connect(self.navigationViewer.redraw_fov)
         if ENABLE_FLEXIBLE_MULTIPOINT:
             self.objectivesWidget.signal_objective_changed.connect(self.flexibleMultiPointWidget.update_fov_positions)
@@ -1046,8 +1054,12 @@ class HighContentScreeningGui(QMainWindow):
                 self.napariLiveWidget.signal_newAnalogGain.connect(self.cameraSettingWidget.set_analog_gain)
                 self.napariLiveWidget.signal_autoLevelSetting.connect(self.imageDisplayWindow.set_autolevel)
         else:
-            self.streamHandler.image_to_display.connect(self.imageDisplay.enqueue)
-            self.imageDisplay.image_to_display.connect(self.imageDisplayWindow.display_image)
+            if self.displayPipeline is not None:
+                self.streamHandler.set_display_pipeline(self.displayPipeline)
+                self.imageDisplayWindow.set_display_pipeline(self.displayPipeline)
+            else:
+                self.streamHandler.image_to_display.connect(self.imageDisplay.enqueue)
+                self.imageDisplay.image_to_display.connect(self.imageDisplayWindow.display_image)
             self.autofocusController.image_to_display.connect(self.imageDisplayWindow.display_image)
             self.multipointController.image_to_display.connect(self.imageDisplayWindow.display_image)
             self.liveControlWidget.signal_autoLevelSetting.connect(self.imageDisplayWindow.set_autolevel)
@@ -1187,9 +1199,10 @@ class HighContentScreeningGui(QMainWindow):
                     ]
                 )
         else:
-            # Non-Napari display connections
-            self.streamHandler.image_to_display.connect(self.imageDisplay.enqueue)
-            self.imageDisplay.image_to_display.connect(self.imageDisplayWindow.display_image)
+            # Non-Napari display connections (the display pipeline is already connected in makeConnections)
+            if self.displayPipeline is None:
+                self.streamHandler.image_to_display.connect(self.imageDisplay.enqueue)
+                self.imageDisplay.image_to_display.connect(self.imageDisplayWindow.display_image)
             self.autofocusController.image_to_display.connect(self.imageDisplayWindow.display_image)
             self.multipointController.image_to_display.connect(self.imageDisplayWindow.display_image)
             self.liveControlWidget.signal_autoLevelSetting.connect(self.imageDisplayWindow.set_autolevel)
@@ -1438,6 +1451,8 @@ class HighContentScreeningGui(QMainWindow):
         if isinstance(format_, QVariant):
             format_ = format_.value()
 
+        self.autofocusController.clear_focus_history()
+
         # TODO(imo): Not sure why glass slide is so special here?  It seems like it's just a "1 well plate".
         if format_ == "glass slide":
             self.toggleWellSelector(False)
@@ -1485,6 +1500,10 @@ class HighContentScreeningGui(QMainWindow):
         self.slidePositionController.signal_slide_loading_position_reached.connect(
             self.navigationWidget.slot_slide_loading_position_reached
         )
+        # The sample is probably about to be swapped.
+        self.slidePositionController.signal_slide_loading_position_reached.connect(
+            self.autofocusController.clear_focus_history
+        )
         if ENABLE_FLEXIBLE_MULTIPOINT:
             self.slidePositionController.signal_slide_loading_position_reached.connect(
                 self.flexibleMultiPointWidget.disable_the_start_aquisition_button
@@ -1675,6 +1694,7 @@ class HighContentScreeningGui(QMainWindow):
         if SUPPORT_LASER_AUTOFOCUS:
             self.liveController_focus_camera.stop_live()
             self.imageDisplayWindow_focus.close()
+            self.displacementMeasurementController.stop_logging()
 
         self.liveController.stop_live()
         self.camera.stop_streaming()
@@ -1691,6 +1711,8 @@ class HighContentScreeningGui(QMainWindow):
 
         self.imageSaver.close()
         self.imageDisplay.close()
+        if self.displayPipeline is not None:
+            self.displayPipeline.close()
         if not SINGLE_WINDOW:
             self.imageDisplayWindow.close()
             self.imageArrayDisplayWindow.close()
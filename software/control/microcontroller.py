@@ -1,15 +1,17 @@
 import abc
+import collections
+import dataclasses
 import enum
 import struct
 import threading
 import time
 from abc import abstractmethod
-from typing import Callable
+from concurrent.futures import Future
+from typing import Callable, List, NamedTuple
 
 import numpy as np
 import serial
 import serial.tools.list_ports
-from crc import CrcCalculator, Crc8
 from serial.serialutil import SerialException
 
 import squid.logging
@@ -60,6 +62,121 @@ class CommandAborted(RuntimeError):
         self.command_id = command_id
 
 
+def _crc8_ccitt_table() -> bytes:
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+# CRC-8/CCITT (poly 0x07, init 0, no reflection), which is what the firmware uses for both commands and packets.
+_CRC8_TABLE = _crc8_ccitt_table()
+
+
+def crc8(data) -> int:
+    """
+    The CRC-8/CCITT checksum of data (anything that iterates over byte values, eg bytes, bytearray, or a memoryview).
+    """
+    crc = 0
+    table = _CRC8_TABLE
+    for b in data:
+        crc = table[crc ^ b]
+    return crc
+
+
+class MicrocontrollerPacket(NamedTuple):
+    """
+    One decoded packet from the micro.  See SimSerial.response_bytes_for for the wire format.
+    """
+
+    command_id: int
+    execution_status: int
+    x: int
+    y: int
+    z: int
+    theta: int
+    button_and_switch_state: int
+    reserved: int
+    crc: int
+
+
+class PacketFramer:
+    """
+    Turns the chunks of bytes we read from the micro into packets.
+
+    Bytes are appended to a fixed size, reusable bytearray, and packet sized windows are checked with the crc.  A window
+    with a bad crc means we are not aligned with the packet boundaries (or the packet was corrupted), so we toss one
+    byte and look again.  Good windows are decoded in one go with struct.
+
+    If we fall behind and more than max_buffered_bytes are waiting, the oldest bytes are tossed.  This is always safe
+    since the micro sends its state periodically without prompting, so there is always a newer packet coming.
+    """
+
+    PACKET_STRUCT = struct.Struct(">BBiiiiBiB")
+
+    def __init__(self, packet_length: int = MicrocontrollerDef.MSG_LENGTH, max_buffered_bytes: int = BUFFER_SIZE_LIMIT):
+        if packet_length != PacketFramer.PACKET_STRUCT.size:
+            raise ValueError(f"Packets are {PacketFramer.PACKET_STRUCT.size} bytes, not {packet_length}.")
+        if max_buffered_bytes < packet_length:
+            raise ValueError(f"Must buffer at least one packet ({packet_length} bytes), not {max_buffered_bytes}.")
+        self._packet_length = packet_length
+        self._buffer = bytearray(max_buffered_bytes)
+        self._view = memoryview(self._buffer)
+        # The bytes we haven't consumed yet are _buffer[_start:_end]
+        self._start = 0
+        self._end = 0
+
+        # Bytes tossed while looking for a packet boundary, and bytes tossed because we fell behind.
+        self.skipped_bytes = 0
+        self.dropped_bytes = 0
+
+    def buffered_bytes(self) -> int:
+        return self._end - self._start
+
+    def feed(self, data: bytes) -> List[MicrocontrollerPacket]:
+        """
+        Adds data to the buffer, and returns all the complete packets with good checksums now in it (oldest first).
+        """
+        capacity = len(self._buffer)
+        if len(data) >= capacity:
+            self.dropped_bytes += self.buffered_bytes() + len(data) - capacity
+            data = data[len(data) - capacity :]
+            self._start = self._end = 0
+        elif self._end + len(data) > capacity:
+            overflow = self.buffered_bytes() + len(data) - capacity
+            if overflow > 0:
+                self.dropped_bytes += overflow
+                self._start += overflow
+            pending = self.buffered_bytes()
+            self._buffer[:pending] = bytes(self._view[self._start : self._end])
+            self._start = 0
+            self._end = pending
+        self._buffer[self._end : self._end + len(data)] = data
+        self._end += len(data)
+
+        packets = []
+        length = self._packet_length
+        while self._end - self._start >= length:
+            start = self._start
+            checksum = self._buffer[start + length - 1]
+            # NOTE(imo): Before April 2025, we didn't send the crc from the micro.  This is here to support firmware
+            # that still sends 0 as the checksum.  This means for the firmware that does support checksums, we can get
+            # fooled by zeros!
+            if checksum == 0 or checksum == crc8(self._view[start : start + length - 1]):
+                packets.append(MicrocontrollerPacket._make(PacketFramer.PACKET_STRUCT.unpack_from(self._buffer, start)))
+                self._start += length
+            else:
+                self.skipped_bytes += 1
+                self._start += 1
+
+        if self._start == self._end:
+            self._start = self._end = 0
+        return packets
+
+
 # NOTE(imo): We'll want to pull this out into a common serial impl shared with serial_peripheral.py at some point, but
 # for now ust auto reconnect down at this level.
 class AbstractCephlaMicroSerial(abc.ABC):
@@ -104,6 +221,22 @@ class AbstractCephlaMicroSerial(abc.ABC):
         """
         pass
 
+    def read_available(self, timeout_s: float) -> bytes:
+        """
+        Wait up to timeout_s for data, and return everything that is available to read in one go (or empty bytes if
+        nothing arrived in time, or if the device is not open).
+
+        This default polls bytes_available(), subclasses should override it with something that blocks on the device.
+        """
+        deadline = time.time() + timeout_s
+        while True:
+            available = self.bytes_available()
+            if available:
+                return self.read(available)
+            if time.time() >= deadline or not self.is_open():
+                return bytes()
+            time.sleep(0.001)
+
     @abstractmethod
     def bytes_available(self) -> int:
         """
@@ -142,14 +275,12 @@ class SimSerial(AbstractCephlaMicroSerial):
         - reserved (4 bytes)
         - CRC (1 byte)
         """
-        crc_calculator = CrcCalculator(Crc8.CCITT, table_based=True)
-
         button_state = joystick_button << BIT_POS_JOYSTICK_BUTTON | switch << BIT_POS_SWITCH
         reserved_state = 0  # This is just filler for the 4 reserved bytes.
         response = bytearray(
             struct.pack(">BBiiiiBi", command_id, execution_status, x, y, z, theta, button_state, reserved_state)
         )
-        response.append(crc_calculator.calculate_checksum(response))
+        response.append(crc8(response))
         return bytes(response)
 
     def __init__(self):
@@ -157,8 +288,10 @@ class SimSerial(AbstractCephlaMicroSerial):
         # All the public methods must hold this to modify internal state.  Any _ prefixed members are
         # assumed to be called from a context that already holds the lock
         self._update_lock = threading.Lock()
+        # Notified whenever we add to the response_buffer, so readers can block instead of polling.
+        self._response_available = threading.Condition(self._update_lock)
         self._in_waiting = 0
-        self.response_buffer = []
+        self.response_buffer = bytearray()
 
         self.x = 0
         self.y = 0
@@ -167,6 +300,14 @@ class SimSerial(AbstractCephlaMicroSerial):
         self.joystick_button = False
         self.switch = False
 
+        # If True, commands are reported as in progress until complete_held_commands() is called, like a micro that
+        # is busy moving.  The micro reports one command id at a time (the last one it received), and only reports it
+        # complete once everything before it is complete too, so that is what we do.
+        self.hold_completions = False
+        self._last_command_id = None
+        # The (command id, command) of the most recent commands we received, oldest first.
+        self.received_commands = collections.deque(maxlen=1024)
+
         self._closed = False
 
     @staticmethod
@@ -212,10 +353,17 @@ class SimSerial(AbstractCephlaMicroSerial):
                 self.x = 0
                 self.y = 0
 
+        self._last_command_id = write_bytes[0]
+        self.received_commands.append((write_bytes[0], command_byte))
+        self._respond_with_status(
+            CMD_EXECUTION_STATUS.IN_PROGRESS if self.hold_completions else CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS
+        )
+
+    def _respond_with_status(self, execution_status):
         self.response_buffer.extend(
             SimSerial.response_bytes_for(
-                write_bytes[0],
-                CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS,
+                self._last_command_id,
+                execution_status,
                 self.x,
                 self.y,
                 self.z,
@@ -226,6 +374,16 @@ class SimSerial(AbstractCephlaMicroSerial):
         )
 
         self._update_internal_state()
+        self._response_available.notify_all()
+
+    def complete_held_commands(self):
+        """
+        When hold_completions is set, report the last command we received (and so all the commands before it) as
+        complete.
+        """
+        with self._update_lock:
+            if self._last_command_id is not None:
+                self._respond_with_status(CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS)
 
     def _update_internal_state(self, clear_buffer: bool = False):
         if clear_buffer:
@@ -259,15 +417,22 @@ class SimSerial(AbstractCephlaMicroSerial):
                 raise IOError("Closed")
 
         with self._update_lock:
-            response = bytearray()
-            for i in range(count):
-                if not len(self.response_buffer):
-                    break
-                response.append(self.response_buffer.pop(0))
+            response = bytes(self.response_buffer[:count])
+            del self.response_buffer[:count]
 
             self._update_internal_state()
             return response
 
+    def read_available(self, timeout_s: float) -> bytes:
+        with self._update_lock:
+            if not self._closed and not self.response_buffer:
+                self._response_available.wait(timeout_s)
+            if self._closed:
+                return bytes()
+            response = bytes(self.response_buffer)
+            self._update_internal_state(clear_buffer=True)
+            return response
+
     def bytes_available(self) -> int:
         with self._update_lock:
             self._update_internal_state()
@@ -312,11 +477,15 @@ class MicrocontrollerSerial(AbstractCephlaMicroSerial):
         else:
             return initial_interval * 2**attempt_index
 
+    # How long a read blocks waiting for data, unless read_available asks for something else.  We want reads to
+    # block (rather than spin checking in_waiting), but not forever so the read loop can notice it should stop.
+    DEFAULT_READ_TIMEOUT = 0.1
+
     def __init__(self, port: str, baudrate: int):
         super().__init__()
         self._port = port
         self._baudrate = baudrate
-        self._serial = serial.Serial(port, baudrate)
+        self._serial = serial.Serial(port, baudrate, timeout=MicrocontrollerSerial.DEFAULT_READ_TIMEOUT)
 
     def close(self) -> None:
         return self._serial.close()
@@ -355,6 +524,23 @@ class MicrocontrollerSerial(AbstractCephlaMicroSerial):
             else:
                 raise
 
+    def read_available(self, timeout_s: float) -> bytes:
+        try:
+            if self._serial.timeout != timeout_s:
+                self._serial.timeout = timeout_s
+            # If nothing is waiting, this blocks in the os until a byte arrives (or the timeout passes).  Then we grab
+            # whatever else came in with it.
+            data = self._serial.read(max(1, self._serial.in_waiting))
+            if data:
+                waiting = self._serial.in_waiting
+                if waiting:
+                    data += self._serial.read(waiting)
+            return data
+        except (IOError, OSError, SerialException) as e:
+            # The read loop checks is_open() and reconnects when it doesn't get any data, so just report nothing here.
+            self._log.debug(f"read_available failed: {e}")
+            return bytes()
+
     def bytes_available(self) -> int:
         if not self.is_open():
             return 0
@@ -388,7 +574,9 @@ class MicrocontrollerSerial(AbstractCephlaMicroSerial):
                         self._serial.close()
                     except OSError:
                         pass
-                    self._serial = serial.Serial(port=self._port, baudrate=self._baudrate)
+                    self._serial = serial.Serial(
+                        port=self._port, baudrate=self._baudrate, timeout=MicrocontrollerSerial.DEFAULT_READ_TIMEOUT
+                    )
                 except (IOError, OSError, SerialException) as se:
                     if i + 1 == attempts:
                         self._log.error(
@@ -439,6 +627,14 @@ def get_microcontroller_serial_device(
         return MicrocontrollerSerial(controller_ports[0], baudrate)
 
 
+@dataclasses.dataclass
+class _QueuedCommand:
+    command: bytearray
+    future: Future
+    # If True, this is only sent once every command before it has completed.
+    after_previous: bool = False
+
+
 class Microcontroller:
     LAST_COMMAND_ACK_TIMEOUT = 0.5
     MAX_RETRY_COUNT = 5
@@ -446,6 +642,11 @@ class Microcontroller:
     # The micro has an update time it tries to keep to.  This must be > that time.  As of 2025-04-28, it's 10ms
     # on the micro.  So 0.1 is 10x that.
     STALE_READ_TIMEOUT = 0.1
+    # How long the read loop blocks waiting for data before checking on the serial device (and whether it should stop).
+    READ_TIMEOUT = 0.1
+    # The most commands we'll have sent to the micro without it reporting them complete.  This must be well under 256
+    # so that command ids of in flight commands are unique.
+    MAX_IN_FLIGHT_COMMANDS = 16
 
     def __init__(self, serial_device: AbstractCephlaMicroSerial, reset_and_initialize=True):
         self.log = squid.logging.get_logger(self.__class__.__name__)
@@ -492,9 +693,15 @@ class Microcontroller:
         self.last_command_send_timestamp = time.time()
         self.last_command_aborted_error = None
 
-        self.crc_calculator = CrcCalculator(Crc8.CCITT, table_based=True)
         self.retry = 0
 
+        # Commands we've sent but the micro hasn't reported complete (by command id, oldest first), and commands
+        # waiting to be sent (either because too many are in flight, or they need to wait for the commands before
+        # them).  Both the callers and the read thread send commands, so these are guarded by _command_lock.
+        self._command_lock = threading.RLock()
+        self._in_flight_commands: "collections.OrderedDict[int, _QueuedCommand]" = collections.OrderedDict()
+        self._queued_commands: "collections.deque[_QueuedCommand]" = collections.deque()
+
         self.new_packet_callback_external = None
         self.terminate_reading_received_packet_thread = False
         self._received_packet_cv = threading.Condition()
@@ -555,11 +762,21 @@ class Microcontroller:
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.RESET
         self.log.debug("reset the microcontroller")
-        self.send_command(cmd)
-        # On the microcontroller side, reset forces the command Id back to 0
-        # so any responses will look like they are for command id 0.  Force that
-        # here.
-        self._cmd_id = 0
+        with self._command_lock:
+            future = self.send_command(cmd)
+            # On the microcontroller side, reset forces the command Id back to 0
+            # so any responses will look like they are for command id 0.  Force that
+            # here.
+            self._cmd_id = 0
+            if any(in_flight.future is future for in_flight in self._in_flight_commands.values()):
+                for in_flight in self._in_flight_commands.values():
+                    # The reset wipes out whatever the micro was doing, so the micro will never report these complete.
+                    if in_flight.future is not future:
+                        in_flight.future.set_result(None)
+                self._in_flight_commands = collections.OrderedDict(
+                    [(0, in_flight) for in_flight in self._in_flight_commands.values() if in_flight.future is future]
+                )
+        return future
 
     def initialize_drivers(self):
         self._cmd_id = 0
@@ -578,12 +795,12 @@ class Microcontroller:
     def turn_on_illumination(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.TURN_ON_ILLUMINATION
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def turn_off_illumination(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.TURN_OFF_ILLUMINATION
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_illumination(self, illumination_source, intensity):
         cmd = bytearray(self.tx_buffer_length)
@@ -591,7 +808,7 @@ class Microcontroller:
         cmd[2] = illumination_source
         cmd[3] = int((intensity / 100) * 65535) >> 8
         cmd[4] = int((intensity / 100) * 65535) & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_illumination_led_matrix(self, illumination_source, r, g, b):
         cmd = bytearray(self.tx_buffer_length)
@@ -600,9 +817,9 @@ class Microcontroller:
         cmd[3] = min(int(g * 255), 255)
         cmd[4] = min(int(r * 255), 255)
         cmd[5] = min(int(b * 255), 255)
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
-    def send_hardware_trigger(self, control_illumination=False, illumination_on_time_us=0, trigger_output_ch=0):
+    def _hardware_trigger_command(self, control_illumination, illumination_on_time_us, trigger_output_ch):
         illumination_on_time_us = int(illumination_on_time_us)
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.SEND_HARDWARE_TRIGGER
@@ -611,7 +828,12 @@ class Microcontroller:
         cmd[4] = (illumination_on_time_us >> 16) & 0xFF
         cmd[5] = (illumination_on_time_us >> 8) & 0xFF
         cmd[6] = illumination_on_time_us & 0xFF
-        self.send_command(cmd)
+        return cmd
+
+    def send_hardware_trigger(self, control_illumination=False, illumination_on_time_us=0, trigger_output_ch=0):
+        return self.send_command(
+            self._hardware_trigger_command(control_illumination, illumination_on_time_us, trigger_output_ch)
+        )
 
     def set_strobe_delay_us(self, strobe_delay_us, camera_channel=0):
         cmd = bytearray(self.tx_buffer_length)
@@ -621,14 +843,14 @@ class Microcontroller:
         cmd[4] = (strobe_delay_us >> 16) & 0xFF
         cmd[5] = (strobe_delay_us >> 8) & 0xFF
         cmd[6] = strobe_delay_us & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_axis_enable_disable(self, axis, status):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.SET_AXIS_DISABLE_ENABLE
         cmd[2] = axis
         cmd[3] = status
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def _move_axis_usteps(self, usteps, axis_command_code):
         direction = np.sign(usteps)
@@ -656,10 +878,10 @@ class Microcontroller:
         cmd[3] = (payload >> 16) & 0xFF
         cmd[4] = (payload >> 8) & 0xFF
         cmd[5] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def move_x_usteps(self, usteps):
-        self._move_axis_usteps(usteps, CMD_SET.MOVE_X)
+        return self._move_axis_usteps(usteps, CMD_SET.MOVE_X)
 
     def move_x_to_usteps(self, usteps):
         payload = self._int_to_payload(usteps, 4)
@@ -669,10 +891,10 @@ class Microcontroller:
         cmd[3] = (payload >> 16) & 0xFF
         cmd[4] = (payload >> 8) & 0xFF
         cmd[5] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def move_y_usteps(self, usteps):
-        self._move_axis_usteps(usteps, CMD_SET.MOVE_Y)
+        return self._move_axis_usteps(usteps, CMD_SET.MOVE_Y)
 
     def move_y_to_usteps(self, usteps):
         payload = self._int_to_payload(usteps, 4)
@@ -682,10 +904,10 @@ class Microcontroller:
         cmd[3] = (payload >> 16) & 0xFF
         cmd[4] = (payload >> 8) & 0xFF
         cmd[5] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def move_z_usteps(self, usteps):
-        self._move_axis_usteps(usteps, CMD_SET.MOVE_Z)
+        return self._move_axis_usteps(usteps, CMD_SET.MOVE_Z)
 
     def move_z_to_usteps(self, usteps):
         payload = self._int_to_payload(usteps, 4)
@@ -695,13 +917,13 @@ class Microcontroller:
         cmd[3] = (payload >> 16) & 0xFF
         cmd[4] = (payload >> 8) & 0xFF
         cmd[5] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def move_theta_usteps(self, usteps):
-        self._move_axis_usteps(usteps, CMD_SET.MOVE_THETA)
+        return self._move_axis_usteps(usteps, CMD_SET.MOVE_THETA)
 
     def move_w_usteps(self, usteps):
-        self._move_axis_usteps(usteps, CMD_SET.MOVE_W)
+        return self._move_axis_usteps(usteps, CMD_SET.MOVE_W)
 
     def set_off_set_velocity_x(self, off_set_velocity):
         # off_set_velocity is in mm/s
@@ -714,7 +936,7 @@ class Microcontroller:
         cmd[4] = (payload >> 16) & 0xFF
         cmd[5] = (payload >> 8) & 0xFF
         cmd[6] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_off_set_velocity_y(self, off_set_velocity):
         cmd = bytearray(self.tx_buffer_length)
@@ -726,35 +948,35 @@ class Microcontroller:
         cmd[4] = (payload >> 16) & 0xFF
         cmd[5] = (payload >> 8) & 0xFF
         cmd[6] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def home_x(self, homing_direction: HomingDirection = _default_x_homing_direction):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.X
         cmd[3] = homing_direction.value
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def home_y(self, homing_direction: HomingDirection = _default_y_homing_direction):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.Y
         cmd[3] = homing_direction.value
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def home_z(self, homing_direction: HomingDirection = _default_z_homing_direction):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.Z
         cmd[3] = homing_direction.value
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def home_theta(self, homing_direction: HomingDirection = _default_theta_homing_direction):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = 3
         cmd[3] = homing_direction.value
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def home_xy(
         self,
@@ -766,49 +988,49 @@ class Microcontroller:
         cmd[2] = AXIS.XY
         cmd[3] = homing_direction_x.value
         cmd[4] = homing_direction_y.value
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def home_w(self, homing_direction: HomingDirection = _default_w_homing_direction):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.W
         cmd[3] = homing_direction.value
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def zero_x(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.X
         cmd[3] = HOME_OR_ZERO.ZERO
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def zero_y(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.Y
         cmd[3] = HOME_OR_ZERO.ZERO
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def zero_z(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.Z
         cmd[3] = HOME_OR_ZERO.ZERO
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def zero_w(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.W
         cmd[3] = HOME_OR_ZERO.ZERO
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def zero_theta(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.HOME_OR_ZERO
         cmd[2] = AXIS.THETA
         cmd[3] = HOME_OR_ZERO.ZERO
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def configure_stage_pid(self, axis, transitions_per_revolution, flip_direction=False):
         cmd = bytearray(self.tx_buffer_length)
@@ -818,19 +1040,19 @@ class Microcontroller:
         payload = self._int_to_payload(transitions_per_revolution, 2)
         cmd[4] = (payload >> 8) & 0xFF
         cmd[5] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def turn_on_stage_pid(self, axis):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.ENABLE_STAGE_PID
         cmd[2] = axis
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def turn_off_stage_pid(self, axis):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.DISABLE_STAGE_PID
         cmd[2] = axis
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def turn_off_all_pid(self):
         for primary_axis_id in [AXIS.X, AXIS.Y, AXIS.Z]:
@@ -847,7 +1069,7 @@ class Microcontroller:
 
         cmd[5] = int(pid_i)
         cmd[6] = int(pid_d)
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_lim(self, limit_code, usteps):
         self.log.info(f"Set lim: {limit_code=}, {usteps=}")
@@ -859,14 +1081,14 @@ class Microcontroller:
         cmd[4] = (payload >> 16) & 0xFF
         cmd[5] = (payload >> 8) & 0xFF
         cmd[6] = payload & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_limit_switch_polarity(self, axis, polarity):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.SET_LIM_SWITCH_POLARITY
         cmd[2] = axis
         cmd[3] = polarity
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_home_safety_margin(self, axis, margin):
         margin = abs(margin)
@@ -877,7 +1099,7 @@ class Microcontroller:
         cmd[2] = axis
         cmd[3] = (margin >> 8) & 0xFF
         cmd[4] = (margin) & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def configure_motor_driver(self, axis, microstepping, current_rms, I_hold):
         # current_rms in mA
@@ -894,7 +1116,7 @@ class Microcontroller:
         cmd[4] = current_rms >> 8
         cmd[5] = current_rms & 0xFF
         cmd[6] = int(I_hold * 255)
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_max_velocity_acceleration(self, axis, velocity, acceleration):
         # velocity: max 65535/100 mm/s
@@ -906,7 +1128,7 @@ class Microcontroller:
         cmd[4] = int(velocity * 100) & 0xFF
         cmd[5] = int(acceleration * 10) >> 8
         cmd[6] = int(acceleration * 10) & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_leadscrew_pitch(self, axis, pitch_mm):
         # pitch: max 65535/1000 = 65.535 (mm)
@@ -915,7 +1137,7 @@ class Microcontroller:
         cmd[2] = axis
         cmd[3] = int(pitch_mm * 1000) >> 8
         cmd[4] = int(pitch_mm * 1000) & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def configure_actuators(self):
         # lead screw pitch
@@ -965,7 +1187,7 @@ class Microcontroller:
     def ack_joystick_button_pressed(self):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.ACK_JOYSTICK_BUTTON_PRESSED
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def analog_write_onboard_DAC(self, dac, value):
         cmd = bytearray(self.tx_buffer_length)
@@ -973,7 +1195,7 @@ class Microcontroller:
         cmd[2] = dac
         cmd[3] = (value >> 8) & 0xFF
         cmd[4] = value & 0xFF
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_piezo_um(self, z_piezo_um):
         dac = int(65535 * (z_piezo_um / OBJECTIVE_PIEZO_RANGE_UM))
@@ -985,14 +1207,14 @@ class Microcontroller:
         cmd[1] = CMD_SET.SET_DAC80508_REFDIV_GAIN
         cmd[2] = div
         cmd[3] = gains
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def set_pin_level(self, pin, level):
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.SET_PIN_LEVEL
         cmd[2] = pin
         cmd[3] = level
-        self.send_command(cmd)
+        return self.send_command(cmd)
 
     def turn_on_AF_laser(self):
         self.set_pin_level(MCU_PINS.AF_LASER, 1)
@@ -1000,28 +1222,92 @@ class Microcontroller:
     def turn_off_AF_laser(self):
         self.set_pin_level(MCU_PINS.AF_LASER, 0)
 
-    def send_command(self, command):
-        self._cmd_id = (self._cmd_id + 1) % 256
-        command[0] = self._cmd_id
-        command[-1] = self.crc_calculator.calculate_checksum(command[:-1])
-        self._serial.write(command, reconnect_tries=Microcontroller.MAX_RECONNECT_COUNT)
-        self.mcu_cmd_execution_in_progress = True
-        self.last_command = command
-        self.last_command_send_timestamp = time.time()
-        self.retry = 0
+    def send_command(self, command, after_previous: bool = False) -> Future:
+        """
+        Queue the command to be sent to the micro, and return a Future that completes when the micro reports it (and
+        every command sent before it) complete, or fails with CommandAborted.
 
-        if self.last_command_aborted_error is not None:
-            self.log.warning(
-                "Last command aborted and not cleared before new command sent!", self.last_command_aborted_error
-            )
-        self.last_command_aborted_error = None
+        Commands are sent right away, so independent commands can be in flight at the same time, unless
+        MAX_IN_FLIGHT_COMMANDS are already in flight or after_previous is True.  Commands with after_previous are
+        held here until every command before them is complete, and are then sent from the read thread as soon as the
+        completion arrives.
+
+        NOTE: The micro only reports the last command id it received, and reports it complete once everything it was
+        doing is complete.  So a command is only ever known to be complete along with all the commands before it.
+        """
+        future = Future()
+        # Our futures can't be cancelled, we can't take commands back from the micro.
+        future.set_running_or_notify_cancel()
+        with self._command_lock:
+            if self.last_command_aborted_error is not None:
+                self.log.warning(
+                    f"Last command aborted and not cleared before new command sent! {self.last_command_aborted_error}"
+                )
+            self.last_command_aborted_error = None
+
+            self._queued_commands.append(_QueuedCommand(command=command, future=future, after_previous=after_previous))
+            self.mcu_cmd_execution_in_progress = True
+            self._send_queued_commands()
 
         self._warn_if_reads_stale()
+        return future
+
+    def _send_queued_commands(self):
+        # Must hold self._command_lock
+        while self._queued_commands:
+            queued = self._queued_commands[0]
+            if len(self._in_flight_commands) >= Microcontroller.MAX_IN_FLIGHT_COMMANDS or (
+                queued.after_previous and self._in_flight_commands
+            ):
+                return
+            self._queued_commands.popleft()
+
+            self._cmd_id = (self._cmd_id + 1) % 256
+            command = queued.command
+            command[0] = self._cmd_id
+            command[-1] = crc8(command[:-1])
+            self._in_flight_commands[self._cmd_id] = queued
+            self.last_command = command
+            self.last_command_send_timestamp = time.time()
+            self.retry = 0
+            try:
+                self._serial.write(command, reconnect_tries=Microcontroller.MAX_RECONNECT_COUNT)
+            except Exception as e:
+                del self._in_flight_commands[self._cmd_id]
+                queued.future.set_exception(e)
+                self._update_command_execution_in_progress()
+                raise
+
+    def _update_command_execution_in_progress(self):
+        # Must hold self._command_lock
+        self.mcu_cmd_execution_in_progress = bool(self._in_flight_commands or self._queued_commands)
+
+    def _complete_commands_through(self, cmd_id):
+        # Must hold self._command_lock, and cmd_id must be in flight.
+        completed_futures = []
+        while self._in_flight_commands:
+            sent_id, completed = self._in_flight_commands.popitem(last=False)
+            completed_futures.append(completed.future)
+            if sent_id == cmd_id:
+                break
+        if not self._in_flight_commands and self.mcu_cmd_execution_in_progress:
+            self.log.debug("mcu command " + str(cmd_id) + " complete")
+        self._send_queued_commands()
+        self._update_command_execution_in_progress()
+        # Only once is_busy() is up to date, so whoever waits on these sees it.
+        for future in completed_futures:
+            future.set_result(None)
 
     def abort_current_command(self, reason):
         self.log.error(f"Command id={self._cmd_id} aborted for reason='{reason}'")
-        self.last_command_aborted_error = CommandAborted(reason=reason, command_id=self._cmd_id)
-        self.mcu_cmd_execution_in_progress = False
+        with self._command_lock:
+            self.last_command_aborted_error = CommandAborted(reason=reason, command_id=self._cmd_id)
+            pending = list(self._in_flight_commands.values()) + list(self._queued_commands)
+            self._in_flight_commands.clear()
+            self._queued_commands.clear()
+            self.mcu_cmd_execution_in_progress = False
+            for aborted in pending:
+                aborted.future.set_exception(self.last_command_aborted_error)
 
     def acknowledge_aborted_command(self):
         if self.last_command_aborted_error is None:
@@ -1041,140 +1327,80 @@ class Microcontroller:
             self.log.warning("resend requested with no last_command, something is wrong!")
             self.abort_current_command("Resend last requested with no last command")
 
+    def _resend_in_flight_commands(self, from_id, including_from_id):
+        """
+        Resend the in flight commands after (or starting at, if including_from_id) from_id, in the order we sent them.
+        If from_id isn't in flight, resend all of them.  Must hold self._command_lock.
+        """
+        ids = list(self._in_flight_commands.keys())
+        if from_id in self._in_flight_commands:
+            ids = ids[ids.index(from_id) + (0 if including_from_id else 1) :]
+        for cmd_id in ids:
+            self._serial.write(
+                self._in_flight_commands[cmd_id].command, reconnect_tries=Microcontroller.MAX_RECONNECT_COUNT
+            )
+        # We use the retry count for both checksum errors, and to keep track of
+        # timeout re-attempts.
+        self.last_command_send_timestamp = time.time()
+        self.retry = self.retry + 1
+
+    def move_xy_to_usteps_then_trigger(
+        self, x_usteps, y_usteps, control_illumination=False, illumination_on_time_us=0, trigger_output_ch=0
+    ) -> Future:
+        """
+        Move x and y (at the same time), and send a hardware trigger as soon as both moves are complete.  The trigger
+        is sent from the read thread when the micro reports the moves complete, so there's no round trip through the
+        caller in between.  Note that this means there's no settling time between the move and the trigger.
+
+        Returns the Future for the trigger, which completes after the moves and the trigger.
+        """
+        with self._command_lock:
+            self.move_x_to_usteps(x_usteps)
+            self.move_y_to_usteps(y_usteps)
+            return self.send_command(
+                self._hardware_trigger_command(control_illumination, illumination_on_time_us, trigger_output_ch),
+                after_previous=True,
+            )
+
     def read_received_packet(self):
-        crc_calculator = CrcCalculator(Crc8.CCITT, table_based=True)
+        framer = PacketFramer(self.rx_buffer_length, BUFFER_SIZE_LIMIT)
         last_watchdog_fail_report = time.time()
         watchdog_fail_report_period = 5.0
 
         while not self.terminate_reading_received_packet_thread:
             try:
-                # If anything hangs, we may fall way behind reading the serial buffer.  In that case, toss everything
-                # in the read buffer and start over.  This should always be safe to do because the micro sends updates
-                # periodically without prompting, and so we'll always get more updates on the current micro state.
-                if self._serial.bytes_available() >= BUFFER_SIZE_LIMIT:
-                    self._serial.reset_input_buffer()
-                    continue
-
-                # If we don't at least have enough bytes for a full packet (rx_buffer_length), there's no reason to
-                # waste our time looking for a valid message.  So wait here until we have at least that many bytes.
-                if self._serial.bytes_available() < self.rx_buffer_length:
+                # This blocks until the micro sends us something (it should send its state every ~10 ms), and then
+                # gives us everything that's waiting in one go.
+                data = self._serial.read_available(timeout_s=Microcontroller.READ_TIMEOUT)
+                if not data:
                     if time.time() - last_watchdog_fail_report > watchdog_fail_report_period:
                         last_watchdog_fail_report = time.time()
                         self._warn_if_reads_stale()
-                    # Sleep a negligible amount of time just to give other threads time to run.  Otherwise,
-                    # we run the rise of spinning forever here and not letting progress happen elsewhere.
-                    time.sleep(0.0001)
                     if not self._serial.is_open():
                         if not self._serial.reconnect(attempts=Microcontroller.MAX_RECONNECT_COUNT):
                             self.log.error(
                                 "In read loop, serial device failed to reconnect.  Microcontroller is defunct!"
                             )
+                            # Don't spin on a device that is gone.
+                            time.sleep(Microcontroller.READ_TIMEOUT)
                     continue
 
-                # This helper reads bytes in the order received by serial, and checks that packet-sized chunks
-                # have valid checksums.  IF the first packet size chunk does not have a valid checksum, it tosses
-                # the first byte and keeps going until it either finds a valid checksum packet or runs out of bytes.
-                def get_msg_with_good_checksum():
-                    maybe_msg = []
-                    while self._serial.bytes_available() > 0:
-                        maybe_msg.append(ord(self._serial.read()))
-                        if len(maybe_msg) < self.rx_buffer_length:
-                            continue
-
-                        checksum = crc_calculator.calculate_checksum(maybe_msg[:-1])
-                        # NOTE(imo): Before April 2025, we didn't send the crc from the micro.  This is
-                        # here to support firmware that still sends 0 as the checksum.  This means for
-                        # the firmware that does support checksums, we can get fooled by zeros!
-                        if checksum == maybe_msg[-1] or maybe_msg[-1] == 0:
-                            return maybe_msg
-                        else:
-                            self.log.warning(f"Bad checksum {checksum} for packet '{maybe_msg}, tossing first byte'")
-                            maybe_msg.pop(0)
-                    return None
-
-                msg = get_msg_with_good_checksum()
-
-                if msg is None:
-                    self.log.warning("Back checksums found, skipping.")
+                skipped_bytes = framer.skipped_bytes
+                dropped_bytes = framer.dropped_bytes
+                packets = framer.feed(data)
+                if framer.skipped_bytes != skipped_bytes:
+                    self.log.warning(
+                        f"Bad checksums found, tossed {framer.skipped_bytes - skipped_bytes} bytes to find a packet."
+                    )
+                if framer.dropped_bytes != dropped_bytes:
+                    # If anything hangs, we may fall way behind reading the serial buffer.  The framer tosses the
+                    # oldest bytes in that case, which is safe because the micro sends updates periodically.
+                    self.log.warning(f"Read loop fell behind, tossed {framer.dropped_bytes - dropped_bytes} bytes.")
+                if not packets:
                     continue
 
-                # parse the message
-                """
-                - command ID (1 byte)
-                - execution status (1 byte)
-                - X pos (4 bytes)
-                - Y pos (4 bytes)
-                - Z pos (4 bytes)
-                - Theta (4 bytes)
-                - buttons and switches (1 byte)
-                - reserved (4 bytes)
-                - CRC (1 byte)
-                """
-                self._last_successful_read_time = time.time()
-                self._cmd_id_mcu = msg[0]
-                self._cmd_execution_status = msg[1]
-                if (self._cmd_id_mcu == self._cmd_id) and (
-                    self._cmd_execution_status == CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS
-                ):
-                    if self.mcu_cmd_execution_in_progress:
-                        self.mcu_cmd_execution_in_progress = False
-                        self.log.debug("mcu command " + str(self._cmd_id) + " complete")
-                elif (
-                    self.mcu_cmd_execution_in_progress
-                    and self._cmd_id_mcu != self._cmd_id
-                    and time.time() - self.last_command_send_timestamp > self.LAST_COMMAND_ACK_TIMEOUT
-                    and self.last_command is not None
-                ):
-                    if self.retry > self.MAX_RETRY_COUNT:
-                        self.abort_current_command(
-                            reason=f"Command timed out without an ack after {self.LAST_COMMAND_ACK_TIMEOUT} [s], and {self.retry} retries"
-                        )
-                    else:
-                        self.log.debug(
-                            f"command timed out without an ack after {self.LAST_COMMAND_ACK_TIMEOUT} [s], resending command"
-                        )
-                        self.resend_last_command()
-                elif (
-                    self.mcu_cmd_execution_in_progress
-                    and self._cmd_execution_status == CMD_EXECUTION_STATUS.CMD_CHECKSUM_ERROR
-                ):
-                    if self.retry > self.MAX_RETRY_COUNT:
-                        self.abort_current_command(reason=f"Checksum error and 10 retries for {self._cmd_id}")
-                    else:
-                        self.log.error("cmd checksum error, resending command")
-                        self.resend_last_command()
-
-                self.x_pos = self._payload_to_int(
-                    msg[2:6], MicrocontrollerDef.N_BYTES_POS
-                )  # unit: microstep or encoder resolution
-                self.y_pos = self._payload_to_int(
-                    msg[6:10], MicrocontrollerDef.N_BYTES_POS
-                )  # unit: microstep or encoder resolution
-                self.z_pos = self._payload_to_int(
-                    msg[10:14], MicrocontrollerDef.N_BYTES_POS
-                )  # unit: microstep or encoder resolution
-                self.theta_pos = self._payload_to_int(
-                    msg[14:18], MicrocontrollerDef.N_BYTES_POS
-                )  # unit: microstep or encoder resolution
-
-                self.button_and_switch_state = msg[18]
-                # joystick button
-                tmp = self.button_and_switch_state & (1 << BIT_POS_JOYSTICK_BUTTON)
-                joystick_button_pressed = tmp > 0
-                if self.joystick_button_pressed != joystick_button_pressed:
-                    if self.joystick_listener_events_enabled:
-                        for _, listener_fn in self.joystick_event_listeners:
-                            listener_fn(joystick_button_pressed)
-
-                    # The microcontroller wants us to send an ack back only when we see a False -> True
-                    # transition. handle that here.
-                    if joystick_button_pressed:
-                        self.ack_joystick_button_pressed()
-                self.joystick_button_pressed = joystick_button_pressed
-
-                # switch
-                tmp = self.button_and_switch_state & (1 << BIT_POS_SWITCH)
-                self.switch_state = tmp > 0
+                for packet in packets:
+                    self._handle_packet(packet)
 
                 with self._received_packet_cv:
                     self._received_packet_cv.notify_all()
@@ -1184,6 +1410,63 @@ class Microcontroller:
             except Exception as e:
                 self.log.error("Read loop failed, continuing to loop to see if anything can recover.", exc_info=e)
 
+    def _handle_packet(self, packet: MicrocontrollerPacket):
+        self._last_successful_read_time = time.time()
+        self._cmd_id_mcu = packet.command_id
+        self._cmd_execution_status = packet.execution_status
+        with self._command_lock:
+            if not self._in_flight_commands:
+                pass
+            elif (self._cmd_id_mcu in self._in_flight_commands) and (
+                self._cmd_execution_status == CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS
+            ):
+                self._complete_commands_through(self._cmd_id_mcu)
+            elif (
+                self._cmd_id_mcu != self._cmd_id
+                and time.time() - self.last_command_send_timestamp > self.LAST_COMMAND_ACK_TIMEOUT
+            ):
+                if self.retry > self.MAX_RETRY_COUNT:
+                    self.abort_current_command(
+                        reason=f"Command timed out without an ack after {self.LAST_COMMAND_ACK_TIMEOUT} [s], and {self.retry} retries"
+                    )
+                else:
+                    self.log.debug(
+                        f"command timed out without an ack after {self.LAST_COMMAND_ACK_TIMEOUT} [s], resending command"
+                    )
+                    # The micro reports the last command it got, so it never got the ones after that.
+                    self._resend_in_flight_commands(self._cmd_id_mcu, including_from_id=False)
+            elif self._cmd_execution_status == CMD_EXECUTION_STATUS.CMD_CHECKSUM_ERROR:
+                if self.retry > self.MAX_RETRY_COUNT:
+                    self.abort_current_command(reason=f"Checksum error and 10 retries for {self._cmd_id}")
+                else:
+                    self.log.error("cmd checksum error, resending command")
+                    self._resend_in_flight_commands(self._cmd_id_mcu, including_from_id=True)
+
+        # unit: microstep or encoder resolution
+        self.x_pos = packet.x
+        self.y_pos = packet.y
+        self.z_pos = packet.z
+        self.theta_pos = packet.theta
+
+        self.button_and_switch_state = packet.button_and_switch_state
+        # joystick button
+        tmp = self.button_and_switch_state & (1 << BIT_POS_JOYSTICK_BUTTON)
+        joystick_button_pressed = tmp > 0
+        if self.joystick_button_pressed != joystick_button_pressed:
+            if self.joystick_listener_events_enabled:
+                for _, listener_fn in self.joystick_event_listeners:
+                    listener_fn(joystick_button_pressed)
+
+            # The microcontroller wants us to send an ack back only when we see a False -> True
+            # transition. handle that here.
+            if joystick_button_pressed:
+                self.ack_joystick_button_pressed()
+        self.joystick_button_pressed = joystick_button_pressed
+
+        # switch
+        tmp = self.button_and_switch_state & (1 << BIT_POS_SWITCH)
+        self.switch_state = tmp > 0
+
     def get_pos(self):
         return self.x_pos, self.y_pos, self.z_pos, self.theta_pos
 
@@ -1224,12 +1507,7 @@ class Microcontroller:
 
     @staticmethod
     def _payload_to_int(payload, number_of_bytes):
-        signed = 0
-        for i in range(number_of_bytes):
-            signed = signed + int(payload[i]) * (256 ** (number_of_bytes - 1 - i))
-        if signed >= 256**number_of_bytes / 2:
-            signed = signed - 256**number_of_bytes
-        return signed
+        return int.from_bytes(bytes(payload[:number_of_bytes]), byteorder="big", signed=True)
 
     def set_dac80508_scaling_factor_for_illumination(self, illumination_intensity_factor):
         if illumination_intensity_factor > 1:
@@ -1242,4 +1520,4 @@ class Microcontroller:
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.SET_ILLUMINATION_INTENSITY_FACTOR
         cmd[2] = int(factor)
-        self.send_command(cmd)
+        return self.send_command(cmd)
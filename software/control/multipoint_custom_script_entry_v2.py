@@ -186,6 +186,8 @@ def process_and_save_image(worker, image, file_ID, config, current_path, current
         round(worker.crop_width * worker.display_resolution_scaling),
         round(worker.crop_height * worker.display_resolution_scaling),
     )
+    # A copy, since it's displayed later and the camera may have reused the frame this is a view of by then.
+    image_to_display = image_to_display.copy()
     worker.image_to_display.emit(image_to_display)
     worker.image_to_display_multi.emit(image_to_display, config.illumination_source)
 
@@ -6,10 +6,12 @@ from qtpy.QtCore import *
 
 import psutil
 import shutil
-import random
 import json
 import time
 import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from lxml import etree
 import numpy as np
@@ -25,7 +27,12 @@ from tifffile import TiffWriter
 from aicsimageio.writers import OmeTiffWriter
 from aicsimageio.writers import OmeZarrWriter
 from aicsimageio import types
-from basicpy import BaSiC
+from control.core import flatfield, registration
+
+# Written next to each time point's images by the CoordinateStitcher, see CoordinateStitcher.load_tile_catalog.
+TILE_CATALOG_FILE_NAME = "tile_catalog.csv"
+# Written in the acquisition folder by the CoordinateStitcher, see CoordinateStitcher.register_region.
+REGISTRATION_CACHE_FILE_NAME = "registration_pairs.csv"
 
 
 class Stitcher(QThread, QObject):
@@ -260,15 +267,6 @@ class Stitcher(QThread, QObject):
         print(self.regions)
 
     def get_flatfields(self, progress_callback=None):
-        def process_images(images, channel_name):
-            images = np.array(images)
-            basic = BaSiC(get_darkfield=False, smoothness_flatfield=1)
-            basic.fit(images)
-            channel_index = self.mono_channel_names.index(channel_name)
-            self.flatfields[channel_index] = basic.flatfield
-            if progress_callback:
-                progress_callback(channel_index + 1, self.num_c)
-
         # Iterate only over the channels you need to process
         for channel in self.channel_names:
             all_tiles = []
@@ -278,23 +276,23 @@ class Stitcher(QThread, QObject):
                     for row_col, tile_info in self.stitching_data[roi][channel][z_level].items():
                         all_tiles.append(tile_info)
 
-            # Shuffle and select a subset of tiles for flatfield calculation
-            random.shuffle(all_tiles)
-            selected_tiles = all_tiles[: min(32, len(all_tiles))]
-
             if self.is_rgb[channel]:
-                # Process each color channel if the channel is RGB
-                images_r = [dask_imread(tile["filepath"])[0][:, :, 0] for tile in selected_tiles]
-                images_g = [dask_imread(tile["filepath"])[0][:, :, 1] for tile in selected_tiles]
-                images_b = [dask_imread(tile["filepath"])[0][:, :, 2] for tile in selected_tiles]
-                channel = channel.split("_")[0]
-                process_images(images_r, channel + "_R")
-                process_images(images_g, channel + "_G")
-                process_images(images_b, channel + "_B")
+                mono_names = [f"{channel.split('_')[0]}_{color}" for color in ["R", "G", "B"]]
             else:
-                # Process monochrome images
-                images = [dask_imread(tile["filepath"])[0] for tile in selected_tiles]
-                process_images(images, channel)
+                mono_names = [channel]
+
+            flatfields = flatfield.estimate_flatfields(
+                [tile["filepath"] for tile in all_tiles],
+                mono_names,
+                max_images=FLATFIELD_MAX_IMAGES,
+                downsample_factor=FLATFIELD_DOWNSAMPLE_FACTOR,
+                read_fn=lambda path: dask_imread(path)[0].compute(scheduler="synchronous"),
+            )
+            for name, channel_flatfield in flatfields.items():
+                channel_index = self.mono_channel_names.index(name)
+                self.flatfields[channel_index] = channel_flatfield
+                if progress_callback:
+                    progress_callback(channel_index + 1, self.num_c)
 
     def normalize_image(self, img):
         img_min, img_max = img.min(), img.max()
@@ -320,7 +318,8 @@ class Stitcher(QThread, QObject):
             img1_overlap = (img1[margin:-margin, -max_overlap:]).astype(self.dtype)
             img2_overlap = (img2[margin:-margin, :max_overlap]).astype(self.dtype)
 
-            self.visualize_image(img1_overlap, img2_overlap, "horizontal")
+            if STITCHING_SAVE_REGISTRATION_DEBUG_IMAGES:
+                self.visualize_image(img1_overlap, img2_overlap, "horizontal")
             shift, error, diffphase = phase_cross_correlation(img1_overlap, img2_overlap, upsample_factor=10)
             return round(shift[0]), round(shift[1] - img1_overlap.shape[1])
         except Exception as e:
@@ -338,7 +337,8 @@ class Stitcher(QThread, QObject):
             img1_overlap = (img1[-max_overlap:, margin:-margin]).astype(self.dtype)
             img2_overlap = (img2[:max_overlap, margin:-margin]).astype(self.dtype)
 
-            self.visualize_image(img1_overlap, img2_overlap, "vertical")
+            if STITCHING_SAVE_REGISTRATION_DEBUG_IMAGES:
+                self.visualize_image(img1_overlap, img2_overlap, "vertical")
             shift, error, diffphase = phase_cross_correlation(img1_overlap, img2_overlap, upsample_factor=10)
             return round(shift[0] - img1_overlap.shape[0]), round(shift[1])
         except Exception as e:
@@ -848,6 +848,42 @@ class Stitcher(QThread, QObject):
             print(f"error While Stitching: {e}")
 
 
+class _TileLoader:
+    """
+    Loads each tile at most once on a thread pool, and keeps it in memory only until it has been released by every
+    user (use_counts[key] of them) that needs it.
+    """
+
+    def __init__(self, executor, load_fn, use_counts):
+        self._executor = executor
+        self._load_fn = load_fn
+        self._use_counts = dict(use_counts)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, key):
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = self._executor.submit(self._load_fn, key)
+
+    def get(self, key):
+        self.prefetch(key)
+        with self._lock:
+            future = self._futures[key]
+        return future.result()
+
+    def release(self, key):
+        """
+        Returns True if this was the last user of the tile (so it has been dropped from memory).
+        """
+        with self._lock:
+            self._use_counts[key] -= 1
+            if self._use_counts[key] > 0:
+                return False
+            del self._futures[key]
+            return True
+
+
 class CoordinateStitcher(QThread, QObject):
     update_progress = Signal(int, int)
     getting_flatfields = Signal()
@@ -896,11 +932,7 @@ class CoordinateStitcher(QThread, QObject):
         self.stitching_data = {}
         self.dtype = np.uint16
         self.chunks = None
-        self.h_shift = (0, 0)
-        if self.scan_pattern == "S-Pattern":
-            self.h_shift_rev = (0, 0)
-            self.h_shift_rev_odd = 0  # 0 reverse even rows, 1 reverse odd rows
-        self.v_shift = (0, 0)
+        self.tile_positions = {}
         self.x_positions = set()
         self.y_positions = set()
 
@@ -929,76 +961,104 @@ class CoordinateStitcher(QThread, QObject):
         self.pixel_size_um = sensor_pixel_size_um / actual_mag
         print("pixel_size_um:", self.pixel_size_um)
 
-    def parse_filenames(self):
-        self.extract_acquisition_parameters()
-        self.get_pixel_size_from_params()
-
-        self.stitching_data = {}
-        self.regions = set()
-        self.channel_names = set()
-        max_z = 0
-        max_fov = 0
-
-        for t, time_point in enumerate(self.time_points):
-            image_folder = os.path.join(self.input_folder, str(time_point))
-            coordinates_path = os.path.join(self.input_folder, time_point, "coordinates.csv")
-            coordinates_df = pd.read_csv(coordinates_path)
+    def build_tile_catalog(self, image_folder, image_files):
+        """
+        Returns a DataFrame with one row per image file in image_folder (filename, region, fov, z_level, channel,
+        x, y, z), made by parsing all the file names at once and doing a single merge against coordinates.csv.
+        Files without coordinates are kept, with NaN positions.
+        """
+        coordinates_df = pd.read_csv(os.path.join(image_folder, "coordinates.csv"), dtype={"region": str})
 
-            print(f"Processing timepoint {time_point}, image folder: {image_folder}")
+        parts = pd.Series(image_files).str.split("_", n=3, expand=True)
+        files_df = pd.DataFrame(
+            {
+                "filename": image_files,
+                "region": parts[0],
+                "fov": parts[1].astype(int),
+                "z_level": parts[2].astype(int),
+                "channel": parts[3]
+                .str.rsplit(".", n=1)
+                .str[0]
+                .str.replace("_", " ", regex=False)
+                .str.replace("full ", "full_", regex=False),
+            }
+        )
 
-            image_files = sorted(
-                [f for f in os.listdir(image_folder) if f.endswith((".bmp", ".tiff")) and "focus_camera" not in f]
-            )
+        return files_df.merge(
+            coordinates_df[["region", "fov", "z_level", "x (mm)", "y (mm)", "z (um)"]],
+            on=["region", "fov", "z_level"],
+            how="left",
+            sort=False,
+        ).rename(columns={"x (mm)": "x", "y (mm)": "y", "z (um)": "z"})
+
+    def load_tile_catalog(self, time_point):
+        """
+        Returns the tile catalog for the time point.  The catalog is cached in a file next to the time point's
+        images, and is only rebuilt if the image files or coordinates.csv have changed since it was written.
+        """
+        image_folder = os.path.join(self.input_folder, str(time_point))
+        print(f"Processing timepoint {time_point}, image folder: {image_folder}")
+
+        image_files = sorted(
+            [f for f in os.listdir(image_folder) if f.endswith((".bmp", ".tiff")) and "focus_camera" not in f]
+        )
+        if not image_files:
+            raise Exception(f"No valid files found in directory for timepoint {time_point}.")
 
-            if not image_files:
-                raise Exception(f"No valid files found in directory for timepoint {time_point}.")
+        catalog_path = os.path.join(image_folder, TILE_CATALOG_FILE_NAME)
+        coordinates_path = os.path.join(image_folder, "coordinates.csv")
+        if os.path.exists(catalog_path) and os.path.getmtime(catalog_path) >= os.path.getmtime(coordinates_path):
+            catalog = pd.read_csv(catalog_path, dtype={"filename": str, "region": str, "channel": str})
+            if catalog["filename"].tolist() == image_files:
+                return catalog
 
-            for file in image_files:
-                parts = file.split("_", 3)
-                region, fov, z_level, channel = parts[0], int(parts[1]), int(parts[2]), os.path.splitext(parts[3])[0]
-                channel = channel.replace("_", " ").replace("full ", "full_")
+        catalog = self.build_tile_catalog(image_folder, image_files)
+        catalog.to_csv(catalog_path, index=False)
+        return catalog
 
-                coord_row = coordinates_df[
-                    (coordinates_df["region"] == region)
-                    & (coordinates_df["fov"] == fov)
-                    & (coordinates_df["z_level"] == z_level)
-                ]
-
-                if coord_row.empty:
-                    print(f"Warning: No matching coordinates found for file {file}")
-                    continue
+    def parse_filenames(self):
+        self.extract_acquisition_parameters()
+        self.get_pixel_size_from_params()
 
-                coord_row = coord_row.iloc[0]
-
-                key = (t, region, fov, z_level, channel)
-                self.stitching_data[key] = {
-                    "filepath": os.path.join(image_folder, file),
-                    "x": coord_row["x (mm)"],
-                    "y": coord_row["y (mm)"],
-                    "z": coord_row["z (um)"],
-                    "channel": channel,
-                    "z_level": z_level,
-                    "region": region,
-                    "fov_idx": fov,
-                    "t": t,
-                }
+        catalogs = []
+        for t, time_point in enumerate(self.time_points):
+            catalog = self.load_tile_catalog(time_point)
+            missing = catalog["x"].isna()
+            for filename in catalog.loc[missing, "filename"]:
+                print(f"Warning: No matching coordinates found for file {filename}")
+            catalog = catalog[~missing].copy()
+            catalog["filepath"] = [
+                os.path.join(self.input_folder, str(time_point), filename) for filename in catalog["filename"]
+            ]
+            catalog.insert(0, "t", t)
+            catalogs.append(catalog)
+        self.tile_catalog = pd.concat(catalogs, ignore_index=True)
 
-                self.regions.add(region)
-                self.channel_names.add(channel)
-                max_z = max(max_z, z_level)
-                max_fov = max(max_fov, fov)
+        self.stitching_data = {}
+        columns = [self.tile_catalog[name].tolist() for name in ["t", "region", "fov", "z_level", "channel"]]
+        positions = [self.tile_catalog[name].tolist() for name in ["filepath", "x", "y", "z"]]
+        for (t, region, fov, z_level, channel), (filepath, x, y, z) in zip(zip(*columns), zip(*positions)):
+            self.stitching_data[(t, region, fov, z_level, channel)] = {
+                "filepath": filepath,
+                "x": x,
+                "y": y,
+                "z": z,
+                "channel": channel,
+                "z_level": z_level,
+                "region": region,
+                "fov_idx": fov,
+                "t": t,
+            }
+        self.index_tiles()
 
-        self.regions = sorted(self.regions)
-        self.channel_names = sorted(self.channel_names)
+        self.regions = sorted(self.region_tiles)
+        self.channel_names = sorted(self.tile_catalog["channel"].unique())
         self.num_t = len(self.time_points)
-        self.num_z = max_z + 1
-        self.num_fovs_per_region = max_fov + 1
+        self.num_z = int(self.tile_catalog["z_level"].max()) + 1
+        self.num_fovs_per_region = int(self.tile_catalog["fov"].max()) + 1
 
         # Set up image parameters based on the first image
-        first_key = list(self.stitching_data.keys())[0]
-        first_region = self.stitching_data[first_key]["region"]
-        first_fov = self.stitching_data[first_key]["fov_idx"]
-        first_z_level = self.stitching_data[first_key]["z_level"]
+        first_key = next(iter(self.stitching_data))
         first_image = dask_imread(self.stitching_data[first_key]["filepath"])[0]
 
         self.dtype = first_image.dtype
@@ -1011,10 +1071,12 @@ class CoordinateStitcher(QThread, QObject):
         self.chunks = (1, 1, 1, 512, 512)
 
         # Set up final monochrome channels
+        first_filepath_per_channel = self.tile_catalog.drop_duplicates(subset="channel").set_index("channel")[
+            "filepath"
+        ]
         self.mono_channel_names = []
         for channel in self.channel_names:
-            channel_key = (t, first_region, first_fov, first_z_level, channel)
-            channel_image = dask_imread(self.stitching_data[channel_key]["filepath"])[0]
+            channel_image = dask_imread(first_filepath_per_channel[channel])[0]
             if len(channel_image.shape) == 3 and channel_image.shape[2] == 3:
                 self.is_rgb[channel] = True
                 channel = channel.split("_")[0]
@@ -1030,6 +1092,22 @@ class CoordinateStitcher(QThread, QObject):
         print(f"{self.num_c} Channels: {self.mono_channel_names}")
         print(f"{len(self.regions)} Regions: {self.regions}")
 
+    def index_tiles(self):
+        """
+        Builds the lookup tables over stitching_data used everywhere else, so nothing has to scan all the tiles:
+          region_tiles: region -> {key: tile_info}
+          fov_tiles: (region, fov) -> {key: tile_info}
+          tile_grid: (region, x, y, channel, z_level) -> key of the first (earliest time point) tile there
+        """
+        self.region_tiles = {}
+        self.fov_tiles = {}
+        self.tile_grid = {}
+        for key, tile_info in self.stitching_data.items():
+            _, region, fov, z_level, channel = key
+            self.region_tiles.setdefault(region, {})[key] = tile_info
+            self.fov_tiles.setdefault((region, fov), {})[key] = tile_info
+            self.tile_grid.setdefault((region, tile_info["x"], tile_info["y"], channel, z_level), key)
+
     def get_channel_color(self, channel_name):
         color_map = {
             "405": 0x0000FF,  # Blue
@@ -1047,31 +1125,20 @@ class CoordinateStitcher(QThread, QObject):
         return 0xFFFFFF  # Default to white if no match found
 
     def calculate_output_dimensions(self, region):
-        region_data = [tile_info for key, tile_info in self.stitching_data.items() if key[1] == region]
+        region_data = list(self.region_tiles.get(region, {}).values())
 
         if not region_data:
             raise ValueError(f"No data found for region {region}")
 
         self.x_positions = sorted(set(tile_info["x"] for tile_info in region_data))
         self.y_positions = sorted(set(tile_info["y"] for tile_info in region_data))
+        self.x_position_index = {x: i for i, x in enumerate(self.x_positions)}
+        self.y_position_index = {y: i for i, y in enumerate(self.y_positions)}
 
-        if self.use_registration:  # Add extra space for shifts
-            num_cols = len(self.x_positions)
-            num_rows = len(self.y_positions)
-
-            if self.scan_pattern == "S-Pattern":
-                max_h_shift = (max(self.h_shift[0], self.h_shift_rev[0]), max(self.h_shift[1], self.h_shift_rev[1]))
-            else:
-                max_h_shift = self.h_shift
-
-            width_pixels = int(
-                self.input_width + ((num_cols - 1) * (self.input_width + max_h_shift[1]))
-            )  # horizontal width with overlap
-            width_pixels += abs((num_rows - 1) * self.v_shift[1])  # horizontal shift from vertical registration
-            height_pixels = int(
-                self.input_height + ((num_rows - 1) * (self.input_height + self.v_shift[0]))
-            )  # vertical height with overlap
-            height_pixels += abs((num_cols - 1) * max_h_shift[0])  # vertical shift from horizontal registration
+        if self.use_registration:
+            positions = self.tile_positions[region].values()
+            width_pixels = int(max(x for _, x in positions)) + self.input_width
+            height_pixels = int(max(y for y, _ in positions)) + self.input_height
 
         else:  # Use coordinates shifts
             width_mm = max(self.x_positions) - min(self.x_positions) + (self.input_width * self.pixel_size_um / 1000)
@@ -1096,83 +1163,83 @@ class CoordinateStitcher(QThread, QObject):
         print("# Pyramid levels:", self.num_pyramid_levels)
         return width_pixels, height_pixels
 
-    def init_output(self, region):
+    def get_output_image_group(self, region):
+        """
+        Returns the zarr group the region's stitched image goes in: the root of the output if there is only one
+        region, or the region's well otherwise.
+        """
+        output_path = os.path.join(self.input_folder, self.output_name)
+        store = ome_zarr.io.parse_url(output_path, mode="a").store
+        root = zarr.group(store=store)
+        if len(self.regions) == 1:
+            return root
+
+        row, col = region[0], region[1:]
+        well_group = root.require_group(row).require_group(col)
+        if "well" not in well_group.attrs:
+            ome_zarr.writer.write_well_metadata(well_group, [{"path": "0", "acquisition": 0}])
+        return well_group.require_group("0")
+
+    def create_output_array(self, image_group, name, shape):
+        return image_group.create_dataset(
+            name,
+            shape=shape,
+            chunks=self.chunks,
+            dtype=self.dtype,
+            fill_value=0,
+            overwrite=True,
+            dimension_separator="/",
+        )
+
+    def init_output(self, region, image_group):
         width, height = self.calculate_output_dimensions(region)
         self.output_shape = (self.num_t, self.num_c, self.num_z, height, width)
         print(f"Output shape for region {region}: {self.output_shape}")
-        return da.zeros(self.output_shape, dtype=self.dtype, chunks=self.chunks)
+        return self.create_output_array(image_group, "0", self.output_shape)
 
     def get_flatfields(self, progress_callback=None):
-        def process_images(images, channel_name):
-            if images.size == 0:
-                print(f"WARNING: No images found for channel {channel_name}")
-                return
-
-            if images.ndim != 3 and images.ndim != 4:
-                raise ValueError(
-                    f"Images must be 3 or 4-dimensional array, with dimension of (T, Y, X) or (T, Z, Y, X). Got shape {images.shape}"
-                )
+        objective = self.acquisition_params.get("objective", {}).get("name", "unknown_objective")
+        binning = self.acquisition_params.get("binning", "unknown_binning")
+        cache = flatfield.FlatfieldCache(FLATFIELD_CACHE_PATH)
 
-            basic = BaSiC(get_darkfield=False, smoothness_flatfield=1)
-            basic.fit(images)
-            channel_index = self.mono_channel_names.index(channel_name)
-            self.flatfields[channel_index] = basic.flatfield
-            if progress_callback:
-                progress_callback(channel_index + 1, self.num_c)
+        paths_by_channel = {}
+        for tile in self.stitching_data.values():
+            paths_by_channel.setdefault(tile["channel"], []).append(tile["filepath"])
 
         for channel in self.channel_names:
-            print(f"Calculating {channel} flatfield...")
-            images = []
-            for t in self.time_points:
-                time_images = [
-                    dask_imread(tile["filepath"])[0]
-                    for key, tile in self.stitching_data.items()
-                    if tile["channel"] == channel and key[0] == int(t)
-                ]
-                if not time_images:
-                    print(f"WARNING: No images found for channel {channel} at timepoint {t}")
-                    continue
-                random.shuffle(time_images)
-                selected_tiles = time_images[: min(32, len(time_images))]
-                images.extend(selected_tiles)
-
-            if not images:
-                print(f"WARNING: No images found for channel {channel} across all timepoints")
-                continue
-
-            images = np.array(images)
-
-            if images.ndim == 3:
-                # Images are in the shape (N, Y, X)
-                process_images(images, channel)
-            elif images.ndim == 4:
-                if images.shape[-1] == 3:
-                    # Images are in the shape (N, Y, X, 3) for RGB images
-                    images_r = images[..., 0]
-                    images_g = images[..., 1]
-                    images_b = images[..., 2]
-                    channel = channel.split("_")[0]
-                    process_images(images_r, channel + "_R")
-                    process_images(images_g, channel + "_G")
-                    process_images(images_b, channel + "_B")
-                else:
-                    # Images are in the shape (N, Z, Y, X)
-                    process_images(images, channel)
+            if self.is_rgb[channel]:
+                mono_names = [f"{channel.split('_')[0]}_{color}" for color in ["R", "G", "B"]]
             else:
-                raise ValueError(f"Unexpected number of dimensions in images array: {images.ndim}")
+                mono_names = [channel]
 
-    def calculate_shifts(self, region):
-        region_data = [v for k, v in self.stitching_data.items() if k[1] == region]
-
-        # Get unique x and y positions
-        x_positions = sorted(set(tile["x"] for tile in region_data))
-        y_positions = sorted(set(tile["y"] for tile in region_data))
+            flatfields = {
+                name: cache.get(objective, name, binning, (self.input_height, self.input_width)) for name in mono_names
+            }
+            if any(flatfields[name] is None for name in mono_names):
+                print(f"Calculating {channel} flatfield...")
+                flatfields = flatfield.estimate_flatfields(
+                    paths_by_channel.get(channel, []),
+                    mono_names,
+                    max_images=FLATFIELD_MAX_IMAGES,
+                    downsample_factor=FLATFIELD_DOWNSAMPLE_FACTOR,
+                    num_workers=STITCHING_NUM_WORKERS,
+                    read_fn=self.read_tile,
+                )
+                if not flatfields:
+                    print(f"WARNING: No images found for channel {channel}")
+                    continue
+                for name, channel_flatfield in flatfields.items():
+                    cache.put(objective, name, binning, channel_flatfield)
+            else:
+                print(f"Using cached {channel} flatfield for objective {objective}, binning {binning}")
 
-        # Initialize shifts
-        self.h_shift = (0, 0)
-        self.v_shift = (0, 0)
+            for name, channel_flatfield in flatfields.items():
+                channel_index = self.mono_channel_names.index(name)
+                self.flatfields[channel_index] = channel_flatfield
+                if progress_callback:
+                    progress_callback(channel_index + 1, self.num_c)
 
-        # Set registration channel if not already set
+    def get_registration_channel(self):
         if not self.registration_channel:
             self.registration_channel = self.channel_names[0]
         elif self.registration_channel not in self.channel_names:
@@ -1180,273 +1247,304 @@ class CoordinateStitcher(QThread, QObject):
                 f"Warning: Specified registration channel '{self.registration_channel}' not found. Using {self.channel_names[0]}."
             )
             self.registration_channel = self.channel_names[0]
-
-        max_x_overlap = round(self.input_width * self.overlap_percent / 2 / 100)
-        max_y_overlap = round(self.input_height * self.overlap_percent / 2 / 100)
-        print(f"Expected shifts - Horizontal: {(0, -max_x_overlap)}, Vertical: {(-max_y_overlap , 0)}")
-
-        # Find center positions
-        center_x_index = (len(x_positions) - 1) // 2
-        center_y_index = (len(y_positions) - 1) // 2
-
-        center_x = x_positions[center_x_index]
-        center_y = y_positions[center_y_index]
-
-        right_x = None
-        bottom_y = None
-
-        # Calculate horizontal shift
-        if center_x_index + 1 < len(x_positions):
-            right_x = x_positions[center_x_index + 1]
-            center_tile = self.get_tile(
-                region, center_x, center_y, self.registration_channel, self.registration_z_level
-            )
-            right_tile = self.get_tile(region, right_x, center_y, self.registration_channel, self.registration_z_level)
-
-            if center_tile is not None and right_tile is not None:
-                self.h_shift = self.calculate_horizontal_shift(center_tile, right_tile, max_x_overlap)
-            else:
-                print(f"Warning: Missing tiles for horizontal shift calculation in region {region}.")
-
-        # Calculate vertical shift
-        if center_y_index + 1 < len(y_positions):
-            bottom_y = y_positions[center_y_index + 1]
-            center_tile = self.get_tile(
-                region, center_x, center_y, self.registration_channel, self.registration_z_level
-            )
-            bottom_tile = self.get_tile(
-                region, center_x, bottom_y, self.registration_channel, self.registration_z_level
+        return self.registration_channel
+
+    def load_registration_cache(self):
+        """
+        Returns the cached pairwise registration results as {cache key: PairwiseOffset}.  The cache is ignored if
+        the first time point's coordinates.csv has changed since it was written.
+        """
+        cache_path = os.path.join(self.input_folder, REGISTRATION_CACHE_FILE_NAME)
+        coordinates_path = os.path.join(self.input_folder, str(self.time_points[0]), "coordinates.csv")
+        if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(coordinates_path):
+            return {}
+        cache = pd.read_csv(cache_path, dtype={"region": str, "channel": str})
+        offsets = {}
+        for row in cache.itertuples(index=False):
+            key = (
+                row.region,
+                row.fov_a,
+                row.fov_b,
+                row.channel,
+                row.z_level,
+                row.downsample,
+                row.expected_dy,
+                row.expected_dx,
             )
+            offsets[key] = registration.PairwiseOffset(row.fov_a, row.fov_b, row.dy, row.dx, row.confidence)
+        return offsets
 
-            if center_tile is not None and bottom_tile is not None:
-                self.v_shift = self.calculate_vertical_shift(center_tile, bottom_tile, max_y_overlap)
-            else:
-                print(f"Warning: Missing tiles for vertical shift calculation in region {region}.")
-
-        if self.scan_pattern == "S-Pattern" and right_x and bottom_y:
-            center_tile = self.get_tile(
-                region, center_x, bottom_y, self.registration_channel, self.registration_z_level
+    def save_registration_cache(self, offsets):
+        rows = [
+            {
+                "region": region,
+                "fov_a": fov_a,
+                "fov_b": fov_b,
+                "channel": channel,
+                "z_level": z_level,
+                "downsample": downsample,
+                "expected_dy": expected_dy,
+                "expected_dx": expected_dx,
+                "dy": offset.dy,
+                "dx": offset.dx,
+                "confidence": offset.confidence,
+            }
+            for (
+                region,
+                fov_a,
+                fov_b,
+                channel,
+                z_level,
+                downsample,
+                expected_dy,
+                expected_dx,
+            ), offset in offsets.items()
+        ]
+        pd.DataFrame(rows).to_csv(os.path.join(self.input_folder, REGISTRATION_CACHE_FILE_NAME), index=False)
+
+    def register_region(self, region):
+        """
+        Sets self.tile_positions[region] to {fov: (y_pixel, x_pixel)}.  Every pair of neighbouring tiles (of the
+        registration channel and z level, at the first time point) is registered on its overlap, and the tiles are
+        placed where they agree best with all the pairwise offsets.  Pairwise offsets are cached on disk, so only
+        pairs that haven't been registered before are read.
+        """
+        channel = self.get_registration_channel()
+        downsample = STITCHING_REGISTRATION_DOWNSAMPLE_FACTOR
+        region_data = list(self.region_tiles[region].values())
+        min_x = min(tile_info["x"] for tile_info in region_data)
+        min_y = min(tile_info["y"] for tile_info in region_data)
+
+        expected_positions = {}
+        registration_tiles = {}
+        for (t, _, fov, z_level, tile_channel), tile_info in sorted(self.region_tiles[region].items()):
+            expected_positions.setdefault(
+                fov,
+                (
+                    (tile_info["y"] - min_y) * 1000 / self.pixel_size_um,
+                    (tile_info["x"] - min_x) * 1000 / self.pixel_size_um,
+                ),
             )
-            right_tile = self.get_tile(region, right_x, bottom_y, self.registration_channel, self.registration_z_level)
-
-            if center_tile is not None and right_tile is not None:
-                self.h_shift_rev = self.calculate_horizontal_shift(center_tile, right_tile, max_x_overlap)
-                self.h_shift_rev_odd = center_y_index % 2 == 0
-                print(f"Bi-Directional Horizontal Shift - Reverse Horizontal: {self.h_shift_rev}")
-            else:
-                print(f"Warning: Missing tiles for reverse horizontal shift calculation in region {region}.")
-
-        print(f"Calculated Uni-Directional Shifts - Horizontal: {self.h_shift}, Vertical: {self.v_shift}")
-
-    def calculate_horizontal_shift(self, img1, img2, max_overlap):
-        img1 = self.normalize_image(img1)
-        img2 = self.normalize_image(img2)
-
-        margin = int(img1.shape[0] * 0.2)  # 20% margin
-        img1_overlap = img1[margin:-margin, -max_overlap:]
-        img2_overlap = img2[margin:-margin, :max_overlap]
+            if t == 0 and z_level == self.registration_z_level and tile_channel == channel:
+                registration_tiles[fov] = tile_info
 
-        self.visualize_image(img1_overlap, img2_overlap, "horizontal")
+        def cache_key(fov_a, fov_b):
+            expected_dy = int(round(expected_positions[fov_b][0] - expected_positions[fov_a][0]))
+            expected_dx = int(round(expected_positions[fov_b][1] - expected_positions[fov_a][1]))
+            return (str(region), fov_a, fov_b, channel, self.registration_z_level, downsample, expected_dy, expected_dx)
 
-        shift, error, diffphase = phase_cross_correlation(img1_overlap, img2_overlap, upsample_factor=10)
-        return round(shift[0]), round(shift[1] - img1_overlap.shape[1])
-
-    def calculate_vertical_shift(self, img1, img2, max_overlap):
-        img1 = self.normalize_image(img1)
-        img2 = self.normalize_image(img2)
-
-        margin = int(img1.shape[1] * 0.2)  # 20% margin
-        img1_overlap = img1[-max_overlap:, margin:-margin]
-        img2_overlap = img2[:max_overlap, margin:-margin]
-
-        self.visualize_image(img1_overlap, img2_overlap, "vertical")
-
-        shift, error, diffphase = phase_cross_correlation(img1_overlap, img2_overlap, upsample_factor=10)
-        return round(shift[0] - img1_overlap.shape[0]), round(shift[1])
+        pairs = registration.find_neighbors(
+            {fov: expected_positions[fov] for fov in registration_tiles}, (self.input_height, self.input_width)
+        )
+        cache = self.load_registration_cache()
+        new_pairs = [pair for pair in pairs if cache_key(*pair) not in cache]
+        print(f"Registering {len(new_pairs)} tile pairs ({len(pairs) - len(new_pairs)} cached)")
+
+        def read_registration_tile(fov):
+            tile = self.read_tile(registration_tiles[fov]["filepath"])
+            return tile.mean(axis=2) if tile.ndim == 3 else tile
+
+        def save_debug_image(fov_a, fov_b, strip_a, strip_b):
+            self.visualize_image(strip_a, strip_b, f"registration_{region}_{fov_a}_{fov_b}")
+
+        new_offsets = registration.register_pairs(
+            new_pairs,
+            expected_positions,
+            read_registration_tile,
+            downsample_factor=downsample,
+            num_workers=STITCHING_NUM_WORKERS,
+            debug_fn=save_debug_image if STITCHING_SAVE_REGISTRATION_DEBUG_IMAGES else None,
+        )
+        if new_offsets:
+            for offset in new_offsets:
+                cache[cache_key(offset.tile_a, offset.tile_b)] = offset
+            self.save_registration_cache(cache)
+
+        offsets = [cache[cache_key(*pair)] for pair in pairs if cache_key(*pair) in cache]
+        positions = registration.solve_positions(
+            expected_positions, offsets, min_confidence=STITCHING_REGISTRATION_MIN_CONFIDENCE
+        )
+        # Shift everything so the top left tile edges are at 0.
+        min_y = min(y for y, _ in positions.values())
+        min_x = min(x for _, x in positions.values())
+        self.tile_positions[region] = {
+            fov: (int(round(y - min_y)), int(round(x - min_x))) for fov, (y, x) in positions.items()
+        }
 
     def get_tile(self, region, x, y, channel, z_level):
-        for key, value in self.stitching_data.items():
-            if (
-                key[1] == region
-                and value["x"] == x
-                and value["y"] == y
-                and value["channel"] == channel
-                and value["z_level"] == z_level
-            ):
-                try:
-                    return dask_imread(value["filepath"])[0]
-                except FileNotFoundError:
-                    print(f"Warning: Tile file not found: {value['filepath']}")
-                    return None
-        print(f"Warning: No matching tile found for region {region}, x={x}, y={y}, channel={channel}, z={z_level}")
-        return None
+        key = self.tile_grid.get((region, x, y, channel, z_level))
+        if key is None:
+            print(f"Warning: No matching tile found for region {region}, x={x}, y={y}, channel={channel}, z={z_level}")
+            return None
 
-    def normalize_image(self, img):
-        img_min, img_max = img.min(), img.max()
-        img_normalized = (img - img_min) / (img_max - img_min)
-        scale_factor = np.iinfo(self.dtype).max if np.issubdtype(self.dtype, np.integer) else 1
-        return (img_normalized * scale_factor).astype(self.dtype)
+        filepath = self.stitching_data[key]["filepath"]
+        try:
+            return dask_imread(filepath)[0]
+        except FileNotFoundError:
+            print(f"Warning: Tile file not found: {filepath}")
+            return None
 
     def visualize_image(self, img1, img2, title):
+        """
+        Writes two overlap strips next to each other (side by side if they are tall, stacked if they are wide) to
+        <input folder>/<title>.png, for checking registration.
+        """
         try:
-            # Ensure images are numpy arrays
-            img1 = np.asarray(img1)
-            img2 = np.asarray(img2)
+            img1 = np.asarray(img1, dtype=np.float32)
+            img2 = np.asarray(img2, dtype=np.float32)
 
-            if title == "horizontal":
+            if img1.shape[0] >= img1.shape[1]:
                 combined_image = np.hstack((img1, img2))
             else:
                 combined_image = np.vstack((img1, img2))
 
-            # Convert to uint8 for saving as PNG
-            combined_image_uint8 = (combined_image / np.iinfo(self.dtype).max * 255).astype(np.uint8)
+            # Stretch to uint8 for saving as PNG
+            combined_image_uint8 = cv2.normalize(combined_image, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
 
             cv2.imwrite(f"{self.input_folder}/{title}.png", combined_image_uint8)
-
-            print(f"Saved {title}.png successfully")
         except Exception as e:
             print(f"Error in visualize_image: {e}")
 
     def stitch_and_save_region(self, region, progress_callback=None):
-        stitched_images = self.init_output(region)  # sets self.x_positions, self.y_positions
-        region_data = {k: v for k, v in self.stitching_data.items() if k[1] == region}
-        total_tiles = len(region_data)
-        processed_tiles = 0
-
-        x_min = min(self.x_positions)
-        y_min = min(self.y_positions)
-
-        for key, tile_info in region_data.items():
-            t, _, fov, z_level, channel = key
-            tile = dask_imread(tile_info["filepath"])[0]
-            if self.use_registration:
-                self.col_index = self.x_positions.index(tile_info["x"])
-                self.row_index = self.y_positions.index(tile_info["y"])
-
-                if self.scan_pattern == "S-Pattern" and self.row_index % 2 == self.h_shift_rev_odd:
-                    h_shift = self.h_shift_rev
-                else:
-                    h_shift = self.h_shift
-
-                # Initialize starting coordinates based on tile position and shift
-                x_pixel = int(self.col_index * (self.input_width + h_shift[1]))
-                y_pixel = int(self.row_index * (self.input_height + self.v_shift[0]))
-
-                # Apply horizontal shift effect on y-coordinate
-                if h_shift[0] < 0:
-                    y_pixel += int(
-                        (len(self.x_positions) - 1 - self.col_index) * abs(h_shift[0])
-                    )  # Fov moves up as cols go right
-                else:
-                    y_pixel += int(self.col_index * h_shift[0])  # Fov moves down as cols go right
-
-                # Apply vertical shift effect on x-coordinate
-                if self.v_shift[1] < 0:
-                    x_pixel += int(
-                        (len(self.y_positions) - 1 - self.row_index) * abs(self.v_shift[1])
-                    )  # Fov moves left as rows go down
-                else:
-                    x_pixel += int(self.row_index * self.v_shift[1])  # Fov moves right as rows go down
-
-            else:
-                # Calculate base position
-                x_pixel = int((tile_info["x"] - x_min) * 1000 / self.pixel_size_um)
-                y_pixel = int((tile_info["y"] - y_min) * 1000 / self.pixel_size_um)
-
-            self.place_tile(stitched_images, tile, x_pixel, y_pixel, z_level, channel, t)
-
-            processed_tiles += 1
-            if progress_callback:
-                progress_callback(processed_tiles, total_tiles)
+        image_group = self.get_output_image_group(region)
+        stitched_images = self.init_output(region, image_group)  # sets self.x_positions, self.y_positions
+        self.stitch_region(region, stitched_images, progress_callback)
 
         self.starting_saving.emit(False)
-        if len(self.regions) > 1:
-            self.save_region_to_hcs_ome_zarr(region, stitched_images)
-        else:
-            # self.save_as_ome_zarr(region, stitched_images)
-            self.save_region_to_ome_zarr(
-                region, stitched_images
-            )  # bugs: when starting to save, main gui lags and disconnects
-
-    def place_tile(self, stitched_images, tile, x_pixel, y_pixel, z_level, channel, t):
-        if len(tile.shape) == 2:
-            # Handle 2D grayscale image
-            channel_idx = self.mono_channel_names.index(channel)
-            self.place_single_channel_tile(stitched_images, tile, x_pixel, y_pixel, z_level, channel_idx, t)
-
-        elif len(tile.shape) == 3:
-            if tile.shape[2] == 3:
-                # Handle RGB image
-                channel = channel.split("_")[0]
-                for i, color in enumerate(["R", "G", "B"]):
-                    channel_idx = self.mono_channel_names.index(f"{channel}_{color}")
-                    self.place_single_channel_tile(
-                        stitched_images, tile[:, :, i], x_pixel, y_pixel, z_level, channel_idx, t
-                    )
-            elif tile.shape[0] == 1:
-                channel_idx = self.mono_channel_names.index(channel)
-                self.place_single_channel_tile(stitched_images, tile[0], x_pixel, y_pixel, z_level, channel_idx, t)
+        self.write_region_pyramid(image_group)
+        self.write_region_metadata(image_group, region if len(self.regions) > 1 else "stitched_image")
+
+    def get_tile_placement(self, tile_info):
+        """
+        Returns (y_pixel, x_pixel), where the top left of the tile goes in the region's stitched image.  Where tiles
+        overlap, the one placed last wins.  calculate_output_dimensions must have been called for the tile's region
+        first.
+        """
+        if not self.use_registration:
+            x_pixel = int((tile_info["x"] - min(self.x_positions)) * 1000 / self.pixel_size_um)
+            y_pixel = int((tile_info["y"] - min(self.y_positions)) * 1000 / self.pixel_size_um)
+            return y_pixel, x_pixel
+
+        y_pixel, x_pixel = self.tile_positions[tile_info["region"]][tile_info["fov_idx"]]
+        return int(y_pixel), int(x_pixel)
+
+    def read_tile(self, filepath):
+        # The stitcher's own thread pools do the parallelism, so don't let dask spin up another one per tile.
+        return dask_imread(filepath)[0].compute(scheduler="synchronous")
+
+    def load_tile_planes(self, tile_info):
+        """
+        Reads a tile and returns a list of (mono channel index, plane) for it, with each plane flatfield corrected
+        (if enabled).  RGB tiles give one plane per color.
+        """
+        tile = self.read_tile(tile_info["filepath"])
+        channel = tile_info["channel"]
+        if tile.ndim == 2:
+            planes = [(self.mono_channel_names.index(channel), tile)]
+        elif tile.ndim == 3 and tile.shape[2] == 3:
+            channel = channel.split("_")[0]
+            planes = [
+                (self.mono_channel_names.index(f"{channel}_{color}"), tile[:, :, i])
+                for i, color in enumerate(["R", "G", "B"])
+            ]
+        elif tile.ndim == 3 and tile.shape[0] == 1:
+            planes = [(self.mono_channel_names.index(channel), tile[0])]
         else:
             raise ValueError(f"Unexpected tile shape: {tile.shape}")
 
-    def place_single_channel_tile(self, stitched_images, tile, x_pixel, y_pixel, z_level, channel_idx, t):
-        if len(stitched_images.shape) != 5:
-            raise ValueError(
-                f"Unexpected stitched_images shape: {stitched_images.shape}. Expected 5D array (t, c, z, y, x)."
-            )
-
         if self.apply_flatfield:
-            tile = self.apply_flatfield_correction(tile, channel_idx)
-
-        if self.use_registration:
-            if self.scan_pattern == "S-Pattern" and self.row_index % 2 == self.h_shift_rev_odd:
-                h_shift = self.h_shift_rev
-            else:
-                h_shift = self.h_shift
-
-            # Determine crop for tile edges
-            top_crop = max(0, (-self.v_shift[0] // 2) - abs(h_shift[0]) // 2) if self.row_index > 0 else 0  # if y
-            bottom_crop = (
-                max(0, (-self.v_shift[0] // 2) - abs(h_shift[0]) // 2)
-                if self.row_index < len(self.y_positions) - 1
-                else 0
-            )
-            left_crop = max(0, (-h_shift[1] // 2) - abs(self.v_shift[1]) // 2) if self.col_index > 0 else 0
-            right_crop = (
-                max(0, (-h_shift[1] // 2) - abs(self.v_shift[1]) // 2)
-                if self.col_index < len(self.x_positions) - 1
-                else 0
-            )
-
-            # Apply cropping to the tile
-            tile = tile[top_crop : tile.shape[0] - bottom_crop, left_crop : tile.shape[1] - right_crop]
-
-            # Adjust x_pixel and y_pixel based on cropping
-            x_pixel += left_crop
-            y_pixel += top_crop
+            planes = [
+                (channel_idx, self.apply_flatfield_correction(plane, channel_idx)) for channel_idx, plane in planes
+            ]
+        return planes
+
+    def stitch_region(self, region, stitched_images, progress_callback=None):
+        """
+        Assembles the region's tiles into stitched_images (a (t, c, z, y, x) zarr array), one row of output chunks
+        at a time.  Each chunk row is built in memory from only the tiles that overlap it and then written as whole
+        chunks, so rows can be written in parallel and the output never has to fit in memory.  Each tile is read
+        once, and dropped as soon as all the chunk rows it overlaps are written.
+        """
+        height, width = stitched_images.shape[3:]
+        row_height = self.chunks[3]
+
+        tile_infos = {}
+        chunk_rows = {}  # (t, z_level, chunk row) -> [(tile key, y_pixel, x_pixel)]
+        use_counts = {}
+        for key, tile_info in self.region_tiles[region].items():
+            t, _, _, z_level, _ = key
+            y_pixel, x_pixel = self.get_tile_placement(tile_info)
+            tile_infos[key] = tile_info
+
+            tile_bottom = min(y_pixel + self.input_height, height)
+            first_row, last_row = y_pixel // row_height, (tile_bottom - 1) // row_height
+            for chunk_row in range(first_row, last_row + 1):
+                chunk_rows.setdefault((t, z_level, chunk_row), []).append((key, y_pixel, x_pixel))
+            use_counts[key] = max(0, last_row - first_row + 1)
+
+        total_tiles = sum(1 for count in use_counts.values() if count > 0)
+        processed_tiles = 0
 
-        y_end = min(y_pixel + tile.shape[0], stitched_images.shape[3])
-        x_end = min(x_pixel + tile.shape[1], stitched_images.shape[4])
+        with ThreadPoolExecutor(STITCHING_NUM_WORKERS) as read_pool, ThreadPoolExecutor(
+            STITCHING_NUM_WORKERS
+        ) as write_pool:
+            tile_loader = _TileLoader(read_pool, lambda key: self.load_tile_planes(tile_infos[key]), use_counts)
+            pending_rows = deque()
+            for t, z_level, chunk_row in sorted(chunk_rows):
+                if len(pending_rows) >= STITCHING_MAX_CHUNK_ROWS_IN_MEMORY:
+                    processed_tiles += pending_rows.popleft().result()
+                    if progress_callback:
+                        progress_callback(processed_tiles, total_tiles)
+
+                row_tiles = chunk_rows[(t, z_level, chunk_row)]
+                for key, _, _ in row_tiles:
+                    tile_loader.prefetch(key)
+                row_start = chunk_row * row_height
+                row_end = min(row_start + row_height, height)
+                pending_rows.append(
+                    write_pool.submit(
+                        self.stitch_chunk_row,
+                        stitched_images,
+                        t,
+                        z_level,
+                        row_start,
+                        row_end,
+                        row_tiles,
+                        tile_loader,
+                    )
+                )
 
-        try:
-            stitched_images[t, channel_idx, z_level, y_pixel:y_end, x_pixel:x_end] = tile[
-                : y_end - y_pixel, : x_end - x_pixel
-            ]
-        except Exception as e:
-            print(f"ERROR: Failed to place tile. Details: {str(e)}")
-            print(
-                f"DEBUG: t:{t}, channel_idx:{channel_idx}, z_level:{z_level}, y:{y_pixel}-{y_end}, x:{x_pixel}-{x_end}"
-            )
-            print(f"DEBUG: tile slice shape: {tile[:y_end-y_pixel, :x_end-x_pixel].shape}")
-            raise
+            while pending_rows:
+                processed_tiles += pending_rows.popleft().result()
+                if progress_callback:
+                    progress_callback(processed_tiles, total_tiles)
+
+    def stitch_chunk_row(self, stitched_images, t, z_level, row_start, row_end, row_tiles, tile_loader):
+        """
+        Builds rows [row_start, row_end) of all channels of the (t, z_level) stitched plane from row_tiles, and
+        writes them to stitched_images.  Returns the number of tiles that are now completely placed.
+        """
+        width = stitched_images.shape[4]
+        chunk_row = np.zeros((self.num_c, row_end - row_start, width), dtype=self.dtype)
+        finished_tiles = 0
+        for key, y_pixel, x_pixel in row_tiles:
+            for channel_idx, plane in tile_loader.get(key):
+                y_start = max(y_pixel, row_start)
+                y_end = min(y_pixel + plane.shape[0], row_end)
+                x_end = min(x_pixel + plane.shape[1], width)
+                if y_end > y_start and x_end > x_pixel:
+                    chunk_row[channel_idx, y_start - row_start : y_end - row_start, x_pixel:x_end] = plane[
+                        y_start - y_pixel : y_end - y_pixel, : x_end - x_pixel
+                    ]
+            if tile_loader.release(key):
+                finished_tiles += 1
+
+        stitched_images[t, :, z_level, row_start:row_end, :] = chunk_row
+        return finished_tiles
 
     def apply_flatfield_correction(self, tile, channel_idx):
         if channel_idx in self.flatfields:
-            return (
-                (tile / self.flatfields[channel_idx])
-                .clip(min=np.iinfo(self.dtype).min, max=np.iinfo(self.dtype).max)
-                .astype(self.dtype)
-            )
+            return flatfield.apply_flatfield(tile, self.flatfields[channel_idx])
         return tile
 
     def generate_pyramid(self, image, num_levels):
@@ -1462,73 +1560,6 @@ class CoordinateStitcher(QThread, QObject):
             pyramid.append(downsampled)
         return pyramid
 
-    def save_region_to_hcs_ome_zarr(self, region, stitched_images):
-        output_path = os.path.join(self.input_folder, self.output_name)
-        store = ome_zarr.io.parse_url(output_path, mode="a").store
-        root = zarr.group(store=store)
-
-        row, col = region[0], region[1:]
-        row_group = root.require_group(row)
-        well_group = row_group.require_group(col)
-
-        if "well" not in well_group.attrs:
-            well_metadata = {
-                "images": [{"path": "0", "acquisition": 0}],
-            }
-            ome_zarr.writer.write_well_metadata(well_group, well_metadata["images"])
-
-        image_group = well_group.require_group("0")
-
-        pyramid = self.generate_pyramid(stitched_images, self.num_pyramid_levels)
-        coordinate_transformations = [
-            [
-                {
-                    "type": "scale",
-                    "scale": [
-                        1,
-                        1,
-                        self.acquisition_params.get("dz(um)", 1),
-                        self.pixel_size_um * (2**i),
-                        self.pixel_size_um * (2**i),
-                    ],
-                }
-            ]
-            for i in range(self.num_pyramid_levels)
-        ]
-
-        axes = [
-            {"name": "t", "type": "time", "unit": "second"},
-            {"name": "c", "type": "channel"},
-            {"name": "z", "type": "space", "unit": "micrometer"},
-            {"name": "y", "type": "space", "unit": "micrometer"},
-            {"name": "x", "type": "space", "unit": "micrometer"},
-        ]
-
-        # Prepare channels metadata
-        omero_channels = [
-            {
-                "label": name,
-                "color": f"{color:06X}",
-                "window": {"start": 0, "end": np.iinfo(self.dtype).max, "min": 0, "max": np.iinfo(self.dtype).max},
-            }
-            for name, color in zip(self.mono_channel_names, self.channel_colors)
-        ]
-
-        omero = {"name": f"{region}", "version": "0.4", "channels": omero_channels}
-
-        image_group.attrs["omero"] = omero
-
-        # Write the multiscale image data and metadata
-        ome_zarr.writer.write_multiscale(
-            pyramid=pyramid,
-            group=image_group,
-            chunks=self.chunks,
-            axes=axes,
-            coordinate_transformations=coordinate_transformations,
-            storage_options=dict(chunks=self.chunks),
-            name=f"{region}",
-        )
-
     def save_as_ome_zarr(self, region, stitched_images):
         output_path = os.path.join(self.input_folder, self.output_name)
         dz_um = self.acquisition_params.get("dz(um)", None)
@@ -1563,14 +1594,23 @@ class CoordinateStitcher(QThread, QObject):
             chunk_dims=self.chunks,
         )
 
-    def save_region_to_ome_zarr(self, region, stitched_images):
-        output_path = os.path.join(self.input_folder, self.output_name)
-        store = ome_zarr.io.parse_url(output_path, mode="a").store
-        root = zarr.group(store=store)
-
-        # Generate the pyramid
-        pyramid = self.generate_pyramid(stitched_images, self.num_pyramid_levels)
+    def write_region_pyramid(self, image_group):
+        """
+        Builds each pyramid level by 2x2 downsampling the level before it, reading from and writing to the output
+        zarr chunk by chunk.
+        """
+        previous_level = da.from_zarr(image_group["0"])
+        for level in range(1, self.num_pyramid_levels):
+            downsampled = (
+                da.coarsen(np.mean, previous_level, {3: 2, 4: 2}, trim_excess=True)
+                .astype(self.dtype)
+                .rechunk(self.chunks)
+            )
+            level_array = self.create_output_array(image_group, str(level), downsampled.shape)
+            da.store(downsampled, level_array, lock=False)
+            previous_level = da.from_zarr(level_array)
 
+    def write_region_metadata(self, image_group, name):
         datasets = []
         for i in range(self.num_pyramid_levels):
             scale = 2**i
@@ -1600,31 +1640,21 @@ class CoordinateStitcher(QThread, QObject):
             {"name": "x", "type": "space", "unit": "micrometer"},
         ]
 
-        ome_zarr.writer.write_multiscales_metadata(root, datasets, axes=axes, name="stitched_image")
+        ome_zarr.writer.write_multiscales_metadata(image_group, datasets, axes=axes, name=name)
 
         omero = {
-            "name": "stitched_image",
+            "name": name,
             "version": "0.4",
             "channels": [
                 {
-                    "label": name,
+                    "label": channel_name,
                     "color": f"{color:06X}",
                     "window": {"start": 0, "end": np.iinfo(self.dtype).max, "min": 0, "max": np.iinfo(self.dtype).max},
                 }
-                for name, color in zip(self.mono_channel_names, self.channel_colors)
+                for channel_name, color in zip(self.mono_channel_names, self.channel_colors)
             ],
         }
-        root.attrs["omero"] = omero
-
-        coordinate_transformations = [dataset["coordinateTransformations"] for dataset in datasets]
-
-        ome_zarr.writer.write_multiscale(
-            pyramid=pyramid,
-            group=root,
-            axes="tczyx",
-            coordinate_transformations=coordinate_transformations,
-            storage_options=dict(chunks=self.chunks),
-        )
+        image_group.attrs["omero"] = omero
 
     def write_stitched_plate_metadata(self):
         output_path = os.path.join(self.input_folder, self.output_name)
@@ -1716,16 +1746,12 @@ class CoordinateStitcher(QThread, QObject):
         if len(self.regions) > 1:
             self.write_stitched_plate_metadata()
 
-        if self.use_registration:
-            print(f"\nCalculating shifts for region {self.regions[0]}...")
-            self.calculate_shifts(self.regions[0])
-
         for region in self.regions:
             wtime = time.time()
 
-            # if self.use_registration:
-            #     print(f"\nCalculating shifts for region {region}...")
-            #     self.calculate_shifts(region)
+            if self.use_registration:
+                print(f"\nRegistering tiles of region {region}...")
+                self.register_region(region)
 
             self.starting_stitching.emit()
             print(f"\nstarting stitching for region {region}...")
@@ -1763,17 +1789,14 @@ class CoordinateStitcher(QThread, QObject):
 
         self.write_fov_plate_metadata(root)
 
-        total_fovs = sum(
-            len(set([k[2] for k in self.stitching_data.keys() if k[1] == region])) for region in self.regions
-        )
+        total_fovs = len(self.fov_tiles)
         processed_fovs = 0
 
         for region in self.regions:
-            region_data = {k: v for k, v in self.stitching_data.items() if k[1] == region}
             well_group = self.write_fov_well_metadata(root, region)
 
             for fov_idx in range(self.num_fovs_per_region):
-                fov_data = {k: v for k, v in region_data.items() if k[2] == fov_idx}
+                fov_data = self.fov_tiles.get((region, fov_idx))
 
                 if not fov_data:
                     continue  # Skip if no data for this FOV index
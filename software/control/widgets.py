@@ -5,6 +5,7 @@ from typing import Optional
 
 import squid.logging
 from control.core.core import TrackingController, MultiPointController, LiveController
+from control.core.mosaic import TiledMosaic
 from control.microcontroller import Microcontroller
 from control.piezo import PiezoStage
 import control.utils as utils
@@ -1801,11 +1802,14 @@ class RecordingWidget(QFrame):
         grid_line3.addWidget(QLabel("Time Limit (s)"), 0, 2)
         grid_line3.addWidget(self.entry_timeLimit, 0, 3)
 
+        self.label_recordingStats = QLabel()
+
         self.grid = QVBoxLayout()
         self.grid.addLayout(grid_line1)
         self.grid.addLayout(grid_line2)
         self.grid.addLayout(grid_line3)
         self.grid.addWidget(self.btn_record)
+        self.grid.addWidget(self.label_recordingStats)
         self.setLayout(self.grid)
 
         # add and display a timer - to be implemented
@@ -1817,6 +1821,7 @@ class RecordingWidget(QFrame):
         self.entry_saveFPS.valueChanged.connect(self.streamHandler.set_save_fps)
         self.entry_timeLimit.valueChanged.connect(self.imageSaver.set_recording_time_limit)
         self.imageSaver.stop_recording.connect(self.stop_recording)
+        self.imageSaver.recording_stats.connect(lambda stats: self.label_recordingStats.setText(str(stats)))
 
     def set_saving_dir(self):
         dialog = QFileDialog()
@@ -1839,14 +1844,19 @@ class RecordingWidget(QFrame):
             self.streamHandler.start_recording()
         else:
             self.streamHandler.stop_recording()
+            self.imageSaver.finish_recording()
             self.lineEdit_experimentID.setEnabled(True)
             self.btn_setSavingDir.setEnabled(True)
 
     # stop_recording can be called by imageSaver
     def stop_recording(self):
+        # imageSaver keeps asking to stop until the stream handler stops sending it frames, only finish once
+        was_recording = self.btn_record.isChecked()
         self.lineEdit_experimentID.setEnabled(True)
         self.btn_record.setChecked(False)
         self.streamHandler.stop_recording()
+        if was_recording:
+            self.imageSaver.finish_recording()
         self.btn_setSavingDir.setEnabled(True)
 
 
@@ -3273,8 +3283,9 @@ class FlexibleMultiPointWidget(QFrame):
 
             # Remove scanCoordinates dictionaries and remove region overlay
             self.scanCoordinates.region_centers.pop(region_id, None)
-            for coord in self.scanCoordinates.region_fov_coordinates.pop(region_id, []):
-                self.navigationViewer.deregister_fov_to_image(coord[0], coord[1])
+            self.navigationViewer.deregister_fovs_to_image(
+                self.scanCoordinates.region_fov_coordinates.pop(region_id, [])
+            )
 
             # Reindex remaining regions and update UI
             for i in range(index, len(self.location_ids)):
@@ -3300,8 +3311,7 @@ class FlexibleMultiPointWidget(QFrame):
 
             print(f"Remaining location IDs: {self.location_ids}")
             for region_id, fov_coords in self.scanCoordinates.region_fov_coordinates.items():
-                for coord in fov_coords:
-                    self.navigationViewer.register_fov_to_image(coord[0], coord[1])
+                self.navigationViewer.register_fovs_to_image(fov_coords)
 
             # Re-enable signals
             self.table_location_list.blockSignals(False)
@@ -3386,8 +3396,7 @@ class FlexibleMultiPointWidget(QFrame):
 
         # Clear all FOVs for this region
         if region_id in self.scanCoordinates.region_fov_coordinates.keys():
-            for coord in self.scanCoordinates.region_fov_coordinates[region_id]:
-                self.navigationViewer.deregister_fov_to_image(coord[0], coord[1])
+            self.navigationViewer.deregister_fovs_to_image(self.scanCoordinates.region_fov_coordinates[region_id])
 
         # Handle the changed value
         val_edit = self.table_location_list.item(row, column).text()
@@ -4552,8 +4561,7 @@ class WellplateMultiPointWidget(QFrame):
                 self.scanCoordinates.region_centers[region_id] = (center_x, center_y)
 
                 # Register FOVs with navigation viewer
-                for x, y in coords:
-                    self.navigationViewer.register_fov_to_image(x, y)
+                self.navigationViewer.register_fovs_to_image(coords)
 
             self._log.info(f"Loaded {len(df)} coordinates from {file_path}")
 
@@ -5047,8 +5055,7 @@ class MultiPointWithFluidicsWidget(QFrame):
                 self.scanCoordinates.region_centers[region_id] = (center_x, center_y)
 
                 # Register FOVs with navigation viewer
-                for x, y in coords:
-                    self.navigationViewer.register_fov_to_image(x, y)
+                self.navigationViewer.register_fovs_to_image(coords)
 
             self._log.info(f"Loaded {len(df)} coordinates from {file_path}")
 
@@ -5704,8 +5711,7 @@ class FocusMapWidget(QFrame):
     def update_focus_point_display(self):
         """Update all focus points on navigation viewer"""
         self.navigationViewer.clear_focus_points()
-        for _, x, y, _ in self.focus_points:
-            self.navigationViewer.register_focus_point(x, y)
+        self.navigationViewer.register_focus_points([(x, y) for _, x, y, _ in self.focus_points])
 
     def generate_grid(self, rows=4, cols=4):
         """Generate focus point grid that spans scan bounds"""
@@ -5725,7 +5731,7 @@ class FocusMapWidget(QFrame):
             for region_id, coords_list in coordinates.items():
                 for coords in coords_list:
                     self.focus_points.append((region_id, coords[0], coords[1], current_z))
-                    self.navigationViewer.register_focus_point(coords[0], coords[1])
+            self.navigationViewer.register_focus_points([(x, y) for _, x, y, _ in self.focus_points])
 
             self.update_point_list()
             self.point_combo.blockSignals(False)
@@ -6957,6 +6963,9 @@ class NapariMosaicDisplayWidget(QWidget):
         self.viewer_extents = []  # [min_y, max_y, min_x, max_x]
         self.top_left_coordinate = None  # [y, x] in mm
         self.mosaic_dtype = None
+        self.mosaics = {}  # channel name -> TiledMosaic
+        self.mosaic_origin_mm = None  # [y, x] in mm of mosaic pixel (0, 0)
+        self.mosaic_bounds = None  # (top, left, height, width) in mosaic pixels
 
     def customizeViewer(self):
         # # hide status bar
@@ -7107,6 +7116,9 @@ class NapariMosaicDisplayWidget(QWidget):
             ]
             self.top_left_coordinate = [y_mm, x_mm]
             self.mosaic_dtype = image_dtype
+            self.mosaics = {}
+            self.mosaic_origin_mm = [y_mm, x_mm]
+            self.mosaic_bounds = None
         else:
             # convert image dtype and scale if necessary
             image = self.convertImageDtype(image, self.mosaic_dtype)
@@ -7118,6 +7130,25 @@ class NapariMosaicDisplayWidget(QWidget):
                     interpolation=cv2.INTER_LINEAR,
                 )
 
+        # update extents
+        self.viewer_extents[0] = min(self.viewer_extents[0], y_mm)
+        self.viewer_extents[1] = max(self.viewer_extents[1], y_mm + image.shape[0] * self.viewer_pixel_size_mm)
+        self.viewer_extents[2] = min(self.viewer_extents[2], x_mm)
+        self.viewer_extents[3] = max(self.viewer_extents[3], x_mm + image.shape[1] * self.viewer_pixel_size_mm)
+
+        # store previous top-left coordinate
+        prev_top_left = self.top_left_coordinate.copy() if self.top_left_coordinate else None
+        top, left = self.mmToMosaicPixels(self.viewer_extents[0], self.viewer_extents[2])
+        self.top_left_coordinate = [
+            self.mosaic_origin_mm[0] + top * self.viewer_pixel_size_mm,
+            self.mosaic_origin_mm[1] + left * self.viewer_pixel_size_mm,
+        ]
+
+        # contrast limits
+        min_val, max_val = self.contrastManager.get_limits(channel_name)
+        scaled_min = self.convertValue(min_val, self.contrastManager.acquisition_dtype, self.mosaic_dtype)
+        scaled_max = self.convertValue(max_val, self.contrastManager.acquisition_dtype, self.mosaic_dtype)
+
         if channel_name not in self.viewer.layers:
             # create new layer for channel
             channel_info = CHANNEL_COLORS_MAP.get(
@@ -7128,8 +7159,18 @@ class NapariMosaicDisplayWidget(QWidget):
             else:
                 color = self.generateColormap(channel_info)
 
+            mosaic = TiledMosaic(
+                self.mosaic_dtype,
+                channels=image.shape[2] if len(image.shape) == 3 else None,
+                tile_size=MOSAIC_VIEW_TILE_SIZE,
+            )
+            if self.mosaic_bounds is not None:
+                mosaic.set_bounds(*self.mosaic_bounds)
+            self.mosaics[channel_name] = mosaic
             layer = self.viewer.add_image(
-                np.zeros_like(image),
+                mosaic.levels(),
+                multiscale=True,
+                contrast_limits=(scaled_min, scaled_max),
                 name=channel_name,
                 rgb=len(image.shape) == 3,
                 colormap=color,
@@ -7143,75 +7184,46 @@ class NapariMosaicDisplayWidget(QWidget):
         # get layer for channel
         layer = self.viewer.layers[channel_name]
 
-        # update extents
-        self.viewer_extents[0] = min(self.viewer_extents[0], y_mm)
-        self.viewer_extents[1] = max(self.viewer_extents[1], y_mm + image.shape[0] * self.viewer_pixel_size_mm)
-        self.viewer_extents[2] = min(self.viewer_extents[2], x_mm)
-        self.viewer_extents[3] = max(self.viewer_extents[3], x_mm + image.shape[1] * self.viewer_pixel_size_mm)
-
-        # store previous top-left coordinate
-        prev_top_left = self.top_left_coordinate.copy() if self.top_left_coordinate else None
-        self.top_left_coordinate = [self.viewer_extents[0], self.viewer_extents[2]]
+        # update contrast limits
+        layer.contrast_limits = (scaled_min, scaled_max)
 
         # update layer
         self.updateLayer(layer, image, x_mm, y_mm, k, prev_top_left)
 
-        # update contrast limits
-        min_val, max_val = self.contrastManager.get_limits(channel_name)
-        scaled_min = self.convertValue(min_val, self.contrastManager.acquisition_dtype, self.mosaic_dtype)
-        scaled_max = self.convertValue(max_val, self.contrastManager.acquisition_dtype, self.mosaic_dtype)
-        layer.contrast_limits = (scaled_min, scaled_max)
-        layer.refresh()
+    def mmToMosaicPixels(self, y_mm, x_mm):
+        # mosaic pixel (relative to the first image's top left corner) that (y_mm, x_mm) is in
+        return (
+            int(math.floor((y_mm - self.mosaic_origin_mm[0]) / self.viewer_pixel_size_mm)),
+            int(math.floor((x_mm - self.mosaic_origin_mm[1]) / self.viewer_pixel_size_mm)),
+        )
 
     def updateLayer(self, layer, image, x_mm, y_mm, k, prev_top_left):
         # calculate new mosaic size and position
-        mosaic_height = int(math.ceil((self.viewer_extents[1] - self.viewer_extents[0]) / self.viewer_pixel_size_mm))
-        mosaic_width = int(math.ceil((self.viewer_extents[3] - self.viewer_extents[2]) / self.viewer_pixel_size_mm))
-
-        is_rgb = len(image.shape) == 3 and image.shape[2] == 3
-        if layer.data.shape[:2] != (mosaic_height, mosaic_width):
-            # calculate offsets for existing data
-            y_offset = int(math.floor((prev_top_left[0] - self.top_left_coordinate[0]) / self.viewer_pixel_size_mm))
-            x_offset = int(math.floor((prev_top_left[1] - self.top_left_coordinate[1]) / self.viewer_pixel_size_mm))
-
-            for mosaic in self.viewer.layers:
-                if mosaic.name != "Manual ROI":
-                    if len(mosaic.data.shape) == 3 and mosaic.data.shape[2] == 3:
-                        new_data = np.zeros((mosaic_height, mosaic_width, 3), dtype=mosaic.data.dtype)
-                    else:
-                        new_data = np.zeros((mosaic_height, mosaic_width), dtype=mosaic.data.dtype)
-
-                    # ensure offsets don't exceed bounds
-                    y_end = min(y_offset + mosaic.data.shape[0], new_data.shape[0])
-                    x_end = min(x_offset + mosaic.data.shape[1], new_data.shape[1])
+        top, left = self.mmToMosaicPixels(self.viewer_extents[0], self.viewer_extents[2])
+        mosaic_height = int(
+            math.ceil((self.viewer_extents[1] - self.top_left_coordinate[0]) / self.viewer_pixel_size_mm)
+        )
+        mosaic_width = int(
+            math.ceil((self.viewer_extents[3] - self.top_left_coordinate[1]) / self.viewer_pixel_size_mm)
+        )
+        mosaic_bounds = (top, left, mosaic_height, mosaic_width)
 
-                    # shift existing data
-                    if len(mosaic.data.shape) == 3 and mosaic.data.shape[2] == 3:
-                        new_data[y_offset:y_end, x_offset:x_end, :] = mosaic.data[
-                            : y_end - y_offset, : x_end - x_offset, :
-                        ]
-                    else:
-                        new_data[y_offset:y_end, x_offset:x_end] = mosaic.data[: y_end - y_offset, : x_end - x_offset]
-                    mosaic.data = new_data
+        if mosaic_bounds != self.mosaic_bounds:
+            # the tiles stay where they are, only what the layers show of them changes
+            self.mosaic_bounds = mosaic_bounds
+            for name, mosaic in self.mosaics.items():
+                mosaic.set_bounds(*mosaic_bounds)
+                if name in self.viewer.layers:
+                    self.viewer.layers[name].data = mosaic.levels()
 
             if "Manual ROI" in self.viewer.layers:
                 self.update_shape_layer_position(prev_top_left, self.top_left_coordinate)
 
             self.resetView()
 
-        # insert new image
-        y_pos = int(math.floor((y_mm - self.top_left_coordinate[0]) / self.viewer_pixel_size_mm))
-        x_pos = int(math.floor((x_mm - self.top_left_coordinate[1]) / self.viewer_pixel_size_mm))
-
-        # ensure indices are within bounds
-        y_end = min(y_pos + image.shape[0], layer.data.shape[0])
-        x_end = min(x_pos + image.shape[1], layer.data.shape[1])
-
-        # insert image data
-        if is_rgb:
-            layer.data[y_pos:y_end, x_pos:x_end, :] = image[: y_end - y_pos, : x_end - x_pos, :]
-        else:
-            layer.data[y_pos:y_end, x_pos:x_end] = image[: y_end - y_pos, : x_end - x_pos]
+        # insert new image, only the part of the mosaic it covers is updated
+        y_pos, x_pos = self.mmToMosaicPixels(y_mm, x_mm)
+        self.mosaics[layer.name].insert(image, y_pos, x_pos)
         layer.refresh()
 
     def convertImageDtype(self, image, target_dtype):
@@ -7289,14 +7301,9 @@ class NapariMosaicDisplayWidget(QWidget):
             if layer.name == "Manual ROI":
                 continue
 
-            if hasattr(layer, "data") and hasattr(layer.data, "shape"):
-                # Create an empty array matching the layer's dimensions
-                if len(layer.data.shape) == 3 and layer.data.shape[2] == 3:  # RGB
-                    empty_data = np.zeros((layer.data.shape[0], layer.data.shape[1], 3), dtype=layer.data.dtype)
-                else:  # Grayscale
-                    empty_data = np.zeros((layer.data.shape[0], layer.data.shape[1]), dtype=layer.data.dtype)
-
-                layer.data = empty_data
+            if layer.name in self.mosaics:
+                # Drop the tiles, the layer keeps its extent
+                self.mosaics[layer.name].clear()
 
         self.channels = set()
 
@@ -7963,15 +7970,19 @@ class MultiCameraRecordingWidget(QFrame):
         else:
             for channel in self.channels:
                 self.streamHandler[channel].stop_recording()
+                self.imageSaver[channel].finish_recording()
             self.lineEdit_experimentID.setEnabled(True)
             self.btn_setSavingDir.setEnabled(True)
 
     # stop_recording can be called by imageSaver
     def stop_recording(self):
+        was_recording = self.btn_record.isChecked()
         self.lineEdit_experimentID.setEnabled(True)
         self.btn_record.setChecked(False)
         for channel in self.channels:
             self.streamHandler[channel].stop_recording()
+            if was_recording:
+                self.imageSaver[channel].finish_recording()
         self.btn_setSavingDir.setEnabled(True)
 
 
@@ -54,7 +54,7 @@ cd "$SQUID_SOFTWARE_ROOT"
 mkdir -p "$SQUID_SOFTWARE_ROOT/cache"
 
 # install libraries 
-pip3 install qtpy pyserial pandas imageio crc==1.3.0 lxml numpy tifffile scipy napari pyreadline3
+pip3 install qtpy pyserial pandas imageio lxml numpy tifffile scipy napari pyreadline3
 pip3 install opencv-python-headless opencv-contrib-python-headless
 pip3 install napari[all] scikit-image dask_image ome_zarr aicsimageio basicpy pytest pytest-qt gitpython matplotlib pydantic_xml pyvisa
 
@@ -4,6 +4,7 @@ from abc import ABC, abstractmethod
 from typing import Callable, Optional, Tuple, Sequence, List
 import abc
 import enum
+import threading
 import time
 
 import pydantic
@@ -167,6 +168,29 @@ class AbstractStage(metaclass=abc.ABCMeta):
     def move_z_to(self, abs_mm: float, blocking: bool = True):
         pass
 
+    def move_xy_to(self, x_abs_mm: float, y_abs_mm: float, blocking: bool = True):
+        """
+        Move x and y to the given positions.  Stages that can move both axes at once should override this, by default
+        it moves x then y.
+        """
+        self.move_x_to(x_abs_mm, blocking=blocking)
+        self.move_y_to(y_abs_mm, blocking=blocking)
+
+    def move_xyz_to(self, x_abs_mm: float, y_abs_mm: float, z_abs_mm: float, blocking: bool = True):
+        """
+        Move x, y and z to the given positions.  Stages that can move z along with x and y should override this, by
+        default it moves x and y, then z.
+        """
+        self.move_xy_to(x_abs_mm, y_abs_mm, blocking=blocking)
+        self.move_z_to(z_abs_mm, blocking=blocking)
+
+    def set_x_max_speed(self, max_speed_mm_per_s: Optional[float]):
+        """
+        Limit how fast x moves (eg: to scan at a constant speed), or go back to the configured max speed if None.
+        Stages that can't change their speed raise NotImplementedError.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} can't change its x speed.")
+
     # TODO(imo): We need a stop or halt or something along these lines
     # @abc.abstractmethod
     # def stop(self, blocking: bool=True):
@@ -242,6 +266,65 @@ class CameraGainRange(pydantic.BaseModel):
     gain_step: float
 
 
+class FrameSlot:
+    """
+    One pre-allocated frame in a FrameRingBuffer.  Cameras decode frames into array, and hand out read only
+    views of it.  The slot is not reused while it is retained (retain and release must be balanced).
+    """
+
+    def __init__(self, buffer: "FrameRingBuffer", array: np.ndarray):
+        self._buffer = buffer
+        self.array = array
+        self.ref_count = 0
+
+    def retain(self):
+        with self._buffer._lock:
+            self.ref_count += 1
+
+    def release(self):
+        with self._buffer._lock:
+            if self.ref_count <= 0:
+                raise ValueError("Released a frame slot more times than it was retained.")
+            self.ref_count -= 1
+
+
+class FrameRingBuffer:
+    """
+    A fixed number of pre-allocated frame slots that a camera decodes frames into, so receiving a frame does not
+    allocate (or copy) a whole new image.  Slots are handed out in order, skipping retained ones, so a frame that
+    nobody retains stays valid until size - 1 newer frames have arrived.  If every slot is retained, a new array
+    is allocated for the frame instead of blocking the camera.
+    """
+
+    def __init__(self, size: int):
+        if size < 2:
+            raise ValueError(f"Frame ring buffer needs at least 2 slots, got {size}")
+        self._lock = threading.Lock()
+        self._slots: List[Optional[FrameSlot]] = [None] * size
+        self._next_index = 0
+        self.overflow_count = 0
+
+    def acquire(self, shape: Tuple[int, ...], dtype) -> FrameSlot:
+        """
+        Returns the next free slot, with an array of the given shape and dtype (reallocated if a previous frame had
+        a different shape or dtype).  The contents of the array are whatever was last written to it.
+        """
+        dtype = np.dtype(dtype)
+        with self._lock:
+            for _ in range(len(self._slots)):
+                index = self._next_index
+                self._next_index = (self._next_index + 1) % len(self._slots)
+                slot = self._slots[index]
+                if slot is not None and slot.ref_count > 0:
+                    continue
+                if slot is None or slot.array.shape != tuple(shape) or slot.array.dtype != dtype:
+                    slot = FrameSlot(self, np.empty(shape, dtype=dtype))
+                    self._slots[index] = slot
+                return slot
+            self.overflow_count += 1
+        return FrameSlot(self, np.empty(shape, dtype=dtype))
+
+
 # NOTE(imo): Dataclass because pydantic does not like the np.array since there's no reasonable default
 # we can provide it.
 @dataclass
@@ -251,10 +334,26 @@ class CameraFrame:
     frame: np.array
     frame_format: CameraFrameFormat
     frame_pixel_format: CameraPixelFormat
+    # The frame ring buffer slot that frame is a (read only) view of, if any.  See retain and release.
+    slot: Optional[FrameSlot] = None
 
     def is_color(self):
         return CameraPixelFormat.is_color_format(self.frame_pixel_format)
 
+    def retain(self) -> "CameraFrame":
+        """
+        Frames are views into the camera's frame ring buffer, which it reuses as new frames come in.  Call this
+        to keep the frame valid for longer than size - 1 frames (eg: while it waits in a queue to be saved), and
+        call release once done with it.
+        """
+        if self.slot:
+            self.slot.retain()
+        return self
+
+    def release(self):
+        if self.slot:
+            self.slot.release()
+
 
 class CameraError(RuntimeError):
     pass
@@ -315,6 +414,9 @@ class AbstractCamera(metaclass=abc.ABCMeta):
         self._frame_callbacks: List[Tuple[int, Callable[[CameraFrame], None]]] = []
         self._frame_callbacks_enabled = True
 
+        # Frames are decoded into the slots of this buffer, see _process_raw_frame_into_buffer.
+        self._frame_buffer = FrameRingBuffer(camera_config.frame_buffer_size)
+
     @contextmanager
     def _pause_streaming(self):
         was_streaming = self.get_is_streaming()
@@ -345,7 +447,9 @@ class AbstractCamera(metaclass=abc.ABCMeta):
         Adds a new callback that will be called with the receipt of every new frame.  This callback
         should not block for a long time because it will be called in the frame receiving hot path!
 
-        This np.ndarray is shared with all callbacks, so you should make a copy if you need to modify it.
+        The frame is a read only view into the camera's frame ring buffer, and is shared with all callbacks.  Make
+        a copy if you need to modify it, and retain it (see CameraFrame.retain) if you need it after the callback
+        returns, for longer than it takes the camera to fill the rest of the ring buffer.
 
         Returns the callback ID that can be used to remove the callback later if needed.
         """
@@ -534,7 +638,8 @@ class AbstractCamera(metaclass=abc.ABCMeta):
         CameraFrame as the frame field.  This takes care of rotating, resizing, etc the raw frame such that
         it respects this camera's settings.
 
-        Your camera's image callback should use this.
+        If no rotation or flip is configured this does not copy, and the result is (a crop of) raw_frame itself.
+        If your camera reuses the memory of raw_frame for later frames, use _process_raw_frame_into_buffer instead.
         """
         # Apply rotation and flip
         image = control.utils.rotate_and_flip_image(
@@ -548,6 +653,50 @@ class AbstractCamera(metaclass=abc.ABCMeta):
 
         return image
 
+    def _needs_rotate_or_flip(self) -> bool:
+        return bool(self._config.rotate_image_angle) or self._config.flip is not None
+
+    def _acquire_frame_slot(self, shape: Tuple[int, ...], dtype) -> FrameSlot:
+        """
+        For cameras that can decode a frame straight into memory we provide: returns the frame ring buffer slot to
+        decode the next frame into.  This is only valid if not self._needs_rotate_or_flip(), in which case
+        _frame_view(slot) is the processed frame.
+        """
+        return self._frame_buffer.acquire(shape, dtype)
+
+    def _process_raw_frame_into_buffer(
+        self, raw_frame: np.ndarray, left_shift: int = 0
+    ) -> Tuple[np.ndarray, FrameSlot]:
+        """
+        Like _process_raw_frame, but writes the rotated and flipped (and left shifted by left_shift bits, for
+        cameras that need to scale up their pixel values) frame straight into the next frame ring buffer slot, so
+        the camera can reuse raw_frame as soon as this returns.  Returns (processed read only frame, slot) for the
+        CameraFrame.
+        """
+        shape = control.utils.rotated_shape(raw_frame.shape, self._config.rotate_image_angle)
+        slot = self._frame_buffer.acquire(shape, raw_frame.dtype)
+        control.utils.rotate_and_flip_image(
+            raw_frame, rotate_image_angle=self._config.rotate_image_angle, flip_image=self._config.flip, out=slot.array
+        )
+        if left_shift:
+            np.left_shift(slot.array, left_shift, out=slot.array)
+        return self._frame_view(slot), slot
+
+    def _frame_view(self, slot: FrameSlot) -> np.ndarray:
+        """
+        Returns the software cropped, read only view of the frame in slot that goes in its CameraFrame.
+        """
+        crop_width, crop_height = self.get_crop_size()
+        view = control.utils.crop_image(slot.array, crop_width, crop_height).view()
+        view.flags.writeable = False
+        return view
+
+    def get_frame_buffer_overflow_count(self) -> int:
+        """
+        Returns how many frames could not use the frame ring buffer because all its slots were retained.
+        """
+        return self._frame_buffer.overflow_count
+
     def get_crop_size(self) -> Tuple[int, int]:
         """
         Returns the final crop size of the image.
@@ -115,10 +115,9 @@ class SimulatedCamera(AbstractCamera):
         def _logged_method(self, *args, **kwargs):
             kwargs_pairs = tuple(f"{k}={v}" for (k, v) in kwargs.items())
             args_str = tuple(str(a) for a in args)
-            current_frame = inspect.currentframe()
-            self._log.debug(
-                f"{inspect.getouterframes(current_frame)[1][3]} -> {method.__name__}({','.join(args_str + kwargs_pairs)})"
-            )
+            # Just the caller's name, getouterframes looks up the source of every frame on the stack which is slow.
+            caller_name = inspect.currentframe().f_back.f_code.co_name
+            self._log.debug(f"{caller_name} -> {method.__name__}({','.join(args_str + kwargs_pairs)})")
             return method(self, *args, **kwargs)
 
         return _logged_method
@@ -127,6 +126,8 @@ class SimulatedCamera(AbstractCamera):
         super().__init__(*args, **kwargs)
         self._frame_id = 0
         self._current_raw_frame = None
+        # Each frame is the first raw frame scrolled down by this many more rows.
+        self._raw_frame_roll = 0
         self._current_frame = None
 
         self._exposure_time_ms = None
@@ -338,6 +339,9 @@ class SimulatedCamera(AbstractCamera):
         if self._acquisition_mode == CameraAcquisitionMode.CONTINUOUS:
             self._log.warning("Sending triggers in continuous acquisition mode is not allowed.")
             return
+        if self._acquisition_mode == CameraAcquisitionMode.HARDWARE_TRIGGER:
+            # Pretend the hardware trigger reached us right away.
+            self._hw_trigger_fn(illumination_time)
         self._next_frame()
 
     @debug_log
@@ -362,17 +366,30 @@ class SimulatedCamera(AbstractCamera):
                 )
             else:
                 raise NotImplementedError(f"Simulated camera does not support pixel_format={self.get_pixel_format()}")
+            self._raw_frame_roll = 0
         else:
-            self._current_raw_frame = np.roll(self._current_raw_frame, 10, axis=0)
+            self._raw_frame_roll = (self._raw_frame_roll + 10) % self._current_raw_frame.shape[0]
 
         self._frame_id += 1
 
+        # Scroll the raw frame straight into the frame buffer, rather than rolling it into a new array first.
+        roll = self._raw_frame_roll
+        if self._needs_rotate_or_flip():
+            frame, slot = self._process_raw_frame_into_buffer(np.roll(self._current_raw_frame, roll, axis=0))
+        else:
+            slot = self._acquire_frame_slot(self._current_raw_frame.shape, self._current_raw_frame.dtype)
+            raw_height = self._current_raw_frame.shape[0]
+            slot.array[roll:] = self._current_raw_frame[: raw_height - roll]
+            slot.array[:roll] = self._current_raw_frame[raw_height - roll :]
+            frame = self._frame_view(slot)
+
         self._current_frame = CameraFrame(
             frame_id=self._frame_id,
             timestamp=time.time(),
-            frame=self._process_raw_frame(self._current_raw_frame),
+            frame=frame,
             frame_format=self.get_frame_format(),
             frame_pixel_format=self.get_pixel_format(),
+            slot=slot,
         )
 
         self._propogate_frame(self._current_frame)
@@ -342,6 +342,10 @@ class CameraConfig(pydantic.BaseModel):
     # After initialization, set the white balance gains to this once. Only valid for color cameras.
     default_white_balance_gains: Optional[RGBValue] = None
 
+    # The number of pre-allocated frames the camera decodes into.  A frame stays valid (unless retained) until
+    # this many - 1 newer frames have come in.
+    frame_buffer_size: int = 4
+
 
 def _old_camera_variant_to_enum(old_string) -> CameraVariant:
     if old_string == "Toupcam":
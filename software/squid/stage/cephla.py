@@ -107,6 +107,53 @@ class CephlaStage(AbstractStage):
                 self._calc_move_timeout(abs_mm - self.get_pos().y_mm, self.get_config().Y_AXIS.MAX_SPEED)
             )
 
+    def move_xy_to(self, x_abs_mm: float, y_abs_mm: float, blocking: bool = True):
+        # Send both moves before waiting, so they happen at the same time.
+        pos = self.get_pos()
+        self._microcontroller.move_x_to_usteps(self._config.X_AXIS.convert_real_units_to_ustep(x_abs_mm))
+        self._microcontroller.move_y_to_usteps(self._config.Y_AXIS.convert_real_units_to_ustep(y_abs_mm))
+        if blocking:
+            self._microcontroller.wait_till_operation_is_completed(
+                max(
+                    self._calc_move_timeout(x_abs_mm - pos.x_mm, self.get_config().X_AXIS.MAX_SPEED),
+                    self._calc_move_timeout(y_abs_mm - pos.y_mm, self.get_config().Y_AXIS.MAX_SPEED),
+                )
+            )
+
+    def move_xyz_to(self, x_abs_mm: float, y_abs_mm: float, z_abs_mm: float, blocking: bool = True):
+        # Send all three moves before waiting, so z moves while x and y do.  Like move_z_to, when z moves down it goes
+        # past its target (along with x and y) and then comes back up to it.
+        pos = self.get_pos()
+        z_first_mm = z_abs_mm
+        if blocking and z_abs_mm < pos.z_mm:
+            z_first_mm = max(
+                z_abs_mm - CephlaStage._BACKLASH_COMPENSATION_DISTANCE_MM, self.get_config().Z_AXIS.MIN_POSITION
+            )
+        self._microcontroller.move_x_to_usteps(self._config.X_AXIS.convert_real_units_to_ustep(x_abs_mm))
+        self._microcontroller.move_y_to_usteps(self._config.Y_AXIS.convert_real_units_to_ustep(y_abs_mm))
+        self._microcontroller.move_z_to_usteps(self._config.Z_AXIS.convert_real_units_to_ustep(z_first_mm))
+        if blocking:
+            self._microcontroller.wait_till_operation_is_completed(
+                max(
+                    self._calc_move_timeout(x_abs_mm - pos.x_mm, self.get_config().X_AXIS.MAX_SPEED),
+                    self._calc_move_timeout(y_abs_mm - pos.y_mm, self.get_config().Y_AXIS.MAX_SPEED),
+                    self._calc_move_timeout(z_first_mm - pos.z_mm, self.get_config().Z_AXIS.MAX_SPEED),
+                )
+            )
+            if z_first_mm != z_abs_mm:
+                self._microcontroller.move_z_to_usteps(self._config.Z_AXIS.convert_real_units_to_ustep(z_abs_mm))
+                self._microcontroller.wait_till_operation_is_completed(
+                    self._calc_move_timeout(z_abs_mm - z_first_mm, self.get_config().Z_AXIS.MAX_SPEED)
+                )
+
+    def set_x_max_speed(self, max_speed_mm_per_s: Optional[float]):
+        axis_config = self.get_config().X_AXIS
+        max_speed = (
+            axis_config.MAX_SPEED if max_speed_mm_per_s is None else min(max_speed_mm_per_s, axis_config.MAX_SPEED)
+        )
+        self._microcontroller.set_max_velocity_acceleration(_def.AXIS.X, max_speed, axis_config.MAX_ACCELERATION)
+        self._microcontroller.wait_till_operation_is_completed()
+
     def move_z_to(self, abs_mm: float, blocking: bool = True):
         # From Hongquan, we want the z axis to rest on the "up" (wrt gravity) direction of gravity. So if we
         # are moving in the negative (down) z direction, we need to move past our mark a bit then
@@ -54,6 +54,10 @@ def test_multi_point_controller_image_count_calculation(qtbot):
     control._def.MERGE_CHANNELS = True
     assert mpc.get_acquisition_image_count() == final_number_of_fov * (all_config_count + 1)
 
+    # Unless there's only one config, so nothing to merge.
+    mpc.set_selected_configurations(all_configuration_names[0:1])
+    assert mpc.get_acquisition_image_count() == final_number_of_fov
+
 
 def test_multi_point_controller_disk_space_esimate(qtbot):
     mpc = gts.get_test_multi_point_controller()
@@ -0,0 +1,37 @@
+import copy
+import json
+
+import tools.acquisition_benchmark as benchmark
+
+
+def test_acquisition_benchmark_reports_throughput_and_regressions(qtbot, tmp_path):
+    scenarios = [
+        benchmark.Scenario(
+            wells=2,
+            fov_grid=(2, 1),
+            nz=2,
+            channels=1,
+            binning=3,
+            pixel_format="MONO8",
+            output_format="bmp",
+            pipelined=pipelined,
+        )
+        for pipelined in (False, True)
+    ]
+    results = benchmark.run_benchmark(scenarios, base_path=str(tmp_path))
+    results = json.loads(json.dumps(results))
+
+    assert [result["scenario"] for result in results["results"]] == [scenario.name for scenario in scenarios]
+    for result in results["results"]:
+        assert (result["fovs"], result["images"]) == (4, 8)
+        assert result["fovs_per_s"] > 0
+        assert result["peak_rss_mb"] >= result["start_rss_mb"] > 0
+        for phase in ("move", "settle", "trigger", "readout", "save", "display"):
+            assert result["phases"][phase]["count"] > 0
+        assert result["phases"]["readout"]["count"] == 8
+
+    assert benchmark.find_regressions(results, results, max_regression=0.1) == []
+    faster_baseline = copy.deepcopy(results)
+    for result in faster_baseline["results"]:
+        result["fovs_per_s"] *= 2
+    assert len(benchmark.find_regressions(results, faster_baseline, max_regression=0.1)) == len(scenarios)
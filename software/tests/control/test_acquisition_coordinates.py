@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+import control._def
+import control.core.multi_point_worker
+import control.stitcher
+import tools.acquisition_benchmark as benchmark
+from control.core.acquisition_coordinates import CoordinatesLog, ImageMetadataLog
+from squid.abc import Pos
+
+
+def pos(x_mm, y_mm, z_mm):
+    return Pos(x_mm=x_mm, y_mm=y_mm, z_mm=z_mm, theta_rad=None)
+
+
+def test_coordinates_log_flushes_as_it_goes(tmp_path):
+    path = str(tmp_path / "coordinates.csv")
+    log = CoordinatesLog(path, use_piezo=True, flush_rows=2, flush_interval_s=1000)
+    assert list(pd.read_csv(path).columns) == log.columns
+
+    log.append("A1", 0, 0, pos(1.0, 2.0, 0.003), "t0", z_piezo_um=5.0)
+    assert len(pd.read_csv(path)) == 0
+    log.append("A1", 0, 1, pos(1.0, 2.0, 0.004), "t1")
+    log.append("A1", 1, 0, pos(1.5, 2.0, 0.003), "t2")
+    # The first two rows are on disk, the third waits for the next flush.
+    assert len(pd.read_csv(path)) == 2
+
+    log.close()
+    on_disk = pd.read_csv(path)
+    assert len(on_disk) == len(log) == 3
+    assert list(on_disk["z (um)"]) == [3.0, 4.0, 3.0]
+    assert on_disk["z_piezo (um)"].isna().tolist() == [False, True, True]
+    pd.testing.assert_frame_equal(on_disk, log.to_dataframe())
+
+
+def test_coordinates_log_flushes_on_interval(tmp_path):
+    path = str(tmp_path / "coordinates.csv")
+    log = CoordinatesLog(path, flush_rows=1000, flush_interval_s=0)
+    log.append("A1", 0, 0, pos(1.0, 2.0, 0.003), "t0")
+    assert len(pd.read_csv(path)) == 1
+    log.close()
+
+    in_memory = CoordinatesLog(None)
+    in_memory.append("A1", 0, 0, pos(1.0, 2.0, 0.003), "t0")
+    in_memory.close()
+    assert list(in_memory.to_dataframe()["x (mm)"]) == [1.0]
+
+
+def test_image_metadata_log(tmp_path):
+    path = str(tmp_path / "image_metadata.csv")
+    log = ImageMetadataLog(path, flush_rows=2, flush_interval_s=1000)
+    log.append("A1", 0, 0, "BF", 10, 7, "t0")
+    log.append("A1", 0, 0, "RGB", 20, None, "t1")
+    log.append("A1", 0, 1, "BF", None, 8, "t2")
+    assert len(pd.read_csv(path)) == 2
+
+    log.close()
+    on_disk = pd.read_csv(path)
+    assert list(on_disk.columns) == log.columns
+    assert on_disk["frame_id"].isna().tolist() == [False, True, False]
+    assert on_disk["exposure (ms)"].isna().tolist() == [False, False, True]
+    pd.testing.assert_frame_equal(
+        on_disk[["region", "fov", "z_level", "channel", "exposure (ms)"]],
+        log.to_dataframe()[["region", "fov", "z_level", "channel", "exposure (ms)"]],
+    )
+
+
+def test_acquisition_coordinates_and_image_metadata(qtbot, monkeypatch, tmp_path):
+    # run_scenario changes these, make sure they're put back.
+    monkeypatch.setattr(control._def.Acquisition, "IMAGE_FORMAT", control._def.Acquisition.IMAGE_FORMAT)
+    monkeypatch.setattr(control._def.Acquisition, "OUTPUT_FORMAT", control._def.Acquisition.OUTPUT_FORMAT)
+    monkeypatch.setattr(
+        control.core.multi_point_worker,
+        "MULTIPOINT_USE_PIPELINED_SAVING",
+        control.core.multi_point_worker.MULTIPOINT_USE_PIPELINED_SAVING,
+    )
+
+    scope = benchmark.create_simulated_microscope()
+    scenario = benchmark.Scenario(
+        wells=1,
+        fov_grid=(2, 1),
+        nz=2,
+        channels=2,
+        binning=3,
+        pixel_format="MONO8",
+        output_format="bmp",
+        pipelined=False,
+    )
+    try:
+        result = benchmark.run_scenario(scope, scenario, str(tmp_path), well_spacing_mm=9.0)
+    finally:
+        scope.camera.stop_streaming()
+
+    coordinates_path = next(tmp_path.rglob("0/coordinates.csv"))
+    coordinates = pd.read_csv(coordinates_path)
+    # A row per fov and z level, and a row per image in image_metadata.csv.
+    assert coordinates[["fov", "z_level"]].values.tolist() == [[0, 0], [0, 1], [1, 0], [1, 1]]
+    image_metadata = pd.read_csv(coordinates_path.parent / "image_metadata.csv")
+    assert len(image_metadata) == result["images"] == 8
+    channel_names = [config.name for config in scope.multipointController.selected_configurations]
+    assert sorted(image_metadata["channel"].unique()) == sorted(channel_names)
+    assert image_metadata.groupby(["fov", "z_level"]).size().tolist() == [2] * 4
+    assert image_metadata["frame_id"].is_unique
+
+    # The stitcher still finds a position for every image.
+    stitcher = control.stitcher.CoordinateStitcher(input_folder=str(coordinates_path.parent.parent))
+    stitcher.get_time_points()
+    stitcher.parse_filenames()
+    assert len(stitcher.stitching_data) == 8
+    assert np.isfinite(stitcher.tile_catalog[["x", "y", "z"]].to_numpy()).all()
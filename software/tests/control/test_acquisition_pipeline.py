@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from control.core.acquisition_pipeline import AcquisitionPipeline, StageTimings
+
+
+def test_pipeline_runs_all_jobs_and_drains():
+    results = []
+    results_lock = threading.Lock()
+
+    def job(i):
+        time.sleep(0.001)
+        with results_lock:
+            results.append(i)
+
+    pipeline = AcquisitionPipeline(num_workers=3, max_queued_jobs=4)
+    for i in range(50):
+        pipeline.submit(job, i)
+    pipeline.drain()
+
+    assert sorted(results) == list(range(50))
+    assert pipeline.pending_jobs() == 0
+
+    pipeline.shutdown()
+    # Shutting down twice is fine, but submitting afterwards is not.
+    pipeline.shutdown()
+    with pytest.raises(RuntimeError):
+        pipeline.submit(job, 51)
+
+
+def test_pipeline_backpressure():
+    release = threading.Event()
+    pipeline = AcquisitionPipeline(num_workers=1, max_queued_jobs=1)
+
+    # The first job blocks the only worker, the second fills the queue, so the third submit must block.
+    pipeline.submit(release.wait)
+    pipeline.submit(lambda: None)
+
+    third_submitted = threading.Event()
+
+    def submit_third():
+        pipeline.submit(lambda: None)
+        third_submitted.set()
+
+    submitter = threading.Thread(target=submit_third)
+    submitter.start()
+    assert not third_submitted.wait(0.1)
+
+    release.set()
+    assert third_submitted.wait(5)
+    submitter.join()
+    pipeline.shutdown()
+    assert pipeline.timings.summary()["queue_wait"]["max_ms"] >= 100
+
+
+def test_pipeline_counts_errors_and_keeps_going():
+    def bad_job():
+        raise ValueError("Boom")
+
+    done = []
+    pipeline = AcquisitionPipeline(num_workers=1, max_queued_jobs=2)
+    pipeline.submit(bad_job)
+    pipeline.submit(done.append, 1)
+    pipeline.shutdown()
+
+    assert pipeline.error_count == 1
+    assert done == [1]
+
+
+def test_stage_timings():
+    timings = StageTimings()
+    with timings.measure("move"):
+        time.sleep(0.01)
+    timings.add("move", 0.02)
+    timings.add("save", 0.005)
+
+    summary = timings.summary()
+    assert summary["move"]["count"] == 2
+    assert summary["move"]["total_s"] >= 0.03
+    assert summary["move"]["max_ms"] >= 20
+    assert summary["save"]["count"] == 1
+    assert "move" in timings.summary_str()
+
+    timings.reset()
+    assert timings.summary() == {}
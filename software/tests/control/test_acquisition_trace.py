@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+import threading
+
+import tests.control.gui_test_stubs as gts
+from control.core.acquisition_pipeline import StageTimings
+from control.core.acquisition_trace import AcquisitionTracer, TRACE_CSV_FILE_NAME, TRACE_JSON_FILE_NAME
+
+
+def test_tracer_attributes_spans_to_fovs_and_threads():
+    tracer = AcquisitionTracer()
+    timings = StageTimings(tracer=tracer)
+
+    with timings.measure("setup"):
+        pass
+    tracer.set_fov((0, "A1", 0))
+    with timings.measure("move"):
+        pass
+
+    # A job for fov 0 that runs on another thread after we've moved on to fov 1.
+    def save():
+        with timings.measure("save"):
+            pass
+
+    job_fov = tracer.get_fov()
+    tracer.set_fov((0, "A1", 1))
+    thread = threading.Thread(target=tracer.run_in_fov, args=(job_fov, save), name="saver")
+    thread.start()
+    thread.join()
+    with timings.measure("move"):
+        pass
+
+    spans = tracer.spans()
+    assert [(span["name"], span["fov"], span["thread"]) for span in spans] == [
+        ("setup", None, "MainThread"),
+        ("move", 0, "MainThread"),
+        ("save", 0, "saver"),
+        ("move", 1, "MainThread"),
+    ]
+    assert all(span["duration_s"] >= 0 for span in spans)
+    assert [span["start_s"] for span in spans] == sorted(span["start_s"] for span in spans)
+    assert timings.summary()["move"]["count"] == 2
+
+
+def test_tracer_limits_and_disabling():
+    tracer = AcquisitionTracer(max_spans=2)
+    for i in range(5):
+        tracer.add_span("move", i, i + 1)
+    assert len(tracer) == 2
+    assert tracer.dropped_spans == 3
+
+    disabled = AcquisitionTracer(enabled=False)
+    disabled.add_span("move", 0, 1)
+    assert len(disabled) == 0
+
+
+def test_tracer_export(tmp_path):
+    tracer = AcquisitionTracer()
+    tracer.export(str(tmp_path))
+    assert not os.path.exists(os.path.join(str(tmp_path), TRACE_JSON_FILE_NAME))
+
+    tracer.set_fov((1, "B2", 3))
+    tracer.add_span("readout", tracer._start_time + 0.5, tracer._start_time + 0.75)
+    tracer.export(str(tmp_path))
+
+    with open(os.path.join(str(tmp_path), TRACE_JSON_FILE_NAME)) as f:
+        trace = json.load(f)
+    (event,) = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert event["name"] == "readout"
+    assert (event["ts"], event["dur"]) == (500000.0, 250000.0)
+    assert event["args"] == {"time_point": 1, "region": "B2", "fov": 3}
+
+    with open(os.path.join(str(tmp_path), TRACE_CSV_FILE_NAME)) as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [
+        {
+            "name": "readout",
+            "start_ms": "500.000",
+            "duration_ms": "250.000",
+            "thread": "MainThread",
+            "time_point": "1",
+            "region": "B2",
+            "fov": "3",
+        }
+    ]
+
+
+def test_acquisition_writes_trace_next_to_coordinates(qtbot, tmp_path):
+    controller = gts.get_test_multi_point_controller()
+    controller.headless = True
+    controller.set_base_path(str(tmp_path))
+    configurations = controller.channelConfigurationManager.get_configurations(
+        controller.objectiveStore.current_objective
+    )
+    controller.set_selected_configurations([configurations[0].name])
+    controller.scanCoordinates.clear_regions()
+    stage_config = controller.stage.get_config()
+    controller.scanCoordinates.add_flexible_region(
+        "A1", stage_config.X_AXIS.MIN_POSITION + 1, stage_config.Y_AXIS.MIN_POSITION + 1, 1.0, 2, 1, 0
+    )
+    controller.start_new_experiment("trace")
+    controller.run_acquisition()
+
+    experiment_path = os.path.join(str(tmp_path), controller.experiment_ID)
+    assert os.path.exists(os.path.join(experiment_path, "coordinates.csv"))
+    with open(os.path.join(experiment_path, TRACE_CSV_FILE_NAME)) as f:
+        rows = list(csv.DictReader(f))
+    fov_spans = [(row["region"], row["fov"]) for row in rows if row["name"] == "fov"]
+    assert fov_spans == [("A1", "0"), ("A1", "1")]
+    names = {row["name"] for row in rows}
+    assert {"move", "settle", "trigger", "readout", "save", "acquire_camera_image"}.issubset(names)
@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+import zarr
+
+from control._def import AcquisitionOutputFormat
+from control.core.acquisition_writers import (
+    OmeTiffImageWriter,
+    OmeZarrImageWriter,
+    get_image_writer,
+    split_well_name,
+)
+
+
+def make_writer_args(tmp_path, region_fov_coordinates):
+    return {
+        "experiment_path": str(tmp_path),
+        "channel_names": ["BF", "Fluorescence 488 nm Ex"],
+        "region_fov_coordinates": region_fov_coordinates,
+        "nt": 2,
+        "nz": 3,
+        "pixel_size_um": 0.5,
+        "dz_um": 1.5,
+        "dt_s": 10,
+        "acquisition_parameters": {"Nz": 3, "dz(um)": 1.5},
+    }
+
+
+def frame(t, fov, z, c):
+    return np.full((8, 10), t * 1000 + fov * 100 + z * 10 + c, dtype=np.uint16)
+
+
+def write_all(writer, region_fov_coordinates):
+    for t in range(writer.nt):
+        for region_id, coords in region_fov_coordinates.items():
+            for fov in range(len(coords)):
+                for z in range(writer.nz):
+                    for c in range(len(writer.channel_names)):
+                        position = {
+                            "x_mm": coords[fov][0],
+                            "y_mm": coords[fov][1] + 0.001 * z,
+                            "z_um": 1000 + 1.5 * z,
+                            "time": f"2025-01-01_12-00-{t:02}.{z * 100000 + c:06}",
+                        }
+                        writer.write_frame(frame(t, fov, z, c), t, region_id, fov, z, c, position)
+        writer.finish_time_point(t)
+    writer.close()
+
+
+def test_split_well_name():
+    assert split_well_name("B12") == ("B", "12")
+    assert split_well_name("AA3") == ("AA", "3")
+    assert split_well_name("manual0") is None
+    assert split_well_name("current") is None
+
+
+def test_ome_zarr_writer_plate_layout(tmp_path):
+    regions = {"A1": [(1.0, 2.0), (1.5, 2.0)], "B2": [(10.0, 11.0)]}
+    writer = get_image_writer(AcquisitionOutputFormat.OME_ZARR.value, **make_writer_args(tmp_path, regions))
+    assert isinstance(writer, OmeZarrImageWriter)
+    assert writer.is_plate
+    write_all(writer, regions)
+
+    root = zarr.open_group(writer.store_path, mode="r")
+    assert root.attrs["squid"]["acquisition_parameters"]["Nz"] == 3
+    assert [row["name"] for row in root.attrs["plate"]["rows"]] == ["A", "B"]
+
+    array = root["A/1/1/0"]
+    assert array.shape == (2, 2, 3, 8, 10)
+    assert array.chunks == (1, 1, 1, 8, 10)
+    np.testing.assert_array_equal(array[1, 1, 2], frame(1, 1, 2, 1))
+
+    fov_attrs = root["A/1/1"].attrs
+    assert fov_attrs["multiscales"][0]["datasets"][0]["coordinateTransformations"][0]["scale"] == [
+        10,
+        1.0,
+        1.5,
+        0.5,
+        0.5,
+    ]
+    assert len(fov_attrs["squid"]["planes"]) == 2 * 3 * 2
+    assert fov_attrs["squid"]["planes"][0]["x_mm"] == 1.5
+
+
+def test_ome_zarr_writer_non_plate_layout(tmp_path):
+    regions = {"manual0": [(1.0, 2.0)], "manual1": [(3.0, 4.0)]}
+    writer = OmeZarrImageWriter(**make_writer_args(tmp_path, regions))
+    assert not writer.is_plate
+    write_all(writer, regions)
+
+    root = zarr.open_group(writer.store_path, mode="r")
+    assert "plate" not in root.attrs
+    np.testing.assert_array_equal(root["manual1/0/0"][0, 0, 1], frame(0, 0, 1, 0))
+
+
+def test_ome_tiff_writer(tmp_path):
+    regions = {"A1": [(1.0, 2.0), (1.5, 2.0)]}
+    writer = get_image_writer(AcquisitionOutputFormat.OME_TIFF.value, **make_writer_args(tmp_path, regions))
+    assert isinstance(writer, OmeTiffImageWriter)
+    write_all(writer, regions)
+
+    for t in range(2):
+        path = writer.get_path(t, "A1")
+        with tifffile.TiffFile(path) as tif:
+            assert tif.is_ome
+            assert len(tif.series) == 2
+            data = tif.series[1].asarray()
+            assert data.shape == (2, 3, 8, 10)
+            np.testing.assert_array_equal(data[1, 2], frame(t, 1, 2, 1))
+            assert "Fluorescence 488 nm Ex" in tif.ome_metadata
+            # Where the stage was for each plane (and when) is in the OME-XML.
+            planes = tifffile.xml2dict(tif.ome_metadata)["OME"]["Image"][1]["Pixels"]["Plane"]
+            assert len(planes) == 2 * 3
+            assert planes[-1]["TheC"] == 1 and planes[-1]["TheZ"] == 2
+            assert planes[-1]["PositionY"] == pytest.approx(2.002)
+            assert planes[-1]["PositionZ"] == pytest.approx(1.003)
+            assert planes[-1]["DeltaT"] == pytest.approx(0.200001)
+    # The time point folders are left to the individual image files the stitcher reads.
+    assert os.path.dirname(writer.get_path(0, "A1")) == os.path.join(tmp_path, OmeTiffImageWriter.FOLDER_NAME, "0")
+    assert not os.path.exists(os.path.join(tmp_path, "0"))
+
+
+def test_writer_rejects_bad_frames(tmp_path):
+    writer = OmeZarrImageWriter(**make_writer_args(tmp_path, {"A1": [(1.0, 2.0)]}))
+    with pytest.raises(ValueError):
+        writer.write_frame(np.zeros((8, 10, 3), dtype=np.uint8), 0, "A1", 0, 0, 0)
+    with pytest.raises(ValueError):
+        writer.write_frame(frame(0, 0, 0, 0), 0, "A1", 1, 0, 0)
+    with pytest.raises(ValueError):
+        writer.write_frame(frame(0, 0, 0, 0), 0, "A2", 0, 0, 0)
+
+
+def test_individual_images_has_no_writer(tmp_path):
+    assert get_image_writer(AcquisitionOutputFormat.INDIVIDUAL_IMAGES.value) is None
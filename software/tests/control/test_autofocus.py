@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+import pytest
+
+import control._def
+import control.core.core
+import tests.control.gui_test_stubs as gts
+from control.core import autofocus
+
+FOCUS_Z_MM = 0.0123
+
+
+def gaussian_focus_curve(z_mm):
+    return 100 * np.exp(-((z_mm - FOCUS_Z_MM) ** 2) / (2 * 0.004**2))
+
+
+def curve_search(curve):
+    z = {"mm": None}
+    search = autofocus.FocusSearch(lambda z_mm: z.update(mm=z_mm), lambda: z["mm"], curve)
+    return search
+
+
+def test_fit_peak():
+    z = np.array([0.008, 0.011, 0.014, 0.017])
+    assert autofocus.fit_peak(z, gaussian_focus_curve(z)) == pytest.approx(FOCUS_Z_MM)
+    # Peaked at the end of the samples, or not peaked at all.
+    assert autofocus.fit_peak(z, z) is None
+    assert autofocus.fit_peak(z, [1, 2, 2, 2]) is None
+
+
+def test_search_fits_the_peak_with_fewer_exposures():
+    delta_z_mm, n = 0.0015, 20
+    result = curve_search(gaussian_focus_curve).run(
+        0, (n - 1) * delta_z_mm, 2 * delta_z_mm, delta_z_mm / 2, control._def.AF.STOP_THRESHOLD
+    )
+    assert result.method == "fit"
+    assert result.z_mm == pytest.approx(FOCUS_Z_MM, abs=1e-6)
+    # Stopped once it was past the peak, instead of taking all n frames.
+    assert result.exposures < n / 2
+
+
+def test_search_falls_back_to_golden_section():
+    # Flat topped, so there's no fitting the peak from the coarse samples.
+    def curve(z_mm):
+        return 10 - max(abs(z_mm - FOCUS_Z_MM), 0.006) * 100
+
+    result = curve_search(curve).run(0, 0.03, 0.005, 0.0005, 0.99)
+    assert result.method == "golden section"
+    assert abs(result.z_mm - FOCUS_Z_MM) <= 0.006
+
+    edge = curve_search(curve).run(0.02, 0.04, 0.005, 0.0005, 0.99)
+    assert edge.method == "edge" and edge.z_mm == 0.02
+
+
+def test_focus_history():
+    history = autofocus.FocusHistory(max_length=2, max_distance_mm=1)
+    assert history.predict(0, 0) is None
+    history.add(0, 0, 1.0)
+    history.add(5, 5, 2.0)
+    assert history.predict(0.5, 0) == 1.0
+    assert history.predict(10, 10) is None
+    history.add(6, 6, 3.0)
+    # The oldest position is gone.
+    assert history.predict(0, 0) is None and len(history) == 2
+
+
+def test_autofocus_worker(qtbot, monkeypatch):
+    controller = gts.get_test_multi_point_controller().autofocusController
+    stage, camera = controller.stage, controller.camera
+    texture = np.random.default_rng(0).integers(0, 255, (256, 256)).astype(np.uint8)
+
+    def read_frame():
+        # Blurrier the further from FOCUS_Z_MM the stage is.
+        sigma = 0.3 + abs(stage.get_pos().z_mm - FOCUS_Z_MM) * 1000 / 6
+        return cv2.GaussianBlur(texture, (0, 0), sigma)
+
+    monkeypatch.setattr(camera, "send_trigger", lambda *args, **kwargs: None)
+    monkeypatch.setattr(camera, "read_frame", read_frame)
+    controller.set_N(10)
+    controller.set_deltaZ(1.5)
+    stage.move_z_to(0.008)
+
+    worker = control.core.core.AutofocusWorker(controller)
+    worker.run_autofocus()
+    assert stage.get_pos().z_mm == pytest.approx(FOCUS_Z_MM, abs=0.00075)
+    assert controller.last_result.exposures < 10
+    first_exposures = controller.last_result.exposures
+
+    # Close by, autofocus starts from where focus was found and searches less.
+    stage.move_z_to(0.008)
+    worker.run_autofocus()
+    assert stage.get_pos().z_mm == pytest.approx(FOCUS_Z_MM, abs=0.00075)
+    assert controller.last_result.exposures < first_exposures
+    sampled_z = [z for z, _ in controller.last_result.samples]
+    assert max(sampled_z) - min(sampled_z) < 9 * 0.0015 / 2
+
+    # Without the history (a new acquisition, objective or sample), it searches the whole range again.
+    controller.clear_focus_history()
+    assert len(controller.focus_history) == 0
+    stage.move_z_to(0.008)
+    worker.run_autofocus()
+    assert controller.last_result.exposures == first_exposures
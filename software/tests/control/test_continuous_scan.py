@@ -0,0 +1,174 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import control._def
+import control.core.multi_point_worker
+import tools.acquisition_benchmark as benchmark
+from control.core import continuous_scan
+
+
+def test_motion_blur_budget():
+    speed = continuous_scan.max_blur_free_speed(exposure_ms=0.1, pixel_size_um=0.5, max_blur_pixels=1)
+    assert speed == pytest.approx(5.0)
+    assert continuous_scan.motion_blur_pixels(speed, exposure_ms=0.1, pixel_size_um=0.5) == pytest.approx(1)
+
+    # Limited by how fast the camera can keep up with 1 mm between fovs.
+    assert (
+        continuous_scan.scan_speed([0, 1, 2], 0.1, 0.5, 1, min_frame_interval_s=0.5, stage_max_speed_mm_per_s=10) == 2
+    )
+    assert (
+        continuous_scan.scan_speed([0, 1, 2], 0.1, 0.5, 1, min_frame_interval_s=0.01, stage_max_speed_mm_per_s=4) == 4
+    )
+
+
+def test_split_into_rows():
+    # An S pattern 3x2 grid, then a fov at another z, then a fov that doubles back.
+    coordinates = [(0, 0, 1), (1, 0, 1), (2, 0, 1), (2, 1, 1), (1, 1, 1), (0, 1, 1), (1, 1, 2), (0, 1, 2), (1, 1, 2)]
+    assert continuous_scan.split_into_rows(coordinates) == [[0, 1, 2], [3, 4, 5], [6, 7], [8]]
+    assert continuous_scan.split_into_rows([(0, 0), (0, 0)]) == [[0], [1]]
+
+
+def test_plan_row():
+    row = continuous_scan.plan_row([3, 2, 1], max_speed_mm_per_s=10, acceleration_mm_per_s2=100)
+    assert row.speed_mm_per_s == 10
+    # Up to speed 0.5 mm before the first fov, and stopped 0.5 mm after the last.
+    assert (row.start_x_mm, row.end_x_mm) == pytest.approx((3.5, 0.5))
+    assert [row.x_at(t) for t in row.trigger_times_s] == pytest.approx([3, 2, 1])
+    assert np.diff(row.trigger_times_s) == pytest.approx([0.1, 0.1])
+    assert row.x_at(0) == pytest.approx(3.5)
+    assert row.x_at(row.duration_s) == pytest.approx(0.5)
+
+    # Only 0.125 mm to get up to speed in, so we can only get up to 5 mm/s.
+    limited = continuous_scan.plan_row([1, 2], 10, 100, x_limits_mm=(0.875, 10))
+    assert limited.speed_mm_per_s == pytest.approx(5)
+    assert limited.start_x_mm == pytest.approx(0.875)
+    with pytest.raises(ValueError):
+        continuous_scan.plan_row([1, 2], 10, 100, x_limits_mm=(1, 10))
+
+
+class FakeClock:
+    """
+    Stands in for the time module in multi_point_worker, so its trigger timing doesn't depend on how busy the machine
+    running the test is: perf_counter only moves on when the worker sleeps, or when the test moves it on.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+        # Without really sleeping, waits for the (simulated) hardware would spin.
+        time.sleep(min(max(seconds, 0), 0.001))
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def test_continuous_scan_acquisition(qtbot, monkeypatch, tmp_path):
+    # run_scenario changes these, make sure they're put back.
+    monkeypatch.setattr(control._def.Acquisition, "IMAGE_FORMAT", control._def.Acquisition.IMAGE_FORMAT)
+    monkeypatch.setattr(control._def.Acquisition, "OUTPUT_FORMAT", control._def.Acquisition.OUTPUT_FORMAT)
+    for name in (
+        "MULTIPOINT_USE_PIPELINED_SAVING",
+        "MULTIPOINT_USE_SEQUENCED_ACQUISITION",
+        "MULTIPOINT_USE_CONTINUOUS_SCAN",
+    ):
+        monkeypatch.setattr(control.core.multi_point_worker, name, getattr(control.core.multi_point_worker, name))
+    clock = FakeClock()
+    monkeypatch.setattr(control.core.multi_point_worker, "time", clock)
+
+    rows = []
+    acquire_row_continuously = control.core.multi_point_worker.MultiPointWorker.acquire_row_continuously
+
+    def recording_acquire_row_continuously(worker, row, *args, **kwargs):
+        rows.append(row)
+        return acquire_row_continuously(worker, row, *args, **kwargs)
+
+    monkeypatch.setattr(
+        control.core.multi_point_worker.MultiPointWorker, "acquire_row_continuously", recording_acquire_row_continuously
+    )
+
+    # How many triggers had gone out when each frame was handled.
+    triggers_when_handled = []
+    handle_camera_frame = control.core.multi_point_worker.MultiPointWorker._handle_camera_frame
+
+    def recording_handle_camera_frame(worker, *args, **kwargs):
+        triggers_when_handled.append(len(illumination_times))
+        return handle_camera_frame(worker, *args, **kwargs)
+
+    monkeypatch.setattr(
+        control.core.multi_point_worker.MultiPointWorker, "_handle_camera_frame", recording_handle_camera_frame
+    )
+
+    scope = benchmark.create_simulated_microscope()
+    x_speeds = []
+    monkeypatch.setattr(scope.stage, "set_x_max_speed", x_speeds.append)
+    illumination_times = []
+    send_trigger = scope.camera.send_trigger
+
+    def recording_send_trigger(illumination_time=None):
+        illumination_times.append(illumination_time)
+        return send_trigger(illumination_time)
+
+    monkeypatch.setattr(scope.camera, "send_trigger", recording_send_trigger)
+    # Reading out the first row's second fov takes long enough to make its third late (and only its third).
+    readouts = []
+    read_camera_frame = scope.camera.read_camera_frame
+
+    def slow_read_camera_frame():
+        readouts.append(clock.now)
+        if len(readouts) == 2:
+            clock.now += 1.5 * np.diff(rows[0].trigger_times_s)[0]
+        return read_camera_frame()
+
+    monkeypatch.setattr(scope.camera, "read_camera_frame", slow_read_camera_frame)
+
+    scenario = benchmark.Scenario(
+        wells=1,
+        fov_grid=(4, 2),
+        nz=1,
+        channels=1,
+        binning=3,
+        pixel_format="MONO8",
+        output_format="bmp",
+        pipelined=False,
+        hardware_trigger=True,
+        continuous=True,
+        exposure_ms=0.02,
+    )
+    try:
+        result = benchmark.run_scenario(scope, scenario, str(tmp_path), well_spacing_mm=9.0)
+    finally:
+        scope.camera.stop_streaming()
+    worker = scope.multipointController.multiPointWorker
+
+    assert worker.get_continuous_scan_unsupported_reason() is None
+    assert len(list(tmp_path.rglob("*.bmp"))) == result["images"] == 8
+    # Two rows, each at a limited speed and then back to full speed.
+    assert len(rows) == 2
+    assert (
+        len(x_speeds) == 4 and x_speeds[1::2] == [None, None] and x_speeds[::2] == [row.speed_mm_per_s for row in rows]
+    )
+    # Every row triggered with the channel's exposure, including the first (with the camera's exposure from before
+    # the channel was selected).
+    assert illumination_times == [0.02] * 8
+    # Frames are displayed and saved once their row is done, not between its triggers.
+    assert triggers_when_handled == [4] * 4 + [8] * 4
+
+    # The time point's coordinates, not the planned coordinates of the whole experiment.
+    coordinates = pd.read_csv(next(tmp_path.rglob("0/coordinates.csv")))
+    planned = scope.multipointController.scanCoordinates.region_fov_coordinates["A1"]
+    assert list(coordinates["fov"]) == list(range(8))
+    assert np.allclose(coordinates["y (mm)"], [y for _, y, *_ in planned], atol=0.001)
+    # Where the stage was planned to be when each trigger went out: on time, at the fov, except for the late one.
+    trigger_times_s = np.concatenate([row.trigger_times_s for row in rows])
+    trigger_times_s[2] = trigger_times_s[1] + 1.5 * np.diff(rows[0].trigger_times_s)[0]
+    expected_x_mm = [rows[i // 4].x_at(t) for i, t in enumerate(trigger_times_s)]
+    assert coordinates["x (mm)"].tolist() == pytest.approx(expected_x_mm, abs=1e-6)
+    assert coordinates["x (mm)"].drop(2).tolist() == pytest.approx([x for i, (x, *_) in enumerate(planned) if i != 2])
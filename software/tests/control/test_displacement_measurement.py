@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from qtpy.QtCore import Qt
+
+from control.core_displacement_measurement import (
+    DisplacementMeasurementController,
+    MeasurementHistory,
+    spot_centroid,
+)
+
+
+def test_measurement_history_wraps_around():
+    history = MeasurementHistory(4)
+    assert len(history) == 0 and history.latest().shape == (0, 3)
+    for i in range(10):
+        history.append(i, 10 * i, 100 * i)
+    assert len(history) == 4
+    assert history.latest()[:, 0].tolist() == [6, 7, 8, 9]
+    assert history.latest(2)[:, 1].tolist() == [80, 90]
+
+    history.resize(2)
+    assert history.latest()[:, 0].tolist() == [8, 9]
+    history.resize(5)
+    history.append(10, 100, 1000)
+    assert history.latest()[:, 0].tolist() == [8, 9, 10]
+
+    history.clear()
+    assert len(history) == 0
+
+
+def test_spot_centroid():
+    y, x = np.mgrid[:60, :80]
+    image = (200 * np.exp(-((x - 50.5) ** 2 + (y - 20.25) ** 2) / 20) + 10).astype(np.uint16)
+    # What update_measurement used to compute.
+    intensity = image.astype(float) - image.min()
+    intensity[intensity / intensity.max() < 0.2] = 0
+    expected = (np.sum(x * intensity) / np.sum(intensity), np.sum(y * intensity) / np.sum(intensity))
+    assert spot_centroid(image) == pytest.approx(expected)
+    assert spot_centroid(np.dstack([image.astype(np.uint8)] * 3)) == pytest.approx(expected, abs=0.05)
+    assert np.isnan(spot_centroid(np.zeros((10, 10), np.uint8))).all()
+
+
+def test_displacement_measurement_controller(tmp_path):
+    controller = DisplacementMeasurementController(x_offset=10, y_scaling=2, N_average=2, N=3)
+    plots, readings = [], []
+    controller.signal_plots.connect(lambda t, data: plots.append((t, data)), Qt.DirectConnection)
+    controller.signal_readings.connect(readings.append, Qt.DirectConnection)
+    path = tmp_path / "displacement.csv"
+    controller.start_logging(str(path))
+
+    image = np.zeros((40, 40), np.uint8)
+    for i in range(5):
+        image[:] = 0
+        image[10, 20 + i] = 255
+        controller.update_measurement(image)
+    controller.stop_logging()
+
+    t, data = plots[-1]
+    assert len(t) == 3 and data.tolist() == [[12, 13, 14], [20, 20, 20]]
+    assert readings[-1] == [13.5, 20]
+    assert controller.history.capacity == 3
+
+    # The log has all of them, not only the plotted ones.
+    logged = pd.read_csv(path)
+    assert logged["x"].tolist() == [10, 11, 12, 13, 14]
+
+    controller.update_settings(0, 0, 1, 1, 5, 4)
+    assert controller.history.capacity == 5 and len(controller.history) == 3
@@ -0,0 +1,278 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+from qtpy.QtCore import Qt
+
+import control.core.core
+import squid.abc
+from control.core.display import DisplayPipeline, LatestFrameMailbox, bin_image, to_8bit
+
+
+def test_latest_frame_mailbox():
+    mailbox = LatestFrameMailbox()
+    assert mailbox.take(timeout=0) is None
+    assert mailbox.put(1) is None
+    assert mailbox.put(2) == 1
+    assert mailbox.take() == 2
+    assert mailbox.take(timeout=0.01) is None
+    mailbox.close()
+    assert mailbox.take() is None
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+def test_prepare(dtype):
+    image = np.random.default_rng(0).integers(0, 200, (101, 150)).astype(dtype)
+    pipeline = DisplayPipeline()
+    pipeline.set_levels(dtype, (50, 150))
+    pipeline.set_binning(4)
+    pipeline.compute_histogram = True
+    try:
+        frame = pipeline.prepare(image)
+        # Unbinned, raw is still a copy: the camera can reuse image's buffer while raw is being shown.
+        pipeline.set_binning(1)
+        assert not np.shares_memory(pipeline.prepare(image).raw, image)
+    finally:
+        pipeline.close()
+
+    binned = cv2.resize(image[:100, :148], (37, 25), interpolation=cv2.INTER_AREA)
+    assert frame.binning == 4 and frame.levels == (50, 150)
+    assert np.array_equal(frame.raw, binned)
+    expected = np.clip((binned.astype(np.float64) - 50) * 255 / 100, 0, 255).astype(np.uint8)
+    assert frame.image.dtype == np.uint8
+    assert np.abs(frame.image.astype(int) - expected).max() <= 1
+    assert frame.histogram[1].sum() == frame.raw[::2, ::2].size
+
+    # Without contrast limits, the frame's range.
+    assert to_8bit(binned, binned.min(), binned.max()).max() == 255
+    assert bin_image(image, 1000).shape == (1, 1)
+
+
+def test_pipeline_levels():
+    pipeline = DisplayPipeline()
+    try:
+        # Nothing set yet, the dtype's whole range (or the frame's own for floats).
+        assert pipeline.get_levels(np.dtype(np.uint16)) == (0, 65535)
+        assert pipeline.get_levels(np.dtype(np.float32)) is None
+        pipeline.set_levels(np.uint16, (100, 200))
+        assert pipeline.get_levels(np.dtype(np.uint16)) == (100, 200)
+        # Levels for one dtype aren't used for another.
+        assert pipeline.get_levels(np.dtype(np.uint8)) == (0, 255)
+        pipeline.auto_levels = True
+        assert pipeline.get_levels(np.dtype(np.uint16)) is None
+    finally:
+        pipeline.close()
+
+
+def wait_for(condition, timeout_s=5.0):
+    deadline = time.time() + timeout_s
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_pipeline_keeps_the_newest_frame():
+    pipeline = DisplayPipeline(max_fps=1000)
+    emitted = []
+    # Stands in for the gui thread, which gets the frames queued and calls frame_displayed once it's painted them.
+    pipeline.frame_ready.connect(emitted.append, Qt.DirectConnection)
+    try:
+        for i in range(50):
+            pipeline.submit(np.full((8, 8), i, np.uint8))
+            time.sleep(0.001)
+        wait_for(lambda: len(emitted) == 1)
+        # Nothing else is emitted until that one's displayed, and only the newest frame waits for it.
+        time.sleep(0.05)
+        assert len(emitted) == 1
+        pipeline.frame_displayed()
+        wait_for(lambda: len(emitted) == 2)
+    finally:
+        pipeline.close()
+
+    assert emitted[1].raw[0, 0] == 49
+    stats = pipeline.get_stats()
+    assert (stats.frames_received, stats.frames_displayed, stats.frames_dropped) == (50, 1, 48)
+    assert "dropped 48" in str(stats)
+
+
+def test_pipeline_releases_camera_frames():
+    buffer = squid.abc.FrameRingBuffer(4)
+    pipeline = DisplayPipeline(max_fps=1000)
+    pipeline.frame_ready.connect(lambda frame: pipeline.frame_displayed(), Qt.DirectConnection)
+    frames = []
+    try:
+        for i in range(10):
+            slot = buffer.acquire((8, 8), np.uint16)
+            frames.append(
+                squid.abc.CameraFrame(
+                    i,
+                    time.time(),
+                    slot.array,
+                    squid.abc.CameraFrameFormat.RAW,
+                    squid.abc.CameraPixelFormat.MONO16,
+                    slot,
+                )
+            )
+            pipeline.submit(slot.array, frames[-1])
+        wait_for(lambda: pipeline.get_stats().frames_displayed >= 1)
+        wait_for(lambda: all(frame.slot.ref_count == 0 for frame in frames))
+    finally:
+        pipeline.close()
+
+
+def test_image_display_window_with_pipeline(qtbot):
+    window = control.core.core.ImageDisplayWindow(show_LUT=True, autoLevels=False)
+    qtbot.addWidget(window)
+    pipeline = DisplayPipeline(max_fps=1000)
+    window.set_display_pipeline(pipeline)
+    stream_handler = control.core.core.StreamHandler()
+    stream_handler.set_display_pipeline(pipeline)
+    stream_handler.set_display_fps(100)
+    assert pipeline.max_fps == 100
+
+    image = np.random.default_rng(0).integers(0, 4000, (400, 600)).astype(np.uint16)
+    pipeline.set_binning(2)
+    # The frames are painted on the gui thread, which isn't running here, so take them as they're emitted.
+    emitted = []
+    pipeline.frame_ready.connect(emitted.append, Qt.DirectConnection)
+    try:
+        stream_handler.on_new_frame(
+            squid.abc.CameraFrame(
+                0, time.time(), image, squid.abc.CameraFrameFormat.RAW, squid.abc.CameraPixelFormat.MONO16
+            )
+        )
+        wait_for(lambda: len(emitted) == 1)
+    finally:
+        pipeline.close()
+    window.display_frame(emitted[0])
+    assert pipeline.get_stats().frames_displayed == 1
+
+    # Painted 8 bit, at half the resolution, but the view is still in image pixels.
+    item = window.graphics_widget.img
+    assert item.image.dtype == np.uint8 and item.image.shape == (200, 300)
+    assert item.mapRectToParent(item.boundingRect()).width() == 600
+    assert window.get_displayed_image().dtype == np.uint16
+    # No contrast manager, so the whole 16 bit range, and the LUT shows it rather than setting the 8 bit image's.
+    assert window.LUTWidget.getLevels() == (0, 65535)
+    assert window.LUTWidget.item.imageItem() is None and item.levels.tolist() == [0, 255]
+
+    clicks = []
+    window.image_click_coordinates.connect(lambda *args: clicks.append(args))
+
+    class DoubleClick:
+        def __init__(self, pos):
+            self._pos = pos
+
+        def double(self):
+            return True
+
+        def pos(self):
+            return self._pos
+
+    view = window.graphics_widget.view.getView()
+    window.handle_mouse_click(DoubleClick(view.mapViewToScene(control.core.core.QPointF(450, 100))))
+    ((x, y, width, height),) = clicks
+    assert (width, height) == (600, 400)
+    assert abs(x - 150) <= 2 and abs(y + 100) <= 2
+
+    # Images displayed directly (like from autofocus) go back to full resolution, with the LUT following them.
+    window.display_image(image)
+    assert item.image.dtype == np.uint16 and window.display_binning == 1 and window.display_raw is None
+    assert window.LUTWidget.item.imageItem() is item
+
+
+class FakeLiveController:
+    def __init__(self, name):
+        self.currentConfiguration = type("Configuration", (), {"name": name})()
+
+
+def test_image_display_window_hands_the_pipeline_its_levels(qtbot, monkeypatch):
+    contrast_manager = control.core.core.ContrastManager()
+    live_controller = FakeLiveController("BF")
+    window = control.core.core.ImageDisplayWindow(live_controller, contrast_manager, show_LUT=True, autoLevels=False)
+    qtbot.addWidget(window)
+    pipeline = DisplayPipeline(max_fps=1000)
+    window.set_display_pipeline(pipeline)
+    emitted = []
+    pipeline.frame_ready.connect(emitted.append, Qt.DirectConnection)
+
+    # The pipeline never asks the window (or the contrast manager) for levels from its thread.
+    monkeypatch.setattr(
+        contrast_manager, "get_limits", lambda *args: pytest.fail("called off the gui thread") or (0, 1)
+    )
+    try:
+        pipeline.submit(np.full((8, 8), 1000, np.uint16))
+        wait_for(lambda: len(emitted) == 1)
+    finally:
+        pipeline.close()
+    assert emitted[0].levels == (0, 65535)
+    monkeypatch.undo()
+
+    contrast_manager.update_limits("BF", 500, 1500)
+    window.display_frame(emitted[0])
+    # Displaying a frame hands over the live channel's levels for its dtype.
+    assert pipeline.get_levels(np.dtype(np.uint16)) == (500, 1500)
+    live_controller.currentConfiguration.name = "Fluorescence"
+    contrast_manager.update_limits("Fluorescence", 10, 20)
+    window.set_autolevel(True)
+    assert pipeline.get_levels(np.dtype(np.uint16)) is None
+    window.set_autolevel(False)
+    assert pipeline.get_levels(np.dtype(np.uint16)) == (10, 20)
+
+    # frame_displayed is called even if painting fails, or the pipeline would never emit another frame.
+    monkeypatch.setattr(window.graphics_widget.img, "setImage", lambda *args, **kwargs: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        window.display_frame(emitted[0])
+    assert pipeline.get_stats().frames_displayed == 2
+
+
+def test_stream_handler_emits_copies_of_camera_frames():
+    stream_handler = control.core.core.StreamHandler()
+    stream_handler.set_display_fps(1000)
+    emitted = []
+    stream_handler.image_to_display.connect(emitted.append, Qt.DirectConnection)
+    buffer = squid.abc.FrameRingBuffer(2)
+    for i in range(3):
+        slot = buffer.acquire((8, 8), np.uint8)
+        slot.array[:] = i
+        # Past the display throttling.
+        time.sleep(0.002)
+        stream_handler.on_new_frame(
+            squid.abc.CameraFrame(
+                i, time.time() + i, slot.array, squid.abc.CameraFrameFormat.RAW, squid.abc.CameraPixelFormat.MONO8, slot
+            )
+        )
+    # The camera has reused the first frame's slot by now, but what was emitted for it is still the first frame.
+    assert [image[0, 0] for image in emitted] == [0, 1, 2]
+    assert not np.shares_memory(emitted[-1], slot.array)
+
+
+def test_stream_handler_only_emits_for_other_receivers_with_a_pipeline():
+    stream_handler = control.core.core.StreamHandler()
+    stream_handler.set_display_fps(1000)
+    pipeline = DisplayPipeline()
+    stream_handler.set_display_pipeline(pipeline)
+    buffer = squid.abc.FrameRingBuffer(2)
+
+    def new_frame(i):
+        slot = buffer.acquire((8, 8), np.uint8)
+        slot.array[:] = i
+        # Past the display throttling.
+        time.sleep(0.002)
+        stream_handler.on_new_frame(
+            squid.abc.CameraFrame(
+                i, time.time(), slot.array, squid.abc.CameraFrameFormat.RAW, squid.abc.CameraPixelFormat.MONO8, slot
+            )
+        )
+
+    try:
+        # Nothing but the pipeline displays the frames, so there's no copy to emit.
+        new_frame(0)
+        assert stream_handler.timestamp_last_display == 0
+        emitted = []
+        stream_handler.image_to_display.connect(emitted.append, Qt.DirectConnection)
+        new_frame(1)
+        assert [image[0, 0] for image in emitted] == [1]
+    finally:
+        pipeline.close()
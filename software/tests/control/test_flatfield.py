@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import tifffile
+
+from control.core import flatfield
+
+
+def test_sample_paths():
+    paths = [f"tile_{i}.tiff" for i in range(100)]
+    sample = flatfield.sample_paths(paths, 10, seed=3)
+    assert len(sample) == 10
+    assert len(set(sample)) == 10
+    assert set(sample).issubset(paths)
+    assert sample == flatfield.sample_paths(paths, 10, seed=3)
+    assert flatfield.sample_paths(paths[:5], 10) == paths[:5]
+
+
+def test_estimate_flatfields_only_reads_sample_and_returns_full_size(tmp_path):
+    height, width = 64, 96
+    y, x = np.mgrid[0:height, 0:width]
+    vignette = 1.0 - 0.5 * (((y - height / 2) / height) ** 2 + ((x - width / 2) / width) ** 2)
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(20):
+        path = os.path.join(str(tmp_path), f"tile_{i}.tiff")
+        tifffile.imwrite(path, (vignette * rng.uniform(1000, 2000, size=(height, width))).astype(np.uint16))
+        paths.append(path)
+
+    read_paths = []
+
+    def read(path):
+        read_paths.append(path)
+        return tifffile.imread(path)
+
+    flatfields = flatfield.estimate_flatfields(
+        paths, ["BF"], max_images=8, downsample_factor=4, num_workers=2, read_fn=read, seed=0
+    )
+    assert len(read_paths) == 8
+    assert flatfields["BF"].shape == (height, width)
+    # The estimated flatfield is brightest in the center, like the vignette.
+    assert flatfields["BF"][height // 2, width // 2] > flatfields["BF"][0, 0]
+
+
+def test_flatfield_cache(tmp_path):
+    cache = flatfield.FlatfieldCache(os.path.join(str(tmp_path), "flatfields"))
+    assert cache.get("20x", "Fluorescence 488 nm Ex", (1, 1)) is None
+
+    ff = np.linspace(0.5, 1.5, 12, dtype=np.float32).reshape(3, 4)
+    cache.put("20x", "Fluorescence 488 nm Ex", (1, 1), ff)
+    np.testing.assert_array_equal(cache.get("20x", "Fluorescence 488 nm Ex", [1, 1]), ff)
+    assert cache.get("20x", "Fluorescence 488 nm Ex", (1, 1), shape=(4, 3)) is None
+    assert cache.get("20x", "Fluorescence 488 nm Ex", (2, 2)) is None
+    assert cache.get("10x", "Fluorescence 488 nm Ex", (1, 1)) is None
+
+
+def test_apply_flatfield_clips_to_dtype():
+    image = np.array([[100, 60000]], dtype=np.uint16)
+    corrected = flatfield.apply_flatfield(image, np.array([[0.5, 0.5]], dtype=np.float32))
+    assert corrected.dtype == np.uint16
+    np.testing.assert_array_equal(corrected, [[200, 65535]])
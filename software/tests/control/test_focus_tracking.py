@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import control._def
+import control.core.core
+import control.core.multi_point_worker
+import tools.acquisition_benchmark as benchmark
+from control.core import autofocus, focus_tracking
+from tests.tools import get_test_microcontroller, get_test_stage
+
+
+def grid(n=5, step_mm=1.0):
+    return [(x * step_mm, y * step_mm) for y in range(n) for x in range(n)]
+
+
+def track(tracker, surface, points):
+    """
+    Autofocuses (finds focus on surface) wherever the tracker says to.  Returns how many times it did.
+    """
+    autofocus_count = 0
+    for x, y in points:
+        if tracker.should_autofocus(x, y):
+            tracker.add(x, y, surface(x, y))
+            autofocus_count += 1
+    return autofocus_count
+
+
+def test_tracking_a_tilted_sample():
+    tracker = focus_tracking.FocusTracker(tolerance_mm=0.001, max_skipped_fovs=5, residual_window=2)
+    assert tracker.predict(0, 0) is None
+
+    def tilted(x, y):
+        return 1.0 + 0.003 * x - 0.002 * y
+
+    autofocus_count = track(tracker, tilted, grid())
+    # Once the plane fits, autofocus only runs after max_skipped_fovs fovs to check it still does.
+    assert autofocus_count <= 10
+    assert tracker.skipped_count == 25 - autofocus_count
+    assert tracker.predict(10, 10) == pytest.approx(tilted(10, 10))
+
+
+def test_tracking_a_warped_sample():
+    def warped(x, y):
+        return 1.0 + 0.004 * ((x - 2) ** 2 + (y - 2) ** 2)
+
+    # A plane can't follow it, so autofocus keeps running.
+    plane_tracker = focus_tracking.FocusTracker(tolerance_mm=0.001, residual_window=2)
+    assert track(plane_tracker, warped, grid()) >= 20
+
+    surface_tracker = focus_tracking.FocusTracker(
+        control.core.core.FocusMap(), method="rbf", tolerance_mm=0.001, residual_window=2
+    )
+    for x, y in grid():
+        surface_tracker.add(x, y, warped(x, y))
+    assert surface_tracker.predict(2.5, 1.5) == pytest.approx(warped(2.5, 1.5), abs=0.001)
+
+    with pytest.raises(ValueError):
+        focus_tracking.FocusTracker(method="rbf")
+
+
+def test_move_xyz_to():
+    stage = get_test_stage(get_test_microcontroller())
+    start = stage.get_pos()
+    for dz_mm in (0.1, -0.05):
+        target = (start.x_mm + 1, start.y_mm + 2, start.z_mm + dz_mm)
+        stage.move_xyz_to(*target)
+        pos = stage.get_pos()
+        assert (pos.x_mm, pos.y_mm, pos.z_mm) == pytest.approx(target, abs=0.001)
+
+
+@pytest.mark.parametrize("fovs_per_af", [1, 2])
+def test_acquisition_skips_autofocus_on_a_tilted_sample(qtbot, monkeypatch, tmp_path, fovs_per_af):
+    # run_scenario changes these, make sure they're put back.
+    monkeypatch.setattr(control._def.Acquisition, "IMAGE_FORMAT", control._def.Acquisition.IMAGE_FORMAT)
+    monkeypatch.setattr(control._def.Acquisition, "OUTPUT_FORMAT", control._def.Acquisition.OUTPUT_FORMAT)
+    monkeypatch.setattr(control._def.Acquisition, "NUMBER_OF_FOVS_PER_AF", fovs_per_af)
+    monkeypatch.setattr(
+        control.core.multi_point_worker,
+        "MULTIPOINT_USE_PIPELINED_SAVING",
+        control.core.multi_point_worker.MULTIPOINT_USE_PIPELINED_SAVING,
+    )
+    monkeypatch.setattr(control.core.multi_point_worker, "MULTIPOINT_USE_FOCUS_TRACKING", True)
+
+    scope = benchmark.create_simulated_microscope()
+    # The simulated microscope doesn't set up contrast autofocus.
+    autofocus_controller = control.core.core.AutoFocusController(
+        scope.camera, scope.stage, scope.liveController, scope.microcontroller
+    )
+    monkeypatch.setattr(scope.multipointController, "autofocusController", autofocus_controller)
+    z0_mm = scope.stage.get_pos().z_mm + 0.1
+
+    def tilted(x, y):
+        return z0_mm + 0.002 * x + 0.001 * y
+
+    autofocus_positions = []
+
+    def fake_autofocus(focus_map_override=False):
+        pos = scope.stage.get_pos()
+        autofocus_positions.append((pos.x_mm, pos.y_mm))
+        z_mm = tilted(pos.x_mm, pos.y_mm)
+        scope.stage.move_z_to(z_mm)
+        autofocus_controller.last_result = autofocus.FocusSearchResult(z_mm, "fit")
+
+    monkeypatch.setattr(autofocus_controller, "autofocus", fake_autofocus)
+    scope.multipointController.set_af_flag(True)
+    scenario = benchmark.Scenario(
+        wells=1,
+        fov_grid=(4, 4),
+        nz=1,
+        channels=1,
+        binning=3,
+        pixel_format="MONO8",
+        output_format="bmp",
+        pipelined=False,
+    )
+    try:
+        benchmark.run_scenario(scope, scenario, str(tmp_path), well_spacing_mm=9.0)
+    finally:
+        scope.camera.stop_streaming()
+        scope.multipointController.set_af_flag(False)
+
+    worker = scope.multipointController.multiPointWorker
+    assert worker.get_focus_tracking_unsupported_reason() is None
+    assert len(autofocus_positions) < 16 // fovs_per_af
+    # Only the fovs autofocus would have run at count as skipped.
+    assert worker.focus_tracker.skipped_count == 16 // fovs_per_af - len(autofocus_positions)
+
+    # Every fov, autofocused or not, was acquired in focus.  (Except, between autofocus fovs, the first row's: there's
+    # only the nearest z to go on until there's a plane.)
+    coordinates = pd.read_csv(next(tmp_path.rglob("0/coordinates.csv")))
+    if fovs_per_af > 1:
+        coordinates = coordinates.iloc[4:]
+    expected_z_um = 1000 * tilted(coordinates["x (mm)"], coordinates["y (mm)"])
+    assert np.abs(coordinates["z (um)"] - expected_z_um).max() < 1
@@ -0,0 +1,102 @@
+import os
+import threading
+
+import numpy as np
+import tifffile
+
+import control.core.core as core
+from control.core import recording
+
+
+def frame(value, shape=(32, 48)):
+    return np.full(shape, value, dtype=np.uint16)
+
+
+def test_image_saver_drops_frames_over_memory_budget(tmp_path, monkeypatch):
+    unblock = threading.Event()
+    write = recording.write_recorded_image
+
+    def blocked_write(path, image):
+        unblock.wait(5)
+        write(path, image)
+
+    monkeypatch.setattr(recording, "write_recorded_image", blocked_write)
+
+    saver = core.ImageSaver()
+    saver.set_base_path(str(tmp_path))
+    saver.use_spill_file = False
+    saver.max_queued_bytes = 3 * frame(0).nbytes
+    saver.start_new_experiment("recording", add_timestamp=False)
+    stats = []
+    saver.recording_stats.connect(stats.append)
+
+    # Three frames fit in the budget while the writers are stuck, the rest are dropped.
+    for frame_ID in range(10):
+        saver.enqueue(frame(frame_ID), frame_ID, frame_ID * 0.1)
+    unblock.set()
+    saver.close()
+
+    final = stats[-1]
+    assert (final.frames_received, final.frames_saved, final.frames_dropped, final.frames_failed) == (10, 3, 7, 0)
+    assert final.bytes_saved == 3 * frame(0).nbytes
+    for counter in range(3):
+        path = recording.recorded_image_path(str(tmp_path / "recording"), counter, counter, "bmp", np.uint16)
+        np.testing.assert_array_equal(tifffile.imread(path), frame(counter))
+
+
+def test_image_saver_spill_file_is_converted_when_finished(tmp_path):
+    saver = core.ImageSaver(image_format="bmp")
+    saver.set_base_path(str(tmp_path))
+    saver.use_spill_file = True
+    saver.start_new_experiment("recording", add_timestamp=False)
+    stats = []
+    saver.recording_stats.connect(stats.append)
+
+    frames = [frame(i) for i in range(5)] + [np.full((16, 16), 7, dtype=np.uint8)]
+    for frame_ID, image in enumerate(frames):
+        saver.enqueue(image, frame_ID, 0.0)
+    saver.finish_recording(blocking=True)
+
+    experiment_path = str(tmp_path / "recording")
+    assert not os.path.exists(os.path.join(experiment_path, recording.SPILL_FILE_NAME))
+    assert not os.path.exists(os.path.join(experiment_path, recording.SPILL_INDEX_FILE_NAME))
+    for counter, image in enumerate(frames):
+        path = recording.recorded_image_path(experiment_path, counter, counter, "bmp", image.dtype)
+        assert os.path.exists(path)
+        if image.dtype == np.uint16:
+            np.testing.assert_array_equal(tifffile.imread(path), image)
+    assert stats[-1].frames_saved == len(frames)
+    saver.close()
+
+
+def test_image_saver_ignores_frames_after_finish_recording(tmp_path):
+    saver = core.ImageSaver(image_format="bmp")
+    saver.set_base_path(str(tmp_path))
+    saver.use_spill_file = True
+    saver.start_new_experiment("recording", add_timestamp=False)
+    stats = []
+    saver.recording_stats.connect(stats.append)
+
+    for frame_ID in range(3):
+        saver.enqueue(frame(frame_ID), frame_ID, 0.0)
+    saver.finish_recording()
+    # Still streaming when the recording was stopped: not appended to the spill file that's being closed.
+    saver.enqueue(frame(3), 3, 0.0)
+    saver.queue.join()
+    saver.close()
+
+    final = stats[-1]
+    assert (final.frames_received, final.frames_saved, final.frames_failed) == (3, 3, 0)
+    experiment_path = str(tmp_path / "recording")
+    assert len([name for _, _, names in os.walk(experiment_path) for name in names if name.endswith(".tiff")]) == 3
+
+    # The next recording takes frames again.
+    saver = core.ImageSaver(image_format="bmp")
+    saver.set_base_path(str(tmp_path))
+    saver.use_spill_file = False
+    saver.start_new_experiment("recording", add_timestamp=False)
+    saver.finish_recording(blocking=True)
+    saver.start_new_experiment("another recording", add_timestamp=False)
+    saver.enqueue(frame(0), 0, 0.0)
+    saver.close()
+    assert saver.stats.frames_saved == 1
@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+import pytest
+
+import control.core.core
+import control.utils
+import tools.laser_spot_benchmark as benchmark
+from control._def import SpotDetectionMode
+from control.core.laser_spot import SpotTracker
+from control.utils_config import LaserAFConfig
+from tests.tools import get_repo_root, get_test_camera, get_test_microcontroller, get_test_piezo_stage, get_test_stage
+
+
+def reference_image():
+    return cv2.imread(str(get_repo_root() / "software/tests/data/laser_af_camera.png"), cv2.IMREAD_GRAYSCALE)
+
+
+def shifted(image, dx, dy=0.0):
+    height, width = image.shape
+    return cv2.warpAffine(image, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+
+@pytest.mark.parametrize("mode", [SpotDetectionMode.DUAL_LEFT, SpotDetectionMode.DUAL_RIGHT])
+def test_spot_tracker_matches_find_spot_location(mode):
+    image = reference_image()
+    tracker = SpotTracker(mode)
+    # Small steps stay in the roi, the jump to 250 doesn't.
+    for dx in (0, 3.5, -10.2, 20, 250, 245.5):
+        frame = shifted(image, dx, dy=dx / 10)
+        assert tracker.detect(frame) == pytest.approx(control.utils.find_spot_location(frame, mode=mode))
+    assert tracker.roi_detections == 4 and tracker.full_frame_detections == 2
+
+    assert tracker.detect(np.zeros_like(image)) is None
+    with pytest.raises(NotImplementedError):
+        SpotTracker(SpotDetectionMode.MULTI_SECOND_RIGHT).detect(image)
+
+
+def test_laser_spot_benchmark():
+    results = benchmark.run_benchmark({"reference": reference_image()}, SpotDetectionMode.DUAL_LEFT, frames=20)
+    result = results["results"][0]
+    assert result["baseline_failures"] == result["tracker_failures"] == 0
+    assert result["max_difference_px"] < 1e-6
+    assert result["roi_detections"] > 0
+    assert "SpotTracker" in benchmark.summary_str(results)
+
+
+@pytest.mark.parametrize("closed_loop", [False, True])
+def test_laser_af_move_to_target(qtbot, monkeypatch, closed_loop):
+    monkeypatch.setattr(control.core.core, "LASER_AF_CLOSED_LOOP_PIEZO", closed_loop)
+    microcontroller = get_test_microcontroller()
+    camera = get_test_camera()
+    piezo = get_test_piezo_stage(microcontroller)
+    controller = control.core.core.LaserAutofocusController(
+        microcontroller, camera, None, get_test_stage(microcontroller), piezo
+    )
+
+    image = reference_image()
+    focus_um = piezo.position
+    px_per_um = 2.0
+    events = []
+
+    def read_frame():
+        events.append("read")
+        return shifted(image, (piezo.position - focus_um) * px_per_um)
+
+    monkeypatch.setattr(camera, "send_trigger", lambda *args, **kwargs: events.append("trigger"))
+    monkeypatch.setattr(camera, "read_frame", read_frame)
+
+    x_reference, _ = control.utils.find_spot_location(image, mode=SpotDetectionMode.DUAL_LEFT)
+    controller.laser_af_properties = LaserAFConfig(
+        has_reference=True,
+        x_reference=x_reference,
+        # Calibrated 20% short, so one move doesn't get all the way there.
+        pixel_to_um=0.8 / px_per_um,
+        laser_af_averaging_n=3,
+        spot_detection_mode=SpotDetectionMode.DUAL_LEFT,
+    )
+    half_crop = controller.laser_af_properties.spot_crop_size // 2
+    center_y = image.shape[0] // 2
+    crop = image[
+        center_y - half_crop : center_y + half_crop, int(x_reference) - half_crop : int(x_reference) + half_crop
+    ]
+    crop = crop.astype(np.float32)
+    controller.reference_crop = (crop - np.mean(crop)) / np.max(crop)
+
+    piezo.move_relative(10)
+    tracker_detect = controller._get_spot_tracker().detect
+    monkeypatch.setattr(
+        controller._spot_tracker, "detect", lambda frame: (events.append("detect"), tracker_detect(frame))[1]
+    )
+    events.clear()
+    # Without the closed loop, the spot ends up too far from the reference for the cross correlation check, which
+    # moves back.
+    assert controller.move_to_target(0) == closed_loop
+
+    # Each frame is processed after the next one is triggered.
+    assert events[:8] == ["trigger", "read", "trigger", "detect", "read", "trigger", "detect", "read"]
+    if closed_loop:
+        assert abs(piezo.position - focus_um) < controller.laser_af_properties.displacement_success_window_um / 2
+    else:
+        assert piezo.position == pytest.approx(focus_um + 10)
@@ -200,3 +200,143 @@ def test_home_directions():
             hm(homing_direction=d)
             wait()
             assert test_micro.last_command[3] == d.value
+
+
+def test_crc8():
+    def reference(data):
+        # Bit by bit CRC-8/CCITT (poly 0x07, init 0, no reflection).
+        crc = 0
+        for b in data:
+            crc ^= b
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        return crc
+
+    # The standard check value for CRC-8/CCITT.
+    assert control.microcontroller.crc8(b"123456789") == 0xF4
+    for data in (b"", b"\x00", bytes(range(23)), bytes(range(255, 100, -3))):
+        assert control.microcontroller.crc8(data) == reference(data)
+
+
+def test_packet_framer_finds_packets_in_noisy_chunks():
+    def packet(command_id, x, y, z, theta, buttons):
+        # Since we accept a 0 checksum from legacy firmware, a misaligned window ending on a 0 byte looks like a good
+        # packet.  So keep zeros out of these packets (status, positions, reserved) to test the resync.
+        body = control.microcontroller.PacketFramer.PACKET_STRUCT.pack(
+            command_id, control._def.CMD_EXECUTION_STATUS.IN_PROGRESS, x, y, z, theta, buttons, 0x01010101, 0
+        )[:-1]
+        return body + bytes([control.microcontroller.crc8(body)])
+
+    first = packet(1, 0x01020304, -0x01020304, 0x11111111, -(2**31) + 0x01010101, 1)
+    second = packet(2, -1, 2**31 - 1, 0x7F7F7F7F, 0x05050505, 2)
+    corrupted = bytearray(first)
+    corrupted[5] ^= 0xFF
+
+    framer = control.microcontroller.PacketFramer()
+    stream = b"\x07\x08" + bytes(corrupted) + first + second
+    packets = []
+    # Feed it in awkward sized chunks, so packets get split across reads.
+    for i in range(0, len(stream), 7):
+        packets.extend(framer.feed(stream[i : i + 7]))
+
+    assert [(p.command_id, p.x, p.y, p.z, p.theta, p.button_and_switch_state) for p in packets] == [
+        (1, 0x01020304, -0x01020304, 0x11111111, -(2**31) + 0x01010101, 1),
+        (2, -1, 2**31 - 1, 0x7F7F7F7F, 0x05050505, 2),
+    ]
+    assert framer.skipped_bytes == 2 + len(corrupted)
+    assert framer.buffered_bytes() == 0
+
+    # Legacy firmware sends a 0 checksum, which we accept.
+    legacy = first[:-1] + b"\x00"
+    assert [p.command_id for p in framer.feed(legacy)] == [1]
+
+
+def test_packet_framer_drops_oldest_bytes_when_behind():
+    status = control._def.CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS
+    packets = [
+        control.microcontroller.SimSerial.response_bytes_for(i, status, i, 0, 0, 0, False, False) for i in range(10)
+    ]
+    length = control._def.MicrocontrollerDef.MSG_LENGTH
+    framer = control.microcontroller.PacketFramer(max_buffered_bytes=3 * length)
+
+    assert framer.feed(packets[0][:10]) == []
+    assert [p.command_id for p in framer.feed(packets[0][10:] + b"".join(packets[1:3]))] == [0, 1, 2]
+    assert [p.command_id for p in framer.feed(b"".join(packets[3:]))] == [7, 8, 9]
+    assert framer.dropped_bytes == 4 * length
+
+
+def test_framer_decodes_like_legacy_reader():
+    import tools.microcontroller_benchmark as benchmark
+
+    stream = benchmark.make_packet_stream(200)
+    legacy = benchmark.legacy_decode(benchmark.chunked(stream, 1))
+    assert len(legacy) == 200
+    for chunk_size in (1, 5, 24, 1000):
+        assert benchmark.framer_decode(benchmark.chunked(stream, chunk_size)) == legacy
+
+
+def wait_for_received(sim_serial, count, timeout_s=2):
+    deadline = time.time() + timeout_s
+    while len(sim_serial.received_commands) < count and time.time() < deadline:
+        time.sleep(0.001)
+    return [command for _, command in sim_serial.received_commands]
+
+
+def test_microcontroller_pipelines_commands():
+    micro = get_test_micro()
+    sim_serial = micro._serial
+    CMD_SET = control._def.CMD_SET
+    sim_serial.hold_completions = True
+    sim_serial.received_commands.clear()
+
+    # Both moves go out right away, without waiting for each other.
+    x_done = micro.move_x_to_usteps(100)
+    y_done = micro.move_y_to_usteps(200)
+    assert wait_for_received(sim_serial, 2) == [CMD_SET.MOVETO_X, CMD_SET.MOVETO_Y]
+    time.sleep(0.05)
+    assert not x_done.done() and not y_done.done()
+    assert micro.is_busy()
+
+    # The micro reports the last command complete, which completes everything before it too.
+    sim_serial.complete_held_commands()
+    y_done.result(timeout=1)
+    assert x_done.done()
+    assert not micro.is_busy()
+    assert_pos_almost_equal((100, 200, 0, 0), micro.get_pos())
+
+
+def test_microcontroller_triggers_after_move():
+    micro = get_test_micro()
+    sim_serial = micro._serial
+    CMD_SET = control._def.CMD_SET
+    sim_serial.hold_completions = True
+    sim_serial.received_commands.clear()
+
+    triggered = micro.move_xy_to_usteps_then_trigger(300, 400)
+    assert wait_for_received(sim_serial, 2) == [CMD_SET.MOVETO_X, CMD_SET.MOVETO_Y]
+    # The trigger waits on our side until the moves are complete.
+    time.sleep(0.05)
+    assert len(sim_serial.received_commands) == 2
+
+    sim_serial.complete_held_commands()
+    assert wait_for_received(sim_serial, 3)[-1] == CMD_SET.SEND_HARDWARE_TRIGGER
+    assert not triggered.done()
+
+    sim_serial.complete_held_commands()
+    triggered.result(timeout=1)
+    micro.wait_till_operation_is_completed()
+
+
+def test_microcontroller_abort_fails_pending_commands():
+    micro = get_test_micro()
+    micro._serial.hold_completions = True
+
+    moved = micro.move_z_usteps(10)
+    micro.abort_current_command("testing")
+    assert isinstance(moved.exception(timeout=1), control.microcontroller.CommandAborted)
+    with pytest.raises(control.microcontroller.CommandAborted):
+        micro.wait_till_operation_is_completed()
+    micro.acknowledge_aborted_command()
+
+    micro._serial.hold_completions = False
+    micro.move_z_usteps(10).result(timeout=1)
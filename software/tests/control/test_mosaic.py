@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+from napari.components import ViewerModel
+
+import control.core.core
+import control.widgets
+import tests.control.gui_test_stubs as gts
+from control.core.mosaic import TiledMosaic
+from tests.tools import get_test_camera
+
+
+def test_tiled_mosaic_insert_and_read():
+    mosaic = TiledMosaic(np.uint16, tile_size=64)
+    image = np.random.default_rng(0).integers(0, 60000, (100, 130)).astype(np.uint16)
+    # Anywhere, including negative coordinates.
+    mosaic.insert(image, -30, -70)
+    assert np.array_equal(mosaic.read(0, -30, -70, 100, 130), image)
+    assert np.array_equal(mosaic.read(0, -40, -70, 10, 130), np.zeros((10, 130), np.uint16))
+    # Only the tiles the image touches: 3x3 on level 0, then 2x2 on each level (it straddles the origin).
+    assert mosaic.tile_count == 9 + 4 * 7
+
+    level_1 = mosaic.read(1, -15, -35, 50, 65)
+    assert np.array_equal(level_1, cv2.resize(image, (65, 50), interpolation=cv2.INTER_AREA))
+
+    mosaic.set_bounds(-30, -70, 100, 130)
+    levels = mosaic.levels(min_size=16)
+    assert [level.shape for level in levels] == [(100, 130), (50, 65), (25, 33), (13, 17)]
+    assert np.array_equal(np.asarray(levels[0]), image)
+    assert np.array_equal(levels[0][5:50:3, -10:], image[5:50:3, -10:])
+    assert levels[0][3, 4] == image[3, 4]
+
+    mosaic.clear()
+    assert mosaic.tile_count == 0 and not np.asarray(levels[0]).any()
+
+
+def test_tiled_mosaic_rgb():
+    mosaic = TiledMosaic(np.uint8, channels=3, tile_size=32)
+    image = np.random.default_rng(0).integers(0, 255, (40, 50, 3)).astype(np.uint8)
+    mosaic.insert(image, 10, 20)
+    mosaic.set_bounds(10, 20, 40, 50)
+    assert np.array_equal(mosaic.levels()[0][:, :, 1], image[:, :, 1])
+
+
+def test_mosaic_display_widget(qtbot, monkeypatch):
+    contrast_manager = control.core.core.ContrastManager()
+    contrast_manager.acquisition_dtype = np.uint8
+    objective_store = gts.get_test_objective_store()
+    camera = get_test_camera()
+    widget = control.widgets.NapariMosaicDisplayWidget(objective_store, camera, contrast_manager)
+    monkeypatch.setattr(control.widgets, "MOSAIC_VIEW_TILE_SIZE", 64)
+    # There's no opengl to draw with here.
+    monkeypatch.setattr(widget, "viewer", ViewerModel())
+
+    image_size = 256
+    widget.updateMosaic(np.full((image_size, image_size), 50, np.uint8), 10.0, 10.0, 0, "BF LED matrix full")
+    fov_mm = image_size * objective_store.get_pixel_size_factor() * camera.get_pixel_size_binned_um() / 1000
+    # Up and to the left, then far to the right.
+    widget.updateMosaic(
+        np.full((image_size, image_size), 100, np.uint8), 10.0 - fov_mm, 10.0 - fov_mm, 0, "BF LED matrix full"
+    )
+    widget.updateMosaic(
+        np.full((image_size, image_size), 150, np.uint8), 10.0 + 200 * fov_mm, 10.0, 0, "BF LED matrix full"
+    )
+    widget.updateMosaic(np.full((image_size, image_size), 200, np.uint8), 10.0, 10.0, 0, "Fluorescence 488 nm Ex")
+
+    layer = widget.viewer.layers["BF LED matrix full"]
+    assert layer.multiscale
+    top, left, height, width = widget.mosaic_bounds
+    assert layer.data[0].shape == (height, width)
+
+    def value_at(layer, x_mm, y_mm):
+        y, x = widget.mmToMosaicPixels(y_mm, x_mm)
+        return layer.data[0][y - top, x - left]
+
+    assert value_at(layer, 10.0, 10.0) == 50
+    assert value_at(layer, 10.0 - fov_mm, 10.0 - fov_mm) == 100
+    assert value_at(layer, 10.0 + 200 * fov_mm, 10.0) == 150
+    assert value_at(layer, 10.0 + 100 * fov_mm, 10.0) == 0
+    assert value_at(widget.viewer.layers["Fluorescence 488 nm Ex"], 10.0, 10.0) == 200
+    # The data on screen starts at top_left_coordinate.
+    assert widget.top_left_coordinate == pytest.approx([10.0 - 1.5 * fov_mm] * 2, abs=widget.viewer_pixel_size_mm)
+
+    # Memory is only spent where there are images, not across the whole 200 fov gap.
+    mosaic = widget.mosaics["BF LED matrix full"]
+    assert mosaic.nbytes < height * width / 4
+
+    widget.clearAllLayers()
+    assert mosaic.tile_count == 0
+    assert layer.data[0].shape == (height, width)
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import pytest
+
+import control.utils
+import tests.control.gui_test_stubs as gts
+from tests.tools import get_test_camera
+
+
+@pytest.mark.parametrize("thickness", [1, 2, 3, 4])
+def test_rectangle_outlines_mask(thickness):
+    shape = (60, 80)
+    # Including ones that overlap, and ones partly and entirely off the image.
+    rectangles = np.array(
+        [(10, 10, 30, 25), (20, 15, 50, 40), (-5, 50, 10, 70), (70, -10, 90, 5), (100, 100, 120, 120)]
+    )
+    mask = control.utils.rectangle_outlines_mask(shape, rectangles, thickness)
+
+    expected = np.zeros(shape, np.uint8)
+    for left, top, right, bottom in rectangles.tolist():
+        cv2.rectangle(expected, (left, top), (right, bottom), 1, thickness)
+    # cv2 rounds the outer corners of thick outlines, the mask doesn't.
+    different = mask != expected.astype(bool)
+    assert not (different & expected.astype(bool)).any()
+    assert different.sum() <= len(rectangles) * 4 * thickness**2
+
+    assert not control.utils.rectangle_outlines_mask(shape, np.empty((0, 4), int), thickness).any()
+
+
+@pytest.fixture
+def navigation_viewer(qtbot):
+    viewer = gts.get_test_navigation_viewer(
+        gts.get_test_objective_store(), get_test_camera().get_pixel_size_unbinned_um()
+    )
+    qtbot.addWidget(viewer)
+    return viewer
+
+
+def test_navigation_viewer_scan_overlay(navigation_viewer, monkeypatch):
+    viewer = navigation_viewer
+    fov_mm = viewer.fov_size_mm
+    x, y = np.meshgrid(20 + np.arange(10) * fov_mm, 20 + np.arange(8) * fov_mm)
+    coordinates = np.column_stack((x.ravel(), y.ravel(), np.zeros(x.size)))
+
+    set_image_calls = []
+    original_set_image = viewer.scan_overlay_item.setImage
+    monkeypatch.setattr(
+        viewer.scan_overlay_item,
+        "setImage",
+        lambda *args, **kwargs: set_image_calls.append(args) or original_set_image(*args, **kwargs),
+    )
+
+    viewer.register_fovs_to_image(coordinates)
+    for x_mm, y_mm, _ in coordinates[:5]:
+        viewer.register_fov_to_image(x_mm, y_mm)
+    # Nothing is drawn until the layers are updated, and then only once.
+    assert not set_image_calls and not viewer.scan_overlay.any()
+    viewer.update_layers()
+    viewer.update_layers()
+    assert len(set_image_calls) == 1
+    assert len(viewer.scan_fovs) == len(coordinates)
+
+    # The same outlines as drawing each fov with cv2.rectangle, as register_fov_to_image used to.
+    expected = np.zeros(viewer.scan_overlay.shape[:2], np.uint8)
+    for x_mm, y_mm, _ in coordinates:
+        left_top, right_bottom = viewer.get_FOV_pixel_coordinates(x_mm, y_mm)
+        cv2.rectangle(expected, left_top, right_bottom, 1, viewer.box_line_thickness)
+    drawn = viewer.scan_overlay.any(axis=2)
+    assert drawn[expected.astype(bool)].all()
+    assert (drawn != expected.astype(bool)).sum() <= len(coordinates) * 4 * viewer.box_line_thickness**2
+    assert (viewer.scan_overlay[drawn] == (252, 174, 30, 128)).all()
+
+    # Taking one fov off leaves the outlines its neighbours share with it.
+    viewer.deregister_fov_to_image(*coordinates[11][:2])
+    viewer.update_layers()
+    left, top, right, bottom = viewer.get_FOV_pixel_rectangles(coordinates[11:12])[0]
+    assert viewer.scan_overlay[top, (left + right) // 2].any()
+    assert len(viewer.scan_fovs) == len(coordinates) - 1
+
+    viewer.deregister_fovs_to_image(coordinates)
+    viewer.update_layers()
+    assert not viewer.scan_fovs and not viewer.scan_overlay.any()
+
+
+def test_navigation_viewer_focus_points(navigation_viewer):
+    viewer = navigation_viewer
+    viewer.register_focus_point(20.0, 20.0)
+    viewer.register_focus_points([(30.0, 25.0, 1.0), (40.0, 30.0, 1.0)])
+    viewer.update_layers()
+    for x_mm, y_mm in [(20.0, 20.0), (30.0, 25.0), (40.0, 30.0)]:
+        left_top, right_bottom = viewer.get_FOV_pixel_coordinates(x_mm, y_mm)
+        center_x = (left_top[0] + right_bottom[0]) // 2
+        center_y = (left_top[1] + right_bottom[1]) // 2
+        assert tuple(viewer.focus_point_overlay[center_y, center_x]) == (0, 255, 0, 255)
+
+    viewer.clear_focus_points()
+    viewer.update_layers()
+    assert not viewer.focus_point_overlay.any()
@@ -0,0 +1,93 @@
+import weakref
+
+import numpy as np
+
+from control.core import registration
+
+TILE_HEIGHT, TILE_WIDTH = 120, 160
+STEP_Y, STEP_X = 100, 130
+
+
+def make_tiles(rows, cols, tile_offsets):
+    rng = np.random.default_rng(0)
+    image = rng.normal(size=(TILE_HEIGHT + rows * STEP_Y + 40, TILE_WIDTH + cols * STEP_X + 40)).astype(np.float32)
+    tiles, expected_positions, true_positions = {}, {}, {}
+    for row in range(rows):
+        for col in range(cols):
+            offset_y, offset_x = tile_offsets.get((row, col), (0, 0))
+            y, x = row * STEP_Y + 20 + offset_y, col * STEP_X + 20 + offset_x
+            tiles[(row, col)] = image[y : y + TILE_HEIGHT, x : x + TILE_WIDTH]
+            expected_positions[(row, col)] = (row * STEP_Y, col * STEP_X)
+            true_positions[(row, col)] = (y, x)
+    return tiles, expected_positions, true_positions
+
+
+def test_find_neighbors_skips_corners_and_far_tiles():
+    positions = {(row, col): (row * STEP_Y, col * STEP_X) for row in range(2) for col in range(3)}
+    positions["far"] = (10 * STEP_Y, 0)
+    pairs = registration.find_neighbors(positions, (TILE_HEIGHT, TILE_WIDTH))
+    assert sorted(pairs) == sorted(
+        [
+            ((0, 0), (0, 1)),
+            ((0, 1), (0, 2)),
+            ((1, 0), (1, 1)),
+            ((1, 1), (1, 2)),
+            ((0, 0), (1, 0)),
+            ((0, 1), (1, 1)),
+            ((0, 2), (1, 2)),
+        ]
+    )
+
+
+def test_register_pairs_measures_true_offsets():
+    tiles, expected_positions, true_positions = make_tiles(1, 2, {(0, 1): (3, -5)})
+    offsets = registration.register_pairs(
+        [((0, 0), (0, 1))], expected_positions, tiles.__getitem__, downsample_factor=1
+    )
+    assert len(offsets) == 1
+    np.testing.assert_allclose((offsets[0].dy, offsets[0].dx), (3, STEP_X - 5), atol=0.1)
+    assert offsets[0].confidence > 0.5
+
+
+def test_register_pairs_only_keeps_the_tiles_being_read():
+    tiles, expected_positions, _ = make_tiles(3, 3, {(1, 1): (2, -3)})
+    pairs = registration.find_neighbors(expected_positions, (TILE_HEIGHT, TILE_WIDTH))
+    read = []
+    most_alive = [0]
+
+    def read_tile(tile):
+        image = tiles[tile].copy()
+        read.append(weakref.ref(image))
+        most_alive[0] = max(most_alive[0], sum(ref() is not None for ref in read))
+        return image
+
+    offsets = registration.register_pairs(pairs, expected_positions, read_tile, downsample_factor=1, num_workers=1)
+    assert len(offsets) == len(pairs)
+    # Each tile is dropped once it's cropped into its strips.
+    assert most_alive[0] == 1
+    expected = registration.register_pairs(pairs, expected_positions, tiles.__getitem__, downsample_factor=1)
+    assert [(offset.dy, offset.dx) for offset in offsets] == [(offset.dy, offset.dx) for offset in expected]
+
+
+def test_solve_positions_recovers_tile_positions():
+    rng = np.random.default_rng(2)
+    tile_offsets = {(row, col): tuple(rng.integers(-8, 9, 2)) for row in range(3) for col in range(4)}
+    tiles, expected_positions, true_positions = make_tiles(3, 4, tile_offsets)
+    pairs = registration.find_neighbors(expected_positions, (TILE_HEIGHT, TILE_WIDTH))
+    offsets = registration.register_pairs(pairs, expected_positions, tiles.__getitem__, downsample_factor=1)
+    # A bad match is ignored rather than pulling its tiles out of place.
+    offsets[0].dy += 40
+    offsets[0].confidence = 0.01
+
+    positions = registration.solve_positions(expected_positions, offsets)
+    origin = np.subtract(true_positions[(0, 0)], positions[(0, 0)])
+    for tile, position in positions.items():
+        np.testing.assert_allclose(np.add(position, origin), true_positions[tile], atol=0.5)
+
+
+def test_solve_positions_keeps_unregistered_tiles_at_expected_positions():
+    expected_positions = {"a": (0.0, 0.0), "b": (0.0, 100.0), "c": (500.0, 0.0)}
+    offsets = [registration.PairwiseOffset("a", "b", 4.0, 96.0, 0.9)]
+    positions = registration.solve_positions(expected_positions, offsets)
+    np.testing.assert_allclose(np.subtract(positions["b"], positions["a"]), (4.0, 96.0), atol=1e-3)
+    np.testing.assert_allclose(positions["c"], (500.0, 0.0), atol=1e-3)
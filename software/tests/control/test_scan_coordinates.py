@@ -0,0 +1,76 @@
+import numpy as np
+
+import tests.control.gui_test_stubs as gts
+
+
+def get_test_scan_coordinates():
+    scan_coordinates = gts.get_test_multi_point_controller().scanCoordinates
+    scan_coordinates.clear_regions()
+    return scan_coordinates
+
+
+def test_points_in_polygon_matches_is_in_polygon(qtbot):
+    scan_coordinates = get_test_scan_coordinates()
+    rng = np.random.default_rng(0)
+    # A concave polygon, with horizontal and vertical edges and vertices on the sampling grid.
+    polygon = np.array([(0, 0), (4, 0), (4, 4), (2, 2), (1, 4), (0, 4)], dtype=float)
+    points = np.vstack([rng.uniform(-1, 5, (2000, 2)), np.round(rng.uniform(-1, 5, (500, 2)))])
+
+    expected = [scan_coordinates._is_in_polygon(x, y, polygon) for x, y in points]
+
+    assert scan_coordinates._points_in_polygon(points, polygon).tolist() == expected
+
+
+def test_add_region_grid_order(qtbot):
+    scan_coordinates = get_test_scan_coordinates()
+    stage_config = scan_coordinates.stage.get_config()
+    x0, y0 = stage_config.X_AXIS.MIN_POSITION + 10, stage_config.Y_AXIS.MIN_POSITION + 10
+
+    scan_coordinates.fov_pattern = "S-Pattern"
+    scan_coordinates.add_flexible_region("A1", x0, y0, 0, 3, 2, 0)
+    xs = [x for x, y, *_ in scan_coordinates.region_fov_coordinates["A1"]]
+    ys = [y for x, y, *_ in scan_coordinates.region_fov_coordinates["A1"]]
+    assert len(xs) == 6
+    # The second row goes back the other way.
+    assert xs[:3] == sorted(xs[:3]) and xs[3:] == sorted(xs[3:], reverse=True)
+    assert ys[0] == ys[1] == ys[2] < ys[3] == ys[4] == ys[5]
+
+    scan_coordinates.fov_pattern = "Unidirectional"
+    scan_coordinates.add_flexible_region("A2", x0, y0, 0, 3, 2, 0)
+    xs = [x for x, y, *_ in scan_coordinates.region_fov_coordinates["A2"]]
+    assert xs[:3] == xs[3:] == sorted(xs[:3])
+
+
+def test_add_manual_region(qtbot):
+    scan_coordinates = get_test_scan_coordinates()
+    scan_coordinates.fov_pattern = "S-Pattern"
+    stage_config = scan_coordinates.stage.get_config()
+    x0, y0 = stage_config.X_AXIS.MIN_POSITION + 10, stage_config.Y_AXIS.MIN_POSITION + 10
+    triangle = np.array([(x0, y0), (x0 + 5, y0), (x0, y0 + 5)])
+
+    fovs = np.array(scan_coordinates.add_manual_region(triangle, overlap_percent=10))
+
+    assert len(fovs) > 3
+    # Every fov touches the triangle, with its center or a corner.
+    assert np.all(fovs[:, 0] + fovs[:, 1] <= x0 + y0 + 5 + scan_coordinates.navigationViewer.fov_size_mm)
+    # Rows go up in y, and alternate direction in x.
+    row_ys, row_starts = np.unique(fovs[:, 1], return_index=True)
+    assert list(row_starts) == sorted(row_starts)
+    for i, row in enumerate(np.split(fovs[:, 0], row_starts[1:])):
+        assert list(row) == sorted(row, reverse=i % 2 == 1)
+
+
+def test_get_scan_bounds(qtbot):
+    scan_coordinates = get_test_scan_coordinates()
+    assert scan_coordinates.get_scan_bounds() is None
+
+    stage_config = scan_coordinates.stage.get_config()
+    x0, y0 = stage_config.X_AXIS.MIN_POSITION + 10, stage_config.Y_AXIS.MIN_POSITION + 10
+    scan_coordinates.add_flexible_region("A1", x0, y0, 0, 3, 2, 0)
+    scan_coordinates.add_flexible_region("A2", x0 + 5, y0 - 2, 0, 1, 1, 0)
+
+    fovs = np.array([fov[:2] for coords in scan_coordinates.region_fov_coordinates.values() for fov in coords])
+    assert scan_coordinates.get_scan_bounds() == {
+        "x": (fovs[:, 0].min(), fovs[:, 0].max()),
+        "y": (fovs[:, 1].min(), fovs[:, 1].max()),
+    }
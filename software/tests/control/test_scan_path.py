@@ -0,0 +1,71 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import squid.config
+import tests.control.gui_test_stubs as gts
+from control.core import scan_path
+
+
+def get_motion_model(**kwargs):
+    return scan_path.MotionModel.from_stage_config(squid.config.get_stage_config(), **kwargs)
+
+
+def test_axis_move_time_profiles():
+    # Never reaches 10 mm/s within 0.1 mm at 100 mm/s^2, so accelerates half the way and decelerates the rest.
+    assert scan_path.axis_move_time(0.1, 10, 100) == pytest.approx(2 * np.sqrt(0.1 / 100))
+    # Reaches max speed, and spends max_speed / max_acceleration extra getting up to speed and stopping.
+    assert scan_path.axis_move_time(-10, 10, 100) == pytest.approx(1.1)
+    assert scan_path.axis_move_time(0, 10, 100) == 0
+
+    motion = get_motion_model(z_backlash_mm=0.005)
+    assert motion.z_move_time(-0.1) > motion.z_move_time(0.1)
+
+
+def test_plan_scan_path_reduces_move_time_deterministically():
+    motion = get_motion_model()
+    rng = np.random.default_rng(0)
+    # Sparse wells in a scrambled order, with a few fovs each.
+    regions = {}
+    for well in rng.permutation(96)[:20]:
+        row, column = divmod(int(well), 12)
+        x, y = 10 + 9 * column, 10 + 9 * row
+        regions[f"well{well}"] = [(x + dx, y + dy) for dx, dy in itertools.product((0, 0.5), (0, 0.5, 1.0))]
+
+    planned = scan_path.plan_scan_path(regions, motion)
+
+    assert set(planned) == set(regions)
+    for region_id, coordinates in planned.items():
+        assert sorted(coordinates) == sorted(regions[region_id])
+    assert (
+        scan_path.estimate_scan_time(planned, motion).move_s
+        < 0.8 * scan_path.estimate_scan_time(regions, motion).move_s
+    )
+    assert scan_path.plan_scan_path(regions, motion) == planned
+
+
+def test_plan_scan_path_keeps_order_it_cant_beat():
+    motion = get_motion_model()
+    row = [(x, 0.0) for x in np.arange(10.0)]
+    assert scan_path.plan_scan_path({"A1": row}, motion) == {"A1": row}
+
+
+def test_scan_coordinates_optimize_and_estimate(qtbot):
+    scan_coordinates = gts.get_test_multi_point_controller().scanCoordinates
+    scan_coordinates.clear_regions()
+    stage_config = scan_coordinates.stage.get_config()
+    x0, y0 = stage_config.X_AXIS.MIN_POSITION + 5, stage_config.Y_AXIS.MIN_POSITION + 5
+    # A1 and A3 are next to each other, A2 is far away.
+    for region_id, dx in (("A1", 0), ("A2", 40), ("A3", 1)):
+        scan_coordinates.add_flexible_region(region_id, x0 + dx, y0, 1.0, 2, 2, 0)
+
+    scan_coordinates.optimize_scan_path = True
+    scan_coordinates.sort_coordinates()
+
+    assert list(scan_coordinates.region_fov_coordinates) == ["A1", "A3", "A2"]
+    assert list(scan_coordinates.region_centers) == ["A1", "A3", "A2"]
+    estimate = scan_coordinates.estimate_scan_time(per_fov_acquisition_s=0.1)
+    assert estimate.n_fovs == 12
+    assert estimate.acquisition_s == pytest.approx(1.2)
+    assert estimate.total_s > estimate.move_s > 0
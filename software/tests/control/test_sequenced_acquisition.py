@@ -0,0 +1,58 @@
+import control._def
+import control.core.multi_point_worker
+import tools.acquisition_benchmark as benchmark
+
+
+def run_scenario(monkeypatch, tmp_path, hardware_trigger, sequenced, channels):
+    # run_scenario changes these, make sure they're put back.
+    monkeypatch.setattr(control._def.Acquisition, "IMAGE_FORMAT", control._def.Acquisition.IMAGE_FORMAT)
+    monkeypatch.setattr(control._def.Acquisition, "OUTPUT_FORMAT", control._def.Acquisition.OUTPUT_FORMAT)
+    for name in ("MULTIPOINT_USE_PIPELINED_SAVING", "MULTIPOINT_USE_SEQUENCED_ACQUISITION"):
+        monkeypatch.setattr(control.core.multi_point_worker, name, getattr(control.core.multi_point_worker, name))
+
+    scope = benchmark.create_simulated_microscope()
+    set_modes = []
+    set_microscope_mode = scope.liveController.set_microscope_mode
+
+    def counting_set_microscope_mode(configuration):
+        set_modes.append(configuration.name)
+        set_microscope_mode(configuration)
+
+    monkeypatch.setattr(scope.liveController, "set_microscope_mode", counting_set_microscope_mode)
+    scenario = benchmark.Scenario(
+        wells=1,
+        fov_grid=(2, 1),
+        nz=3,
+        channels=channels,
+        binning=3,
+        pixel_format="MONO8",
+        output_format="bmp",
+        pipelined=False,
+        hardware_trigger=hardware_trigger,
+        sequenced=sequenced,
+    )
+    try:
+        result = benchmark.run_scenario(scope, scenario, str(tmp_path), well_spacing_mm=9.0)
+    finally:
+        scope.camera.stop_streaming()
+    return result, scope.multipointController.multiPointWorker, set_modes
+
+
+def test_sequenced_acquisition_with_hardware_trigger(qtbot, monkeypatch, tmp_path):
+    result, worker, set_modes = run_scenario(monkeypatch, tmp_path, hardware_trigger=True, sequenced=True, channels=1)
+
+    assert worker.get_sequencing_unsupported_reason() is None
+    assert result["images"] == 6
+    assert result["phases"]["readout"]["count"] == 6
+    # The first is run_scenario setting up the trigger mode.  With one channel, the channel is then only set once per
+    # fov rather than once per z level.
+    assert len(set_modes) == 1 + 2
+    assert len(list(tmp_path.rglob("*.bmp"))) == 6
+
+
+def test_sequenced_acquisition_falls_back_without_hardware_trigger(qtbot, monkeypatch, tmp_path):
+    result, worker, set_modes = run_scenario(monkeypatch, tmp_path, hardware_trigger=False, sequenced=True, channels=2)
+
+    assert "hardware triggered" in worker.get_sequencing_unsupported_reason()
+    assert result["phases"]["readout"]["count"] == 12
+    assert len(set_modes) == 1 + 12
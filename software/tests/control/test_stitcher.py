@@ -0,0 +1,236 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import tifffile
+import zarr
+
+import control.stitcher
+from control.core import flatfield
+
+TILE_HEIGHT, TILE_WIDTH = 300, 400
+STEP_Y, STEP_X = 250, 350
+CHANNELS = ["Fluorescence 488 nm Ex", "Fluorescence 561 nm Ex"]
+MAX_TILE_OFFSET = 8
+
+
+def make_acquisition(path, rows=3, cols=3, nz=2, tile_offsets=None):
+    """
+    Writes a fake single region acquisition whose tiles are crops of a known mosaic, with a 1 um pixel size so
+    stage coordinates map directly to pixels.  Returns the (c, z, y, x) ground truth mosaic.
+
+    tile_offsets optionally maps fovs to a (dy, dx) error between where the stage says a tile is and where it
+    really is.  The mosaic then has a margin of MAX_TILE_OFFSET around it to crop those tiles from.
+    """
+    tile_offsets = tile_offsets or {}
+    margin = MAX_TILE_OFFSET if tile_offsets else 0
+    rng = np.random.default_rng(0)
+    mosaic = rng.integers(
+        0,
+        60000,
+        size=(
+            len(CHANNELS),
+            nz,
+            TILE_HEIGHT + (rows - 1) * STEP_Y + 2 * margin,
+            TILE_WIDTH + (cols - 1) * STEP_X + 2 * margin,
+        ),
+        dtype=np.uint16,
+    )
+
+    with open(os.path.join(path, "acquisition parameters.json"), "w") as f:
+        json.dump(
+            {
+                "objective": {"magnification": 10, "tube_lens_f_mm": 200},
+                "sensor_pixel_size_um": 10,
+                "tube_lens_mm": 200,
+                "dz(um)": 1.5,
+            },
+            f,
+        )
+
+    time_point_path = os.path.join(path, "0")
+    os.mkdir(time_point_path)
+    coordinates = []
+    for row in range(rows):
+        for col in range(cols):
+            fov = row * cols + col
+            offset_y, offset_x = tile_offsets.get(fov, (0, 0))
+            y, x = row * STEP_Y + margin + offset_y, col * STEP_X + margin + offset_x
+            for z_level in range(nz):
+                coordinates.append(
+                    {
+                        "region": "A1",
+                        "fov": fov,
+                        "z_level": z_level,
+                        "x (mm)": col * STEP_X / 1000,
+                        "y (mm)": row * STEP_Y / 1000,
+                        "z (um)": z_level * 1.5,
+                    }
+                )
+                for c, channel in enumerate(CHANNELS):
+                    tile = mosaic[c, z_level, y : y + TILE_HEIGHT, x : x + TILE_WIDTH]
+                    filename = f"A1_{fov}_{z_level}_{channel.replace(' ', '_')}.tiff"
+                    tifffile.imwrite(os.path.join(time_point_path, filename), tile)
+    pd.DataFrame(coordinates).to_csv(os.path.join(time_point_path, "coordinates.csv"), index=False)
+
+    return mosaic
+
+
+def test_coordinate_stitcher_places_tiles_from_coordinates(tmp_path):
+    mosaic = make_acquisition(str(tmp_path))
+
+    stitcher = control.stitcher.CoordinateStitcher(
+        input_folder=str(tmp_path), output_name="stitched", output_format=".ome.zarr"
+    )
+    progress = []
+    stitcher.update_progress.connect(lambda done, total: progress.append((done, total)))
+    stitcher.run()
+
+    assert stitcher.mono_channel_names == CHANNELS
+    output = zarr.open(os.path.join(str(tmp_path), "stitched.ome.zarr"), mode="r")
+    stitched = output["0"]
+    assert stitched.shape[:3] == (1, len(CHANNELS), 2)
+
+    height, width = mosaic.shape[2:]
+    np.testing.assert_array_equal(stitched[0, :, :, :height, :width], mosaic)
+    assert not np.any(stitched[0, :, :, height:, :])
+    assert not np.any(stitched[0, :, :, :, width:])
+
+    assert output.attrs["multiscales"][0]["datasets"][0]["path"] == "0"
+    assert [channel["label"] for channel in output.attrs["omero"]["channels"]] == CHANNELS
+    assert progress[-1] == (3 * 3 * 2 * len(CHANNELS), 3 * 3 * 2 * len(CHANNELS))
+
+
+def test_stitch_region_bounds_rows_in_memory(tmp_path, monkeypatch):
+    mosaic = make_acquisition(str(tmp_path), nz=1)
+    monkeypatch.setattr(control.stitcher, "STITCHING_MAX_CHUNK_ROWS_IN_MEMORY", 1)
+    monkeypatch.setattr(control.stitcher, "STITCHING_NUM_WORKERS", 1)
+
+    stitcher = control.stitcher.CoordinateStitcher(
+        input_folder=str(tmp_path), output_name="stitched", output_format=".ome.zarr"
+    )
+    stitcher.get_time_points()
+    stitcher.parse_filenames()
+    # Small chunks, so each tile spans several chunk rows and each chunk row several tiles.
+    stitcher.chunks = (1, 1, 1, 64, 64)
+
+    read_count = {}
+    read_tile = stitcher.read_tile
+
+    def counting_read_tile(filepath):
+        read_count[filepath] = read_count.get(filepath, 0) + 1
+        return read_tile(filepath)
+
+    stitcher.read_tile = counting_read_tile
+    stitcher.stitch_and_save_region("A1")
+
+    stitched = zarr.open(os.path.join(str(tmp_path), "stitched.ome.zarr"), mode="r")["0"]
+    height, width = mosaic.shape[2:]
+    np.testing.assert_array_equal(stitched[0, :, :, :height, :width], mosaic)
+    assert set(read_count.values()) == {1}
+
+
+def test_tile_catalog_is_cached_and_indexed(tmp_path):
+    make_acquisition(str(tmp_path), nz=1)
+
+    stitcher = control.stitcher.CoordinateStitcher(input_folder=str(tmp_path))
+    stitcher.get_time_points()
+    stitcher.parse_filenames()
+    catalog_path = os.path.join(str(tmp_path), "0", control.stitcher.TILE_CATALOG_FILE_NAME)
+    assert os.path.exists(catalog_path)
+    assert len(stitcher.stitching_data) == 9 * len(CHANNELS)
+    assert stitcher.num_fovs_per_region == 9
+    assert stitcher.regions == ["A1"]
+
+    tile_info = stitcher.stitching_data[(0, "A1", 4, 0, CHANNELS[1])]
+    assert (tile_info["x"], tile_info["y"]) == (STEP_X / 1000, STEP_Y / 1000)
+    assert stitcher.tile_grid[("A1", tile_info["x"], tile_info["y"], CHANNELS[1], 0)] == (0, "A1", 4, 0, CHANNELS[1])
+    assert len(stitcher.fov_tiles[("A1", 4)]) == len(CHANNELS)
+    assert stitcher.get_tile("A1", 123.0, 0.0, CHANNELS[0], 0) is None
+
+    # A second parse uses the cached catalog...
+    cached_stitcher = control.stitcher.CoordinateStitcher(input_folder=str(tmp_path))
+    cached_stitcher.get_time_points()
+
+    def fail_build(*args):
+        raise AssertionError("The tile catalog should have been loaded from the cache")
+
+    cached_stitcher.build_tile_catalog = fail_build
+    cached_stitcher.parse_filenames()
+    assert cached_stitcher.stitching_data == stitcher.stitching_data
+
+    # ...until the images change.
+    os.remove(os.path.join(str(tmp_path), "0", f"A1_8_0_{CHANNELS[0].replace(' ', '_')}.tiff"))
+    rebuilt_stitcher = control.stitcher.CoordinateStitcher(input_folder=str(tmp_path))
+    rebuilt_stitcher.get_time_points()
+    rebuilt_stitcher.parse_filenames()
+    assert len(rebuilt_stitcher.stitching_data) == 9 * len(CHANNELS) - 1
+
+
+def test_stitcher_uses_cached_flatfields(tmp_path, monkeypatch):
+    acquisition_path = os.path.join(str(tmp_path), "acquisition")
+    os.mkdir(acquisition_path)
+    mosaic = make_acquisition(acquisition_path, nz=1)
+
+    cache_path = os.path.join(str(tmp_path), "flatfields")
+    monkeypatch.setattr(control.stitcher, "FLATFIELD_CACHE_PATH", cache_path)
+    cache = flatfield.FlatfieldCache(cache_path)
+    for channel in CHANNELS:
+        cache.put("unknown_objective", channel, "unknown_binning", np.full((TILE_HEIGHT, TILE_WIDTH), 2.0))
+
+    stitcher = control.stitcher.CoordinateStitcher(
+        input_folder=acquisition_path, output_name="stitched", output_format=".ome.zarr", apply_flatfield=1
+    )
+    stitcher.run()
+
+    stitched = zarr.open(os.path.join(acquisition_path, "stitched.ome.zarr"), mode="r")["0"]
+    height, width = mosaic.shape[2:]
+    np.testing.assert_array_equal(stitched[0, :, :, :height, :width], (mosaic / 2.0).astype(np.uint16))
+
+
+def test_registration_places_tiles_where_they_really_are(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    tile_offsets = {
+        fov: tuple(2 * rng.integers(-MAX_TILE_OFFSET // 2, MAX_TILE_OFFSET // 2 + 1, 2)) for fov in range(9)
+    }
+    mosaic = make_acquisition(str(tmp_path), nz=1, tile_offsets=tile_offsets)
+
+    stitcher = control.stitcher.CoordinateStitcher(
+        input_folder=str(tmp_path),
+        output_name="stitched",
+        output_format=".ome.zarr",
+        use_registration=1,
+        registration_channel=CHANNELS[1],
+    )
+    stitcher.run()
+
+    true_positions = {
+        fov: ((fov // 3) * STEP_Y + offset_y, (fov % 3) * STEP_X + offset_x)
+        for fov, (offset_y, offset_x) in tile_offsets.items()
+    }
+    min_y = min(y for y, _ in true_positions.values())
+    min_x = min(x for _, x in true_positions.values())
+    assert stitcher.tile_positions["A1"] == {fov: (y - min_y, x - min_x) for fov, (y, x) in true_positions.items()}
+
+    stitched = zarr.open(os.path.join(str(tmp_path), "stitched.ome.zarr"), mode="r")["0"]
+    for fov, (y, x) in stitcher.tile_positions["A1"].items():
+        mosaic_y, mosaic_x = y + min_y + MAX_TILE_OFFSET, x + min_x + MAX_TILE_OFFSET
+        np.testing.assert_array_equal(
+            stitched[0, :, 0, y : y + TILE_HEIGHT, x : x + TILE_WIDTH],
+            mosaic[:, 0, mosaic_y : mosaic_y + TILE_HEIGHT, mosaic_x : mosaic_x + TILE_WIDTH],
+        )
+
+    # Re-stitching reuses the cached pairwise offsets instead of reading tiles to register them.
+    assert os.path.exists(os.path.join(str(tmp_path), control.stitcher.REGISTRATION_CACHE_FILE_NAME))
+    monkeypatch.setattr(
+        control.stitcher.registration,
+        "register_pairs",
+        lambda pairs, *args, **kwargs: [] if not pairs else pytest.fail("Pairs should have been cached"),
+    )
+    cached_stitcher = control.stitcher.CoordinateStitcher(
+        input_folder=str(tmp_path), output_name="restitched", use_registration=1, registration_channel=CHANNELS[1]
+    )
+    cached_stitcher.run()
+    assert cached_stitcher.tile_positions == stitcher.tile_positions
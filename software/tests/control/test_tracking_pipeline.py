@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from control.core.tracking_pipeline import TrackLog, WindowedTracker, read_track_log, search_window
+from squid.abc import Pos
+
+
+def test_track_log(tmp_path):
+    path = str(tmp_path / "track.bin")
+    log = TrackLog(path, flush_rows=2, flush_interval_s=1000)
+    pos = Pos(x_mm=1.0, y_mm=2.0, z_mm=0.5, theta_rad=None)
+    log.append(0, 100.0, pos, 0.01, -0.02, 5.0)
+    assert len(read_track_log(path)) == 0
+    log.append(1, 100.1, pos, 0.03, -0.04)
+    log.append(2, 100.2, pos, 0.05, -0.06, 7.0)
+    # The first two rows are on disk, the third waits for the next flush.
+    assert read_track_log(path)["frame"].tolist() == [0, 1]
+
+    csv_path = str(tmp_path / "track.csv")
+    log.close(csv_path)
+    track = read_track_log(path)
+    assert len(track) == len(log) == 3
+    assert track["x_error_mm"].tolist() == [0.01, 0.03, 0.05]
+    assert math.isnan(track["latency_ms"][1])
+    pd.testing.assert_frame_equal(pd.read_csv(csv_path), track)
+
+
+def test_search_window():
+    assert search_window((1000, 2000), (100, 200, 20, 40), 0) == (0, 0, 2000, 1000)
+    assert search_window((1000, 2000), (990, 490, 20, 20), 200) == (900, 400, 1100, 600)
+    # Moved inside the image, and clipped to it.
+    assert search_window((1000, 2000), (0, 990, 10, 10), 200) == (0, 800, 200, 1000)
+    assert search_window((100, 2000), (990, 40, 20, 20), 200) == (900, 0, 1100, 100)
+
+
+class BrightestBlobTracker:
+    """
+    Stands in for tracking.Tracker_Image: finds the bright pixels in whatever it's given.
+    """
+
+    def __init__(self):
+        self.bbox = None
+        self.roi_bbox = None
+        self.initialized_with = []
+
+    def reset(self):
+        self.bbox = None
+
+    def set_roi_bbox(self, bbox):
+        self.roi_bbox = bbox
+
+    def track(self, image, thresh_image, is_first_frame=False):
+        if is_first_frame:
+            self.initialized_with.append((image.shape, tuple(self.roi_bbox)))
+        ys, xs = np.nonzero(image > 128)
+        if not len(xs):
+            return False, None, None
+        self.bbox = (xs.min(), ys.min(), xs.max() - xs.min() + 1, ys.max() - ys.min() + 1)
+        centroid = np.array([int(self.bbox[0] + self.bbox[2] / 2), int(self.bbox[1] + self.bbox[3] / 2)])
+        rect_pts = np.array([[self.bbox[0], self.bbox[1]], [self.bbox[0] + self.bbox[2], self.bbox[1] + self.bbox[3]]])
+        return True, centroid, rect_pts
+
+
+def frame_with_object(x, y, shape=(600, 800)):
+    image = np.zeros(shape, np.uint8)
+    image[y : y + 10, x : x + 10] = 255
+    return image
+
+
+def test_windowed_tracker():
+    tracker = BrightestBlobTracker()
+    windowed_tracker = WindowedTracker(tracker, window_size_px=200, margin_px=30)
+    windowed_tracker.start((300, 300, 10, 10))
+
+    # The object moves right a few pixels a frame, the window stays put until it gets close to the edge.
+    for x in range(300, 400, 5):
+        object_found, centroid, rect_pts = windowed_tracker.track(frame_with_object(x, 300))
+        assert object_found
+        assert centroid.tolist() == [x + 5, 305]
+        assert rect_pts.tolist() == [[x, 300], [x + 10, 310]]
+    assert len(tracker.initialized_with) == 2
+    # Given just the window, with the roi in its coordinates.
+    assert tracker.initialized_with[0] == ((200, 200), (95.0, 95.0, 10.0, 10.0))
+    assert tracker.initialized_with[1][1][0] == 95.0
+
+    # Lost when it's outside the window.
+    assert windowed_tracker.track(frame_with_object(700, 50)) == (False, None, None)
@@ -1,10 +1,12 @@
 from typing import Optional, Sequence
 
+import numpy as np
+
 import squid.camera.utils
 import squid.config
-from squid.abc import AbstractCamera, CameraFrame
+from squid.abc import AbstractCamera, CameraFrame, FrameRingBuffer
 from squid.camera.utils import SimulatedCamera
-from squid.config import CameraConfig
+from squid.config import CameraConfig, FlipVariant
 
 
 def test_create_simulated_camera():
@@ -105,3 +107,69 @@ def test_read_frame_on_timeout():
     assert frames[frame_to_idx(8)] is None
     assert frames[frame_to_idx(9)] is not None
     assert frames[frame_to_idx(10)] is not None
+
+
+def test_frame_ring_buffer_reuses_unretained_slots():
+    buffer = FrameRingBuffer(3)
+    slots = [buffer.acquire((4, 5), np.uint16) for _ in range(3)]
+    assert len({id(slot.array) for slot in slots}) == 3
+
+    # Unretained slots are handed out again in order...
+    assert buffer.acquire((4, 5), np.uint16).array is slots[0].array
+    # ...skipping retained ones.
+    slots[1].retain()
+    assert buffer.acquire((4, 5), np.uint16).array is slots[2].array
+    assert buffer.acquire((4, 5), np.uint16).array is slots[0].array
+    slots[1].release()
+    assert buffer.acquire((4, 5), np.uint16).array is slots[1].array
+
+    # A different frame shape reallocates the slot.
+    assert buffer.acquire((2, 2), np.uint8).array.shape == (2, 2)
+
+    # When everything is retained, frames get their own array instead of waiting.
+    for slot in buffer._slots:
+        slot.retain()
+    extra = buffer.acquire((4, 5), np.uint16)
+    assert all(extra.array is not slot.array for slot in buffer._slots)
+    assert buffer.overflow_count == 1
+
+
+def test_simulated_camera_frames_are_read_only_views_into_the_frame_buffer():
+    sim_cam_config: CameraConfig = squid.config.get_camera_config().model_copy(
+        update={"rotate_image_angle": None, "flip": None, "frame_buffer_size": 2}
+    )
+    sim_cam = squid.camera.utils.get_camera(sim_cam_config, simulated=True)
+
+    sim_cam.send_trigger()
+    first = sim_cam.read_camera_frame()
+    assert not first.frame.flags.writeable
+    first_image = first.frame.copy()
+
+    # A retained frame is not overwritten by later frames.
+    first.retain()
+    for _ in range(3):
+        sim_cam.send_trigger()
+    np.testing.assert_array_equal(first.frame, first_image)
+    first.release()
+
+    sim_cam.send_trigger()
+    latest = sim_cam.read_camera_frame()
+    np.testing.assert_array_equal(latest.frame, np.roll(first_image, 10 * (latest.frame_id - first.frame_id), axis=0))
+
+
+def test_simulated_camera_rotates_into_the_frame_buffer():
+    sim_cam_config: CameraConfig = squid.config.get_camera_config().model_copy(
+        update={"rotate_image_angle": None, "flip": None}
+    )
+    rotated_config = sim_cam_config.model_copy(update={"rotate_image_angle": 90, "flip": FlipVariant.HORIZONTAL})
+    sim_cam = squid.camera.utils.get_camera(sim_cam_config, simulated=True)
+    rotated_cam = squid.camera.utils.get_camera(rotated_config, simulated=True)
+
+    sim_cam.send_trigger()
+    rotated_cam._current_raw_frame = sim_cam._current_raw_frame
+    rotated_cam._frame_id = 1
+    rotated_cam.send_trigger()
+    sim_cam.send_trigger()
+
+    expected = np.rot90(sim_cam.read_frame(), -1)[:, ::-1]
+    np.testing.assert_array_equal(rotated_cam.read_frame(), expected)
@@ -23,6 +23,17 @@ def test_simulated_cephla_stage_ops():
     assert stage.get_pos() == squid.abc.Pos(x_mm=0.0, y_mm=0.0, z_mm=0.0, theta_rad=0.0)
 
 
+def test_simulated_cephla_stage_moves_xy_together():
+    microcontroller = get_test_micro()
+    stage = squid.stage.cephla.CephlaStage(microcontroller, squid.config.get_stage_config())
+
+    stage.move_xy_to(1.0, 2.0)
+    pos = stage.get_pos()
+    assert pos.x_mm == pytest.approx(1.0, abs=1e-3)
+    assert pos.y_mm == pytest.approx(2.0, abs=1e-3)
+    assert not stage.get_state().busy
+
+
 def test_position_caching():
     (unused_temp_fd, temp_cache_path) = tempfile.mkstemp(".cache", "squid_testing_")
 
@@ -0,0 +1,417 @@
+"""
+Headless end-to-end acquisition throughput benchmark, run on the simulated microscope.
+
+Every combination of the given parameters (wells x fov grid x z levels x channels x binning x pixel format x output
+format x pipelined saving x trigger x sequenced acquisition x continuous scanning) is run as a multipoint acquisition through MultiPointController (headless, so the
+acquisition runs on this thread), and we report fovs/s, the per phase latencies recorded by the MultiPointWorker
+(move, settle, trigger, readout, save, display, ...) and the peak RSS of the process during the acquisition.
+
+The results are written as json so they can be compared between runs.  With --baseline, the results are compared
+against a previous results file and the exit code is non-zero if any scenario got slower by more than
+--max_regression, so this can gate changes to the acquisition hot path.
+
+Example:
+  python tools/acquisition_benchmark.py --wells 1 4 --fov_grids 2x2 --nz 1 3 --channels 1 3 --output results.json
+"""
+
+import dataclasses
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psutil
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from qtpy.QtWidgets import QApplication
+
+import control._def
+import control.core.core as core
+import control.core.multi_point_worker
+import control.microscope
+import squid.config
+import squid.logging
+
+log = squid.logging.get_logger("acquisition benchmark")
+
+INDIVIDUAL_IMAGE_FORMATS = ("bmp", "tiff")
+OUTPUT_FORMATS = INDIVIDUAL_IMAGE_FORMATS + tuple(
+    output_format.value
+    for output_format in control._def.AcquisitionOutputFormat
+    if output_format != control._def.AcquisitionOutputFormat.INDIVIDUAL_IMAGES
+)
+RESULTS_VERSION = 1
+
+
+@dataclasses.dataclass(frozen=True)
+class Scenario:
+    wells: int
+    fov_grid: Tuple[int, int]
+    nz: int
+    channels: int
+    binning: int
+    pixel_format: str
+    output_format: str
+    pipelined: bool
+    hardware_trigger: bool = False
+    sequenced: bool = False
+    continuous: bool = False
+    # The exposure time of every channel, or None to use the configured exposure times.
+    exposure_ms: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        # The newer parameters are only named when they aren't the default, so names match older results.
+        return (
+            f"wells={self.wells},fovs={self.fov_grid[0]}x{self.fov_grid[1]},nz={self.nz},channels={self.channels},"
+            f"binning={self.binning},pixel_format={self.pixel_format},format={self.output_format},"
+            f"pipelined={self.pipelined}"
+            + (",hardware_trigger=True" if self.hardware_trigger else "")
+            + (",sequenced=True" if self.sequenced else "")
+            + (",continuous=True" if self.continuous else "")
+            + (f",exposure_ms={self.exposure_ms}" if self.exposure_ms is not None else "")
+        )
+
+
+class PeakRssSampler:
+    """
+    Samples the RSS of this process on a background thread while in the with block, and keeps the peak.  Unlike
+    ru_maxrss, this gives the peak of each scenario rather than of the whole process so far.
+    """
+
+    def __init__(self, interval_s: float = 0.005):
+        self._interval_s = interval_s
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.start_bytes = 0
+        self.peak_bytes = 0
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._process.memory_info().rss)
+            self._stop.wait(self._interval_s)
+
+    def __enter__(self):
+        self.start_bytes = self.peak_bytes = self._process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._process.memory_info().rss)
+
+
+def parse_grid(grid: str) -> Tuple[int, int]:
+    nx, ny = (int(n) for n in grid.lower().split("x"))
+    return nx, ny
+
+
+def scenarios_from_args(args) -> List[Scenario]:
+    return [
+        Scenario(*combination)
+        for combination in itertools.product(
+            args.wells,
+            [parse_grid(grid) for grid in args.fov_grids],
+            args.nz,
+            args.channels,
+            args.binning,
+            args.pixel_formats,
+            args.formats,
+            args.pipelined,
+            args.hardware_trigger,
+            args.sequenced,
+            args.continuous,
+            args.exposure_ms,
+        )
+    ]
+
+
+def create_simulated_microscope() -> control.microscope.Microscope:
+    """
+    Returns a simulated microscope whose multipoint controller has scan coordinates to benchmark with.
+    """
+    scope = control.microscope.Microscope(is_simulation=True)
+    navigation_viewer = core.NavigationViewer(scope.objectiveStore, scope.camera.get_pixel_size_unbinned_um())
+    scope.multipointController.scanCoordinates = core.ScanCoordinates(
+        scope.objectiveStore, navigation_viewer, scope.stage
+    )
+    return scope
+
+
+def add_wells(scan_coordinates: core.ScanCoordinates, stage_config, scenario: Scenario, well_spacing_mm: float):
+    """
+    Lays the scenario's wells out in rows of up to 12, well_spacing_mm apart (like a 96 well plate), each with a
+    fov_grid of fovs.
+    """
+    scan_coordinates.clear_regions()
+    start_x = stage_config.X_AXIS.MIN_POSITION + well_spacing_mm
+    start_y = stage_config.Y_AXIS.MIN_POSITION + well_spacing_mm
+    nx, ny = scenario.fov_grid
+    for well in range(scenario.wells):
+        row, column = divmod(well, 12)
+        scan_coordinates.add_flexible_region(
+            f"{chr(ord('A') + row)}{column + 1}",
+            start_x + column * well_spacing_mm,
+            start_y + row * well_spacing_mm,
+            stage_config.Z_AXIS.MIN_POSITION + 1,
+            nx,
+            ny,
+            overlap_percent=10,
+        )
+
+
+def run_scenario(
+    scope: control.microscope.Microscope, scenario: Scenario, base_path: str, well_spacing_mm: float
+) -> Dict:
+    controller = scope.multipointController
+
+    scope.camera.set_binning(scenario.binning, scenario.binning)
+    scope.camera.set_pixel_format(squid.config.CameraPixelFormat.from_string(scenario.pixel_format))
+    if scenario.output_format in INDIVIDUAL_IMAGE_FORMATS:
+        control._def.Acquisition.IMAGE_FORMAT = scenario.output_format
+        control._def.Acquisition.OUTPUT_FORMAT = control._def.AcquisitionOutputFormat.INDIVIDUAL_IMAGES.value
+    else:
+        control._def.Acquisition.OUTPUT_FORMAT = scenario.output_format
+    # The worker module has its own copy of these from its "from control._def import *"
+    control.core.multi_point_worker.MULTIPOINT_USE_PIPELINED_SAVING = scenario.pipelined
+    control.core.multi_point_worker.MULTIPOINT_USE_SEQUENCED_ACQUISITION = scenario.sequenced
+    control.core.multi_point_worker.MULTIPOINT_USE_CONTINUOUS_SCAN = scenario.continuous
+
+    channels = [
+        config
+        for config in controller.channelConfigurationManager.get_configurations(scope.objectiveStore.current_objective)
+        if "RGB" not in config.name and "USB Spectrometer" not in config.name
+    ]
+    if scenario.channels > len(channels):
+        raise ValueError(f"Asked for {scenario.channels} channels, but only {len(channels)} are configured.")
+    controller.set_selected_configurations([config.name for config in channels[: scenario.channels]])
+    if scenario.exposure_ms is not None:
+        # Copies, so the configured exposure times are left alone for the other scenarios.
+        controller.selected_configurations = [
+            config.model_copy(update={"exposure_time": scenario.exposure_ms})
+            for config in controller.selected_configurations
+        ]
+    # Setting the trigger mode needs a channel to take the exposure time from.
+    scope.liveController.set_microscope_mode(channels[0])
+    scope.liveController.set_trigger_mode(
+        control._def.TriggerMode.HARDWARE if scenario.hardware_trigger else control._def.TriggerMode.SOFTWARE
+    )
+    controller.set_NZ(scenario.nz)
+    controller.set_Nt(1)
+    add_wells(controller.scanCoordinates, scope.stage.get_config(), scenario, well_spacing_mm)
+    fov_count = sum(len(coordinates) for coordinates in controller.scanCoordinates.region_fov_coordinates.values())
+
+    controller.set_base_path(base_path)
+    controller.start_new_experiment("benchmark")
+
+    with PeakRssSampler() as rss:
+        start = time.perf_counter()
+        controller.run_acquisition()
+        wall_s = time.perf_counter() - start
+
+    image_count = fov_count * scenario.nz * scenario.channels
+    return {
+        "scenario": scenario.name,
+        "parameters": dataclasses.asdict(scenario),
+        "fovs": fov_count,
+        "images": image_count,
+        "wall_s": wall_s,
+        "fovs_per_s": fov_count / wall_s,
+        "images_per_s": image_count / wall_s,
+        "phases": controller.multiPointWorker.timings.summary(),
+        "start_rss_mb": rss.start_bytes / 1024**2,
+        "peak_rss_mb": rss.peak_bytes / 1024**2,
+    }
+
+
+def run_benchmark(
+    scenarios: List[Scenario], repeat: int = 1, well_spacing_mm: float = 9.0, base_path: Optional[str] = None
+) -> Dict:
+    """
+    Runs every scenario repeat times on a freshly created simulated microscope, and returns the results (see
+    the module docstring) in a json serializable dict.  The acquired images are saved under base_path, or in a
+    temporary directory that is deleted afterwards if base_path is None.
+    """
+    app = QApplication.instance() or QApplication([])
+    scope = create_simulated_microscope()
+    # The scenarios change these, put them back afterwards.
+    saved_settings = (
+        control._def.Acquisition.IMAGE_FORMAT,
+        control._def.Acquisition.OUTPUT_FORMAT,
+        control.core.multi_point_worker.MULTIPOINT_USE_PIPELINED_SAVING,
+        control.core.multi_point_worker.MULTIPOINT_USE_SEQUENCED_ACQUISITION,
+        control.core.multi_point_worker.MULTIPOINT_USE_CONTINUOUS_SCAN,
+    )
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as temporary_path:
+            for scenario in scenarios:
+                for run in range(repeat):
+                    result = run_scenario(scope, scenario, base_path or temporary_path, well_spacing_mm)
+                    result["repeat"] = run
+                    log.info(
+                        f"{scenario.name} [{run + 1}/{repeat}]: {result['fovs_per_s']:.2f} fovs/s, "
+                        f"peak rss={result['peak_rss_mb']:.0f} [MB]"
+                    )
+                    results.append(result)
+    finally:
+        scope.camera.stop_streaming()
+        (
+            control._def.Acquisition.IMAGE_FORMAT,
+            control._def.Acquisition.OUTPUT_FORMAT,
+            control.core.multi_point_worker.MULTIPOINT_USE_PIPELINED_SAVING,
+            control.core.multi_point_worker.MULTIPOINT_USE_SEQUENCED_ACQUISITION,
+            control.core.multi_point_worker.MULTIPOINT_USE_CONTINUOUS_SCAN,
+        ) = saved_settings
+
+    return {
+        "version": RESULTS_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "total_memory_mb": psutil.virtual_memory().total / 1024**2,
+        },
+        "results": results,
+    }
+
+
+def median_fovs_per_s(results: Dict) -> Dict[str, float]:
+    per_scenario = {}
+    for result in results["results"]:
+        per_scenario.setdefault(result["scenario"], []).append(result["fovs_per_s"])
+    return {scenario: statistics.median(fovs_per_s) for scenario, fovs_per_s in per_scenario.items()}
+
+
+def find_regressions(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """
+    Returns a description of every scenario in both results whose median fovs/s dropped by more than
+    max_regression (a fraction) compared to the baseline.
+    """
+    current = median_fovs_per_s(results)
+    regressions = []
+    for scenario, baseline_fovs_per_s in median_fovs_per_s(baseline).items():
+        if scenario in current and current[scenario] < baseline_fovs_per_s * (1 - max_regression):
+            regressions.append(
+                f"{scenario}: {current[scenario]:.2f} fovs/s, was {baseline_fovs_per_s:.2f} fovs/s "
+                f"({100 * (current[scenario] / baseline_fovs_per_s - 1):.0f}%)"
+            )
+    return regressions
+
+
+def summary_str(results: Dict) -> str:
+    lines = []
+    for result in results["results"]:
+        phases = ", ".join(
+            f"{phase}={stats['mean_ms']:.1f}" for phase, stats in sorted(result["phases"].items(), key=lambda p: p[0])
+        )
+        lines.append(
+            f"{result['scenario']}\n"
+            f"  {result['fovs_per_s']:.2f} fovs/s, {result['images_per_s']:.2f} images/s, "
+            f"wall={result['wall_s']:.2f} [s], peak rss={result['peak_rss_mb']:.0f} [MB]\n"
+            f"  mean phase latencies [ms]: {phases}"
+        )
+    return "\n".join(lines)
+
+
+def main(args):
+    if args.verbose:
+        squid.logging.set_stdout_log_level(logging.DEBUG)
+    else:
+        squid.logging.set_stdout_log_level(logging.WARNING)
+
+    results = run_benchmark(scenarios_from_args(args), args.repeat, args.well_spacing, args.save_path)
+    print(summary_str(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        if regressions:
+            print("Throughput regressions compared to the baseline:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No throughput regressions compared to the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Benchmark multipoint acquisitions on the simulated microscope.")
+
+    ap.add_argument("--wells", type=int, nargs="+", default=[1], help="Number(s) of wells to acquire.")
+    ap.add_argument("--fov_grids", type=str, nargs="+", default=["3x3"], help="Fov grid(s) per well, as NXxNY.")
+    ap.add_argument("--nz", type=int, nargs="+", default=[1], help="Number(s) of z levels per fov.")
+    ap.add_argument("--channels", type=int, nargs="+", default=[1], help="Number(s) of channels per z level.")
+    ap.add_argument(
+        "--binning", type=int, nargs="+", default=[1], choices=[1, 2, 3], help="Camera binning(s), sets image size."
+    )
+    ap.add_argument("--pixel_formats", type=str, nargs="+", default=["MONO8"], choices=["MONO8", "MONO12", "MONO16"])
+    ap.add_argument("--formats", type=str, nargs="+", default=["bmp"], choices=OUTPUT_FORMATS, help="Output formats.")
+    ap.add_argument(
+        "--pipelined",
+        type=lambda value: value.lower() in ("1", "true", "yes"),
+        nargs="+",
+        default=[control._def.MULTIPOINT_USE_PIPELINED_SAVING],
+        help="Whether to use pipelined saving (true/false, both to compare).",
+    )
+    ap.add_argument(
+        "--hardware_trigger",
+        type=lambda value: value.lower() in ("1", "true", "yes"),
+        nargs="+",
+        default=[False],
+        help="Whether to hardware trigger the camera (true/false, both to compare).",
+    )
+    ap.add_argument(
+        "--sequenced",
+        type=lambda value: value.lower() in ("1", "true", "yes"),
+        nargs="+",
+        default=[control._def.MULTIPOINT_USE_SEQUENCED_ACQUISITION],
+        help="Whether to use sequenced acquisition, which needs a hardware trigger (true/false, both to compare).",
+    )
+    ap.add_argument(
+        "--continuous",
+        type=lambda value: value.lower() in ("1", "true", "yes"),
+        nargs="+",
+        default=[control._def.MULTIPOINT_USE_CONTINUOUS_SCAN],
+        help="Whether to scan rows of fovs without stopping, which needs a hardware trigger, one channel and nz=1 "
+        "(true/false, both to compare).",
+    )
+    ap.add_argument(
+        "--exposure_ms",
+        type=lambda value: None if value.lower() == "none" else float(value),
+        nargs="+",
+        default=[None],
+        help="Exposure time(s) of every channel in ms (none for the configured exposure times).",
+    )
+    ap.add_argument("--repeat", type=int, default=1, help="Run each scenario this many times.")
+    ap.add_argument("--well_spacing", type=float, default=9.0, help="Distance between wells in mm.")
+    ap.add_argument("--save_path", type=str, default=None, help="Keep the acquired images here (default: discard).")
+    ap.add_argument("--output", type=str, default=None, help="Write the json results to this file.")
+    ap.add_argument("--baseline", type=str, default=None, help="Compare against this previous json results file.")
+    ap.add_argument(
+        "--max_regression",
+        type=float,
+        default=0.1,
+        help="Fail if any scenario's median fovs/s is more than this fraction below the baseline.",
+    )
+    ap.add_argument("--verbose", action="store_true", help="Turn on debug logging")
+
+    sys.exit(main(ap.parse_args()))
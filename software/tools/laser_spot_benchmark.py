@@ -0,0 +1,185 @@
+"""
+Benchmarks laser autofocus spot detection on recorded focus camera images: SpotTracker against
+utils.find_spot_location.
+
+Each image is turned into a sequence of frames like the ones laser AF sees along a scan: the image shifted by a random
+walk in x (with a jump now and then, like moving to a new well) and a little in y, plus some noise.  Both find the spot
+in every frame.  Reported are the detection times per frame and per measurement (of --averaging-n frames), how many
+frames the tracker found the spot in its ROI, and how far apart the two centroids were.
+
+Example:
+  python tools/laser_spot_benchmark.py --images tests/data/laser_af_camera.png --frames 500 --output results.json
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import control._def
+import control.utils
+import squid.logging
+from control.core.laser_spot import SpotTracker
+
+log = squid.logging.get_logger("laser_spot_benchmark")
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "laser_af_camera.png")
+
+
+def load_image(path: str) -> np.ndarray:
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Failed to load image from {path}")
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def make_frames(
+    image: np.ndarray, n: int, step_px: float, rng: np.random.Generator, jump_probability: float = 0.02
+) -> List[np.ndarray]:
+    """
+    n copies of image, shifted by a random walk in x with steps of about step_px (and jumps of up to a sixth of the
+    width with jump_probability), jittered in y, and with noise added.
+    """
+    height, width = image.shape
+    max_shift = width / 6
+    info = np.iinfo(image.dtype)
+    frames = []
+    dx = 0.0
+    for _ in range(n):
+        if rng.random() < jump_probability:
+            dx = rng.uniform(-max_shift, max_shift)
+        else:
+            dx = float(np.clip(dx + rng.normal(0, step_px), -max_shift, max_shift))
+        dy = rng.normal(0, 1)
+        shifted = cv2.warpAffine(
+            image, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height), borderMode=cv2.BORDER_REPLICATE
+        )
+        noisy = shifted + rng.normal(0, 0.01 * info.max, shifted.shape)
+        frames.append(np.clip(noisy, 0, info.max).astype(image.dtype))
+    return frames
+
+
+def _detect_baseline(frame: np.ndarray, mode: control._def.SpotDetectionMode) -> Optional[Tuple[float, float]]:
+    try:
+        return control.utils.find_spot_location(frame, mode=mode)
+    except ValueError:
+        return None
+
+
+def _time_ms(fn, frames: Iterable[np.ndarray]) -> Tuple[List[Optional[Tuple[float, float]]], np.ndarray]:
+    results = []
+    times_ms = []
+    for frame in frames:
+        start = time.perf_counter()
+        results.append(fn(frame))
+        times_ms.append(1000 * (time.perf_counter() - start))
+    return results, np.array(times_ms)
+
+
+def _time_summary(times_ms: np.ndarray, averaging_n: int) -> Dict:
+    return {
+        "mean_ms": float(np.mean(times_ms)),
+        "p95_ms": float(np.percentile(times_ms, 95)),
+        "max_ms": float(np.max(times_ms)),
+        "measurement_ms": averaging_n * float(np.mean(times_ms)),
+    }
+
+
+def run_benchmark(
+    images: Dict[str, np.ndarray],
+    mode: control._def.SpotDetectionMode,
+    frames: int,
+    step_px: float = 8.0,
+    averaging_n: int = control._def.LASER_AF_AVERAGING_N,
+    seed: int = 0,
+) -> Dict:
+    rng = np.random.default_rng(seed)
+    results = []
+    for name, image in images.items():
+        sequence = make_frames(image, frames, step_px, rng)
+        baseline, baseline_ms = _time_ms(lambda frame: _detect_baseline(frame, mode), sequence)
+        tracker = SpotTracker(mode)
+        tracked, tracker_ms = _time_ms(tracker.detect, sequence)
+
+        both_found = [(b, t) for b, t in zip(baseline, tracked) if b is not None and t is not None]
+        differences = [np.hypot(b[0] - t[0], b[1] - t[1]) for b, t in both_found]
+        results.append(
+            {
+                "image": name,
+                "shape": list(image.shape),
+                "frames": frames,
+                "baseline": _time_summary(baseline_ms, averaging_n),
+                "tracker": _time_summary(tracker_ms, averaging_n),
+                "roi_detections": tracker.roi_detections,
+                "baseline_failures": sum(b is None for b in baseline),
+                "tracker_failures": sum(t is None for t in tracked),
+                "max_difference_px": float(max(differences, default=0.0)),
+            }
+        )
+    return {"mode": mode.name, "averaging_n": averaging_n, "step_px": step_px, "results": results}
+
+
+def summary_str(results: Dict) -> str:
+    lines = [f"{results['mode']}, {results['averaging_n']} frames per measurement:"]
+    for result in results["results"]:
+        baseline, tracker = result["baseline"], result["tracker"]
+        lines.append(
+            f"  {result['image']} {tuple(result['shape'])}, {result['frames']} frames: "
+            f"find_spot_location {baseline['mean_ms']:.2f} [ms] per frame (p95 {baseline['p95_ms']:.2f}), "
+            f"{baseline['measurement_ms']:.1f} [ms] per measurement; "
+            f"SpotTracker {tracker['mean_ms']:.2f} [ms] per frame (p95 {tracker['p95_ms']:.2f}), "
+            f"{tracker['measurement_ms']:.1f} [ms] per measurement, {result['roi_detections']} found in the roi; "
+            f"failures {result['baseline_failures']} vs {result['tracker_failures']}, "
+            f"max centroid difference {result['max_difference_px']:.3f} [px]"
+        )
+    return "\n".join(lines)
+
+
+def main(args):
+    if args.verbose:
+        squid.logging.set_stdout_log_level(logging.DEBUG)
+    else:
+        squid.logging.set_stdout_log_level(logging.WARNING)
+
+    images = {os.path.basename(path): load_image(path) for path in args.images}
+    mode = control._def.SpotDetectionMode[args.mode]
+    results = run_benchmark(images, mode, args.frames, args.step_px, args.averaging_n, args.seed)
+    print(summary_str(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Benchmark laser autofocus spot detection on recorded images.")
+
+    ap.add_argument("--images", type=str, nargs="+", default=[DEFAULT_IMAGE], help="Focus camera images to use.")
+    ap.add_argument(
+        "--mode",
+        type=str,
+        choices=[mode.name for mode in control._def.SpotDetectionMode],
+        default=control._def.SpotDetectionMode(control._def.LASER_AF_SPOT_DETECTION_MODE).name,
+        help="Which spot to detect.",
+    )
+    ap.add_argument("--frames", type=int, default=200, help="Frames per image.")
+    ap.add_argument("--step-px", type=float, default=8.0, help="Typical spot movement between frames, in pixels.")
+    ap.add_argument(
+        "--averaging-n", type=int, default=control._def.LASER_AF_AVERAGING_N, help="Frames per measurement."
+    )
+    ap.add_argument("--seed", type=int, default=0, help="Seed for the spot movement and noise.")
+    ap.add_argument("--output", type=str, default=None, help="Write the json results to this file.")
+    ap.add_argument("--verbose", action="store_true", help="Turn on debug logging")
+
+    sys.exit(main(ap.parse_args()))
@@ -0,0 +1,213 @@
+"""
+Benchmarks the Microcontroller read path against the simulated micro (SimSerial).
+
+Reports:
+  - packet decode throughput of the PacketFramer the read loop uses, compared to the per byte decoding the read loop
+    used to do (kept here as a reference), for a few read chunk sizes.
+  - command round trip latency: sending a command, and waiting for the read loop to see its ack.
+  - the cpu the process uses while the micro is connected but idle (the read loop should block, not spin).
+
+Example:
+  python tools/microcontroller_benchmark.py --packets 20000 --commands 500 --output results.json
+"""
+
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from typing import Dict, Iterable, List
+
+import control._def
+import control.microcontroller
+import squid.logging
+
+log = squid.logging.get_logger("microcontroller_benchmark")
+
+
+def make_packet_stream(n_packets: int, seed: int = 0) -> bytes:
+    """
+    n_packets packets like the micro sends (random positions), with a little garbage sprinkled in between.
+    """
+    rng = random.Random(seed)
+    stream = bytearray()
+    for i in range(n_packets):
+        if rng.random() < 0.01:
+            stream.extend(rng.randbytes(rng.randint(1, 5)))
+        stream.extend(
+            control.microcontroller.SimSerial.response_bytes_for(
+                i % 256,
+                control._def.CMD_EXECUTION_STATUS.COMPLETED_WITHOUT_ERRORS,
+                rng.randint(-(2**31), 2**31 - 1),
+                rng.randint(-(2**31), 2**31 - 1),
+                rng.randint(-(2**31), 2**31 - 1),
+                rng.randint(-(2**31), 2**31 - 1),
+                False,
+                False,
+            )
+        )
+    return bytes(stream)
+
+
+def chunked(stream: bytes, chunk_size: int) -> List[bytes]:
+    return [stream[i : i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def legacy_decode(chunks: Iterable[bytes], packet_length: int = control._def.MicrocontrollerDef.MSG_LENGTH) -> List:
+    """
+    The decoding the read loop did before it used the PacketFramer: one byte at a time into a list, checking the crc of
+    every packet sized window, and decoding positions byte by byte.  Returns (command id, x, y, z, theta) per packet.
+    It uses today's crc8 (rather than the crc package it used then), so it doesn't count that speedup.
+    """
+
+    def payload_to_int(payload, number_of_bytes):
+        signed = 0
+        for i in range(number_of_bytes):
+            signed = signed + int(payload[i]) * (256 ** (number_of_bytes - 1 - i))
+        if signed >= 256**number_of_bytes / 2:
+            signed = signed - 256**number_of_bytes
+        return signed
+
+    packets = []
+    maybe_msg = []
+    for chunk in chunks:
+        for b in chunk:
+            maybe_msg.append(b)
+            if len(maybe_msg) < packet_length:
+                continue
+            checksum = control.microcontroller.crc8(maybe_msg[:-1])
+            if checksum == maybe_msg[-1] or maybe_msg[-1] == 0:
+                packets.append(
+                    (
+                        maybe_msg[0],
+                        payload_to_int(maybe_msg[2:6], 4),
+                        payload_to_int(maybe_msg[6:10], 4),
+                        payload_to_int(maybe_msg[10:14], 4),
+                        payload_to_int(maybe_msg[14:18], 4),
+                    )
+                )
+                maybe_msg = []
+            else:
+                maybe_msg.pop(0)
+    return packets
+
+
+def framer_decode(chunks: Iterable[bytes]) -> List:
+    """
+    Same as legacy_decode, but with the PacketFramer.
+    """
+    framer = control.microcontroller.PacketFramer()
+    packets = []
+    for chunk in chunks:
+        packets.extend((p.command_id, p.x, p.y, p.z, p.theta) for p in framer.feed(chunk))
+    return packets
+
+
+def decode_throughput(n_packets: int, chunk_sizes: Iterable[int]) -> List[Dict]:
+    stream = make_packet_stream(n_packets)
+    results = []
+    for chunk_size in chunk_sizes:
+        chunks = chunked(stream, chunk_size)
+        result = {"chunk_size": chunk_size}
+        for name, decoder in (("legacy", legacy_decode), ("framer", framer_decode)):
+            start = time.perf_counter()
+            decoded = decoder(chunks)
+            elapsed = time.perf_counter() - start
+            result[f"{name}_packets"] = len(decoded)
+            result[f"{name}_packets_per_s"] = len(decoded) / elapsed
+        result["speedup"] = result["framer_packets_per_s"] / result["legacy_packets_per_s"]
+        results.append(result)
+    return results
+
+
+def round_trip_latency(n_commands: int) -> Dict:
+    micro = control.microcontroller.Microcontroller(control.microcontroller.SimSerial(), reset_and_initialize=False)
+    try:
+        latencies = []
+        for i in range(n_commands):
+            start = time.perf_counter()
+            micro.move_x_usteps(1 if i % 2 else -1)
+            micro.wait_till_operation_is_completed()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        micro.close()
+
+    latencies.sort()
+    return {
+        "commands": n_commands,
+        "mean_ms": 1000 * statistics.mean(latencies),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p99_ms": 1000 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+        "max_ms": 1000 * latencies[-1],
+    }
+
+
+def idle_cpu(duration_s: float) -> Dict:
+    micro = control.microcontroller.Microcontroller(control.microcontroller.SimSerial(), reset_and_initialize=False)
+    try:
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        time.sleep(duration_s)
+        cpu_s = time.process_time() - start_cpu
+        wall_s = time.perf_counter() - start
+    finally:
+        micro.close()
+    return {"wall_s": wall_s, "cpu_s": cpu_s, "cpu_percent": 100 * cpu_s / wall_s}
+
+
+def run_benchmark(n_packets: int, chunk_sizes: Iterable[int], n_commands: int, idle_s: float) -> Dict:
+    return {
+        "decode": decode_throughput(n_packets, chunk_sizes),
+        "round_trip": round_trip_latency(n_commands),
+        "idle": idle_cpu(idle_s),
+    }
+
+
+def summary_str(results: Dict) -> str:
+    lines = ["packet decode throughput [packets/s]:"]
+    for result in results["decode"]:
+        lines.append(
+            f"  chunks of {result['chunk_size']:>5} bytes: legacy={result['legacy_packets_per_s']:.0f}, "
+            f"framer={result['framer_packets_per_s']:.0f} ({result['speedup']:.1f}x)"
+        )
+    round_trip = results["round_trip"]
+    lines.append(
+        f"command round trip over {round_trip['commands']} commands [ms]: mean={round_trip['mean_ms']:.3f}, "
+        f"p50={round_trip['p50_ms']:.3f}, p99={round_trip['p99_ms']:.3f}, max={round_trip['max_ms']:.3f}"
+    )
+    lines.append(f"idle cpu: {results['idle']['cpu_percent']:.1f}% over {results['idle']['wall_s']:.1f} [s]")
+    return "\n".join(lines)
+
+
+def main(args):
+    if args.verbose:
+        squid.logging.set_stdout_log_level(logging.DEBUG)
+    else:
+        squid.logging.set_stdout_log_level(logging.WARNING)
+
+    results = run_benchmark(args.packets, args.chunk_sizes, args.commands, args.idle_time)
+    print(summary_str(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Benchmark the microcontroller read path against the simulated micro.")
+
+    ap.add_argument("--packets", type=int, default=20000, help="Number of packets to decode.")
+    ap.add_argument(
+        "--chunk_sizes", type=int, nargs="+", default=[1, 24, 4096], help="Read sizes to feed the decoders."
+    )
+    ap.add_argument("--commands", type=int, default=500, help="Number of commands for the round trip latency.")
+    ap.add_argument("--idle_time", type=float, default=2.0, help="Seconds to measure idle cpu for.")
+    ap.add_argument("--output", type=str, default=None, help="Write the json results to this file.")
+    ap.add_argument("--verbose", action="store_true", help="Turn on debug logging")
+
+    sys.exit(main(ap.parse_args()))
@@ -0,0 +1,142 @@
+"""
+Benchmarks fov generation in ScanCoordinates for big manual ROIs and dense regions, on the simulated microscope.
+
+Times, for each target number of fovs:
+  - add_manual_region with a polygon (an irregular octagon) sized to give about that many fovs.
+  - add_region with a square well sized to give about that many fovs.
+  - get_scan_bounds over everything added so far.
+
+Each timing includes drawing the fovs on the navigation viewer, like when adding regions from the gui.
+
+Example:
+  QT_QPA_PLATFORM=offscreen python tools/scan_coordinates_benchmark.py --fovs 10000 30000 100000 --output results.json
+"""
+
+import json
+import logging
+import math
+import sys
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+
+import control._def
+import squid.logging
+
+log = squid.logging.get_logger("scan_coordinates_benchmark")
+
+
+def make_scan_coordinates():
+    # Importing the stubs needs a QApplication around.
+    import tests.control.gui_test_stubs as gts
+
+    scan_coordinates = gts.get_test_multi_point_controller().scanCoordinates
+    scan_coordinates.clear_regions()
+    return scan_coordinates
+
+
+def octagon(center_x: float, center_y: float, radius: float) -> np.ndarray:
+    angles = np.arange(8) * 2 * np.pi / 8 + 0.1
+    # Alternate the radius so the polygon is concave.
+    radii = radius * np.where(np.arange(8) % 2 == 0, 1.0, 0.8)
+    return np.column_stack((center_x + radii * np.cos(angles), center_y + radii * np.sin(angles)))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def with_drawing(scan_coordinates, fn):
+    # The navigation viewer draws the next time the event loop runs, which it doesn't here.
+    def fn_then_draw(*args, **kwargs):
+        result = fn(*args, **kwargs)
+        scan_coordinates.navigationViewer.update_layers()
+        return result
+
+    return fn_then_draw
+
+
+def run_benchmark(fov_counts: Iterable[int]) -> Dict:
+    scan_coordinates = make_scan_coordinates()
+    fov_size_mm = scan_coordinates.navigationViewer.fov_size_mm
+    limits = control._def.SOFTWARE_POS_LIMIT
+    center_x = (limits.X_NEGATIVE + limits.X_POSITIVE) / 2
+    center_y = (limits.Y_NEGATIVE + limits.Y_POSITIVE) / 2
+    usable_mm = min(limits.X_POSITIVE - limits.X_NEGATIVE, limits.Y_POSITIVE - limits.Y_NEGATIVE) - 2 * fov_size_mm
+
+    results = []
+    for n_fovs in fov_counts:
+        # Pick the overlap so that ~n_fovs fovs fit in a polygon that fits in our movement range.
+        step_mm = usable_mm / math.sqrt(n_fovs)
+        overlap_percent = 100 * (1 - step_mm / fov_size_mm)
+        result = {"target_fovs": n_fovs, "overlap_percent": overlap_percent}
+
+        scan_coordinates.clear_regions()
+        polygon = octagon(center_x, center_y, usable_mm / 2)
+        fovs, result["manual_region_s"] = timed(
+            with_drawing(scan_coordinates, scan_coordinates.add_manual_region), polygon, overlap_percent
+        )
+        result["manual_region_fovs"] = len(fovs)
+
+        scan_coordinates.clear_regions()
+        _, result["square_region_s"] = timed(
+            with_drawing(scan_coordinates, scan_coordinates.add_region),
+            "A1",
+            center_x,
+            center_y,
+            usable_mm,
+            overlap_percent,
+            "Square",
+        )
+        result["square_region_fovs"] = len(scan_coordinates.region_fov_coordinates.get("A1", []))
+
+        _, result["scan_bounds_s"] = timed(scan_coordinates.get_scan_bounds)
+        results.append(result)
+    scan_coordinates.clear_regions()
+    return {"fov_size_mm": fov_size_mm, "results": results}
+
+
+def summary_str(results: Dict) -> str:
+    lines = [f"fov size {results['fov_size_mm']:.3f} [mm]:"]
+    for result in results["results"]:
+        lines.append(
+            f"  ~{result['target_fovs']} fovs: manual region {result['manual_region_fovs']} fovs in "
+            f"{result['manual_region_s']:.3f} [s], square region {result['square_region_fovs']} fovs in "
+            f"{result['square_region_s']:.3f} [s], scan bounds in {1000 * result['scan_bounds_s']:.1f} [ms]"
+        )
+    return "\n".join(lines)
+
+
+def main(args):
+    if args.verbose:
+        squid.logging.set_stdout_log_level(logging.DEBUG)
+    else:
+        squid.logging.set_stdout_log_level(logging.WARNING)
+
+    from qtpy.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+
+    results = run_benchmark(args.fovs)
+    print(summary_str(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Benchmark ScanCoordinates fov generation on the simulated microscope.")
+
+    ap.add_argument("--fovs", type=int, nargs="+", default=[10000, 30000, 100000], help="Target fov counts.")
+    ap.add_argument("--output", type=str, default=None, help="Write the json results to this file.")
+    ap.add_argument("--verbose", action="store_true", help="Turn on debug logging")
+
+    sys.exit(main(ap.parse_args()))